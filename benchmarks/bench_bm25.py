@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark the BM25 inverted index on a synthetic Zipf-distributed corpus.
+
+Reports build time, postings memory, and WAND top-k latency for short
+queries mixing frequent and rare terms, plus the latency of incremental
+inserts and deletes on the loaded index.
+
+Example:
+    python benchmarks/bench_bm25.py --sizes 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.deepthought.memory.bm25 import BM25Index  # noqa: E402
+
+
+def zipf_corpus(n: int, vocab: int, length: int, rng: np.random.Generator):
+    weights = 1.0 / np.arange(1, vocab + 1)
+    words = rng.choice(vocab, size=(n, length), p=weights / weights.sum())
+    return [" ".join(f"w{w}" for w in row) for row in words]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000])
+    parser.add_argument("--vocab", type=int, default=50_000)
+    parser.add_argument("--length", type=int, default=10, help="Tokens per fact")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    for n in args.sizes:
+        facts = zipf_corpus(n, args.vocab, args.length, rng)
+        index = BM25Index()
+        start = time.perf_counter()
+        index.add_many(facts)
+        build = time.perf_counter() - start
+        print(f"n={n}: build {build:.1f}s, postings {index.nbytes / 1e6:.1f} MB")
+
+        terms = rng.zipf(1.3, size=(args.queries, 3)) % args.vocab
+        queries = [" ".join(f"w{t}" for t in row) for row in terms]
+        start = time.perf_counter()
+        for query in queries:
+            index.search(query, args.k)
+        per_query = (time.perf_counter() - start) / len(queries)
+        print(f"  top-{args.k} query: {per_query * 1e3:.3f} ms")
+
+        new = zipf_corpus(1000, args.vocab, args.length, rng)
+        start = time.perf_counter()
+        for fact in new:
+            index.add(fact)
+        for doc in range(0, 2000, 2):
+            index.delete(doc)
+        update = (time.perf_counter() - start) / 2000
+        print(f"  incremental add/delete: {update * 1e6:.1f} us/op")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark retrieval latency under sustained churn with and without compaction.
+
+Starts from a Zipf-distributed corpus, then runs rounds that each add and
+delete ``--churn`` facts (a sliding window of live memories). After every
+round it measures BM25 query latency (p50/p99) on an index that is never
+compacted and on one kept by a MemoryCompactor, whose rebuild runs in a
+worker thread concurrently with a stream of queries on the event loop. The
+rebuild time is how long the loop would stall if it rebuilt in place.
+
+Example:
+    python benchmarks/bench_compaction.py --size 100000 --rounds 10 --churn 20000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.deepthought.memory.bm25 import BM25Index  # noqa: E402
+from src.deepthought.memory.compaction import MemoryCompactor  # noqa: E402
+
+
+def zipf_corpus(n: int, vocab: int, length: int, rng: np.random.Generator):
+    weights = 1.0 / np.arange(1, vocab + 1)
+    words = rng.choice(vocab, size=(n, length), p=weights / weights.sum())
+    return [" ".join(f"w{w}" for w in row) for row in words]
+
+
+def latencies(index: BM25Index, queries, k: int) -> np.ndarray:
+    out = np.empty(len(queries))
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        index.search(query, k)
+        out[i] = time.perf_counter() - start
+    return out * 1e3
+
+
+async def queries_during(compactor: MemoryCompactor, queries, k: int) -> np.ndarray:
+    """Query the live index from the event loop while a compaction runs."""
+    task = asyncio.create_task(compactor.compact(force=True))
+    out = []
+    while not task.done():
+        for query in queries[:20]:
+            start = time.perf_counter()
+            compactor.bm25.search(query, k)
+            out.append(time.perf_counter() - start)
+        await asyncio.sleep(0)
+    await task
+    return np.asarray(out) * 1e3
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=8)
+    parser.add_argument("--churn", type=int, default=20_000, help="Facts added and deleted per round")
+    parser.add_argument("--vocab", type=int, default=50_000)
+    parser.add_argument("--length", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    facts = zipf_corpus(args.size, args.vocab, args.length, rng)
+    plain, managed = BM25Index(), BM25Index()
+    plain.add_many(facts)
+    managed.add_many(facts)
+    compactor = MemoryCompactor(bm25=managed)
+    terms = rng.zipf(1.3, size=(args.queries, 3)) % args.vocab
+    queries = [" ".join(f"w{t}" for t in row) for row in terms]
+    oldest = 0
+
+    print("round  tombstones   plain p50/p99 ms   compacted p50/p99 ms   during compaction p99 ms   rebuild s")
+    for round_ in range(1, args.rounds + 1):
+        new = zipf_corpus(args.churn, args.vocab, args.length, rng)
+        for index in (plain, compactor.bm25):
+            index.add_many(new)
+            for doc in range(oldest, oldest + args.churn):
+                index.delete(doc)
+        oldest += args.churn
+        spent = compactor.compaction_seconds
+        during = await queries_during(compactor, queries, args.k)
+        a = latencies(plain, queries, args.k)
+        b = latencies(compactor.bm25, queries, args.k)
+        print(f"{round_:5d}  {plain.tombstones:10d}   {np.percentile(a, 50):6.2f} / {np.percentile(a, 99):6.2f}"
+              f"      {np.percentile(b, 50):6.2f} / {np.percentile(b, 99):6.2f}"
+              f"          {np.percentile(during, 99):6.2f}                  {compactor.compaction_seconds - spent:5.2f}")
+    print(f"compaction time total {compactor.compaction_seconds:.1f}s over {args.rounds} rounds")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
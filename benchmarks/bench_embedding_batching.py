@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark cross-request embedding batching against per-query calls.
+
+Simulates ``--concurrency`` memory-stage handlers embedding queries through
+a BatchingEmbedder for each batching window, using an embedder with a
+model-like cost profile (fixed per-call overhead plus a dense projection),
+and reports throughput, batch size and latency per window.
+
+Example:
+    python benchmarks/bench_embedding_batching.py --concurrency 64 --windows 0 0.001 0.005
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.deepthought.memory.embedding import BatchingEmbedder  # noqa: E402
+from src.deepthought.memory.vector_index import HashingEmbedder  # noqa: E402
+
+
+class ProjectionEmbedder:
+    """Hashed features followed by a dense layer, with a per-call overhead."""
+
+    def __init__(self, features: int = 2048, dim: int = 384, overhead: float = 0.002):
+        self._features = HashingEmbedder(features)
+        self._weights = np.random.default_rng(0).standard_normal((features, dim)).astype(np.float32)
+        self._overhead = overhead
+
+    def __call__(self, texts):
+        time.sleep(self._overhead)
+        return np.tanh(self._features(texts) @ self._weights)
+
+
+async def run(window: float, concurrency: int, requests: int, max_batch: int, embedder) -> dict:
+    service = BatchingEmbedder(embedder, max_batch=max_batch, window=window)
+    queue = iter(range(requests))
+
+    async def client():
+        for i in queue:
+            await service.embed(f"what do you know about topic {i % 997}?")
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return service.stats()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0.0, 0.0005, 0.002, 0.005, 0.01])
+    args = parser.parse_args()
+    embedder = ProjectionEmbedder()
+
+    start = time.perf_counter()
+    for i in range(200):
+        embedder([f"what do you know about topic {i}?"])
+    print(f"unbatched: {200 / (time.perf_counter() - start):.0f} queries/s")
+    for window in args.windows:
+        stats = asyncio.run(run(window, args.concurrency, args.requests, args.max_batch, embedder))
+        print(f"window {window * 1e3:5.1f} ms: {stats['throughput_per_s']:7.0f} queries/s, "
+              f"batch {stats['mean_batch_size']:5.1f}, p50 {stats['p50_latency_ms']:6.2f} ms, "
+              f"p95 {stats['p95_latency_ms']:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
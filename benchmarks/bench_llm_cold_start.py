@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark LLM worker cold start: time-to-ready, first-request latency and memory.
+
+Starts ``--workers`` worker processes at once, the way an autoscaler adds
+replicas, for each combination of:
+
+* loading: ``read`` (``from_pretrained``) or ``mmap`` (``load_mapped_model``);
+* warm-up: off, or ``engine.warm_up()`` before the worker would subscribe.
+
+Each worker reports its import, load and warm-up time, time-to-ready (from
+process start until it would subscribe), the latency of its first real
+request, and its unique (USS) and proportional (PSS) memory. Mapped weights
+are shared page cache, so they count towards PSS split across workers but
+not towards USS. transformers 5 itself maps fp32 safetensors checkpoints, so
+``read`` only differs from ``mmap`` on older versions or for dtype changes.
+
+Without ``--model`` a random Llama checkpoint is written to a temporary
+directory first. Memory figures need Linux (``/proc/self/smaps_rollup``).
+
+Example:
+    python benchmarks/bench_llm_cold_start.py --workers 4
+    python benchmarks/bench_llm_cold_start.py --model ./results/merged --workers 2
+"""
+import time
+
+STARTED = time.perf_counter()
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+import subprocess  # noqa: E402
+import sys  # noqa: E402
+import tempfile  # noqa: E402
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def memory_mib():
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        return None, None
+    uss = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return uss, fields.get("Pss")
+
+
+async def worker(args) -> None:
+    import torch
+    from src.deepthought.llm.engine import ContinuousBatchingEngine, GenerationParams
+    from src.deepthought.llm.prompt import build_prompt
+
+    imported = time.perf_counter() - STARTED
+    engine = ContinuousBatchingEngine.from_pretrained(args.model, memory_map=args.mode == "mmap",
+                                                      max_batch_size=args.batch)
+    if args.random:
+        engine._eos = set()
+    warmup = await engine.warm_up() if args.warmup else 0.0
+    ready = time.perf_counter() - STARTED
+    prompt = build_prompt("Which river flows through Paris?", ["The Seine flows through Paris."])
+    result = await engine.generate(prompt, GenerationParams(max_new_tokens=args.max_new_tokens))
+    uss, pss = memory_mib()
+    print(json.dumps({"import": imported, "load": engine.load_seconds, "warmup": warmup, "ready": ready,
+                      "first_ms": result.latency * 1e3, "uss": uss, "pss": pss, "threads": torch.get_num_threads()}),
+          flush=True)
+    sys.stdin.read()  # stay resident until every worker has reported, so pages are shared
+    await engine.close()
+
+
+def random_checkpoint(path: str, layers: int, hidden: int) -> None:
+    from bench_llm_engine import tiny_engine
+    engine = tiny_engine(layers, hidden)
+    engine.model.save_pretrained(path)
+    engine.tokenizer.save_pretrained(path)
+    asyncio.run(engine.close())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="Local model directory (default: random Llama checkpoint)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=4, help="Engine max_batch_size")
+    parser.add_argument("--max-new-tokens", type=int, default=16)
+    parser.add_argument("--layers", type=int, default=8)
+    parser.add_argument("--hidden", type=int, default=768)
+    parser.add_argument("--threads", type=int, default=1, help="torch threads per worker")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", default="mmap", help=argparse.SUPPRESS)
+    parser.add_argument("--warmup", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--random", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        import torch
+        torch.set_num_threads(args.threads)
+        asyncio.run(worker(args))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model = args.model
+        if model is None:
+            model = tmp
+            random_checkpoint(tmp, args.layers, args.hidden)
+        size = sum(os.path.getsize(os.path.join(model, f)) for f in os.listdir(model) if f.endswith(".safetensors"))
+        print(f"checkpoint {size / 2**20:.0f} MiB, {args.workers} workers started together\n")
+        print("load   warm-up   import s   load s   warm-up s   ready s   first req ms   USS MiB   PSS MiB")
+        for mode in ("read", "mmap"):
+            for warmup in (False, True):
+                command = [sys.executable, __file__, "--worker", "--mode", mode, "--model", model,
+                           "--batch", str(args.batch), "--max-new-tokens", str(args.max_new_tokens),
+                           "--threads", str(args.threads)]
+                command += ["--warmup"] * warmup + ["--random"] * (args.model is None)
+                procs = [subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                          stderr=subprocess.DEVNULL, text=True) for _ in range(args.workers)]
+                reports = [json.loads(proc.stdout.readline()) for proc in procs]
+                for proc in procs:
+                    proc.stdin.close()
+                    proc.wait()
+
+                def mean(key):
+                    values = [r[key] for r in reports if r[key] is not None]
+                    return sum(values) / len(values) if values else float("nan")
+                print(f"{mode:5s}   {'on' if warmup else 'off':7s}   {mean('import'):8.2f}   {mean('load'):6.2f}"
+                      f"   {mean('warmup'):9.2f}   {mean('ready'):7.2f}   {mean('first_ms'):12.1f}"
+                      f"   {mean('uss'):7.0f}   {mean('pss'):7.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark CPU generation throughput and time-to-first-token under concurrency.
+
+Submits ``--requests`` prompts with ``--concurrency`` of them in flight at a
+time (a closed loop: each finished request is replaced by the next) and
+reports aggregate tokens/s, TTFT p50/p95 and the mean decode batch size.
+Concurrency 1 is the old one-request-at-a-time behaviour; higher values let
+the engine batch decode steps across requests.
+
+Without ``--model`` a small randomly initialised Llama is built locally, so
+the numbers measure the batching machinery rather than a real model.
+``--prefix-cache`` reuses the key/values of the shared prompt template, so
+only each prompt's own suffix is prefilled; compare TTFT with and without.
+
+Example:
+    python benchmarks/bench_llm_engine.py --concurrency 1 4 8 16
+    python benchmarks/bench_llm_engine.py --concurrency 1 8 --prefix-cache
+    python benchmarks/bench_llm_engine.py --model ./results/merged --max-new-tokens 64
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.deepthought.llm.engine import ContinuousBatchingEngine, GenerationParams  # noqa: E402
+from src.deepthought.llm.prefix_cache import PrefixCache  # noqa: E402
+from src.deepthought.llm.prompt import build_prompt  # noqa: E402
+
+
+def tiny_engine(layers: int, hidden: int, **kwargs) -> ContinuousBatchingEngine:
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+
+    vocab = {"<pad>": 0, "</s>": 1}
+    for char in sorted(pre_tokenizers.ByteLevel.alphabet()):
+        vocab[char] = len(vocab)
+    tok = Tokenizer(models.BPE(vocab=vocab, merges=[]))
+    tok.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tok.decoder = decoders.ByteLevel()
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=tok, eos_token="</s>", pad_token="<pad>")
+    torch.manual_seed(0)
+    config = LlamaConfig(vocab_size=len(vocab), hidden_size=hidden, intermediate_size=hidden * 4,
+                         num_hidden_layers=layers, num_attention_heads=8, num_key_value_heads=4,
+                         max_position_embeddings=2048, eos_token_id=1, pad_token_id=0)
+    engine = ContinuousBatchingEngine(LlamaForCausalLM(config), tokenizer, **kwargs)
+    engine._eos = set()  # random weights: run every request to its token limit
+    return engine
+
+
+async def run(engine: ContinuousBatchingEngine, prompts, concurrency: int, params: GenerationParams):
+    queue = list(prompts)
+    results = []
+
+    async def client():
+        while queue:
+            results.append(await engine.generate(queue.pop(), params))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return results, time.perf_counter() - start
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="Model directory or hub id (default: tiny random Llama)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=48)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--hidden", type=int, default=256)
+    parser.add_argument("--threads", type=int, default=0, help="torch threads (0: torch default)")
+    parser.add_argument("--prefix-cache", action="store_true", help="Reuse cached prompt-prefix key/values")
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    rng = np.random.default_rng(0)
+    words = ["memory", "graph", "Paris", "capital", "river", "event", "stream", "fact", "model", "batch"]
+    prompts = [build_prompt(" ".join(rng.choice(words, rng.integers(3, 12))) + "?",
+                            [" ".join(rng.choice(words, 6)) for _ in range(rng.integers(0, 4))])
+               for _ in range(args.requests)]
+    params = GenerationParams(max_new_tokens=args.max_new_tokens)
+
+    print("concurrency   tokens/s   TTFT p50 ms   TTFT p95 ms   latency p50 ms   mean batch   reused prompt")
+    for concurrency in args.concurrency:
+        options = {"max_batch_size": concurrency, "prefix_cache": PrefixCache() if args.prefix_cache else None}
+        if args.model:
+            engine = ContinuousBatchingEngine.from_pretrained(args.model, **options)
+        else:
+            engine = tiny_engine(args.layers, args.hidden, **options)
+        await engine.generate(prompts[0], GenerationParams(max_new_tokens=2))  # warm-up
+        engine.steps = engine._batch_rows = engine.prefill_tokens = engine.reused_tokens = 0
+        results, elapsed = await run(engine, prompts, concurrency, params)
+        await engine.close()
+        ttft = np.array([r.ttft for r in results]) * 1e3
+        latency = np.array([r.latency for r in results]) * 1e3
+        tokens = sum(len(r.token_ids) for r in results)
+        reused = engine.reused_tokens / max(engine.reused_tokens + engine.prefill_tokens, 1)
+        print(f"{concurrency:11d}   {tokens / elapsed:8.1f}   {np.percentile(ttft, 50):11.1f}"
+              f"   {np.percentile(ttft, 95):11.1f}   {np.percentile(latency, 50):14.1f}"
+              f"   {engine.stats()['mean_batch_size']:10.2f}   {reused:12.0%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
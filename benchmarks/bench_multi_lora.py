@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark serving several LoRA fine-tunes from one base model.
+
+Writes ``--adapters`` random LoRA adapters (rank ``--rank`` on the attention
+projections, like ``train_script.py``) and compares:
+
+* memory: one merged model per adapter against one base model plus the
+  resident adapters of an ``AdapterPool``;
+* tokens/s of one engine at ``--concurrency`` for requests on the base
+  model, all on one adapter, and spread round-robin over every adapter
+  (each decode batch then mixes adapters).
+
+Without ``--model`` the small random Llama of ``bench_llm_engine.py`` is
+the base model.
+
+Example:
+    python benchmarks/bench_multi_lora.py --adapters 8 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench_llm_engine import tiny_engine  # noqa: E402
+from src.deepthought.llm.adapters import AdapterPool  # noqa: E402
+from src.deepthought.llm.engine import ContinuousBatchingEngine, GenerationParams  # noqa: E402
+from src.deepthought.llm.loader import load_cpu_model, model_nbytes  # noqa: E402
+from src.deepthought.llm.prompt import build_prompt  # noqa: E402
+
+
+def write_adapters(model, directory: str, count: int, rank: int):
+    from peft import LoraConfig, get_peft_model
+
+    paths = {}
+    for i in range(count):
+        torch.manual_seed(i)
+        config = LoraConfig(r=rank, lora_alpha=2 * rank, target_modules=["q_proj", "k_proj", "v_proj", "o_proj"],
+                            init_lora_weights=False)
+        adapted = get_peft_model(model, config)
+        paths[f"task-{i}"] = os.path.join(directory, f"task-{i}")
+        adapted.save_pretrained(paths[f"task-{i}"])
+        model = adapted.unload()
+    return paths
+
+
+async def run(engine, prompts, adapters, concurrency: int, params: GenerationParams):
+    queue = list(zip(prompts, adapters))
+    results = []
+
+    async def client():
+        while queue:
+            prompt, adapter = queue.pop()
+            results.append(await engine.generate(prompt, params, adapter=adapter))
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return sum(len(r.token_ids) for r in results) / (loop.time() - start)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="Base model directory (default: tiny random Llama)")
+    parser.add_argument("--adapters", type=int, default=8)
+    parser.add_argument("--rank", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--hidden", type=int, default=512)
+    parser.add_argument("--threads", type=int, default=0, help="torch threads (0: torch default)")
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    if args.model:
+        model, tokenizer = load_cpu_model(args.model, quantize=False)
+        eos = None
+    else:
+        tiny = tiny_engine(args.layers, args.hidden)
+        model, tokenizer, eos = tiny.model, tiny.tokenizer, tiny._eos
+        await tiny.close()
+
+    rng = np.random.default_rng(0)
+    words = ["memory", "graph", "Paris", "capital", "river", "event", "stream", "fact", "model", "batch"]
+    prompts = [build_prompt(" ".join(rng.choice(words, rng.integers(3, 12))) + "?",
+                            [" ".join(rng.choice(words, 6)) for _ in range(rng.integers(0, 4))])
+               for _ in range(args.requests)]
+    params = GenerationParams(max_new_tokens=args.max_new_tokens)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_adapters(model, tmp, args.adapters, args.rank)
+        pool = AdapterPool(paths, max_loaded=args.adapters)
+        engine = ContinuousBatchingEngine(model, tokenizer, max_batch_size=args.concurrency, adapters=pool)
+        if eos is not None:
+            engine._eos = eos
+        names = list(paths)
+        for name in names:
+            pool.get(name)
+        base_bytes = model_nbytes(model)
+        print(f"{args.adapters} adapters of rank {args.rank}: {args.adapters} merged models "
+              f"{args.adapters * base_bytes / 2**20:.0f} MiB, shared base + pool "
+              f"{(base_bytes + pool.nbytes) / 2**20:.0f} MiB ({pool.nbytes / 2**20:.1f} MiB of adapters)\n")
+
+        await engine.generate(prompts[0], GenerationParams(max_new_tokens=2))  # warm-up
+        print("requests                       tokens/s")
+        for label, adapters in [("base model", [None] * len(prompts)),
+                                ("one adapter", [names[0]] * len(prompts)),
+                                (f"{args.adapters} adapters, mixed", [names[i % len(names)] for i in range(len(prompts))])]:
+            print(f"{label:30s} {await run(engine, prompts, adapters, args.concurrency, params):8.1f}")
+        await engine.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
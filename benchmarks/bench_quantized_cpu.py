@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Compare the fp32 and dynamic int8 CPU serving paths of the LLM stage.
+
+Loads the model once in fp32 (merging ``--adapter`` when given), makes an
+int8 copy with ``quantize_int8`` and, for each, reports:
+
+* weight memory (int8 packed weights counted at their stored size);
+* generation tokens/s through ``ContinuousBatchingEngine`` at each
+  ``--concurrency``;
+* agreement with fp32: the share of the fp32 greedy tokens the int8 model
+  also ranks first when fed the same text (teacher forced), and the share
+  of requests whose whole greedy output is identical.
+
+Without ``--model``/``--adapter`` the small random Llama of
+``bench_llm_engine.py`` is used. Its near-flat logits make agreement a lower
+bound: a trained model's confident predictions survive quantization better.
+
+Example:
+    python benchmarks/bench_quantized_cpu.py --hidden 512 --layers 4
+    python benchmarks/bench_quantized_cpu.py --adapter ./results/lora-adapter --max-new-tokens 64
+"""
+import argparse
+import asyncio
+import copy
+import os
+import sys
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench_llm_engine import run, tiny_engine  # noqa: E402
+from src.deepthought.llm.engine import ContinuousBatchingEngine, GenerationParams  # noqa: E402
+from src.deepthought.llm.loader import load_cpu_model, model_nbytes, quantize_int8  # noqa: E402
+from src.deepthought.llm.prompt import build_prompt  # noqa: E402
+
+
+def agreement(reference, model, sequences) -> float:
+    """Share of positions where ``model`` ranks the reference's next token first."""
+    agree = total = 0
+    with torch.no_grad():
+        for prompt_ids, generated in sequences:
+            ids = torch.tensor([prompt_ids + generated])
+            predicted = model(input_ids=ids).logits[0, len(prompt_ids) - 1:-1].argmax(-1)
+            agree += int((predicted == torch.tensor(generated)).sum())
+            total += len(generated)
+    return agree / max(total, 1)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="Base model directory or hub id (default: the adapter's base)")
+    parser.add_argument("--adapter", help="LoRA adapter directory to merge, e.g. ./results/lora-adapter")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--hidden", type=int, default=512)
+    parser.add_argument("--threads", type=int, default=0, help="torch threads (0: torch default)")
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    if args.model or args.adapter:
+        fp32, tokenizer = load_cpu_model(args.model, args.adapter, quantize=False)
+        eos = None
+    else:
+        tiny = tiny_engine(args.layers, args.hidden)
+        fp32, tokenizer, eos = tiny.model, tiny.tokenizer, tiny._eos
+        await tiny.close()
+    int8 = quantize_int8(copy.deepcopy(fp32))
+
+    rng = np.random.default_rng(0)
+    words = ["memory", "graph", "Paris", "capital", "river", "event", "stream", "fact", "model", "batch"]
+    prompts = [build_prompt(" ".join(rng.choice(words, rng.integers(3, 12))) + "?",
+                            [" ".join(rng.choice(words, 6)) for _ in range(rng.integers(0, 4))])
+               for _ in range(args.requests)]
+    params = GenerationParams(max_new_tokens=args.max_new_tokens)
+
+    outputs = {}
+    print("model   weights MiB   concurrency   tokens/s   latency p50 ms")
+    for name, model in [("fp32", fp32), ("int8", int8)]:
+        for concurrency in args.concurrency:
+            engine = ContinuousBatchingEngine(model, tokenizer, max_batch_size=concurrency)
+            if eos is not None:
+                engine._eos = eos
+            await engine.generate(prompts[0], GenerationParams(max_new_tokens=2))  # warm-up
+            results, elapsed = await run(engine, prompts, concurrency, params)
+            await engine.close()
+            tokens = sum(len(r.token_ids) for r in results)
+            latency = np.percentile([r.latency for r in results], 50) * 1e3
+            print(f"{name:5s}   {model_nbytes(model) / 2**20:11.1f}   {concurrency:11d}   {tokens / elapsed:8.1f}"
+                  f"   {latency:14.1f}")
+        # Sequential greedy outputs in prompt order, for the agreement check
+        engine = ContinuousBatchingEngine(model, tokenizer, max_batch_size=1)
+        if eos is not None:
+            engine._eos = eos
+        outputs[name] = [(engine.encode(p), (await engine.generate(p, params)).token_ids) for p in prompts]
+        await engine.close()
+
+    token_agreement = agreement(fp32, int8, outputs["fp32"])
+    identical = np.mean([a[1] == b[1] for a, b in zip(outputs["fp32"], outputs["int8"])])
+    print(f"\nint8 vs fp32: {token_agreement:.1%} of fp32 greedy tokens ranked first (teacher forced), "
+          f"{identical:.0%} of outputs identical")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark the memory-stage vector indexes against brute force.
+
+Generates clustered synthetic embeddings (no model, GPU or network needed),
+then reports build time, memory, per-query latency and recall@k of IVFIndex
+relative to the exact FlatIndex.
+
+Example:
+    python benchmarks/bench_vector_index.py --sizes 100000 1000000 --nprobe 4 8 16
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.deepthought.memory.vector_index import FlatIndex, IVFIndex  # noqa: E402
+
+
+def clustered_data(n: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    return centers[labels] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def recall(truth: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth.tolist(), found.tolist()))
+    return hits / truth.size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000])
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0, help="IVF clusters (default: 4*sqrt(n))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    for n in args.sizes:
+        data = clustered_data(n, args.dim, 1000, rng)
+        queries = clustered_data(args.queries, args.dim, 1000, rng)
+        print(f"\n== n={n:,} dim={args.dim} queries={args.queries} k={args.k}")
+
+        flat = FlatIndex(args.dim, initial_capacity=n)
+        _, build = timed(flat.add, data)
+        (_, truth), batch_time = timed(flat.search, queries, args.k)
+        _, single_time = timed(lambda: [flat.search(q, args.k) for q in queries[:50]])
+        print(f"flat   build {build:6.2f}s  mem {flat.nbytes / 2**20:7.1f}MiB  "
+              f"batched {batch_time / len(queries) * 1e3:7.3f}ms/q  single {single_time / 50 * 1e3:7.3f}ms/q")
+
+        nlist = args.nlist or int(4 * np.sqrt(n))
+        ivf = IVFIndex(args.dim, nlist=nlist)
+        sample = data[rng.choice(n, min(n, nlist * 40), replace=False)]
+        _, train = timed(ivf.train, sample)
+        _, build = timed(ivf.add, data)
+        ivf.regroup()  # group lists outside the timed runs
+        for nprobe in args.nprobe:
+            (_, found), elapsed = timed(ivf.search, queries, args.k, nprobe)
+            print(f"ivf    nlist {nlist} nprobe {nprobe:3d}  train+build {train + build:6.2f}s  "
+                  f"mem {ivf.nbytes / 2**20:7.1f}MiB  {elapsed / len(queries) * 1e3:7.3f}ms/q  "
+                  f"recall@{args.k} {recall(truth, found):.3f}")
+
+
+if __name__ == "__main__":
+    main()
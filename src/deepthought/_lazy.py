@@ -0,0 +1,37 @@
+# File: src/deepthought/_lazy.py
+"""
+Lazy package exports.
+
+Each DeepThought package maps its public names to the submodule that defines
+them and imports that submodule on first attribute access, so importing a
+package stays cheap and does not load NATS, NumPy or torch until a component
+that needs them is used.
+"""
+import importlib
+import sys
+from typing import Any, Callable, Dict, List, Tuple
+
+
+def lazy_exports(package: str, mapping: Dict[str, str]) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """
+    Build the module-level ``__getattr__`` and ``__dir__`` of ``package``.
+
+    Args:
+        package: The package's ``__name__``.
+        mapping: Public name -> relative module defining it, e.g. ``".events"``.
+
+    Returns:
+        ``(__getattr__, __dir__)``; resolved names are cached in the package namespace.
+    """
+    def __getattr__(name: str) -> Any:
+        module = mapping.get(name)
+        if module is None:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(module, package), name)
+        setattr(sys.modules[package], name, value)
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(vars(sys.modules[package])) | set(mapping))
+
+    return __getattr__, __dir__
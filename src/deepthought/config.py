@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, asdict
+from functools import lru_cache
 import os
 
 
@@ -30,5 +31,16 @@ def load_config_from_env() -> DeepThoughtConfig:
     )
 
 
-#: The configuration instance used by the library and tests
-DEFAULT_CONFIG: DeepThoughtConfig = load_config_from_env()
+@lru_cache(maxsize=None)
+def get_default_config() -> DeepThoughtConfig:
+    """Return the configuration used by the library, reading the environment once."""
+
+    return load_config_from_env()
+
+
+def __getattr__(name: str):
+    # ``DEFAULT_CONFIG`` is resolved on first access so importing this module
+    # does not read the environment.
+    if name == "DEFAULT_CONFIG":
+        return get_default_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -4,10 +4,59 @@ EDA (Event-Driven Architecture) package for DeepThought reThought.
 This package contains components for event-driven communication between
 different modules of the DeepThought reThought system using NATS as
 the message broker.
+
+Public names are imported lazily on first access so that importing the
+package does not pull in the NATS client stack.
 """
 
-from .events import EventPayload, EventSubjects, InputReceivedPayload, MemoryRetrievedPayload, ResponseGeneratedPayload
-from .publisher import Publisher
-from .subscriber import Subscriber
+from typing import TYPE_CHECKING
+
+from .._lazy import lazy_exports
+
+if TYPE_CHECKING:
+    from .events import (ConsumerLagPayload, EventPayload, EventSubjects, InputReceivedPayload,
+                         MemoryRetrievedPayload, MemoryStorePayload, MemoryVersionPayload,
+                         ResponseChunkPayload, ResponseGeneratedPayload)
+    from .publisher import Publisher
+    from .subscriber import DrainReport, Subscriber
+    from .segment_log import SegmentLogReader, SegmentLogWriter, SegmentRecord
+    from .exporter import ExportResult, StreamExporter
+    from .archive import ArchiveService, EventArchive
+    from .lag_monitor import ConsumerLagMonitor, LagTracker, ScalingPolicy
+    from .supervisor import WorkerSupervisor
+    from .pipeline import Pipeline, Stage
+    from .streaming import ChunkCoalescer, ResponseStream, StreamAborted
+
+_LAZY_IMPORTS = {
+    "ConsumerLagPayload": ".events",
+    "EventPayload": ".events",
+    "EventSubjects": ".events",
+    "InputReceivedPayload": ".events",
+    "MemoryRetrievedPayload": ".events",
+    "MemoryStorePayload": ".events",
+    "MemoryVersionPayload": ".events",
+    "ResponseChunkPayload": ".events",
+    "ResponseGeneratedPayload": ".events",
+    "Publisher": ".publisher",
+    "Subscriber": ".subscriber",
+    "DrainReport": ".subscriber",
+    "SegmentLogReader": ".segment_log",
+    "SegmentLogWriter": ".segment_log",
+    "SegmentRecord": ".segment_log",
+    "ExportResult": ".exporter",
+    "StreamExporter": ".exporter",
+    "ArchiveService": ".archive",
+    "EventArchive": ".archive",
+    "ConsumerLagMonitor": ".lag_monitor",
+    "LagTracker": ".lag_monitor",
+    "ScalingPolicy": ".lag_monitor",
+    "WorkerSupervisor": ".supervisor",
+    "Pipeline": ".pipeline",
+    "Stage": ".pipeline",
+    "ChunkCoalescer": ".streaming",
+    "ResponseStream": ".streaming",
+    "StreamAborted": ".streaming",
+}
 
-__all__ = ["EventPayload", "EventSubjects", "InputReceivedPayload", "MemoryRetrievedPayload", "ResponseGeneratedPayload", "Publisher", "Subscriber"] 
\ No newline at end of file
+__all__ = list(_LAZY_IMPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _LAZY_IMPORTS)
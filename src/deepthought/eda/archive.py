@@ -0,0 +1,354 @@
+# File: src/deepthought/eda/archive.py
+"""
+Local event archive indexed by ``input_id``.
+
+Events are appended to a segment log (see ``segment_log``) and every event
+that carries an ``input_id`` is recorded in an index mapping a 64-bit hash
+of the id to the event's stream sequence. Recent entries live in a bounded
+in-memory table; when it fills up it is written out as an immutable, sorted
+run file that is searched through ``mmap``. ``compact`` merges all runs into
+one so lookups stay a handful of binary searches.
+"""
+import asyncio
+import hashlib
+import heapq
+import json
+import logging
+import mmap
+import os
+import struct
+import zlib
+from typing import Dict, Iterator, List, Optional
+from nats.aio.client import Client as NATS
+from nats.js.api import AckPolicy, ConsumerConfig, DeliverPolicy
+from nats.js.client import JetStreamContext
+from nats.errors import TimeoutError as NatsTimeoutError
+
+from ..config import get_default_config
+from .exporter import _reply_metadata
+from .segment_log import SegmentLogReader, SegmentLogWriter, SegmentRecord
+
+logger = logging.getLogger(__name__)
+
+RUN_ENTRY = struct.Struct("<QQ")
+RUN_SUFFIX = ".run"
+
+
+def input_key(input_id: str) -> int:
+    """Stable 64-bit key used to index an ``input_id``."""
+    return int.from_bytes(hashlib.blake2b(input_id.encode(), digest_size=8).digest(), "little")
+
+
+def _extract_input_id(data: bytes) -> Optional[str]:
+    try:
+        value = json.loads(data).get("input_id")
+    except (ValueError, AttributeError, UnicodeDecodeError):
+        return None
+    return value if isinstance(value, str) and value else None
+
+
+class _Run:
+    """An immutable sorted index run mapped read-only."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.max_seq = int(os.path.basename(path)[:-len(RUN_SUFFIX)])
+        self._fd = open(path, "rb")
+        size = os.fstat(self._fd.fileno()).st_size
+        self._map = mmap.mmap(self._fd.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.count = size // RUN_ENTRY.size
+
+    def entry(self, i: int) -> tuple:
+        return RUN_ENTRY.unpack_from(self._map, i * RUN_ENTRY.size)
+
+    def lookup(self, key: int) -> List[int]:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.entry(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        seqs = []
+        while lo < self.count:
+            k, seq = self.entry(lo)
+            if k != key:
+                break
+            seqs.append(seq)
+            lo += 1
+        return seqs
+
+    def __iter__(self) -> Iterator[tuple]:
+        for i in range(self.count):
+            yield self.entry(i)
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        self._fd.close()
+
+
+class EventArchive:
+    """Append-only event store with an on-disk ``input_id`` index."""
+
+    def __init__(self, directory: str, max_memtable_entries: int = 100_000,
+                 max_runs: int = 8, compress: bool = True,
+                 max_segment_bytes: int = 64 * 1024 * 1024):
+        """
+        Open or create an archive in ``directory``.
+
+        Args:
+            max_memtable_entries: Index entries kept in memory before a run is flushed.
+            max_runs: Number of runs that triggers an automatic compaction.
+            compress: Store event bodies zlib-compressed.
+        """
+        self._segments_dir = os.path.join(directory, "segments")
+        self._index_dir = os.path.join(directory, "index")
+        os.makedirs(self._index_dir, exist_ok=True)
+        self._max_memtable_entries = max_memtable_entries
+        self._max_runs = max_runs
+        self._compress = compress
+        self._writer = SegmentLogWriter(self._segments_dir, max_segment_bytes=max_segment_bytes)
+        self._reader: Optional[SegmentLogReader] = None
+        self._reader_seq = 0
+        self._memtable: Dict[int, List[int]] = {}
+        self._memtable_entries = 0
+        self._runs: List[_Run] = []
+        for name in sorted(os.listdir(self._index_dir)):
+            path = os.path.join(self._index_dir, name)
+            if name.endswith(RUN_SUFFIX):
+                self._runs.append(_Run(path))
+            elif name.endswith(".tmp"):
+                os.remove(path)
+        self._indexed_seq = max((run.max_seq for run in self._runs), default=0)
+        self._recover()
+
+    @property
+    def last_seq(self) -> int:
+        """Highest stream sequence stored in the archive."""
+        return self._writer.last_seq
+
+    @property
+    def run_count(self) -> int:
+        return len(self._runs)
+
+    def _recover(self) -> None:
+        """Re-index events written after the last flushed run."""
+        if self._writer.last_seq <= self._indexed_seq:
+            return
+        recovered = 0
+        for record in self._records(self._indexed_seq + 1):
+            input_id = _extract_input_id(self._decode(record.data))
+            if input_id:
+                self._index(input_id, record.seq)
+                recovered += 1
+        logger.info(f"EventArchive re-indexed {recovered} events after seq {self._indexed_seq}")
+
+    def _decode(self, data: bytes) -> bytes:
+        return zlib.decompress(data) if self._compress else data
+
+    def _index(self, input_id: str, seq: int) -> None:
+        self._memtable.setdefault(input_key(input_id), []).append(seq)
+        self._memtable_entries += 1
+        if self._memtable_entries >= self._max_memtable_entries:
+            self.flush_index()
+
+    def append(self, seq: int, timestamp_ns: int, subject: str, data: bytes) -> bool:
+        """Store one event. Returns False if ``seq`` was already archived."""
+        if seq <= self._writer.last_seq:
+            return False
+        body = zlib.compress(data, 1) if self._compress else data
+        self._writer.append(seq, timestamp_ns, subject, body)
+        input_id = _extract_input_id(data)
+        if input_id:
+            self._index(input_id, seq)
+        return True
+
+    def flush(self) -> None:
+        """Make appended events durable on disk."""
+        self._writer.flush()
+
+    def flush_index(self) -> None:
+        """Write the in-memory index table out as a sorted run."""
+        self._writer.flush()
+        if not self._memtable:
+            return
+        path = os.path.join(self._index_dir, f"{self._writer.last_seq:020d}{RUN_SUFFIX}")
+        entries = sorted((key, seq) for key, seqs in self._memtable.items() for seq in seqs)
+        self._write_run(path, entries)
+        self._runs.append(_Run(path))
+        self._indexed_seq = self._writer.last_seq
+        self._memtable = {}
+        self._memtable_entries = 0
+        logger.debug(f"EventArchive flushed index run with {len(entries)} entries")
+        if len(self._runs) > self._max_runs:
+            self.compact()
+
+    @staticmethod
+    def _write_run(path: str, entries) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            buf = bytearray()
+            for key, seq in entries:
+                buf += RUN_ENTRY.pack(key, seq)
+                if len(buf) >= 1 << 20:
+                    f.write(buf)
+                    buf = bytearray()
+            f.write(buf)
+        os.replace(tmp, path)
+
+    def compact(self) -> None:
+        """Merge all index runs into a single run."""
+        if len(self._runs) < 2:
+            return
+        old = self._runs
+        path = os.path.join(self._index_dir, f"{max(run.max_seq for run in old):020d}{RUN_SUFFIX}")
+        # Runs are individually sorted, so a streaming k-way merge keeps memory flat
+        self._write_run(path, heapq.merge(*old))
+        for run in old:
+            run.close()
+            if run.path != path:
+                os.remove(run.path)
+        self._runs = [_Run(path)]
+        logger.info(f"EventArchive compacted {len(old)} index runs")
+
+    def _current_reader(self) -> SegmentLogReader:
+        if self._reader is None or self._reader_seq != self._writer.last_seq:
+            self._writer.flush()
+            if self._reader is None:
+                self._reader = SegmentLogReader(self._segments_dir)
+            else:
+                # Only the segment being written (and any rolled since) changed
+                self._reader.refresh()
+            self._reader_seq = self._writer.last_seq
+        return self._reader
+
+    def _records(self, start_seq: int) -> Iterator[SegmentRecord]:
+        return self._current_reader().read_seq_range(start_seq)
+
+    def _read(self, seq: int) -> Optional[SegmentRecord]:
+        for record in self._current_reader().read_seq_range(seq, seq + 1):
+            return record
+        return None
+
+    def lookup(self, input_id: str) -> List[SegmentRecord]:
+        """Return every archived event for ``input_id`` in stream order."""
+        key = input_key(input_id)
+        seqs = list(self._memtable.get(key, ()))
+        for run in self._runs:
+            seqs.extend(run.lookup(key))
+        events = []
+        for seq in sorted(set(seqs)):
+            record = self._read(seq)
+            if record is None:
+                continue
+            data = self._decode(record.data)
+            # Guard against 64-bit hash collisions
+            if _extract_input_id(data) == input_id:
+                events.append(SegmentRecord(record.seq, record.timestamp_ns, record.subject, data))
+        return events
+
+    def close(self) -> None:
+        """Flush the index and release all files."""
+        self.flush_index()
+        self._writer.close()
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        for run in self._runs:
+            run.close()
+        self._runs = []
+
+    def __enter__(self) -> "EventArchive":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ArchiveService:
+    """Consumes all ``dtr.>`` events from JetStream into an EventArchive."""
+
+    def __init__(self, nats_client: NATS, js_context: JetStreamContext, archive: EventArchive,
+                 stream_name: Optional[str] = None):
+        """Initialize with shared NATS client and JetStream context."""
+        if not nats_client or not nats_client.is_connected:
+            raise ValueError("NATS client must be connected.")
+        if not js_context:
+            raise ValueError("JetStream context must be provided.")
+        self._nc = nats_client
+        self._js = js_context
+        self._archive = archive
+        self._stream = stream_name or get_default_config().stream_name
+        self._sub = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        logger.info("ArchiveService initialized (JetStream enabled).")
+
+    async def _run(self, batch_size: int, fetch_timeout: float) -> None:
+        while self._running:
+            try:
+                msgs = await self._sub.fetch(batch_size, timeout=fetch_timeout)
+            except (NatsTimeoutError, asyncio.TimeoutError):
+                continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"ArchiveService fetch failed: {e}", exc_info=True)
+                await asyncio.sleep(1.0)
+                continue
+            if not msgs:
+                continue
+            stored = 0
+            for msg in msgs:
+                seq, timestamp_ns, _ = _reply_metadata(msg)
+                if self._archive.append(seq, timestamp_ns, msg.subject, msg.data):
+                    stored += 1
+            self._archive.flush()
+            # AckPolicy.ALL: acknowledging the last message covers the whole batch
+            await msgs[-1].ack()
+            logger.debug(f"ArchiveService stored {stored}/{len(msgs)} events")
+
+    async def start(self, durable_name: str = "event_archive", subject: str = "dtr.>",
+                    batch_size: int = 500, fetch_timeout: float = 1.0) -> bool:
+        """
+        Start archiving events in a background task.
+
+        Args:
+            durable_name: Name of the durable pull consumer. Defaults to "event_archive".
+
+        Returns:
+            bool: True if the consumer was bound successfully, False otherwise.
+        """
+        config = ConsumerConfig(
+            durable_name=durable_name,
+            deliver_policy=DeliverPolicy.BY_START_SEQUENCE,
+            opt_start_seq=self._archive.last_seq + 1,
+            ack_policy=AckPolicy.ALL,
+        )
+        try:
+            self._sub = await self._js.pull_subscribe(subject, durable=durable_name,
+                                                      stream=self._stream, config=config)
+        except Exception as e:
+            logger.error(f"ArchiveService failed to subscribe: {e}", exc_info=True)
+            return False
+        self._running = True
+        self._task = asyncio.create_task(self._run(batch_size, fetch_timeout))
+        logger.info(f"ArchiveService archiving '{subject}' with durable '{durable_name}'")
+        return True
+
+    async def stop(self) -> None:
+        """Stop the background task and flush the archive index."""
+        self._running = False
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._sub:
+            try:
+                await self._sub.unsubscribe()
+            except Exception as e:
+                logger.warning(f"Error unsubscribing ArchiveService: {e}")
+            self._sub = None
+        self._archive.flush_index()
+        logger.info("ArchiveService stopped.")
@@ -6,7 +6,7 @@ in the DeepThought reThought system's event-driven architecture.
 """
 
 from dataclasses import dataclass
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import json
 
 
@@ -16,19 +16,28 @@ class EventSubjects:
     Defines standard subject names for the DeepThought reThought event system.
     
     Subject naming convention: dtr.<module>.<event_type>
+
+    The ``deepthought_events`` stream stores every ``dtr.>`` subject. Transient
+    events that only matter to live subscribers go over core NATS under a
+    ``<kind>.dtr.<module>.<event_type>`` subject, outside the stream.
     """
     # Input events
     INPUT_RECEIVED = "dtr.input.received"
     
     # Memory events
     MEMORY_RETRIEVED = "dtr.memory.retrieved"
+    MEMORY_STORE = "dtr.memory.store"
+    MEMORY_VERSION = "dtr.memory.version"
     
     # LLM events
     RESPONSE_GENERATED = "dtr.llm.response_generated"
+    RESPONSE_CHUNK = "live.dtr.llm.response_chunk"
     
+    # Metrics events
+    CONSUMER_LAG = "metrics.dtr.consumer_lag"
+
     # Other potential event subjects can be added here as the system expands
     # e.g., ERROR = "dtr.error"
-    # e.g., METRICS = "dtr.metrics.reported"
 
 
 @dataclass
@@ -57,6 +66,12 @@ class InputReceivedPayload(EventPayload):
     user_input: str
     input_id: Optional[str] = None
     timestamp: Optional[str] = None
+    #: "interactive" (default) or "batch"; interactive work keeps reserved LLM capacity
+    priority: Optional[str] = None
+    #: Unix time after which the caller no longer wants a response
+    deadline: Optional[float] = None
+    #: Name of the LoRA adapter (fine-tune) to answer with; None uses the base model
+    adapter: Optional[str] = None
 
 
 @dataclass
@@ -65,6 +80,33 @@ class MemoryRetrievedPayload(EventPayload):
     retrieved_knowledge: Dict[str, Any]
     input_id: Optional[str] = None
     timestamp: Optional[str] = None
+    #: The input the knowledge was retrieved for, used to build the LLM prompt
+    user_input: Optional[str] = None
+    #: "interactive" (default) or "batch"; interactive work keeps reserved LLM capacity
+    priority: Optional[str] = None
+    #: Unix time after which the caller no longer wants a response
+    deadline: Optional[float] = None
+    #: Name of the LoRA adapter (fine-tune) to answer with; None uses the base model
+    adapter: Optional[str] = None
+
+
+@dataclass
+class MemoryStorePayload(EventPayload):
+    """Payload for requests to write facts into memory."""
+    facts: List[str]
+    input_id: Optional[str] = None
+    timestamp: Optional[str] = None
+
+
+@dataclass
+class MemoryVersionPayload(EventPayload):
+    """Payload announcing a new memory index version after an ingested batch."""
+    #: Batches applied by ``worker`` so far; versions of different workers are unrelated
+    version: int
+    facts: List[str]
+    batch_events: int
+    timestamp: Optional[str] = None
+    worker: Optional[str] = None
 
 
 @dataclass
@@ -73,4 +115,39 @@ class ResponseGeneratedPayload(EventPayload):
     final_response: str
     input_id: Optional[str] = None
     timestamp: Optional[str] = None
-    confidence: Optional[float] = None 
\ No newline at end of file
+    confidence: Optional[float] = None 
+    #: Seconds from the LLM stage receiving the event to the first generated token
+    ttft: Optional[float] = None
+    #: True when the response was served from the response cache
+    cached: bool = False
+    #: True when the response was shared from an identical request generating at the same time
+    coalesced: bool = False
+
+
+@dataclass
+class ResponseChunkPayload(EventPayload):
+    """Payload for a piece of a response that is still being generated."""
+    text: str
+    #: Position of the chunk in its response, starting at 0
+    seq: int
+    input_id: Optional[str] = None
+    #: Set on the last chunk; the text of all chunks is then the full response
+    final: bool = False
+    timestamp: Optional[str] = None
+    #: Set with ``final`` when generation failed or was dropped; no response follows
+    error: bool = False
+
+
+@dataclass
+class ConsumerLagPayload(EventPayload):
+    """Payload for consumer lag and scaling recommendation events."""
+    consumer: str
+    num_pending: int
+    num_ack_pending: int
+    num_redelivered: int
+    backlog_rate: float
+    drain_seconds: Optional[float]
+    current_workers: int
+    recommended_workers: int
+    action: str
+    timestamp: Optional[str] = None
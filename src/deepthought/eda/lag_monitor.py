@@ -0,0 +1,279 @@
+# File: src/deepthought/eda/lag_monitor.py
+"""
+Consumer lag monitoring and scaling recommendations.
+
+The monitor polls JetStream consumer info for each stage consumer, keeps a
+short window of samples and derives the backlog trend, processing rate and
+an estimated time to drain the backlog. A ScalingPolicy turns those numbers
+into a recommended worker count, which is published on
+``EventSubjects.CONSUMER_LAG`` and can optionally be applied to a local
+WorkerSupervisor.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+from nats.aio.client import Client as NATS
+from nats.js.client import JetStreamContext
+
+from ..config import get_default_config
+from .events import ConsumerLagPayload, EventSubjects
+from .publisher import Publisher
+from .supervisor import WorkerSupervisor
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LagSample:
+    """One observation of a consumer's state."""
+    timestamp: float
+    num_pending: int
+    num_ack_pending: int
+    num_redelivered: int
+    acked: int
+
+    @property
+    def backlog(self) -> int:
+        return self.num_pending + self.num_ack_pending
+
+
+class LagTracker:
+    """Sliding window of LagSamples with derived rates."""
+
+    def __init__(self, window: int = 12):
+        self._samples: Deque[LagSample] = deque(maxlen=window)
+
+    def add(self, sample: LagSample) -> None:
+        self._samples.append(sample)
+
+    @property
+    def latest(self) -> Optional[LagSample]:
+        return self._samples[-1] if self._samples else None
+
+    def _span(self) -> float:
+        if len(self._samples) < 2:
+            return 0.0
+        return self._samples[-1].timestamp - self._samples[0].timestamp
+
+    def backlog_rate(self) -> float:
+        """Least-squares slope of the backlog in messages per second."""
+        n = len(self._samples)
+        if n < 2 or self._span() <= 0:
+            return 0.0
+        t0 = self._samples[0].timestamp
+        xs = [s.timestamp - t0 for s in self._samples]
+        ys = [s.backlog for s in self._samples]
+        mx, my = sum(xs) / n, sum(ys) / n
+        var = sum((x - mx) ** 2 for x in xs)
+        if var == 0:
+            return 0.0
+        return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / var
+
+    def processing_rate(self) -> float:
+        """Messages acknowledged per second over the window."""
+        span = self._span()
+        if span <= 0:
+            return 0.0
+        return max(self._samples[-1].acked - self._samples[0].acked, 0) / span
+
+    def arrival_rate(self) -> float:
+        """Messages arriving per second (processed plus backlog growth)."""
+        return max(self.processing_rate() + self.backlog_rate(), 0.0)
+
+    def drain_seconds(self) -> Optional[float]:
+        """Estimated seconds until the backlog is empty, or None if it is not shrinking."""
+        latest = self.latest
+        if latest is None:
+            return None
+        if latest.backlog == 0:
+            return 0.0
+        rate = self.backlog_rate()
+        if rate >= 0:
+            return None
+        return latest.backlog / -rate
+
+
+@dataclass
+class ScalingPolicy:
+    """Turns lag trends into a worker count."""
+
+    #: Backlog should be cleared within this many seconds
+    target_drain_seconds: float = 30.0
+    min_workers: int = 1
+    max_workers: int = 8
+    #: Messages per second one worker can process; learned from saturated periods if None
+    worker_capacity: Optional[float] = None
+    #: Consecutive polls that must agree before scaling down
+    scale_down_after: int = 3
+
+    def desired_workers(self, tracker: LagTracker, current: int,
+                        capacity: Optional[float] = None) -> int:
+        """Return the worker count needed to keep up with arrivals and drain the backlog."""
+        latest = tracker.latest
+        if latest is None:
+            return current
+        capacity = self.worker_capacity or capacity
+        required = tracker.arrival_rate() + latest.backlog / self.target_drain_seconds
+        if capacity:
+            desired = math.ceil(required / capacity) if required > 0 else self.min_workers
+        elif latest.backlog > 0 and tracker.backlog_rate() >= 0:
+            # Capacity unknown and the backlog is not shrinking: add a worker
+            desired = current + 1
+        else:
+            desired = current
+        return max(self.min_workers, min(self.max_workers, desired))
+
+
+class ConsumerLagMonitor:
+    """Polls consumer lag and publishes scaling recommendations."""
+
+    def __init__(self, nats_client: NATS, js_context: JetStreamContext,
+                 consumers: Optional[List[str]] = None, stream_name: Optional[str] = None,
+                 policy: Optional[ScalingPolicy] = None, interval: float = 5.0, window: int = 12,
+                 supervisors: Optional[Dict[str, WorkerSupervisor]] = None,
+                 publish: bool = True):
+        """
+        Args:
+            consumers: Durable consumer names to watch. All consumers of the stream if None.
+            supervisors: Optional mapping of consumer name to the supervisor running its workers.
+                Recommendations for those consumers are applied directly.
+        """
+        if not nats_client or not nats_client.is_connected:
+            raise ValueError("NATS client must be connected.")
+        if not js_context:
+            raise ValueError("JetStream context must be provided.")
+        self._js = js_context
+        self._publisher = Publisher(nats_client, js_context) if publish else None
+        self._consumers = consumers
+        self._stream = stream_name or get_default_config().stream_name
+        self._policy = policy or ScalingPolicy()
+        self._interval = interval
+        self._window = window
+        self._supervisors = supervisors or {}
+        self._trackers: Dict[str, LagTracker] = {}
+        self._capacity: Dict[str, float] = {}
+        self._workers: Dict[str, int] = {}
+        self._down_votes: Dict[str, int] = {}
+        self._latest: Dict[str, ConsumerLagPayload] = {}
+        self._task: Optional[asyncio.Task] = None
+        logger.info("ConsumerLagMonitor initialized.")
+
+    def set_worker_count(self, consumer: str, count: int) -> None:
+        """Tell the monitor how many workers serve ``consumer`` when no supervisor is attached."""
+        self._workers[consumer] = count
+
+    def latest(self, consumer: str) -> Optional[ConsumerLagPayload]:
+        """Return the most recent report for ``consumer``."""
+        return self._latest.get(consumer)
+
+    async def _consumer_infos(self) -> list:
+        if self._consumers is None:
+            return await self._js.consumers_info(self._stream)
+        infos = await asyncio.gather(*(self._js.consumer_info(self._stream, name)
+                                       for name in self._consumers), return_exceptions=True)
+        result = []
+        for name, info in zip(self._consumers, infos):
+            if isinstance(info, Exception):
+                logger.warning(f"Could not read consumer '{name}': {info}")
+            else:
+                result.append(info)
+        return result
+
+    def _current_workers(self, consumer: str) -> int:
+        supervisor = self._supervisors.get(consumer)
+        if supervisor is not None:
+            return supervisor.worker_count
+        return self._workers.get(consumer, 1)
+
+    def _evaluate(self, consumer: str, tracker: LagTracker, current: int) -> tuple:
+        latest = tracker.latest
+        # While work is queued the workers are saturated, so their rate is their capacity
+        if latest.backlog > 0 and current > 0:
+            rate = tracker.processing_rate() / current
+            if rate > 0:
+                self._capacity[consumer] = max(self._capacity.get(consumer, 0.0), rate)
+        desired = self._policy.desired_workers(tracker, current, self._capacity.get(consumer))
+        if desired < current:
+            self._down_votes[consumer] = self._down_votes.get(consumer, 0) + 1
+            if self._down_votes[consumer] < self._policy.scale_down_after:
+                return current, "hold"
+        else:
+            self._down_votes[consumer] = 0
+        if desired > current:
+            return desired, "scale_up"
+        if desired < current:
+            self._down_votes[consumer] = 0
+            return desired, "scale_down"
+        return current, "hold"
+
+    async def collect(self) -> Dict[str, ConsumerLagPayload]:
+        """Poll every consumer once, publish and apply recommendations."""
+        now = time.monotonic()
+        reports = {}
+        for info in await self._consumer_infos():
+            name = info.name
+            acked = info.ack_floor.consumer_seq if info.ack_floor else 0
+            tracker = self._trackers.setdefault(name, LagTracker(self._window))
+            tracker.add(LagSample(now, info.num_pending or 0, info.num_ack_pending or 0,
+                                  info.num_redelivered or 0, acked))
+            current = self._current_workers(name)
+            recommended, action = self._evaluate(name, tracker, current)
+            drain = tracker.drain_seconds()
+            report = ConsumerLagPayload(
+                consumer=name,
+                num_pending=info.num_pending or 0,
+                num_ack_pending=info.num_ack_pending or 0,
+                num_redelivered=info.num_redelivered or 0,
+                backlog_rate=tracker.backlog_rate(),
+                drain_seconds=drain,
+                current_workers=current,
+                recommended_workers=recommended,
+                action=action,
+                timestamp=datetime.utcnow().isoformat(),
+            )
+            reports[name] = report
+            self._latest[name] = report
+            if action != "hold":
+                logger.info(f"Consumer '{name}': backlog={tracker.latest.backlog} "
+                            f"drain={drain} -> {action} to {recommended} workers")
+                supervisor = self._supervisors.get(name)
+                if supervisor is not None:
+                    await supervisor.scale_to(recommended)
+                else:
+                    self._workers[name] = recommended
+            if self._publisher:
+                try:
+                    # Core NATS on a subject outside dtr.>, so reports are neither stored nor archived
+                    await self._publisher.publish(EventSubjects.CONSUMER_LAG, report, use_jetstream=False)
+                except Exception as e:
+                    logger.warning(f"Failed to publish lag report for '{name}': {e}")
+        return reports
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.collect()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"ConsumerLagMonitor poll failed: {e}", exc_info=True)
+            await asyncio.sleep(self._interval)
+
+    def start(self) -> None:
+        """Start polling in a background task."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"ConsumerLagMonitor polling every {self._interval}s")
+
+    async def stop(self) -> None:
+        """Stop the background polling task."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            logger.info("ConsumerLagMonitor stopped.")
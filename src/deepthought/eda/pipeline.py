@@ -0,0 +1,257 @@
+# File: src/deepthought/eda/pipeline.py
+"""
+Declarative stage pipeline with fusion of co-located stages.
+
+A pipeline is a set of stages, each consuming one subject and optionally
+producing another. When a stage's consumer runs in the same process it is
+called directly with the producer's payload, skipping JSON serialization and
+the broker round trip. A stage output is instead published to JetStream when
+a stage outside this process consumes it, when nothing in this process does,
+or when the stage asks for it with ``publish_output`` (durability, fan-out to
+observers such as the event archive); local consumers then receive it from
+the broker like everyone else, so no event is handled twice.
+
+Every local stage also keeps its broker subscription, so events on its input
+subject from other processes (a remote InputHandler, scaled-out workers of
+the producing stage) are consumed too. A fused stage whose input only ever
+comes from this process can skip it with ``local_input_only``.
+
+Example::
+
+    pipeline = Pipeline([memory.as_stage(), llm.as_stage(), output.as_stage()])
+    await pipeline.start(nc, js)                  # everything fused in one process
+    await pipeline.start(nc, js, local={"llm"})   # only the LLM stage here
+"""
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+from nats.aio.client import Client as NATS
+from nats.aio.msg import Msg
+from nats.js.client import JetStreamContext
+
+from .publisher import Publisher
+from .subscriber import DrainReport, Subscriber
+
+logger = logging.getLogger(__name__)
+
+#: A stage receives the decoded event and returns the payload to emit, or None
+StageHandler = Callable[[Dict[str, Any]], Awaitable[Optional[Any]]]
+
+
+@dataclass
+class Stage:
+    """A pipeline stage consuming ``input_subject`` and producing ``output_subject``."""
+    name: str
+    input_subject: str
+    handler: StageHandler
+    output_subject: Optional[str] = None
+    #: Durable consumer name used when the stage reads from the broker
+    durable: Optional[str] = None
+    #: Publish the output even when every consumer is fused in-process
+    publish_output: bool = False
+    #: Broker events handled at once when the stage reads from the broker
+    max_concurrency: int = 1
+    #: No other process produces the input subject: skip the broker subscription when fused
+    local_input_only: bool = False
+
+
+def _as_dict(payload: Any) -> Dict[str, Any]:
+    if isinstance(payload, dict):
+        return payload
+    if hasattr(payload, "__dict__"):
+        return dict(payload.__dict__)
+    raise TypeError(f"Stage returned unsupported payload type {type(payload).__name__}")
+
+
+class Pipeline:
+    """Wires stages together and fuses the ones that run in this process."""
+
+    def __init__(self, stages: Iterable[Stage] = ()):
+        self._stages: Dict[str, Stage] = {}
+        self._local: Set[str] = set()
+        self._publisher: Optional[Publisher] = None
+        self._subscriber: Optional[Subscriber] = None
+        for stage in stages:
+            self.add_stage(stage)
+
+    def add_stage(self, stage: Stage) -> "Pipeline":
+        """Add a stage, rejecting duplicate names and cycles."""
+        if stage.name in self._stages:
+            raise ValueError(f"Duplicate stage name '{stage.name}'.")
+        self._stages[stage.name] = stage
+        try:
+            self._check_acyclic()
+        except ValueError:
+            del self._stages[stage.name]
+            raise
+        return self
+
+    @property
+    def stages(self) -> List[Stage]:
+        return list(self._stages.values())
+
+    def consumers(self, subject: str) -> List[Stage]:
+        """Stages that consume ``subject``."""
+        return [s for s in self._stages.values() if s.input_subject == subject]
+
+    def _check_acyclic(self) -> None:
+        state: Dict[str, int] = {}
+
+        def visit(stage: Stage) -> None:
+            if state.get(stage.name) == 1:
+                raise ValueError(f"Pipeline has a cycle through stage '{stage.name}'.")
+            if state.get(stage.name) == 2:
+                return
+            state[stage.name] = 1
+            if stage.output_subject:
+                for nxt in self.consumers(stage.output_subject):
+                    visit(nxt)
+            state[stage.name] = 2
+
+        for stage in self._stages.values():
+            visit(stage)
+
+    def _resolve_local(self, local: Optional[Iterable[str]]) -> Set[str]:
+        names = set(self._stages) if local is None else set(local)
+        unknown = names - set(self._stages)
+        if unknown:
+            raise ValueError(f"Unknown stages: {sorted(unknown)}")
+        return names
+
+    def _publishes(self, subject: str, force: bool = False) -> bool:
+        """Whether an event on ``subject`` goes to the broker: forced, consumed nowhere here, or elsewhere."""
+        consumers = self.consumers(subject)
+        if force or not consumers:
+            return True
+        return any(c.name not in self._local for c in consumers)
+
+    def _must_publish(self, stage: Stage) -> bool:
+        return self._publishes(stage.output_subject, stage.publish_output)
+
+    def _fused(self, stage: Stage) -> bool:
+        """Whether local stages produce ``stage``'s input and all hand it over in-process."""
+        producers = [s for s in self._stages.values() if s.name in self._local and s.output_subject == stage.input_subject]
+        return bool(producers) and not any(self._must_publish(p) for p in producers)
+
+    def _heads(self) -> List[Stage]:
+        """Local stages that subscribe to their input subject on the broker."""
+        return [s for s in self._stages.values()
+                if s.name in self._local and not (s.local_input_only and self._fused(s))]
+
+    def plan(self, local: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        Describe how the pipeline would run with ``local`` stages in this process.
+
+        Returns:
+            Dict with the broker-fed ``heads``, the ``fused`` producer -> consumer
+            edges called in-process, and the ``published`` subjects.
+        """
+        previous, self._local = self._local, self._resolve_local(local)
+        try:
+            fused, published = [], set()
+            for name in sorted(self._local):
+                stage = self._stages[name]
+                if not stage.output_subject:
+                    continue
+                if self._must_publish(stage):
+                    published.add(stage.output_subject)
+                else:
+                    fused.extend((name, c.name) for c in self.consumers(stage.output_subject) if c.name in self._local)
+            return {"heads": sorted(s.name for s in self._heads()), "fused": sorted(fused),
+                    "published": sorted(published)}
+        finally:
+            self._local = previous
+
+    async def _run_stage(self, stage: Stage, data: Dict[str, Any]) -> None:
+        result = await stage.handler(data)
+        if result is None or not stage.output_subject:
+            return
+        await self._emit(stage.output_subject, result, self._must_publish(stage))
+
+    async def _emit(self, subject: str, payload: Any, publish: bool) -> None:
+        if publish:
+            if self._publisher is None:
+                raise RuntimeError(f"Pipeline must be started with a NATS client to publish '{subject}'.")
+            await self._publisher.publish(subject, payload, use_jetstream=True, timeout=10.0)
+            # Local consumers get it through their broker subscription
+            return
+        local = [c for c in self.consumers(subject) if c.name in self._local]
+        if not local:
+            return
+        data = _as_dict(payload)
+        if len(local) == 1:
+            await self._run_stage(local[0], data)
+        else:
+            await asyncio.gather(*(self._run_stage(c, dict(data)) for c in local))
+
+    async def submit(self, subject: str, payload: Any, publish: bool = False) -> None:
+        """
+        Inject an event produced in this process (e.g. by InputHandler).
+
+        The same rule as for stage outputs applies: the event is published if
+        a non-local stage or no stage consumes it, and otherwise local consumers
+        are called directly. An event fused into local stages never reaches the
+        stream, so observers such as the event archive do not see it unless
+        ``publish`` is set.
+
+        Args:
+            publish: Publish even when every consumer runs in this process.
+        """
+        await self._emit(subject, payload, self._publishes(subject, publish))
+
+    def _make_handler(self, stage: Stage):
+        async def handler(msg: Msg) -> None:
+            try:
+                data = json.loads(msg.data.decode())
+                await self._run_stage(stage, data)
+                # Ack only after the whole fused chain has finished so a failure retries it
+                await msg.ack()
+            except Exception as e:
+                logger.error(f"Pipeline stage '{stage.name}' failed: {e}", exc_info=True)
+        return handler
+
+    async def start(self, nats_client: Optional[NATS] = None, js_context: Optional[JetStreamContext] = None,
+                    local: Optional[Iterable[str]] = None) -> bool:
+        """
+        Run the ``local`` stages (all stages by default) in this process.
+
+        Stages fed by another local stage are fused; every stage also subscribes
+        to its input subject with its durable consumer, handling up to the
+        stage's ``max_concurrency`` events at once, unless it is fused and marked
+        ``local_input_only``. Without a NATS client the
+        pipeline only serves events injected with ``submit``.
+
+        Returns:
+            bool: True if all subscriptions were created, False otherwise.
+        """
+        self._local = self._resolve_local(local)
+        if nats_client is None:
+            logger.info(f"Pipeline running in-process only: {self.plan(self._local)}")
+            return True
+        self._publisher = Publisher(nats_client, js_context)
+        self._subscriber = Subscriber(nats_client, js_context)
+        try:
+            for stage in self._heads():
+                await self._subscriber.subscribe(
+                    subject=stage.input_subject,
+                    handler=self._make_handler(stage),
+                    use_jetstream=True,
+                    durable=stage.durable or f"{stage.name}_listener",
+                    max_concurrency=stage.max_concurrency,
+                )
+        except Exception as e:
+            logger.error(f"Pipeline failed to subscribe: {e}", exc_info=True)
+            return False
+        logger.info(f"Pipeline started: {self.plan(self._local)}")
+        return True
+
+    async def stop(self, drain_timeout: float = 30.0) -> Optional[DrainReport]:
+        """Drain the pipeline's subscriptions."""
+        if not self._subscriber:
+            return None
+        publishers = [self._publisher] if self._publisher else []
+        report = await self._subscriber.drain(drain_timeout, publishers=publishers)
+        self._subscriber = None
+        return report
@@ -1,4 +1,5 @@
 # File: src/deepthought/eda/publisher.py
+import asyncio
 import logging
 import nats
 from typing import Any, Dict, Optional, Union
@@ -18,8 +19,25 @@ class Publisher:
             raise ValueError("JetStream context must be provided.")
         self._nc = nats_client
         self._js = js_context
+        self._pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
         logger.debug("Publisher initialized with shared client and JS context.")
 
+    @property
+    def pending(self) -> int:
+        """Number of publishes that have not completed yet."""
+        return self._pending
+
+    async def wait_idle(self, timeout: float) -> int:
+        """Wait up to ``timeout`` seconds for in-flight publishes; return how many remain."""
+        if self._pending:
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout=max(timeout, 0))
+            except asyncio.TimeoutError:
+                logger.warning(f"{self._pending} publishes still pending after {timeout:.1f}s")
+        return self._pending
+
     async def publish(self, subject: str, payload: Union[str, Dict, Any],
                       use_jetstream: bool = True, timeout: float = 10.0) -> Optional[Dict]: # Increased default timeout
         """Publish message, using JetStream if requested."""
@@ -32,6 +50,8 @@ class Publisher:
             data = json.dumps(payload).encode()
         else: data = str(payload).encode()
 
+        self._pending += 1
+        self._idle.clear()
         try:
             if use_jetstream:
                 # Use JetStream publish with timeout
@@ -45,4 +65,8 @@ class Publisher:
                 return None
         except Exception as e:
             logger.error(f"Failed to publish to '{subject}': {e}", exc_info=True) # Log traceback
-            raise e
\ No newline at end of file
+            raise e
+        finally:
+            self._pending -= 1
+            if not self._pending:
+                self._idle.set()
\ No newline at end of file
@@ -0,0 +1,331 @@
+# File: src/deepthought/eda/segment_log.py
+"""
+Append-only segment log for exported DeepThought events.
+
+Each segment is a pair of files named after the first stream sequence
+they contain:
+
+* ``<base_seq>.log`` - records laid out back to back as
+  ``<seq:u64><timestamp_ns:i64><subject_len:u16><data_len:u32>`` followed by
+  the subject and data bytes.
+* ``<base_seq>.idx`` - one fixed width ``<seq:u64><timestamp_ns:i64><offset:u64>``
+  entry per record.
+
+Both files are read through ``mmap`` so lookups by sequence or time are a
+binary search over the index followed by a sequential walk of the log,
+without scanning segments outside the requested range.
+"""
+import bisect
+import logging
+import mmap
+import os
+import struct
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+RECORD_HEADER = struct.Struct("<QqHI")
+INDEX_ENTRY = struct.Struct("<QqQ")
+LOG_SUFFIX = ".log"
+INDEX_SUFFIX = ".idx"
+
+
+@dataclass
+class SegmentRecord:
+    """A single event read back from a segment log."""
+    seq: int
+    timestamp_ns: int
+    subject: str
+    data: bytes
+
+
+def _segment_paths(directory: str, base_seq: int) -> tuple:
+    name = f"{base_seq:020d}"
+    return (os.path.join(directory, name + LOG_SUFFIX),
+            os.path.join(directory, name + INDEX_SUFFIX))
+
+
+def list_segments(directory: str) -> List[int]:
+    """Return the base sequences of all segments in ``directory`` in order."""
+    if not os.path.isdir(directory):
+        return []
+    bases = []
+    for name in os.listdir(directory):
+        if name.endswith(LOG_SUFFIX):
+            try:
+                bases.append(int(name[:-len(LOG_SUFFIX)]))
+            except ValueError:
+                continue
+    return sorted(bases)
+
+
+class SegmentLogWriter:
+    """Buffers records and appends them to rolling segment files."""
+
+    def __init__(self, directory: str, max_segment_bytes: int = 64 * 1024 * 1024,
+                 buffer_bytes: int = 1024 * 1024):
+        """Open ``directory`` for appending, continuing after its last record."""
+        self._directory = directory
+        self._max_segment_bytes = max_segment_bytes
+        self._buffer_bytes = buffer_bytes
+        self._log_buf = bytearray()
+        self._idx_buf = bytearray()
+        self._log_file = None
+        self._idx_file = None
+        self._segment_size = 0
+        self._last_seq = 0
+        os.makedirs(directory, exist_ok=True)
+        self._resume()
+
+    @property
+    def last_seq(self) -> int:
+        """Highest sequence written so far (0 for an empty log)."""
+        return self._last_seq
+
+    def _resume(self) -> None:
+        bases = list_segments(self._directory)
+        if not bases:
+            return
+        log_path, idx_path = _segment_paths(self._directory, bases[-1])
+        idx_size = os.path.getsize(idx_path) if os.path.exists(idx_path) else 0
+        # Drop a torn trailing index entry left by an interrupted flush
+        idx_size -= idx_size % INDEX_ENTRY.size
+        if idx_size:
+            with open(idx_path, "rb") as f:
+                f.seek(idx_size - INDEX_ENTRY.size)
+                seq, ts, offset = INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))
+            with open(log_path, "rb") as f:
+                f.seek(offset)
+                _, _, subj_len, data_len = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+            self._last_seq = seq
+            log_size = offset + RECORD_HEADER.size + subj_len + data_len
+        else:
+            log_size = 0
+        self._log_file = open(log_path, "r+b")
+        self._log_file.truncate(log_size)
+        self._log_file.seek(log_size)
+        self._idx_file = open(idx_path, "r+b" if os.path.exists(idx_path) else "w+b")
+        self._idx_file.truncate(idx_size)
+        self._idx_file.seek(idx_size)
+        self._segment_size = log_size
+        logger.debug(f"Resuming segment log in '{self._directory}' after seq {self._last_seq}")
+
+    def _roll(self, base_seq: int) -> None:
+        self._flush_buffers()
+        self._close_files()
+        log_path, idx_path = _segment_paths(self._directory, base_seq)
+        self._log_file = open(log_path, "wb")
+        self._idx_file = open(idx_path, "wb")
+        self._segment_size = 0
+        logger.debug(f"Opened new segment {base_seq} in '{self._directory}'")
+
+    def append(self, seq: int, timestamp_ns: int, subject: str, data: bytes) -> None:
+        """Append one record. Sequences must be strictly increasing."""
+        if seq <= self._last_seq:
+            raise ValueError(f"Sequence {seq} is not after last written sequence {self._last_seq}.")
+        subj = subject.encode()
+        size = RECORD_HEADER.size + len(subj) + len(data)
+        full = self._segment_size and self._segment_size + size > self._max_segment_bytes
+        if self._log_file is None or full:
+            self._roll(seq)
+        self._idx_buf += INDEX_ENTRY.pack(seq, timestamp_ns, self._segment_size)
+        self._log_buf += RECORD_HEADER.pack(seq, timestamp_ns, len(subj), len(data))
+        self._log_buf += subj
+        self._log_buf += data
+        self._segment_size += size
+        self._last_seq = seq
+        if len(self._log_buf) >= self._buffer_bytes:
+            self._flush_buffers()
+
+    def _flush_buffers(self) -> None:
+        if self._log_file is None:
+            return
+        # Log data goes first so an index entry never points past the log
+        if self._log_buf:
+            self._log_file.write(self._log_buf)
+            self._log_buf = bytearray()
+        if self._idx_buf:
+            self._idx_file.write(self._idx_buf)
+            self._idx_buf = bytearray()
+
+    def flush(self) -> None:
+        """Write buffered records to disk."""
+        self._flush_buffers()
+        if self._log_file is not None:
+            self._log_file.flush()
+            self._idx_file.flush()
+
+    def _close_files(self) -> None:
+        for f in (self._log_file, self._idx_file):
+            if f is not None:
+                f.close()
+        self._log_file = None
+        self._idx_file = None
+
+    def close(self) -> None:
+        """Flush and close the current segment."""
+        self.flush()
+        self._close_files()
+
+    def __enter__(self) -> "SegmentLogWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class _Segment:
+    """A memory-mapped segment and its index."""
+
+    def __init__(self, directory: str, base_seq: int):
+        log_path, idx_path = _segment_paths(directory, base_seq)
+        self.base_seq = base_seq
+        self._log_fd = open(log_path, "rb")
+        self._idx_fd = open(idx_path, "rb")
+        self._log = self._idx = None
+        self.remap()
+
+    def remap(self) -> None:
+        """Map the files again to see records appended since they were mapped."""
+        self._unmap()
+        self._log = self._map(self._log_fd)
+        self._idx = self._map(self._idx_fd)
+        self.count = len(self._idx) // INDEX_ENTRY.size if self._idx is not None else 0
+
+    @staticmethod
+    def _map(f) -> Optional[mmap.mmap]:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def entry(self, i: int) -> tuple:
+        return INDEX_ENTRY.unpack_from(self._idx, i * INDEX_ENTRY.size)
+
+    def first(self) -> tuple:
+        return self.entry(0)
+
+    def last(self) -> tuple:
+        return self.entry(self.count - 1)
+
+    def bisect(self, value: int, field: int) -> int:
+        """Index of the first entry whose ``field`` is >= ``value``."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.entry(mid)[field] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def read(self, i: int) -> SegmentRecord:
+        offset = self.entry(i)[2]
+        seq, ts, subj_len, data_len = RECORD_HEADER.unpack_from(self._log, offset)
+        start = offset + RECORD_HEADER.size
+        subject = self._log[start:start + subj_len].decode()
+        data = self._log[start + subj_len:start + subj_len + data_len]
+        return SegmentRecord(seq=seq, timestamp_ns=ts, subject=subject, data=data)
+
+    def _unmap(self) -> None:
+        for m in (self._log, self._idx):
+            if m is not None:
+                m.close()
+        self._log = self._idx = None
+
+    def close(self) -> None:
+        self._unmap()
+        self._log_fd.close()
+        self._idx_fd.close()
+
+
+class SegmentLogReader:
+    """Random access over a directory of segments written by SegmentLogWriter.
+
+    Timestamps are assumed to be non-decreasing with sequence, which holds
+    for events exported from a single JetStream stream.
+    """
+
+    def __init__(self, directory: str):
+        """Memory-map every non-empty segment in ``directory``."""
+        self._directory = directory
+        self._segments = []
+        self._open(list_segments(directory))
+
+    def _open(self, bases: List[int]) -> None:
+        for base in bases:
+            seg = _Segment(self._directory, base)
+            if seg.count:
+                self._segments.append(seg)
+            else:
+                seg.close()
+        self._first_seqs = [seg.base_seq for seg in self._segments]
+        self._first_ts = [seg.first()[1] for seg in self._segments]
+
+    def refresh(self) -> None:
+        """
+        Pick up records written since the reader was opened.
+
+        The writer only appends to its newest segment, so that one is remapped
+        and segments created after it are mapped; the others are left alone.
+        """
+        newest = self._segments[-1].base_seq if self._segments else -1
+        if self._segments:
+            self._segments[-1].remap()
+        self._open([base for base in list_segments(self._directory) if base > newest])
+
+    def __len__(self) -> int:
+        return sum(seg.count for seg in self._segments)
+
+    @property
+    def first_seq(self) -> Optional[int]:
+        return self._segments[0].first()[0] if self._segments else None
+
+    @property
+    def last_seq(self) -> Optional[int]:
+        return self._segments[-1].last()[0] if self._segments else None
+
+    def _scan(self, start_seg: int, start_idx: int, field: int,
+              end: Optional[int]) -> Iterator[SegmentRecord]:
+        for s in range(start_seg, len(self._segments)):
+            seg = self._segments[s]
+            i = start_idx if s == start_seg else 0
+            stop = seg.count if end is None else seg.bisect(end, field)
+            for j in range(i, stop):
+                yield seg.read(j)
+            if stop < seg.count:
+                return
+
+    def read_seq_range(self, start_seq: int = 0,
+                       end_seq: Optional[int] = None) -> Iterator[SegmentRecord]:
+        """Yield records with ``start_seq <= seq < end_seq``."""
+        if not self._segments:
+            return iter(())
+        s = max(bisect.bisect_right(self._first_seqs, start_seq) - 1, 0)
+        return self._scan(s, self._segments[s].bisect(start_seq, 0), 0, end_seq)
+
+    def read_time_range(self, start_ns: int = 0,
+                        end_ns: Optional[int] = None) -> Iterator[SegmentRecord]:
+        """Yield records with ``start_ns <= timestamp_ns < end_ns``."""
+        if not self._segments:
+            return iter(())
+        s = max(bisect.bisect_left(self._first_ts, start_ns) - 1, 0)
+        # Skip segments that end entirely before the requested start
+        while s < len(self._segments) - 1 and self._segments[s].last()[1] < start_ns:
+            s += 1
+        return self._scan(s, self._segments[s].bisect(start_ns, 1), 1, end_ns)
+
+    def __iter__(self) -> Iterator[SegmentRecord]:
+        return self.read_seq_range()
+
+    def close(self) -> None:
+        """Unmap all segments."""
+        for seg in self._segments:
+            seg.close()
+        self._segments = []
+
+    def __enter__(self) -> "SegmentLogReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,204 @@
+# File: src/deepthought/eda/streaming.py
+"""
+Incremental delivery of responses as ``RESPONSE_CHUNK`` events.
+
+``ChunkCoalescer`` sits on the producing side. Text fed to it is published
+as sequence-numbered chunks: the first piece goes out at once (it sets the
+time to first token the user sees) and later pieces are merged into at most
+one chunk per ``interval`` unless ``max_chars`` accumulate sooner, so a
+fast model does not cost one message per token.
+
+``ResponseStream`` sits on the consuming side. It puts chunks back in
+sequence order, drops duplicates and serves any number of async iterators
+over the text. When the final ``RESPONSE_GENERATED`` event arrives before
+the stream is complete (chunks are best effort), the missing tail is taken
+from the full response. A generation that fails or is dropped ends its
+stream with a final chunk flagged ``error``; readers then get
+``StreamAborted`` instead of a truncated response.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .events import ResponseChunkPayload
+
+logger = logging.getLogger(__name__)
+
+ChunkSender = Callable[[ResponseChunkPayload], Awaitable[None]]
+
+
+class StreamAborted(Exception):
+    """The response being streamed will not be completed."""
+
+
+class ChunkCoalescer:
+    """Publishes the text of one response as coalesced, sequence-numbered chunks."""
+
+    def __init__(self, send: ChunkSender, input_id: Optional[str], interval: float = 0.05,
+                 max_chars: int = 512):
+        """
+        Args:
+            send: Publishes one chunk payload.
+            input_id: Response the chunks belong to.
+            interval: Minimum seconds between chunks after the first.
+            max_chars: Buffered characters that trigger a chunk before ``interval`` is up.
+        """
+        self._send = send
+        self.input_id = input_id
+        self.interval = interval
+        self.max_chars = max_chars
+        self._buffer: List[str] = []
+        self._size = 0
+        self._wake = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+        self.chunks = 0
+        self.chars = 0
+        self.failures = 0
+        self.first_chunk_at: Optional[float] = None
+
+    def feed(self, text: str) -> None:
+        """Queue newly generated text; never blocks."""
+        if not text or self._closing:
+            return
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._pump())
+        self._wake.set()
+
+    async def _pump(self) -> None:
+        loop = asyncio.get_running_loop()
+        while not self._closing:
+            await self._wake.wait()
+            self._wake.clear()
+            if not self._buffer or self._closing:
+                continue
+            await self._flush(final=False)
+            # Coalescing window: let text pile up until it is over or the buffer is full
+            deadline = loop.time() + self.interval
+            while not self._closing and self._size < self.max_chars:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._wake.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                self._wake.clear()
+            self._wake.set()
+
+    async def _flush(self, final: bool, error: bool = False) -> None:
+        text = "".join(self._buffer)
+        self._buffer.clear()
+        self._size = 0
+        payload = ResponseChunkPayload(text=text, seq=self.chunks, input_id=self.input_id, final=final,
+                                       timestamp=datetime.utcnow().isoformat(), error=error)
+        self.chunks += 1
+        self.chars += len(text)
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.perf_counter()
+        try:
+            await self._send(payload)
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"Failed to publish chunk {payload.seq} of {self.input_id}: {e}")
+
+    async def close(self, aborted: bool = False) -> None:
+        """
+        Publish whatever is buffered as the final chunk, ending the stream.
+
+        With ``aborted`` the final chunk carries the ``error`` flag: the text
+        sent so far is not a complete response and none will follow.
+        """
+        if self._closing:
+            return
+        self._closing = True
+        self._wake.set()
+        if self._task is not None:
+            await self._task
+        await self._flush(final=True, error=aborted)
+
+
+class ResponseStream:
+    """Reassembles the chunks of one response and serves its text as it arrives."""
+
+    def __init__(self):
+        self._pieces: List[str] = []
+        self._early: Dict[int, Tuple[str, bool]] = {}
+        self._next = 0
+        self._changed = asyncio.Event()
+        self.done = False
+        self.failed = False
+        self.first_chunk_at: Optional[float] = None
+
+    @property
+    def text(self) -> str:
+        """Text received in order so far."""
+        return "".join(self._pieces)
+
+    def add(self, seq: int, text: str, final: bool = False, error: bool = False) -> None:
+        """
+        Record chunk ``seq``; chunks after a gap are held until the gap is filled.
+
+        A final chunk flagged ``error`` fails the stream at once, gap or not.
+        """
+        if self.done or seq < self._next or seq in self._early:
+            return
+        if final and error:
+            self.fail()
+            return
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.perf_counter()
+        self._early[seq] = (text, final)
+        while self._next in self._early:
+            text, final = self._early.pop(self._next)
+            self._next += 1
+            self._append(text)
+            if final:
+                self._finish()
+                return
+
+    def finish(self, final_response: Optional[str] = None) -> None:
+        """End the stream, appending the part of ``final_response`` no chunk delivered."""
+        if self.done:
+            return
+        received = self.text
+        if final_response and final_response.startswith(received):
+            self._append(final_response[len(received):])
+        self._finish()
+
+    def fail(self) -> None:
+        """End the stream without a response; readers raise ``StreamAborted``."""
+        if self.done:
+            return
+        self.failed = True
+        self._finish()
+
+    def _append(self, text: str) -> None:
+        if text:
+            self._pieces.append(text)
+            self._notify()
+
+    def _finish(self) -> None:
+        self.done = True
+        self._early.clear()
+        self._notify()
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        index = 0
+        while True:
+            while index < len(self._pieces):
+                yield self._pieces[index]
+                index += 1
+            if self.failed:
+                raise StreamAborted("Response generation failed or was dropped")
+            if self.done:
+                return
+            await self._changed.wait()
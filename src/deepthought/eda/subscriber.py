@@ -2,7 +2,9 @@
 import asyncio
 import json
 import logging
-from typing import Any, Callable, Dict, List, Optional, Union, Awaitable
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Union, Awaitable
 import nats
 from nats.aio.client import Client as NATS
 from nats.aio.msg import Msg
@@ -12,6 +14,32 @@ from nats.js.client import JetStreamContext
 logger = logging.getLogger(__name__)
 MessageHandlerType = Callable[[Msg], Awaitable[None]]
 
+
+@dataclass
+class DrainReport:
+    """Outcome of draining a subscriber."""
+    #: Handlers that were running when the drain started and finished in time
+    completed: int = 0
+    #: Messages delivered during the drain and handed back to the server unprocessed
+    rejected: int = 0
+    #: Messages whose handlers were still running at the deadline
+    abandoned: List[str] = field(default_factory=list)
+    #: Publishes that had not completed at the deadline
+    pending_publishes: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def clean(self) -> bool:
+        """True if nothing was cut off by the deadline."""
+        return not self.abandoned and not self.pending_publishes
+
+
+def _describe(msg: Msg) -> str:
+    try:
+        return f"{msg.subject}#{msg.metadata.sequence.stream}"
+    except Exception:
+        return msg.subject
+
 class Subscriber:
     """A subscriber using a shared NATS client and JetStream context."""
 
@@ -22,15 +50,85 @@ class Subscriber:
          self._nc = nats_client
          self._js = js_context # Store JS context if provided
          self._subscriptions = []
+         self._inflight: Dict[int, Msg] = {}
+         self._tasks: Set[asyncio.Task] = set()
+         self._idle = asyncio.Event()
+         self._idle.set()
+         self._draining = False
+         self._drain_completed = 0
+         self._drain_rejected = 0
          logger.debug("Subscriber initialized with shared client.")
 
+    @property
+    def in_flight(self) -> int:
+        """Number of handlers currently running."""
+        return len(self._inflight)
+
+    def _track(self, handler: MessageHandlerType, max_concurrency: int = 1) -> MessageHandlerType:
+        """
+        Wrap ``handler`` so running invocations are counted and drains can reject new ones.
+
+        With ``max_concurrency`` above one, each message runs in its own task and
+        the callback returns once a slot is free, so the client delivers the next
+        message while earlier handlers are still running.
+        """
+        slots = asyncio.Semaphore(max_concurrency) if max_concurrency > 1 else None
+
+        async def run(msg: Msg, key: int) -> None:
+            try:
+                await handler(msg)
+            finally:
+                self._inflight.pop(key, None)
+                if self._draining:
+                    self._drain_completed += 1
+                if not self._inflight:
+                    self._idle.set()
+                if slots is not None:
+                    slots.release()
+
+        async def tracked(msg: Msg) -> None:
+            if self._draining:
+                await self._reject(msg)
+                return
+            if slots is not None:
+                await slots.acquire()
+                if self._draining:
+                    slots.release()
+                    await self._reject(msg)
+                    return
+            key = id(msg)
+            self._inflight[key] = msg
+            self._idle.clear()
+            if slots is None:
+                await run(msg, key)
+                return
+            task = asyncio.create_task(run(msg, key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return tracked
+
+    async def _reject(self, msg: Msg) -> None:
+        """Hand a message that was never started back to JetStream for another worker to take."""
+        self._drain_rejected += 1
+        if self._js is not None and msg.reply and msg.reply.startswith("$JS.ACK"):
+            try:
+                await msg.nak()
+            except Exception as e:
+                logger.warning(f"Failed to NAK {msg.subject} during drain: {e}")
+
     async def subscribe(self,
                         subject: str,
                         handler: MessageHandlerType,
                         queue: str = "",
                         use_jetstream: bool = False, # Flag to control behavior
-                        durable: str = "") -> None:
-        """Subscribe using basic NATS or JetStream."""
+                        durable: str = "",
+                        max_concurrency: int = 1) -> None:
+        """
+        Subscribe using basic NATS or JetStream.
+
+        Args:
+            max_concurrency: Messages handled at the same time; 1 handles them in order.
+        """
         try:
             if use_jetstream:
                 if not self._js: raise ValueError("JetStream context required for JetStream subscriptions.")
@@ -42,7 +140,7 @@ class Subscriber:
                     subject=subject, # Subject filtering is primarily done by consumer config
                     queue=queue,     # Queue group name (optional for durable)
                     durable=durable, # Name of the durable consumer config
-                    cb=handler,      # Async callback function
+                    cb=self._track(handler, max_concurrency),  # Async callback with in-flight accounting
                     manual_ack=True  # IMPORTANT: We must manually ack messages
                 )
                 logger.info(f"JetStream subscription bound for subject '{subject}' to durable '{durable}'")
@@ -51,7 +149,7 @@ class Subscriber:
                 sub = await self._nc.subscribe(
                     subject=subject,
                     queue=queue,
-                    cb=handler
+                    cb=self._track(handler, max_concurrency)
                 )
                 logger.info(f"Basic NATS subscription created for '{subject}'")
 
@@ -74,6 +172,71 @@ class Subscriber:
         logger.info(f"Successfully unsubscribed from {successful_unsubs} subscriptions.")
         self._subscriptions = []
 
+    async def _stop_delivery(self, sub: Any) -> None:
+        """Remove interest in ``sub``; messages the client already buffered still reach the callback."""
+        try:
+            await sub.drain()
+            self._subscriptions.remove(sub)
+        except Exception as e:
+            logger.warning(f"Failed to stop delivery on a subscription during drain: {e}")
+
+    async def drain(self, timeout: float = 30.0, publishers: Sequence[Any] = ()) -> DrainReport:
+        """
+        Stop delivery, then wait for running handlers to finish.
+
+        Interest is removed from every subscription first, so the server stops
+        delivering here; messages the client had already buffered are NAKed so
+        another worker picks them up, and are not sent back to this one. Running
+        handlers get until ``timeout`` to finish, then the given publishers get
+        the remaining time to complete outstanding publishes, and the connection
+        is flushed so acks reach the server.
+
+        Args:
+            timeout: Deadline in seconds for the whole drain.
+            publishers: Publishers whose in-flight publishes should be awaited.
+
+        Returns:
+            DrainReport: What completed and what was abandoned.
+        """
+        started = time.monotonic()
+        deadline = started + timeout
+        self._draining = True
+        self._drain_completed = 0
+        self._drain_rejected = 0
+        # A subscription left bound while draining would get every NAKed message
+        # straight back, looping until the deadline and using up max_deliver.
+        stopping = [asyncio.create_task(self._stop_delivery(sub)) for sub in list(self._subscriptions)]
+        if self._inflight:
+            logger.info(f"Draining: waiting up to {timeout:.1f}s for {len(self._inflight)} running handlers")
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+        if stopping:
+            _, unfinished = await asyncio.wait(stopping, timeout=max(deadline - time.monotonic(), 0.0))
+            for task in unfinished:
+                task.cancel()
+        abandoned = [_describe(msg) for msg in self._inflight.values()]
+        pending = 0
+        for publisher in publishers:
+            pending += await publisher.wait_idle(max(deadline - time.monotonic(), 0.0))
+        try:
+            # Acks are fire-and-forget; flushing makes sure they left the client
+            await self._nc.flush(timeout=max(deadline - time.monotonic(), 1.0))
+        except Exception as e:
+            logger.warning(f"Flush during drain failed: {e}")
+        await self.unsubscribe_all()
+        self._draining = False
+        report = DrainReport(completed=self._drain_completed, rejected=self._drain_rejected,
+                             abandoned=abandoned, pending_publishes=pending,
+                             elapsed=time.monotonic() - started)
+        if report.clean:
+            logger.info(f"Drain finished in {report.elapsed:.2f}s: {report.completed} completed, "
+                        f"{report.rejected} returned to the server")
+        else:
+            logger.warning(f"Drain deadline hit: abandoned {abandoned}, {pending} publishes pending")
+        return report
+
     async def default_handler(self, msg: Msg) -> None:
          """Default handler (should generally not be used if handler is mandatory)."""
          logger.warning(f"Default handler called for message on {msg.subject}.")
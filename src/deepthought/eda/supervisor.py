@@ -0,0 +1,77 @@
+# File: src/deepthought/eda/supervisor.py
+import asyncio
+import logging
+import signal
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerSupervisor:
+    """Runs a variable number of identical worker processes on this host."""
+
+    def __init__(self, command: List[str], min_workers: int = 1, max_workers: int = 8,
+                 env: Optional[Dict[str, str]] = None, stop_timeout: float = 30.0):
+        """
+        Args:
+            command: Program and arguments used to start one worker.
+            stop_timeout: Seconds a worker gets to drain after SIGTERM before it is killed.
+        """
+        if min_workers < 0 or max_workers < min_workers:
+            raise ValueError("Require 0 <= min_workers <= max_workers.")
+        self._command = command
+        self._env = env
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self._stop_timeout = stop_timeout
+        self._procs: List[asyncio.subprocess.Process] = []
+        self._lock = asyncio.Lock()
+
+    @property
+    def worker_count(self) -> int:
+        """Number of worker processes that are still running."""
+        self._reap()
+        return len(self._procs)
+
+    def _reap(self) -> None:
+        alive = []
+        for proc in self._procs:
+            if proc.returncode is None:
+                alive.append(proc)
+            else:
+                logger.warning(f"Worker pid {proc.pid} exited with code {proc.returncode}")
+        self._procs = alive
+
+    async def _stop(self, proc: asyncio.subprocess.Process) -> None:
+        try:
+            proc.send_signal(signal.SIGTERM)
+            await asyncio.wait_for(proc.wait(), timeout=self._stop_timeout)
+        except ProcessLookupError:
+            return
+        except asyncio.TimeoutError:
+            logger.warning(f"Worker pid {proc.pid} did not stop in {self._stop_timeout}s, killing it")
+            proc.kill()
+            await proc.wait()
+
+    async def scale_to(self, count: int) -> int:
+        """Start or stop workers until ``count`` are running (clamped to the limits)."""
+        count = max(self.min_workers, min(self.max_workers, count))
+        async with self._lock:
+            self._reap()
+            while len(self._procs) < count:
+                proc = await asyncio.create_subprocess_exec(*self._command, env=self._env)
+                self._procs.append(proc)
+                logger.info(f"Started worker pid {proc.pid} ({len(self._procs)}/{count})")
+            if len(self._procs) > count:
+                # Newest workers are stopped first; they hold the least warm state
+                surplus = self._procs[count:]
+                self._procs = self._procs[:count]
+                await asyncio.gather(*(self._stop(p) for p in surplus))
+                logger.info(f"Stopped {len(surplus)} workers, {count} running")
+            return len(self._procs)
+
+    async def stop_all(self) -> None:
+        """Stop every worker, ignoring ``min_workers``."""
+        async with self._lock:
+            procs, self._procs = self._procs, []
+            await asyncio.gather(*(self._stop(p) for p in procs))
@@ -0,0 +1,43 @@
+"""
+LLM inference for DeepThought reThought.
+
+This package contains the generation engine that the LLM stage
+(``LLMStub``) runs on, the prompt template it renders, the key/value
+cache of shared prompt prefixes, the response cache, the loader that
+merges a fine-tuned LoRA adapter and quantizes the model for CPU serving,
+and the adapter pool that serves many LoRA adapters on one base model.
+
+Public names are imported lazily on first access so that importing the
+package does not pull in torch or transformers.
+"""
+
+from typing import TYPE_CHECKING
+
+from .._lazy import lazy_exports
+
+if TYPE_CHECKING:
+    from .adapters import AdapterPool
+    from .engine import ContinuousBatchingEngine, GenerationParams, GenerationResult
+    from .loader import load_cpu_model, load_mapped_model, merge_lora, quantize_int8
+    from .prefix_cache import PrefixCache
+    from .prompt import build_prompt, format_prompt
+    from .response_cache import CachedResponse, ResponseCache
+
+_LAZY_IMPORTS = {
+    "AdapterPool": ".adapters",
+    "ContinuousBatchingEngine": ".engine",
+    "GenerationParams": ".engine",
+    "GenerationResult": ".engine",
+    "load_cpu_model": ".loader",
+    "load_mapped_model": ".loader",
+    "merge_lora": ".loader",
+    "quantize_int8": ".loader",
+    "PrefixCache": ".prefix_cache",
+    "build_prompt": ".prompt",
+    "format_prompt": ".prompt",
+    "CachedResponse": ".response_cache",
+    "ResponseCache": ".response_cache",
+}
+
+__all__ = list(_LAZY_IMPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _LAZY_IMPORTS)
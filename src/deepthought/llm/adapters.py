@@ -0,0 +1,285 @@
+# File: src/deepthought/llm/adapters.py
+"""
+Serve many LoRA adapters on one resident base model.
+
+Merging an adapter (see ``loader.merge_lora``) bakes one fine-tune into the
+weights, so serving N fine-tunes that way needs N model copies. Here the
+base model stays unmerged and shared instead: ``AdapterPool.attach`` wraps
+each targeted linear layer in a ``LoRALinear``, which adds
+
+    x @ A.T @ B.T * scale
+
+for the adapter chosen by each batch row. One forward pass therefore serves
+a batch that mixes adapters (and rows with no adapter): the base matmul runs
+once for all rows, and the low-rank update runs once per distinct adapter
+over just that adapter's rows. An adapter of rank r costs
+``r * (in + out)`` values per layer, a few MB against a base model of GBs,
+so N fine-tunes fit in roughly the memory of one model.
+
+Adapters are registered by name and loaded on first use from the directory
+``train_script.py`` writes (``adapter_config.json`` plus
+``adapter_model.safetensors``, memory-mapped). At most ``max_loaded`` stay
+resident; the least recently used is evicted beyond that. Sequences hold a
+reference to their adapter, so evicting one that is still generating only
+frees it once those sequences retire.
+
+The engine resolves each request's adapter on the event loop at admission
+and selects the batch's adapters around every forward pass in its model
+thread. Once a model is attached, its layers may only be replaced in that
+thread: ``register`` rejects an adapter targeting layers that are not
+wrapped yet, and ``ContinuousBatchingEngine.register_adapter`` wraps them
+between forward passes instead.
+"""
+import contextlib
+import json
+import logging
+import math
+import os
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import torch
+import torch.nn.functional as F
+from torch import nn
+
+from .loader import map_safetensors
+
+logger = logging.getLogger(__name__)
+
+_PEFT_PREFIX = "base_model.model."
+_LINEAR_TYPES = (nn.Linear, torch.ao.nn.quantized.dynamic.Linear)
+
+
+@dataclass(eq=False)
+class LoRAAdapter:
+    name: str
+    #: Module path -> ``(A, B)`` of shapes ``(r, in)`` and ``(out, r)``, scale folded into ``B``
+    weights: Dict[str, Tuple[torch.Tensor, torch.Tensor]]
+    #: Bumped when the name is registered again; part of prefix- and response-cache keys
+    version: int = 0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes + b.nbytes for a, b in self.weights.values())
+
+    @property
+    def key(self) -> str:
+        """Identifies this adapter's weights, e.g. to namespace cached key/values."""
+        return f"{self.name}#{self.version}"
+
+
+def _adapter_config(path: str) -> Dict[str, Any]:
+    with open(os.path.join(path, "adapter_config.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_lora_adapter(name: str, path: str, dtype: torch.dtype = torch.float32, version: int = 0) -> LoRAAdapter:
+    """
+    Read a peft LoRA adapter directory.
+
+    Raises:
+        ValueError: The adapter uses features ``LoRALinear`` does not apply
+            (trained biases, extra saved modules, DoRA, embedding adapters).
+    """
+    config = _adapter_config(path)
+    if config.get("use_dora") or config.get("modules_to_save") or config.get("bias", "none") != "none":
+        raise ValueError(f"Adapter {name!r} needs DoRA, biases or extra modules, which are not supported.")
+    rank, alpha = config["r"], config.get("lora_alpha", config["r"])
+    scale = alpha / math.sqrt(rank) if config.get("use_rslora") else alpha / rank
+    filename = os.path.join(path, "adapter_model.safetensors")
+    if os.path.exists(filename):
+        tensors = map_safetensors(filename)
+    else:
+        tensors = torch.load(os.path.join(path, "adapter_model.bin"), map_location="cpu", weights_only=True)
+    pairs: Dict[str, Dict[str, torch.Tensor]] = {}
+    for key, tensor in tensors.items():
+        match = re.fullmatch(r"(.+)\.lora_([AB])(?:\.[^.]+)?\.weight", key)
+        if match is None:
+            raise ValueError(f"Adapter {name!r} has an unsupported tensor {key!r}.")
+        module = match.group(1)
+        if module.startswith(_PEFT_PREFIX):
+            module = module[len(_PEFT_PREFIX):]
+        pairs.setdefault(module, {})[match.group(2)] = tensor
+    weights = {}
+    for module, pair in pairs.items():
+        if set(pair) != {"A", "B"}:
+            raise ValueError(f"Adapter {name!r} lacks lora_A or lora_B for {module}.")
+        weights[module] = (pair["A"].to(dtype), pair["B"].to(dtype) * scale)
+    return LoRAAdapter(name, weights, version)
+
+
+def _targeted(targets: Any, module_path: str) -> bool:
+    """Whether peft's ``target_modules`` (a regex or a list of layer names) selects ``module_path``."""
+    if isinstance(targets, str):
+        return re.fullmatch(targets, module_path) is not None
+    return module_path.rsplit(".", 1)[-1] in targets
+
+
+class LoRALinear(nn.Module):
+    """A linear layer plus the LoRA update of the adapter selected for each batch row."""
+
+    def __init__(self, base: nn.Module, path: str, pool: "AdapterPool"):
+        super().__init__()
+        self.base = base
+        self.path = path
+        self._pool = pool
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        out = self.base(x)
+        for adapter, rows in self._pool.groups:
+            pair = adapter.weights.get(self.path)
+            if pair is None:
+                continue
+            a, b = pair
+            if rows is None:
+                out = out + F.linear(F.linear(x, a), b)
+            else:
+                out = out.index_add(0, rows, F.linear(F.linear(x.index_select(0, rows), a), b))
+        return out
+
+
+class AdapterPool:
+    """Named LoRA adapters, loaded on demand into an LRU of resident adapters."""
+
+    def __init__(self, adapters: Optional[Dict[str, str]] = None, max_loaded: int = 8,
+                 dtype: torch.dtype = torch.float32):
+        """
+        Args:
+            adapters: Adapter name -> directory to register up front.
+            max_loaded: Adapters kept resident; the least recently used beyond it is evicted.
+            dtype: Dtype of the adapter weights (the base model's activations).
+        """
+        if max_loaded < 1:
+            raise ValueError("max_loaded must be positive.")
+        self.max_loaded = max_loaded
+        self.dtype = dtype
+        self._paths: Dict[str, str] = {}
+        self._versions: Dict[str, int] = {}
+        self._loaded: "OrderedDict[str, LoRAAdapter]" = OrderedDict()
+        self._model: Optional[nn.Module] = None
+        #: ``(adapter, rows)`` of the forward pass in progress; rows None means every row
+        self.groups: List[Tuple[LoRAAdapter, Optional[torch.Tensor]]] = []
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+        for name, path in (adapters or {}).items():
+            self.register(name, path)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._paths
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._paths)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(adapter.nbytes for adapter in self._loaded.values())
+
+    def register(self, name: str, path: str) -> None:
+        """
+        Make an adapter directory available as ``name``, replacing an earlier one.
+
+        Raises:
+            ValueError: A model is attached and the adapter targets layers it
+                does not wrap yet; wrap them first with ``wrap`` in the model's thread.
+        """
+        if self._model is not None:
+            missing = self._unwrapped(path)
+            if missing:
+                raise ValueError(f"Adapter {name!r} targets unwrapped layers {missing[:3]}; wrap them in the "
+                                 f"model's thread first (ContinuousBatchingEngine.register_adapter).")
+        else:
+            _adapter_config(path)  # fail early on a wrong path
+        self._paths[name] = path
+        self._versions[name] = self._versions.get(name, -1) + 1
+        self._loaded.pop(name, None)
+
+    def key(self, name: str) -> str:
+        """The ``LoRAAdapter.key`` that ``name`` currently resolves to, without loading it."""
+        if name not in self._paths:
+            raise KeyError(f"Unknown adapter {name!r}.")
+        return f"{name}#{self._versions[name]}"
+
+    def get(self, name: str) -> LoRAAdapter:
+        """The resident adapter ``name``, loading it (and evicting the LRU one) if needed."""
+        adapter = self._loaded.get(name)
+        if adapter is not None:
+            self._loaded.move_to_end(name)
+            self.hits += 1
+            return adapter
+        if name not in self._paths:
+            raise KeyError(f"Unknown adapter {name!r}.")
+        adapter = load_lora_adapter(name, self._paths[name], self.dtype, self._versions[name])
+        self.loads += 1
+        self._loaded[name] = adapter
+        while len(self._loaded) > self.max_loaded:
+            evicted, _ = self._loaded.popitem(last=False)
+            self.evictions += 1
+            logger.info(f"AdapterPool evicted adapter {evicted!r}")
+        logger.info(f"AdapterPool loaded adapter {name!r} ({adapter.nbytes / 2**20:.1f} MiB)")
+        return adapter
+
+    def attach(self, model: nn.Module) -> None:
+        """Wrap the layers targeted by any registered adapter."""
+        self._model = model
+        for path in self._paths.values():
+            self.wrap(path)
+
+    def _unwrapped(self, path: str) -> List[str]:
+        """Module paths of linear layers the adapter at ``path`` targets that are not wrapped yet."""
+        targets = _adapter_config(path).get("target_modules") or []
+        found = []
+        for module_path, module in self._model.named_modules():
+            if not isinstance(module, _LINEAR_TYPES) or not _targeted(targets, module_path):
+                continue
+            parent_path = module_path.rpartition(".")[0]
+            if not isinstance(self._model.get_submodule(parent_path) if parent_path else self._model, LoRALinear):
+                found.append(module_path)
+        return found
+
+    def wrap(self, path: str) -> None:
+        """
+        Wrap the attached model's layers targeted by the adapter at ``path``.
+
+        Replaces modules in place, so it must not overlap a forward pass: call
+        it from the thread that runs the model.
+        """
+        missing = self._unwrapped(path)
+        for module_path in missing:
+            parent_path, _, child = module_path.rpartition(".")
+            parent = self._model.get_submodule(parent_path) if parent_path else self._model
+            setattr(parent, child, LoRALinear(getattr(parent, child), module_path, self))
+        if missing:
+            logger.info(f"AdapterPool wrapped {len(missing)} linear layers for LoRA")
+
+    @contextlib.contextmanager
+    def select(self, adapters: Sequence[Optional[LoRAAdapter]]) -> Iterator[None]:
+        """Apply ``adapters[i]`` to batch row ``i`` (None: base model) during the block."""
+        rows: Dict[int, List[int]] = {}
+        chosen: Dict[int, LoRAAdapter] = {}
+        for row, adapter in enumerate(adapters):
+            if adapter is not None:
+                rows.setdefault(id(adapter), []).append(row)
+                chosen[id(adapter)] = adapter
+        self.groups = [(chosen[key], None if len(members) == len(adapters) else torch.tensor(members))
+                       for key, members in rows.items()]
+        try:
+            yield
+        finally:
+            self.groups = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "registered": len(self._paths),
+            "loaded": len(self._loaded),
+            "bytes": self.nbytes,
+            "loads": self.loads,
+            "hits": self.hits,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,604 @@
+# File: src/deepthought/llm/engine.py
+"""
+CPU generation engine with continuous batching.
+
+``ContinuousBatchingEngine`` runs a Hugging Face causal LM for many
+concurrent requests. Instead of generating one request at a time, it keeps
+one running decode batch and, at every step:
+
+1. admits waiting requests into free batch slots: their prompts are
+   prefilled together (left-padded) and their key/value states are joined
+   to the running batch's cache;
+2. decodes one token for every running sequence in a single forward pass;
+3. retires sequences that produced EOS or hit their token limit, so their
+   slots are free for the next step.
+
+Every sequence in the batch is left-padded to the same cache length; the
+attention mask hides the padding and explicit position ids keep each
+sequence's positions independent of it. Model steps run in a dedicated
+executor thread; admission and result delivery happen on the event loop.
+
+With a ``PrefixCache``, admission looks up the cached key/value blocks of
+each prompt's leading tokens (the shared template preamble) and prefills
+only the remaining suffix on top of them; newly seen prompt blocks are
+stored after the prefill.
+
+Waiting requests are admitted by a ``RequestScheduler``: interactive before
+batch priority, earliest deadline first, with slots reserved for interactive
+traffic. Requests that cannot meet their deadline fail with
+``DeadlineExceeded`` instead of taking a slot, and running ones are stopped
+once their deadline passes.
+
+``from_pretrained`` memory-maps local safetensors checkpoints (see
+``loader``), and ``warm_up`` runs throwaway generations so a new worker
+pays its first-use costs before it takes traffic.
+
+With an ``AdapterPool``, each request may name a LoRA adapter; the batch
+mixes adapters freely and every forward pass applies each row's own
+adapter on top of the shared base weights (see ``adapters``).
+"""
+import asyncio
+import contextlib
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import torch
+import torch.nn.functional as F
+from transformers import DynamicCache
+
+from .adapters import AdapterPool, LoRAAdapter
+from .loader import load_cpu_model
+from .prefix_cache import PrefixCache
+from .prompt import build_prompt
+from .scheduler import BATCH, INTERACTIVE, DeadlineExceeded, RequestScheduler
+
+logger = logging.getLogger(__name__)
+
+#: Per-layer ``(keys, values)`` of shape ``(batch, heads, length, head_dim)``
+KVLayers = List[Tuple[torch.Tensor, torch.Tensor]]
+#: Receives each newly decoded piece of a sequence's text
+TextCallback = Callable[[str], None]
+
+
+@dataclass(frozen=True)
+class GenerationParams:
+    """Decoding settings of one request."""
+    max_new_tokens: int = 128
+    #: 0 selects greedy decoding
+    temperature: float = 0.0
+    top_k: int = 0
+    top_p: float = 1.0
+    seed: Optional[int] = None
+
+    @property
+    def greedy(self) -> bool:
+        return self.temperature <= 0.0
+
+
+@dataclass
+class GenerationResult:
+    text: str
+    token_ids: List[int]
+    prompt_tokens: int
+    #: ``"eos"``, ``"length"`` or ``"context"`` (model context window full)
+    finish_reason: str
+    #: Seconds from submission to the first generated token
+    ttft: float
+    latency: float
+    #: Geometric mean probability of the generated tokens
+    confidence: float
+
+
+@dataclass(eq=False)
+class _Sequence:
+    prompt_ids: List[int]
+    params: GenerationParams
+    future: asyncio.Future
+    submitted: float
+    generator: Optional[torch.Generator] = None
+    tokens: List[int] = field(default_factory=list)
+    logprob: float = 0.0
+    first_token: Optional[float] = None
+    finish_reason: Optional[str] = None
+    on_text: Optional[TextCallback] = None
+    #: Characters of the decoded text already passed to ``on_text``
+    streamed: int = 0
+    priority: str = INTERACTIVE
+    #: ``time.perf_counter()`` value after which the result is no longer wanted
+    deadline: Optional[float] = None
+    adapter: Optional[str] = None
+    #: The resident adapter, resolved at admission
+    lora: Optional[LoRAAdapter] = None
+
+
+def _namespace(seq: _Sequence) -> str:
+    """Prefix-cache namespace: key/values depend on the adapter that produced them."""
+    return seq.lora.key if seq.lora is not None else ""
+
+
+def _to_cache(layers: KVLayers) -> DynamicCache:
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(tuple(layers))
+    return DynamicCache(layers)
+
+
+def _from_cache(cache) -> KVLayers:
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    return list(zip(cache.key_cache, cache.value_cache))
+
+
+def _pad_left(tensor: torch.Tensor, length: int, dim: int) -> torch.Tensor:
+    missing = length - tensor.shape[dim]
+    if missing <= 0:
+        return tensor
+    pad = [0, 0] * (tensor.dim() - 1 - dim) + [missing, 0]
+    return F.pad(tensor, pad)
+
+
+class ContinuousBatchingEngine:
+    """Serves concurrent generation requests from one continuously refilled decode batch."""
+
+    def __init__(self, model, tokenizer, max_batch_size: int = 8, max_prefill_batch: Optional[int] = None,
+                 default_params: Optional[GenerationParams] = None, prefix_cache: Optional[PrefixCache] = None,
+                 reserved_slots: int = 0, adapters: Optional[AdapterPool] = None):
+        """
+        Args:
+            model: Hugging Face causal LM (kept in eval mode on the CPU).
+            tokenizer: Matching tokenizer; its EOS token ends a sequence.
+            max_batch_size: Sequences decoded together.
+            max_prefill_batch: Prompts prefilled in one step (default: all free slots).
+                Lower values bound the stall a large admission adds to running sequences.
+            default_params: Used for requests that pass no parameters.
+            prefix_cache: Reuses the key/values of shared prompt prefixes across requests.
+            reserved_slots: Batch rows that batch-priority requests may not take, so
+                interactive requests find a free slot even under a batch backlog.
+            adapters: LoRA adapters requests can select; attached to ``model``.
+        """
+        self.model = model.eval()
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.reserved_slots = reserved_slots
+        self.max_prefill_batch = max_prefill_batch or max_batch_size
+        self.default_params = default_params or GenerationParams()
+        self.prefix_cache = prefix_cache
+        self.adapters = adapters
+        if adapters is not None:
+            adapters.attach(self.model)
+        eos = getattr(tokenizer, "eos_token_id", None)
+        if eos is None:
+            eos = getattr(model.generation_config, "eos_token_id", None)
+        self._eos = set(eos if isinstance(eos, (list, tuple)) else [] if eos is None else [eos])
+        self._pad_id = getattr(tokenizer, "pad_token_id", None) or 0
+        self._max_positions = getattr(model.config, "max_position_embeddings", None) or 1 << 30
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-engine")
+        self._scheduler = RequestScheduler(max_batch_size, reserved_slots)
+        self._active: List[_Sequence] = []
+        self._kv: KVLayers = []
+        self._mask = torch.zeros((0, 0), dtype=torch.long)
+        self._positions = torch.zeros(0, dtype=torch.long)
+        self._last = torch.zeros(0, dtype=torch.long)
+        self._task: Optional[asyncio.Task] = None
+        self.requests = 0
+        self.completed = 0
+        self.steps = 0
+        self.tokens_generated = 0
+        self.prefill_tokens = 0
+        self.reused_tokens = 0
+        self.prefill_seconds = 0.0
+        self.decode_seconds = 0.0
+        self.expired = 0
+        self._batch_rows = 0
+        #: Moving averages that predict whether a request can meet its deadline
+        self._step_seconds = 0.0
+        self._mean_tokens: Optional[float] = None
+        #: ``perf_counter`` time model loading began (construction, for a model passed in)
+        self.load_started = time.perf_counter()
+        self.load_seconds = 0.0
+        self.warmup_seconds = 0.0
+
+    @classmethod
+    def from_pretrained(cls, path: Optional[str] = None, dtype: torch.dtype = torch.float32,
+                        adapter_path: Optional[str] = None, quantize: bool = False, memory_map: bool = True,
+                        **kwargs) -> "ContinuousBatchingEngine":
+        """
+        Load a model directory or hub id with its tokenizer.
+
+        A local safetensors checkpoint is memory-mapped unless ``memory_map`` is
+        False. With ``adapter_path`` the LoRA adapter is merged into the base
+        weights (``path`` defaults to the adapter's base model); ``quantize``
+        applies dynamic int8 quantization. See ``loader.load_cpu_model``.
+        """
+        start = time.perf_counter()
+        model, tokenizer = load_cpu_model(path, adapter_path, quantize=quantize, memory_map=memory_map, dtype=dtype)
+        engine = cls(model, tokenizer, **kwargs)
+        engine.load_started = start
+        engine.load_seconds = time.perf_counter() - start
+        logger.info(f"Engine loaded its model in {engine.load_seconds:.2f}s")
+        return engine
+
+    async def warm_up(self, prompt: Optional[str] = None, max_new_tokens: int = 8) -> float:
+        """
+        Run throwaway generations so real requests do not pay first-use costs.
+
+        The first forward passes of a new process fault the weight pages in, pick
+        kernels for each new shape and grow the allocator's pools. Warm-up
+        generates ``prompt`` alone and then as a full batch, covering single and
+        batched prefill and decode, and leaves the prompt template's blocks in
+        the prefix cache. Request counters are reset afterwards; the measured
+        step time is kept for deadline admission.
+
+        Returns:
+            Seconds the warm-up took.
+        """
+        start = time.perf_counter()
+        prompt = prompt or build_prompt("What can you tell me about this?", ["This is a warm-up request."])
+        params = GenerationParams(max_new_tokens=max_new_tokens)
+        await self.generate(prompt, params)
+        await asyncio.gather(*(self.generate(prompt, params) for _ in range(self.max_batch_size)))
+        self.requests = self.completed = self.steps = self.tokens_generated = self._batch_rows = 0
+        self.prefill_tokens = self.reused_tokens = 0
+        self.prefill_seconds = self.decode_seconds = 0.0
+        self._mean_tokens = None
+        self.warmup_seconds = time.perf_counter() - start
+        logger.info(f"Engine warmed up in {self.warmup_seconds:.2f}s")
+        return self.warmup_seconds
+
+    async def register_adapter(self, name: str, path: str) -> None:
+        """
+        Register a LoRA adapter while serving, replacing one of the same name.
+
+        Layers it targets that no adapter wrapped yet are wrapped in the engine
+        thread, between forward passes.
+        """
+        if self.adapters is None:
+            raise ValueError("Engine was created without an AdapterPool.")
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.adapters.wrap, path)
+        self.adapters.register(name, path)
+
+    @property
+    def running(self) -> int:
+        return len(self._active)
+
+    @property
+    def waiting(self) -> int:
+        return len(self._scheduler)
+
+    def encode(self, prompt: str) -> List[int]:
+        return list(self.tokenizer.encode(prompt))
+
+    async def generate(self, prompt: str, params: Optional[GenerationParams] = None,
+                       on_text: Optional[TextCallback] = None, priority: str = INTERACTIVE,
+                       deadline: Optional[float] = None, adapter: Optional[str] = None) -> GenerationResult:
+        """
+        Generate a completion of ``prompt``; resolves when the sequence is retired.
+
+        ``on_text`` is called on the event loop after every decode step with the
+        text added since its previous call, so the pieces concatenate to the
+        result's text. Bytes of an incomplete UTF-8 character are held back
+        until the character is complete.
+
+        Args:
+            priority: ``"interactive"`` or ``"batch"``.
+            deadline: Unix time after which the result is no longer wanted.
+            adapter: Registered LoRA adapter to generate with (default: the base model).
+
+        Raises:
+            DeadlineExceeded: The deadline passed or could not have been met.
+            ValueError: ``adapter`` is not registered.
+        """
+        return await self.generate_ids(self.encode(prompt), params, on_text, priority, deadline, adapter)
+
+    async def generate_ids(self, prompt_ids: Sequence[int], params: Optional[GenerationParams] = None,
+                           on_text: Optional[TextCallback] = None, priority: str = INTERACTIVE,
+                           deadline: Optional[float] = None, adapter: Optional[str] = None) -> GenerationResult:
+        params = params or self.default_params
+        if not prompt_ids:
+            raise ValueError("Prompt must contain at least one token.")
+        if adapter is not None and (self.adapters is None or adapter not in self.adapters):
+            raise ValueError(f"Unknown adapter {adapter!r}.")
+        loop = asyncio.get_running_loop()
+        now = time.perf_counter()
+        seq = _Sequence(list(prompt_ids), params, loop.create_future(), now, on_text=on_text, priority=priority,
+                        deadline=None if deadline is None else now + deadline - time.time(), adapter=adapter)
+        if not params.greedy and params.seed is not None:
+            seq.generator = torch.Generator().manual_seed(params.seed)
+        self._scheduler.push(seq)
+        self.requests += 1
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        return await seq.future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._scheduler or self._active:
+            now = time.perf_counter()
+            for seq in self._active:
+                if seq.deadline is not None and seq.deadline <= now:
+                    self._expire(seq, "while generating")
+            cancelled = [i for i, seq in enumerate(self._active) if seq.future.done()]
+            free = min(self.max_batch_size - len(self._active) + len(cancelled), self.max_prefill_batch)
+            running_batch = sum(1 for seq in self._active if seq.priority == BATCH and not seq.future.done())
+            admitted, dropped = self._scheduler.admit(free, running_batch, now, self._step_seconds,
+                                                      self._mean_tokens)
+            for seq in dropped:
+                self._expire(seq, "before admission")
+            if any(seq.adapter is not None for seq in admitted):
+                # Reading and scaling adapter weights blocks: keep it off the event loop
+                failures = await loop.run_in_executor(self._executor, self._load_adapters, admitted)
+                for seq, error in failures:
+                    seq.future.set_exception(error)
+                admitted = [seq for seq in admitted if not seq.future.done()]
+            try:
+                finished = await loop.run_in_executor(self._executor, self._step, admitted, cancelled)
+            except Exception as e:
+                logger.error(f"Generation step failed; failing {len(self._active) + len(admitted)} requests: {e}",
+                             exc_info=True)
+                for seq in self._active + admitted:
+                    if not seq.future.done():
+                        seq.future.set_exception(e)
+                self._reset()
+                continue
+            for seq in self._active:
+                if seq.on_text is not None:
+                    self._stream(seq, self._decode(seq))
+            for seq in finished:
+                self._resolve(seq)
+
+    def _load_adapters(self, seqs: List[_Sequence]) -> List[Tuple[_Sequence, Exception]]:
+        """Resolve each sequence's adapter (engine thread); returns the ones that failed to load."""
+        failures = []
+        for seq in seqs:
+            if seq.adapter is None:
+                continue
+            try:
+                seq.lora = self.adapters.get(seq.adapter)
+            except Exception as e:
+                logger.error(f"Failed to load adapter {seq.adapter!r}: {e}", exc_info=True)
+                failures.append((seq, e))
+        return failures
+
+    def _expire(self, seq: _Sequence, when: str) -> None:
+        if seq.future.done():
+            return
+        self.expired += 1
+        seq.future.set_exception(DeadlineExceeded(
+            f"Deadline passed {when} ({len(seq.tokens)} of {seq.params.max_new_tokens} tokens generated)"))
+
+    def _decode(self, seq: _Sequence) -> str:
+        return self.tokenizer.decode(seq.tokens, skip_special_tokens=True)
+
+    def _stream(self, seq: _Sequence, text: str, final: bool = False) -> None:
+        if seq.future.done():
+            return
+        end = len(text)
+        if not final:
+            while end > seq.streamed and text[end - 1] == "\ufffd":
+                end -= 1
+        if end <= seq.streamed:
+            return
+        piece, seq.streamed = text[seq.streamed:end], end
+        try:
+            seq.on_text(piece)
+        except Exception as e:
+            logger.warning(f"Text callback failed: {e}", exc_info=True)
+
+    def _resolve(self, seq: _Sequence) -> None:
+        self.completed += 1
+        if seq.future.done():
+            return
+        self._mean_tokens = (len(seq.tokens) if self._mean_tokens is None
+                             else 0.9 * self._mean_tokens + 0.1 * len(seq.tokens))
+        done = time.perf_counter()
+        text = self._decode(seq)
+        if seq.on_text is not None:
+            self._stream(seq, text, final=True)
+        count = max(len(seq.tokens), 1)
+        seq.future.set_result(GenerationResult(
+            text=text, token_ids=list(seq.tokens), prompt_tokens=len(seq.prompt_ids),
+            finish_reason=seq.finish_reason, ttft=(seq.first_token or done) - seq.submitted,
+            latency=done - seq.submitted, confidence=math.exp(seq.logprob / count)))
+
+    def _reset(self) -> None:
+        self._active, self._kv = [], []
+        self._mask = torch.zeros((0, 0), dtype=torch.long)
+        self._positions = torch.zeros(0, dtype=torch.long)
+        self._last = torch.zeros(0, dtype=torch.long)
+
+    # Everything below runs in the engine thread
+
+    def _forward(self, input_ids: torch.Tensor, mask: torch.Tensor, positions: torch.Tensor,
+                 kv: Optional[KVLayers], seqs: Sequence[_Sequence]) -> Tuple[torch.Tensor, KVLayers]:
+        cache = _to_cache(kv) if kv else DynamicCache()
+        selected = self.adapters.select([seq.lora for seq in seqs]) if self.adapters is not None else None
+        with selected or contextlib.nullcontext():
+            out = self.model(input_ids=input_ids, attention_mask=mask, position_ids=positions,
+                             past_key_values=cache, use_cache=True)
+        return out.logits[:, -1, :].float(), _from_cache(out.past_key_values)
+
+    def _sample(self, logits: torch.Tensor, seqs: Sequence[_Sequence]) -> List[int]:
+        logprobs = torch.log_softmax(logits, dim=-1)
+        chosen = logits.argmax(dim=-1).tolist()
+        for row, seq in enumerate(seqs):
+            params = seq.params
+            if params.greedy:
+                continue
+            scores = logits[row] / params.temperature
+            if params.top_k:
+                kth = torch.topk(scores, min(params.top_k, scores.numel())).values[-1]
+                scores = scores.masked_fill(scores < kth, -math.inf)
+            probs = torch.softmax(scores, dim=-1)
+            if params.top_p < 1.0:
+                ordered, order = torch.sort(probs, descending=True)
+                outside = torch.cumsum(ordered, dim=-1) - ordered > params.top_p
+                probs = probs.scatter(0, order, ordered.masked_fill(outside, 0.0))
+            chosen[row] = int(torch.multinomial(probs, 1, generator=seq.generator))
+        now = time.perf_counter()
+        self.tokens_generated += len(seqs)
+        for row, (seq, token) in enumerate(zip(seqs, chosen)):
+            seq.tokens.append(token)
+            seq.logprob += float(logprobs[row, token])
+            if seq.first_token is None:
+                seq.first_token = now
+        return chosen
+
+    def _retire(self, rows: List[int]) -> None:
+        if not rows:
+            return
+        gone = set(rows)
+        keep = [i for i in range(len(self._active)) if i not in gone]
+        index = torch.tensor(keep, dtype=torch.long)
+        self._active = [self._active[i] for i in keep]
+        self._mask = self._mask.index_select(0, index)
+        self._positions = self._positions.index_select(0, index)
+        self._last = self._last.index_select(0, index)
+        self._kv = [(k.index_select(0, index), v.index_select(0, index)) for k, v in self._kv]
+        if not keep:
+            self._reset()
+            return
+        # Drop cache columns that are padding for every remaining sequence
+        start = int(self._mask.any(dim=0).long().argmax())
+        if start:
+            self._mask = self._mask[:, start:]
+            self._kv = [(k[:, :, start:], v[:, :, start:]) for k, v in self._kv]
+
+    def _cached_prefixes(self, admitted: List[_Sequence]) -> Tuple[List[int], Optional[KVLayers]]:
+        """Look up each prompt's cached prefix and left-pad them into one past cache."""
+        if self.prefix_cache is None:
+            return [0] * len(admitted), None
+        found = [self.prefix_cache.lookup(seq.prompt_ids, _namespace(seq)) for seq in admitted]
+        lengths = [tokens for tokens, _ in found]
+        longest = max(lengths)
+        if not longest:
+            return lengths, None
+        template = next(layers for _, layers in found if layers is not None)
+        past = []
+        for layer, (k, v) in enumerate(template):
+            empty_k = k.new_zeros(k.shape[:2] + (0,) + k.shape[3:])
+            empty_v = v.new_zeros(v.shape[:2] + (0,) + v.shape[3:])
+            past.append((
+                torch.cat([_pad_left(layers[layer][0] if layers else empty_k, longest, 2) for _, layers in found]),
+                torch.cat([_pad_left(layers[layer][1] if layers else empty_v, longest, 2) for _, layers in found])))
+        return lengths, past
+
+    def _store_prefixes(self, admitted: List[_Sequence], kv: KVLayers, mask: torch.Tensor) -> None:
+        size = self.prefix_cache.block_size
+        for row, seq in enumerate(admitted):
+            columns = mask[row].nonzero().squeeze(1)
+
+            def block_kv(block: int, row: int = row, columns: torch.Tensor = columns):
+                index = columns[block * size:(block + 1) * size]
+                return [(k[row:row + 1].index_select(2, index), v[row:row + 1].index_select(2, index))
+                        for k, v in kv]
+            self.prefix_cache.store(seq.prompt_ids, block_kv, _namespace(seq))
+
+    def _prefill(self, admitted: List[_Sequence]) -> None:
+        started = time.perf_counter()
+        cached, past = self._cached_prefixes(admitted)
+        reused = max(cached)
+        suffixes = [seq.prompt_ids[tokens:] for seq, tokens in zip(admitted, cached)]
+        length = max(len(suffix) for suffix in suffixes)
+        ids = torch.full((len(admitted), length), self._pad_id, dtype=torch.long)
+        mask = torch.zeros((len(admitted), reused + length), dtype=torch.long)
+        for row, (suffix, tokens) in enumerate(zip(suffixes, cached)):
+            ids[row, length - len(suffix):] = torch.tensor(suffix)
+            mask[row, reused - tokens:reused] = 1
+            mask[row, reused + length - len(suffix):] = 1
+        positions = (torch.tensor(cached)[:, None] + mask[:, reused:].cumsum(-1) - 1).clamp(min=0)
+        logits, kv = self._forward(ids, mask, positions, past, admitted)
+        last = torch.tensor(self._sample(logits, admitted), dtype=torch.long)
+        if self.prefix_cache is not None:
+            self._store_prefixes(admitted, kv, mask)
+        length = mask.shape[1]
+        # Join the running batch at a common cache length
+        total = max(self._mask.shape[1], length)
+        if self._kv:
+            self._kv = [(torch.cat((_pad_left(k0, total, 2), _pad_left(k1, total, 2))),
+                         torch.cat((_pad_left(v0, total, 2), _pad_left(v1, total, 2))))
+                        for (k0, v0), (k1, v1) in zip(self._kv, kv)]
+        else:
+            self._kv = kv
+        self._mask = torch.cat((_pad_left(self._mask, total, 1), _pad_left(mask, total, 1)))
+        self._positions = torch.cat((self._positions, mask.sum(dim=1)))
+        self._last = torch.cat((self._last, last))
+        self._active.extend(admitted)
+        self.prefill_tokens += int(mask.sum()) - sum(cached)
+        self.reused_tokens += sum(cached)
+        self.prefill_seconds += time.perf_counter() - started
+
+    def _finished(self) -> List[int]:
+        rows = []
+        for row, seq in enumerate(self._active):
+            if seq.tokens and seq.tokens[-1] in self._eos:
+                seq.finish_reason = "eos"
+            elif len(seq.tokens) >= seq.params.max_new_tokens:
+                seq.finish_reason = "length"
+            elif int(self._positions[row]) + 1 >= self._max_positions:
+                seq.finish_reason = "context"
+            else:
+                continue
+            rows.append(row)
+        return rows
+
+    def _step(self, admitted: List[_Sequence], cancelled: List[int]) -> List[_Sequence]:
+        """Admit, decode one token for every running sequence, and return the retired ones."""
+        with torch.inference_mode():
+            for row in cancelled:
+                self._active[row].finish_reason = "cancelled"
+            self._retire(cancelled)
+            finished: List[_Sequence] = []
+            if admitted:
+                self._prefill(admitted)
+                rows = self._finished()
+                finished.extend(self._active[row] for row in rows)
+                self._retire(rows)
+            if not self._active:
+                return finished
+            started = time.perf_counter()
+            self._mask = torch.cat((self._mask, torch.ones((len(self._active), 1), dtype=torch.long)), dim=1)
+            logits, self._kv = self._forward(self._last[:, None], self._mask, self._positions[:, None], self._kv,
+                                             self._active)
+            self._positions = self._positions + 1
+            self._last = torch.tensor(self._sample(logits, self._active), dtype=torch.long)
+            self.steps += 1
+            self._batch_rows += len(self._active)
+            elapsed = time.perf_counter() - started
+            self.decode_seconds += elapsed
+            self._step_seconds = elapsed if not self._step_seconds else 0.9 * self._step_seconds + 0.1 * elapsed
+            rows = self._finished()
+            finished.extend(self._active[row] for row in rows)
+            self._retire(rows)
+        return finished
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "completed": self.completed,
+            "running": len(self._active),
+            "waiting": len(self._scheduler),
+            "expired": self.expired,
+            "steps": self.steps,
+            "mean_batch_size": self._batch_rows / self.steps if self.steps else 0.0,
+            "tokens_generated": self.tokens_generated,
+            "decode_tokens_per_s": self._batch_rows / self.decode_seconds if self.decode_seconds else 0.0,
+            "prefill_tokens_per_s": self.prefill_tokens / self.prefill_seconds if self.prefill_seconds else 0.0,
+            "prefill_tokens": self.prefill_tokens,
+            "reused_prefix_tokens": self.reused_tokens,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "adapters": self.adapters.stats() if self.adapters is not None else None,
+        }
+
+    async def close(self) -> None:
+        """Fail waiting requests, let running ones finish, and stop the engine thread."""
+        for seq in self._scheduler.pop_all():
+            if not seq.future.done():
+                seq.future.set_exception(RuntimeError("Engine closed."))
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._executor.shutdown(wait=True)
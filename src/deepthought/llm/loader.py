@@ -0,0 +1,267 @@
+# File: src/deepthought/llm/loader.py
+"""
+Load the fine-tuned model for CPU serving.
+
+``train_script.py`` saves a LoRA adapter (``./results/lora-adapter``) on
+top of a base model. Serving it unmerged would cost an extra pair of small
+matmuls per adapted projection on every token, so ``load_cpu_model`` merges
+the adapter into the base weights once at load time (``W + scale * B @ A``)
+and then, optionally, applies dynamic int8 quantization:
+
+* every ``nn.Linear`` weight is stored as int8 with one scale per output
+  channel, a quarter of its fp32 size;
+* activations are quantized on the fly per batch, so no calibration data
+  is needed, and the int8 GEMM kernels (fbgemm/onednn on x86, qnnpack on
+  ARM) replace the fp32 ones.
+
+The embedding stays in fp32, and so does ``lm_head`` by default: its
+logits pick every token, so keeping it exact keeps greedy output closest to
+the fp32 model for a small share of the memory.
+
+Weights are memory-mapped rather than read (``load_mapped_model``): a
+safetensors file is a JSON header followed by raw little-endian arrays, so
+every tensor is wrapped in place with ``torch.frombuffer`` over a private
+file mapping. Loading does no reads and no copies, pages are faulted in on
+first use, and the clean pages are the host's page cache, shared by every
+worker process that maps the same file. Writes (e.g. merging an adapter)
+copy only the touched pages into the writing process. Quantized weights
+are new tensors, so an int8 model keeps only its fp32 leftovers (embedding,
+``lm_head``, norms) shared.
+
+The merge needs ``peft`` (already required for training). Quantization
+goes through torchao's ``quantize_`` with int8 dynamic activations and int8
+weights when torchao is installed, and otherwise falls back to
+``torch.ao.quantization.quantize_dynamic``, which recent torch releases
+deprecate.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import torch
+from torch import nn
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer
+
+logger = logging.getLogger(__name__)
+
+#: Linear layers left in fp32 by ``quantize_int8`` unless told otherwise
+DEFAULT_SKIP = ("lm_head",)
+
+_SAFETENSORS_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8, "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+_HEADER = struct.Struct("<Q")
+
+
+def _safetensors_files(path: str) -> List[str]:
+    """The weight files of a model directory, single-file or sharded."""
+    index = os.path.join(path, "model.safetensors.index.json")
+    if os.path.exists(index):
+        with open(index, encoding="utf-8") as f:
+            shards = sorted(set(json.load(f)["weight_map"].values()))
+        return [os.path.join(path, shard) for shard in shards]
+    single = os.path.join(path, "model.safetensors")
+    return [single] if os.path.exists(single) else []
+
+
+def map_safetensors(filename: str) -> Dict[str, torch.Tensor]:
+    """
+    Wrap every tensor of a safetensors file in place over a private file mapping.
+
+    The tensors keep the mapping alive. Writing to one copies the touched pages
+    into this process; the file is never modified.
+    """
+    with open(filename, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    (header_len,) = _HEADER.unpack_from(mapped, 0)
+    header = json.loads(mapped[_HEADER.size:_HEADER.size + header_len])
+    start = _HEADER.size + header_len
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = _SAFETENSORS_DTYPES[info["dtype"]]
+        begin, end = info["data_offsets"]
+        itemsize = dtype.itemsize
+        if end == begin:
+            tensor = torch.empty(info["shape"], dtype=dtype)
+        elif (start + begin) % itemsize:
+            # Misaligned data cannot be viewed in place; fall back to a copy
+            tensor = torch.frombuffer(bytearray(mapped[start + begin:start + end]), dtype=dtype)
+        else:
+            tensor = torch.frombuffer(mapped, dtype=dtype, count=(end - begin) // itemsize, offset=start + begin)
+        tensors[name] = tensor.view(info["shape"])
+    return tensors
+
+
+def load_mapped_model(path: str, dtype: torch.dtype = torch.float32) -> nn.Module:
+    """
+    Build a causal LM from a local safetensors checkpoint without reading its weights.
+
+    The module tree is created with parameters on the meta device (buffers such
+    as rotary tables are still computed), then the mapped tensors are assigned
+    as its parameters. Tensors stored in another dtype are converted, which
+    copies them.
+
+    Raises:
+        FileNotFoundError: ``path`` has no safetensors weights.
+        ValueError: The checkpoint lacks some of the model's parameters.
+    """
+    try:
+        from accelerate import init_empty_weights
+    except ImportError as e:
+        raise ImportError("Memory-mapped loading requires accelerate (pip install accelerate).") from e
+    files = _safetensors_files(path)
+    if not files:
+        raise FileNotFoundError(f"No safetensors weights in {path}.")
+    state: Dict[str, torch.Tensor] = {}
+    for filename in files:
+        state.update(map_safetensors(filename))
+    converted = 0
+    for name, tensor in state.items():
+        if tensor.is_floating_point() and tensor.dtype != dtype:
+            state[name] = tensor.to(dtype)
+            converted += 1
+    config = AutoConfig.from_pretrained(path)
+    with init_empty_weights(include_buffers=False):
+        model = AutoModelForCausalLM.from_config(config, dtype=dtype)
+    model.load_state_dict(state, strict=False, assign=True)
+    model.tie_weights()
+    missing = [name for name, param in model.named_parameters() if param.is_meta]
+    if missing:
+        raise ValueError(f"{path} is missing {len(missing)} parameters, e.g. {missing[:3]}.")
+    if converted:
+        logger.info(f"Converted {converted} tensors of {path} to {dtype}; those are copies, not mapped")
+    return model.eval()
+
+
+def adapter_base_model(adapter_path: str) -> str:
+    """The base model an adapter was trained on, from its ``adapter_config.json``."""
+    with open(os.path.join(adapter_path, "adapter_config.json"), encoding="utf-8") as f:
+        base = json.load(f).get("base_model_name_or_path")
+    if not base:
+        raise ValueError(f"{adapter_path} does not name its base model; pass it explicitly.")
+    return base
+
+
+def merge_lora(model: nn.Module, adapter_path: str) -> nn.Module:
+    """Fold a saved LoRA adapter into ``model``'s weights and return the plain model."""
+    try:
+        from peft import PeftModel
+    except ImportError as e:
+        raise ImportError("Merging a LoRA adapter requires peft (pip install peft).") from e
+    merged = PeftModel.from_pretrained(model, adapter_path).merge_and_unload()
+    logger.info(f"Merged LoRA adapter {adapter_path} into the base weights")
+    return merged
+
+
+def _torchao_int8_config():
+    """torchao's int8 dynamic-activation, int8-weight config, or None without torchao."""
+    try:
+        from torchao import quantization
+    except ImportError:
+        return None
+    config = getattr(quantization, "Int8DynamicActivationInt8WeightConfig", None)
+    if config is not None:
+        return config()
+    # Releases before the config classes expose a factory function
+    return quantization.int8_dynamic_activation_int8_weight()
+
+
+def quantize_int8(model: nn.Module, skip: Iterable[str] = DEFAULT_SKIP) -> nn.Module:
+    """
+    Replace ``model``'s linear layers with dynamically quantized int8 ones, in place.
+
+    Uses torchao when it is installed and ``torch.ao.quantization`` otherwise.
+
+    Args:
+        skip: Names (last path component) of linear layers to keep in fp32.
+    """
+    skip = set(skip)
+    targets = [name for name, module in model.named_modules()
+               if isinstance(module, nn.Linear) and name.rsplit(".", 1)[-1] not in skip]
+    config = _torchao_int8_config()
+    if config is not None:
+        from torchao.quantization import quantize_
+        wanted = set(targets)
+        quantize_(model, config, filter_fn=lambda module, name: isinstance(module, nn.Linear) and name in wanted)
+        backend = "torchao"
+    else:
+        if torch.backends.quantized.engine == "none":
+            raise RuntimeError("This torch build has no quantized CPU engine.")
+        qconfig = torch.ao.quantization.per_channel_dynamic_qconfig
+        model = torch.ao.quantization.quantize_dynamic(model, {name: qconfig for name in targets},
+                                                       dtype=torch.qint8, inplace=True)
+        backend = f"torch.ao, engine {torch.backends.quantized.engine}"
+    logger.info(f"Quantized {len(targets)} linear layers to int8 ({backend}); kept {sorted(skip)} in fp32")
+    return model
+
+
+def _tensor_bytes(value: Any) -> int:
+    if isinstance(value, torch.Tensor) and hasattr(value, "__tensor_flatten__"):
+        # Tensor subclasses (torchao's quantized weights) report their logical dtype
+        names, _ = value.__tensor_flatten__()
+        return sum(_tensor_bytes(getattr(value, name)) for name in names)
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, (tuple, list)):
+        return sum(_tensor_bytes(v) for v in value)
+    return 0
+
+
+def model_nbytes(model: nn.Module) -> int:
+    """Bytes held by the model's weights, counting int8 packed weights at their stored size."""
+    seen = set()
+    total = 0
+    for value in model.state_dict(keep_vars=True).values():
+        tensors = value if isinstance(value, (tuple, list)) else (value,)
+        for tensor in tensors:
+            if isinstance(tensor, torch.Tensor) and id(tensor) not in seen:
+                seen.add(id(tensor))
+                total += _tensor_bytes(tensor)
+    return total
+
+
+def load_cpu_model(path: Optional[str] = None, adapter_path: Optional[str] = None, quantize: bool = True,
+                   skip: Iterable[str] = DEFAULT_SKIP, memory_map: bool = True,
+                   dtype: torch.dtype = torch.float32) -> Tuple[nn.Module, Any]:
+    """
+    Load a model and tokenizer for CPU inference.
+
+    Args:
+        path: Base model directory or hub id; read from the adapter's config if omitted.
+        adapter_path: LoRA adapter directory to merge into the base weights.
+        quantize: Apply dynamic int8 quantization after merging.
+        skip: Linear layers to keep in fp32 when quantizing.
+        memory_map: Map a local safetensors checkpoint instead of reading it
+            (hub ids and other formats always go through ``from_pretrained``).
+        dtype: Weight dtype; merging and int8 quantization expect float32.
+
+    Returns:
+        The model in eval mode and its tokenizer. The tokenizer is read from the
+        adapter directory when it has one (training saves it there), else from ``path``.
+    """
+    if path is None:
+        if adapter_path is None:
+            raise ValueError("Pass a base model path, an adapter path, or both.")
+        path = adapter_base_model(adapter_path)
+    tokenizer_path = path
+    if adapter_path and os.path.exists(os.path.join(adapter_path, "tokenizer_config.json")):
+        tokenizer_path = adapter_path
+    tokenizer = AutoTokenizer.from_pretrained(tokenizer_path)
+    if memory_map and _safetensors_files(path):
+        model = load_mapped_model(path, dtype)
+    else:
+        model = AutoModelForCausalLM.from_pretrained(path, dtype=dtype)
+    if adapter_path:
+        model = merge_lora(model, adapter_path)
+    model.eval()
+    if quantize:
+        model = quantize_int8(model, skip)
+    logger.info(f"Loaded {path} for CPU serving: {model_nbytes(model) / 2**20:.1f} MiB of weights")
+    return model, tokenizer
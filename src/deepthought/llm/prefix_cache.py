@@ -0,0 +1,136 @@
+# File: src/deepthought/llm/prefix_cache.py
+"""
+Key/value cache of shared prompt prefixes.
+
+Every prompt the LLM stage renders starts with the same template preamble,
+so the attention keys and values of those tokens are identical from request
+to request. ``PrefixCache`` stores them in fixed-size token blocks. A block
+is addressed by a hash chained over all tokens up to its end, so a block
+only matches when the entire prefix before it matches too, exactly like
+the model's causal attention sees it.
+
+Blocks live in an LRU bounded by ``max_bytes``. A lookup refreshes the
+blocks of a hit from the last to the first, so the earliest blocks of a
+chain are always the most recently used and eviction removes chains from
+their tail instead of orphaning them.
+
+Key/values also depend on the weights that produced them, so lookups and
+stores take a ``namespace`` (the LoRA adapter in use) that seeds the chain.
+
+The cache is used from the engine thread only and is not thread-safe.
+"""
+import hashlib
+import logging
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+#: Per-layer ``(keys, values)`` of shape ``(1, heads, tokens, head_dim)``
+BlockKV = List[Tuple[torch.Tensor, torch.Tensor]]
+
+
+class PrefixCache:
+    """LRU of attention key/value blocks addressed by chained token-block hashes."""
+
+    def __init__(self, block_size: int = 16, max_bytes: int = 256 << 20):
+        """
+        Args:
+            block_size: Tokens per block; only whole blocks are cached and reused.
+            max_bytes: Memory bound for the stored key/value tensors.
+        """
+        if block_size < 1:
+            raise ValueError("block_size must be positive.")
+        self.block_size = block_size
+        self.max_bytes = max_bytes
+        self._blocks: "OrderedDict[bytes, BlockKV]" = OrderedDict()
+        self._bytes = 0
+        self.lookups = 0
+        self.hit_tokens = 0
+        self.lookup_tokens = 0
+        self.stored_blocks = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def _hashes(self, ids: Sequence[int], blocks: int, namespace: str = "") -> List[bytes]:
+        out, digest = [], namespace.encode()
+        for block in range(blocks):
+            tokens = array("q", ids[block * self.block_size:(block + 1) * self.block_size])
+            digest = hashlib.blake2b(digest + tokens.tobytes(), digest_size=16).digest()
+            out.append(digest)
+        return out
+
+    def lookup(self, ids: Sequence[int], namespace: str = "") -> Tuple[int, Optional[BlockKV]]:
+        """
+        Longest cached prefix of ``ids`` that leaves at least one token to prefill.
+
+        Returns:
+            The prefix length in tokens and its per-layer keys and values
+            (None when nothing is cached).
+        """
+        self.lookups += 1
+        self.lookup_tokens += len(ids)
+        hits: List[bytes] = []
+        for digest in self._hashes(ids, (len(ids) - 1) // self.block_size, namespace):
+            if digest not in self._blocks:
+                break
+            hits.append(digest)
+        if not hits:
+            return 0, None
+        for digest in reversed(hits):
+            self._blocks.move_to_end(digest)
+        blocks = [self._blocks[digest] for digest in hits]
+        layers = [(torch.cat([block[layer][0] for block in blocks], dim=2),
+                   torch.cat([block[layer][1] for block in blocks], dim=2))
+                  for layer in range(len(blocks[0]))]
+        tokens = len(hits) * self.block_size
+        self.hit_tokens += tokens
+        return tokens, layers
+
+    def store(self, ids: Sequence[int], block_kv: Callable[[int], BlockKV], namespace: str = "") -> int:
+        """
+        Cache the whole blocks of ``ids`` that are not cached yet.
+
+        ``block_kv(i)`` returns the keys and values of block ``i``; it is only
+        called for missing blocks. Returns the number of blocks stored.
+        """
+        stored = 0
+        for block, digest in enumerate(self._hashes(ids, len(ids) // self.block_size, namespace)):
+            if digest in self._blocks:
+                self._blocks.move_to_end(digest)
+                continue
+            layers = [(k.contiguous(), v.contiguous()) for k, v in block_kv(block)]
+            self._blocks[digest] = layers
+            self._bytes += sum(k.nbytes + v.nbytes for k, v in layers)
+            stored += 1
+        self.stored_blocks += stored
+        while self._bytes > self.max_bytes and self._blocks:
+            _, layers = self._blocks.popitem(last=False)
+            self._bytes -= sum(k.nbytes + v.nbytes for k, v in layers)
+            self.evictions += 1
+        return stored
+
+    def clear(self) -> None:
+        """Drop every block, e.g. after the model weights changed."""
+        self._blocks.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "blocks": len(self._blocks),
+            "bytes": self._bytes,
+            "lookups": self.lookups,
+            "hit_tokens": self.hit_tokens,
+            "hit_rate": self.hit_tokens / self.lookup_tokens if self.lookup_tokens else 0.0,
+            "stored_blocks": self.stored_blocks,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,28 @@
+# File: src/deepthought/llm/prompt.py
+"""
+Prompt rendering for the LLM stage.
+
+Uses the Alpaca-style template the adapters are fine-tuned on (see
+``format_prompt`` in ``train_script.py``), stopping right after the
+``### Response:`` header so the model writes the answer. Retrieved facts go
+into the ``### Input:`` section.
+"""
+from typing import Sequence
+
+PREAMBLE = ("Below is an instruction that describes a task. "
+            "Write a response that appropriately completes the request.")
+PREAMBLE_WITH_INPUT = ("Below is an instruction that describes a task, paired with an input that provides "
+                       "further context. Write a response that appropriately completes the request.")
+
+
+def format_prompt(instruction: str, context: str = "") -> str:
+    """Render the training template without a response."""
+    if context and context.strip():
+        return f"{PREAMBLE_WITH_INPUT}\n\n### Instruction:\n{instruction}\n\n### Input:\n{context}\n\n### Response:\n"
+    return f"{PREAMBLE}\n\n### Instruction:\n{instruction}\n\n### Response:\n"
+
+
+def build_prompt(user_input: str, facts: Sequence[str] = ()) -> str:
+    """Prompt for a user input with the facts retrieved for it as context."""
+    context = "\n".join(f"- {fact}" for fact in facts)
+    return format_prompt(user_input, context)
@@ -0,0 +1,257 @@
+# File: src/deepthought/llm/response_cache.py
+"""
+Response cache for the LLM stage.
+
+Responses are keyed by a stable hash of the fully rendered prompt (which
+already contains the retrieved facts), the generation parameters and a
+model namespace, so a different fact set, decoding setting or model never
+shares an entry.
+
+Two policies apply:
+
+* Deterministic requests (greedy decoding, or sampling with a fixed seed)
+  produce the same text every time, so one stored response answers every
+  repeat until it expires (``ttl``).
+* Unseeded sampling is asked for variety. Such requests are only cached
+  when ``sample_pool`` is set: the first ``sample_pool`` generations for a
+  key are stored as variants, and once the pool is full a random variant is
+  served. Their entries expire after ``sampled_ttl``.
+
+The in-memory tier is an LRU bounded by ``max_bytes``. An optional SQLite
+file adds a larger on-disk tier that survives restarts and can be shared by
+workers on one host: entries are written through to it and promoted back
+into memory on a memory miss. Single-row SQLite reads and writes take tens
+of microseconds, so they run inline on the event loop.
+"""
+import dataclasses
+import hashlib
+import json
+import logging
+import random
+import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+#: Approximate per-entry bookkeeping cost added to the text size
+_ENTRY_OVERHEAD = 200
+
+
+@dataclass
+class CachedResponse:
+    text: str
+    confidence: Optional[float] = None
+    tokens: int = 0
+    #: Seconds the generation took, credited to ``saved_seconds`` on hits
+    cost: float = 0.0
+
+
+@dataclass
+class _Entry:
+    variants: List[CachedResponse]
+    #: Variants stored before the entry is served
+    capacity: int
+    expires: float
+    size: int
+
+
+def _param_fields(params: Any) -> Dict[str, Any]:
+    if params is None:
+        return {}
+    if dataclasses.is_dataclass(params):
+        return dataclasses.asdict(params)
+    return dict(params)
+
+
+def response_key(prompt: str, params: Any = None, namespace: str = "", adapter: Optional[str] = None) -> str:
+    """
+    Stable fingerprint of a generation request: model namespace, LoRA adapter, rendered prompt and parameters.
+
+    ``adapter`` should identify the adapter's weights, e.g. ``LoRAAdapter.key``
+    (name and version), so an adapter registered again gets fresh entries.
+    """
+    if adapter is not None:
+        namespace = f"{namespace}#{adapter}"
+    blob = json.dumps([namespace, prompt, _param_fields(params)], sort_keys=True)
+    return hashlib.blake2b(blob.encode(), digest_size=20).hexdigest()
+
+
+def _is_deterministic(fields: Dict[str, Any]) -> bool:
+    return (fields.get("temperature") or 0.0) <= 0.0 or fields.get("seed") is not None
+
+
+class ResponseCache:
+    """Size-bounded LRU of generated responses with an optional SQLite tier."""
+
+    def __init__(self, max_bytes: int = 32 << 20, ttl: float = 3600.0, sampled_ttl: float = 300.0,
+                 sample_pool: int = 0, disk_path: Optional[str] = None, max_disk_entries: int = 100_000,
+                 namespace: str = "", clock: Callable[[], float] = time.time,
+                 rng: Optional[random.Random] = None):
+        """
+        Args:
+            max_bytes: Approximate memory bound for the in-memory tier.
+            ttl: Seconds a deterministic response stays valid; 0 disables expiry.
+            sampled_ttl: Seconds the variants of an unseeded sampled request stay valid.
+            sample_pool: Variants kept per unseeded sampled request; 0 never caches them.
+            disk_path: SQLite file for the on-disk tier (default: memory only).
+            max_disk_entries: Rows kept in the on-disk tier before the least recently used go.
+            namespace: Identifies the model and adapter; part of every key.
+            clock: Wall clock, since on-disk expiry times outlive the process.
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sampled_ttl = sampled_ttl
+        self.sample_pool = sample_pool
+        self.max_disk_entries = max_disk_entries
+        self.namespace = namespace
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._disk_writes = 0
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses ("
+                             "key TEXT PRIMARY KEY, capacity INTEGER, expires REAL, accessed REAL, value TEXT)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.saved_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, prompt: str, params: Any = None, adapter: Optional[str] = None) -> str:
+        return response_key(prompt, params, self.namespace, adapter)
+
+    def _capacity(self, fields: Dict[str, Any]) -> int:
+        return 1 if _is_deterministic(fields) else self.sample_pool
+
+    def get(self, prompt: str, params: Any = None, adapter: Optional[str] = None) -> Optional[CachedResponse]:
+        """Return a cached response for this prompt, parameters and LoRA adapter, or None."""
+        fields = _param_fields(params)
+        if not self._capacity(fields):
+            self.bypassed += 1
+            return None
+        key = self.key(prompt, params, adapter)
+        entry = self._entries.get(key)
+        now = self._clock()
+        if entry is not None and entry.expires and entry.expires <= now:
+            self._remove(key)
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            entry = self._load(key, now)
+        if entry is None or len(entry.variants) < entry.capacity:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        response = entry.variants[0] if entry.capacity == 1 else self._rng.choice(entry.variants)
+        self.saved_seconds += response.cost
+        return response
+
+    def put(self, prompt: str, params: Any, response: CachedResponse, adapter: Optional[str] = None) -> bool:
+        """Store a generated response. Returns False if the policy does not cache it."""
+        fields = _param_fields(params)
+        capacity = self._capacity(fields)
+        if not capacity:
+            return False
+        key = self.key(prompt, params, adapter)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._remove(key)
+            if len(entry.variants) >= capacity:
+                entry = None
+        ttl = self.ttl if capacity == 1 else self.sampled_ttl
+        if entry is None:
+            entry = _Entry([], capacity, self._clock() + ttl if ttl else 0.0, 0)
+        entry.variants.append(response)
+        entry.size = sum(len(v.text.encode()) + _ENTRY_OVERHEAD for v in entry.variants)
+        self._insert(key, entry)
+        self._store(key, entry)
+        return True
+
+    def _insert(self, key: str, entry: _Entry) -> None:
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        self._bytes -= self._entries.pop(key).size
+
+    def _load(self, key: str, now: float) -> Optional[_Entry]:
+        if self._db is None:
+            return None
+        row = self._db.execute("SELECT capacity, expires, value FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        capacity, expires, value = row
+        if expires and expires <= now:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.expirations += 1
+            return None
+        variants = [CachedResponse(**v) for v in json.loads(value)]
+        entry = _Entry(variants, capacity, expires, sum(len(v.text.encode()) + _ENTRY_OVERHEAD for v in variants))
+        if len(variants) >= capacity:
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.disk_hits += 1
+        self._insert(key, entry)
+        return entry
+
+    def _store(self, key: str, entry: _Entry) -> None:
+        if self._db is None:
+            return
+        value = json.dumps([dataclasses.asdict(v) for v in entry.variants])
+        try:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                             (key, entry.capacity, entry.expires, self._clock(), value))
+            self._disk_writes += 1
+            if self._disk_writes % 256 == 0:
+                self._prune_disk()
+        except sqlite3.Error as e:
+            logger.warning(f"ResponseCache failed to write the disk tier: {e}")
+
+    def _prune_disk(self) -> None:
+        self._db.execute("DELETE FROM responses WHERE expires > 0 AND expires <= ?", (self._clock(),))
+        self._db.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                         "ORDER BY accessed DESC LIMIT -1 OFFSET ?)", (self.max_disk_entries,))
+
+    def clear(self) -> None:
+        """Drop every entry, e.g. after the model or adapter changed."""
+        self._entries.clear()
+        self._bytes = 0
+        if self._db is not None:
+            self._db.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._prune_disk()
+            self._db.close()
+            self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "saved_seconds": self.saved_seconds,
+        }
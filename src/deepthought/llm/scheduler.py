@@ -0,0 +1,106 @@
+# File: src/deepthought/llm/scheduler.py
+"""
+Admission order for the generation engine.
+
+Waiting requests are grouped by priority class; ``interactive`` work is
+always admitted before ``batch`` work, and within a class the request with
+the earliest deadline goes first (requests without a deadline go last, in
+arrival order).
+
+Two rules keep generation capacity for requests that can still use it:
+
+* Requests whose deadline has passed, or that cannot finish before it at
+  the engine's measured decode speed, are dropped instead of admitted.
+* ``reserved_slots`` batch slots are kept free for interactive traffic:
+  batch requests only fill up to ``max_batch_size - reserved_slots`` rows.
+"""
+import heapq
+import itertools
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+#: Priority classes in admission order
+PRIORITIES = (INTERACTIVE, BATCH)
+
+
+class DeadlineExceeded(Exception):
+    """A request's deadline passed, or it could not have finished before it."""
+
+
+class RequestScheduler:
+    """Priority classes with earliest-deadline-first order inside each class."""
+
+    def __init__(self, max_batch_size: int, reserved_slots: int = 0):
+        """
+        Args:
+            max_batch_size: Rows of the engine's decode batch.
+            reserved_slots: Rows batch-priority requests may never take.
+        """
+        if not 0 <= reserved_slots < max_batch_size:
+            raise ValueError("reserved_slots must leave at least one slot for batch requests.")
+        self.max_batch_size = max_batch_size
+        self.reserved_slots = reserved_slots
+        self._queues: Dict[str, List[Tuple[float, int, Any]]] = {name: [] for name in PRIORITIES}
+        self._order = itertools.count()
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def __bool__(self) -> bool:
+        return any(self._queues.values())
+
+    def push(self, seq: Any) -> None:
+        """Queue a sequence; it needs ``priority``, ``deadline``, ``future`` and ``params`` attributes."""
+        if seq.priority not in self._queues:
+            raise ValueError(f"Unknown priority {seq.priority!r}; expected one of {PRIORITIES}.")
+        deadline = seq.deadline if seq.deadline is not None else math.inf
+        heapq.heappush(self._queues[seq.priority], (deadline, next(self._order), seq))
+
+    def pop_all(self) -> List[Any]:
+        seqs = [seq for queue in self._queues.values() for _, _, seq in queue]
+        for queue in self._queues.values():
+            queue.clear()
+        return seqs
+
+    def admit(self, free: int, running_batch: int, now: float, seconds_per_token: float = 0.0,
+              mean_tokens: Optional[float] = None) -> Tuple[List[Any], List[Any]]:
+        """
+        Pick up to ``free`` sequences to admit.
+
+        Args:
+            running_batch: Batch-priority sequences already decoding.
+            seconds_per_token: Measured seconds per decode step (0 until known).
+            mean_tokens: Typical tokens generated per request, used with
+                ``seconds_per_token`` to predict when a request would finish.
+
+        Returns:
+            The sequences to admit and the ones dropped because they cannot meet
+            their deadline. Sequences whose future is already done are discarded.
+        """
+        dropped: List[Any] = []
+        for queue in self._queues.values():
+            late = [item for item in queue if item[0] <= now]
+            if late:
+                dropped.extend(seq for _, _, seq in late if not seq.future.done())
+                queue[:] = [item for item in queue if item[0] > now]
+                heapq.heapify(queue)
+        admitted: List[Any] = []
+        batch_room = self.max_batch_size - self.reserved_slots - running_batch
+        for name in PRIORITIES:
+            queue = self._queues[name]
+            while queue and len(admitted) < free:
+                if name == BATCH and batch_room <= 0:
+                    break
+                deadline, _, seq = heapq.heappop(queue)
+                if seq.future.done():
+                    continue
+                expected = min(seq.params.max_new_tokens, mean_tokens or 0.0) * seconds_per_token
+                if now + expected > deadline:
+                    dropped.append(seq)
+                    continue
+                admitted.append(seq)
+                if name == BATCH:
+                    batch_room -= 1
+        return admitted, dropped
@@ -0,0 +1,54 @@
+"""
+Memory backends for DeepThought reThought.
+
+This package contains the knowledge stores and retrievers that the memory
+stage (``MemoryStub``) queries to build ``retrieved_knowledge``.
+
+Public names are imported lazily on first access so that importing the
+package does not pull in NumPy.
+"""
+
+from typing import TYPE_CHECKING
+
+from .._lazy import lazy_exports
+
+if TYPE_CHECKING:
+    from .retriever import Retriever
+    from .bm25 import BM25Index
+    from .cache import RetrievalCache
+    from .compaction import MemoryCompactor
+    from .ingest import MemoryIngestor
+    from .shared_cache import LocalKeyValue, SharedRetrievalCache, open_cache_bucket
+    from .embedding import BatchedVectorRetriever, BatchingEmbedder
+    from .graph import GraphRetriever, KnowledgeGraph
+    from .traversal import GraphTraversal, NeighborSummaries, TraversalBudget, TraversalRetriever
+    from .store import KnowledgeStore, StringTable
+    from .vector_index import FlatIndex, HashingEmbedder, IVFIndex, VectorRetriever
+
+_LAZY_IMPORTS = {
+    "Retriever": ".retriever",
+    "BM25Index": ".bm25",
+    "RetrievalCache": ".cache",
+    "MemoryCompactor": ".compaction",
+    "MemoryIngestor": ".ingest",
+    "LocalKeyValue": ".shared_cache",
+    "SharedRetrievalCache": ".shared_cache",
+    "open_cache_bucket": ".shared_cache",
+    "BatchedVectorRetriever": ".embedding",
+    "BatchingEmbedder": ".embedding",
+    "GraphRetriever": ".graph",
+    "KnowledgeGraph": ".graph",
+    "GraphTraversal": ".traversal",
+    "NeighborSummaries": ".traversal",
+    "TraversalBudget": ".traversal",
+    "TraversalRetriever": ".traversal",
+    "KnowledgeStore": ".store",
+    "StringTable": ".store",
+    "FlatIndex": ".vector_index",
+    "HashingEmbedder": ".vector_index",
+    "IVFIndex": ".vector_index",
+    "VectorRetriever": ".vector_index",
+}
+
+__all__ = list(_LAZY_IMPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _LAZY_IMPORTS)
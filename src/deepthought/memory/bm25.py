@@ -0,0 +1,349 @@
+# File: src/deepthought/memory/bm25.py
+"""
+Incremental BM25 inverted index for lexical fact retrieval.
+
+Postings are kept per term as sealed blocks of ``BLOCK_SIZE`` entries plus
+an uncompressed tail that receives new documents. A sealed block stores doc
+id gaps (the first one relative to the previous block) in the narrowest
+unsigned NumPy dtype that fits, with term frequencies as ``uint8``. The
+last doc id of every block is kept as a skip list so single documents can
+be looked up by decoding only the blocks that may contain them.
+
+Top-k queries use MaxScore dynamic pruning, evaluated a whole posting list
+at a time with NumPy rather than one document at a time: terms are visited
+from the highest to the lowest BM25 upper bound, and once the bounds of the
+remaining terms cannot lift an unseen document above the current k-th best
+score, those terms are only probed for the existing candidates.
+
+Deletes mark a tombstone and update collection statistics immediately;
+``compact`` rewrites postings without deleted documents. ``from_documents``
+plus ``catch_up`` rebuild an index from scratch (also tightening the score
+bounds that deletes leave loose) while the old one keeps serving.
+"""
+import logging
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .retriever import RetrievalResult, tokenize
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 128
+
+
+def _narrowest(values: np.ndarray) -> np.ndarray:
+    top = int(values.max()) if len(values) else 0
+    dtype = np.uint8 if top < 1 << 8 else np.uint16 if top < 1 << 16 else np.uint32
+    return values.astype(dtype)
+
+
+def _grow(array: np.ndarray, size: int) -> np.ndarray:
+    if size <= len(array):
+        return array
+    grown = np.zeros(max(size, 2 * len(array)), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class _Postings:
+    """Block-compressed posting list for one term."""
+
+    __slots__ = ("gaps", "tfs", "last", "tail_docs", "tail_tfs", "df", "max_tf", "_skip")
+
+    def __init__(self):
+        self.gaps: List[np.ndarray] = []
+        self.tfs: List[np.ndarray] = []
+        self.last: List[int] = []
+        self.tail_docs: List[int] = []
+        self.tail_tfs: List[int] = []
+        self.df = 0
+        self.max_tf = 0
+        self._skip: Optional[np.ndarray] = None
+
+    def append(self, doc: int, tf: int) -> None:
+        self.tail_docs.append(doc)
+        self.tail_tfs.append(min(tf, 255))
+        self.max_tf = max(self.max_tf, tf)
+        self._skip = None
+        if len(self.tail_docs) == BLOCK_SIZE:
+            self.seal()
+
+    def seal(self) -> None:
+        if not self.tail_docs:
+            return
+        base = self.last[-1] if self.last else 0
+        self.gaps.append(_narrowest(np.diff(np.asarray(self.tail_docs, dtype=np.int64), prepend=base)))
+        self.tfs.append(np.asarray(self.tail_tfs, dtype=np.uint8))
+        self.last.append(self.tail_docs[-1])
+        self.tail_docs, self.tail_tfs = [], []
+        self._skip = None
+
+    def skip_list(self) -> np.ndarray:
+        """Last doc id of each block, the tail counting as a final block."""
+        if self._skip is None:
+            self._skip = np.asarray(self.last + self.tail_docs[-1:], dtype=np.int64)
+        return self._skip
+
+    def decode(self, block: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(doc_ids, tfs)`` of sealed block ``block`` or of the tail."""
+        if block == len(self.gaps):
+            return np.asarray(self.tail_docs, dtype=np.int64), np.asarray(self.tail_tfs, dtype=np.uint8)
+        base = self.last[block - 1] if block else 0
+        return base + np.cumsum(self.gaps[block], dtype=np.int64), self.tfs[block]
+
+    def decode_all(self) -> Tuple[np.ndarray, np.ndarray]:
+        docs, tfs = np.zeros(0, np.int64), np.zeros(0, np.uint8)
+        if self.gaps:
+            docs = np.cumsum(np.concatenate(self.gaps, dtype=np.int64))
+            tfs = np.concatenate(self.tfs)
+        if self.tail_docs:
+            docs = np.concatenate((docs, np.asarray(self.tail_docs, dtype=np.int64)))
+            tfs = np.concatenate((tfs, np.asarray(self.tail_tfs, dtype=np.uint8)))
+        return docs, tfs
+
+    def lookup(self, docs: np.ndarray) -> np.ndarray:
+        """Term frequencies of sorted ``docs`` in this list (0 where absent)."""
+        out = np.zeros(len(docs), dtype=np.uint8)
+        skip = self.skip_list()
+        blocks = np.unique(np.searchsorted(skip, docs))
+        blocks = blocks[blocks < len(skip)]
+        if not len(blocks):
+            return out
+        if len(blocks) * 4 > len(skip):
+            found, tfs = self.decode_all()
+        else:
+            parts = [self.decode(int(b)) for b in blocks]
+            found = np.concatenate([d for d, _ in parts])
+            tfs = np.concatenate([t for _, t in parts])
+        pos = np.minimum(np.searchsorted(found, docs), len(found) - 1)
+        match = found[pos] == docs
+        out[match] = tfs[pos[match]]
+        return out
+
+    @property
+    def nbytes(self) -> int:
+        return sum(g.nbytes + t.nbytes + 8 for g, t in zip(self.gaps, self.tfs)) + 16 * len(self.tail_docs)
+
+
+class BM25Index:
+    """Inverted index over short facts with BM25 ranking."""
+    #: Only facts sharing a query term can change a result (see ``RetrievalCache``)
+    lexical = True
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, _Postings] = {}
+        self._docs: List[Optional[str]] = []
+        self._lengths = np.zeros(1024, dtype=np.uint32)
+        self._deleted = np.zeros(1024, dtype=bool)
+        self._live = 0
+        self._total_length = 0
+        self._min_length = 1 << 31
+        #: Deletes whose documents are still in the postings
+        self.tombstones = 0
+
+    @classmethod
+    def from_documents(cls, docs: Sequence[Optional[str]], k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        """Build an index whose doc ids are positions in ``docs``; None marks a deleted id."""
+        index = cls(k1, b)
+        n = len(docs)
+        index._docs = list(docs)
+        index._lengths = _grow(index._lengths, n)
+        index._deleted = _grow(index._deleted, n)
+        vocab: Dict[str, int] = {}
+        intern = vocab.setdefault
+        terms: List[int] = []
+        for doc, fact in enumerate(index._docs):
+            if fact is None:
+                index._deleted[doc] = True
+                continue
+            tokens = tokenize(fact)
+            index._lengths[doc] = len(tokens)
+            terms.extend([intern(t, len(vocab)) for t in tokens])
+        lengths = index._lengths[:n].astype(np.int64)
+        live = ~index._deleted[:n]
+        index._live = int(live.sum())
+        index._total_length = int(lengths.sum())
+        if index._live:
+            index._min_length = int(max(lengths[live].min(), 1))
+        if not terms:
+            return index
+        # One sorted (term, doc) -> tf table for the whole collection
+        keys = np.asarray(terms, dtype=np.int64) * n + np.repeat(np.arange(n, dtype=np.int64), lengths)
+        keys, tfs = np.unique(keys, return_counts=True)
+        term_of, doc_ids = keys // n, keys % n
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(term_of)) + 1))
+        ends = np.append(starts[1:], len(keys))
+        gaps = np.diff(doc_ids, prepend=0)
+        gaps[starts] = doc_ids[starts]
+        max_tfs = np.maximum.reduceat(tfs, starts).tolist()
+        tfs8 = np.minimum(tfs, 255).astype(np.uint8)
+        names = list(vocab)
+        for term, start, end, max_tf in zip(term_of[starts].tolist(), starts.tolist(), ends.tolist(), max_tfs):
+            postings = index._postings[names[term]] = _Postings()
+            for block in range(start, end, BLOCK_SIZE):
+                stop = min(block + BLOCK_SIZE, end)
+                postings.gaps.append(_narrowest(gaps[block:stop]))
+                postings.tfs.append(tfs8[block:stop])
+                postings.last.append(int(doc_ids[stop - 1]))
+            postings.df = end - start
+            postings.max_tf = max_tf
+        return index
+
+    def catch_up(self, other: "BM25Index") -> int:
+        """
+        Apply what happened to ``other`` after this index was built from its documents.
+
+        Returns:
+            int: Number of documents added or deleted.
+        """
+        base = len(self._docs)
+        for fact in other._docs[base:]:
+            if fact is None:
+                self._lengths = _grow(self._lengths, len(self._docs) + 1)
+                self._deleted = _grow(self._deleted, len(self._docs) + 1)
+                self._deleted[len(self._docs)] = True
+                self._docs.append(None)
+            else:
+                self.add(fact)
+        changed = len(other._docs) - base
+        for doc in np.nonzero(other._deleted[:base] & ~self._deleted[:base])[0].tolist():
+            changed += self.delete(doc)
+        return changed
+
+    def __len__(self) -> int:
+        return self._live
+
+    @property
+    def num_docs(self) -> int:
+        """Document ids handed out so far, deleted documents included."""
+        return len(self._docs)
+
+    def documents(self) -> List[Optional[str]]:
+        """Copy of all documents by id; deleted ones are None."""
+        return list(self._docs)
+
+    @property
+    def avg_length(self) -> float:
+        return self._total_length / self._live if self._live else 0.0
+
+    def add(self, fact: str) -> int:
+        """Index a fact and return its document id."""
+        doc = len(self._docs)
+        terms = Counter(tokenize(fact))
+        length = sum(terms.values())
+        self._docs.append(fact)
+        self._lengths = _grow(self._lengths, doc + 1)
+        self._deleted = _grow(self._deleted, doc + 1)
+        self._lengths[doc] = length
+        self._live += 1
+        self._total_length += length
+        self._min_length = min(self._min_length, max(length, 1))
+        for term, tf in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = _Postings()
+            postings.append(doc, tf)
+            postings.df += 1
+        return doc
+
+    def add_many(self, facts: Iterable[str]) -> List[int]:
+        return [self.add(fact) for fact in facts]
+
+    def delete(self, doc: int) -> bool:
+        """Remove a document. Returns False if it was unknown or already deleted."""
+        if doc >= len(self._docs) or self._docs[doc] is None:
+            return False
+        for term in set(tokenize(self._docs[doc])):
+            self._postings[term].df -= 1
+        self._docs[doc] = None
+        self._deleted[doc] = True
+        self._live -= 1
+        self._total_length -= int(self._lengths[doc])
+        self.tombstones += 1
+        return True
+
+    def get(self, doc: int) -> Optional[str]:
+        return self._docs[doc] if doc < len(self._docs) else None
+
+    def compact(self) -> None:
+        """Rewrite postings without deleted documents."""
+        rebuilt: Dict[str, _Postings] = {}
+        for term, postings in self._postings.items():
+            if postings.df <= 0:
+                continue
+            docs, tfs = postings.decode_all()
+            keep = ~self._deleted[docs]
+            fresh = _Postings()
+            for doc, tf in zip(docs[keep].tolist(), tfs[keep].tolist()):
+                fresh.append(doc, tf)
+            fresh.df = postings.df
+            rebuilt[term] = fresh
+        self._postings = rebuilt
+        self.tombstones = 0
+        logger.debug(f"BM25Index compacted to {len(rebuilt)} terms")
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate size of postings, document lengths and tombstones."""
+        return sum(p.nbytes for p in self._postings.values()) + 5 * len(self._docs)
+
+    def _idf(self, df: int) -> float:
+        return math.log(1.0 + (self._live - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        """Return up to ``top_k`` ``(doc_id, score)`` pairs, best first."""
+        if not self._live or top_k <= 0:
+            return []
+        k1, b = self.k1, self.b
+        norm_a, norm_b = k1 * (1 - b), k1 * b / (self.avg_length or 1.0)
+        terms = []
+        for term, qtf in Counter(tokenize(query)).items():
+            postings = self._postings.get(term)
+            if postings is None or postings.df <= 0:
+                continue
+            weight = self._idf(postings.df) * qtf
+            tf = postings.max_tf
+            # Bound: highest tf in the shortest document ever indexed
+            upper = weight * tf * (k1 + 1) / (tf + norm_a + norm_b * self._min_length)
+            terms.append((upper, weight, postings))
+        terms.sort(key=lambda t: -t[0])
+        # rest[i]: best score a document can still gain from terms i and later
+        rest = np.cumsum([t[0] for t in terms][::-1])[::-1].tolist() + [0.0]
+
+        def contribution(weight: float, docs: np.ndarray, tfs: np.ndarray) -> np.ndarray:
+            tfs = tfs.astype(np.float64)
+            return weight * tfs * (k1 + 1) / (tfs + norm_a + norm_b * self._lengths[docs])
+
+        cands, scores = np.zeros(0, np.int64), np.zeros(0, np.float64)
+        threshold = 0.0
+        for i, (_, weight, postings) in enumerate(terms):
+            if len(cands) >= top_k and threshold >= rest[i]:
+                # Unseen documents can no longer reach the top k: only probe candidates
+                tfs = postings.lookup(cands)
+                hit = tfs > 0
+                scores[hit] += contribution(weight, cands[hit], tfs[hit])
+            else:
+                docs, tfs = postings.decode_all()
+                live = ~self._deleted[docs]
+                docs, tfs = docs[live], tfs[live]
+                cands, inverse = np.unique(np.concatenate((cands, docs)), return_inverse=True)
+                weights = np.concatenate((scores, contribution(weight, docs, tfs)))
+                scores = np.bincount(inverse, weights=weights, minlength=len(cands))
+            if len(cands) >= top_k:
+                threshold = float(np.partition(scores, len(scores) - top_k)[len(scores) - top_k])
+                keep = scores + rest[i + 1] >= threshold
+                cands, scores = cands[keep], scores[keep]
+        if not len(cands):
+            return []
+        top = np.argsort(-scores, kind="stable")[:top_k]
+        return [(int(cands[j]), float(scores[j])) for j in top]
+
+    def retrieve(self, query: str, top_k: int = 10) -> RetrievalResult:
+        hits = self.search(query, top_k)
+        return {"facts": [self._docs[doc] for doc, _ in hits], "scores": [score for _, score in hits],
+                "source": "bm25"}
@@ -0,0 +1,230 @@
+# File: src/deepthought/memory/cache.py
+"""
+Retrieval result cache for the memory stage.
+
+Results are keyed by the normalized query (its lower-cased word tokens) and
+``top_k``, bounded by an LRU size limit and a TTL. Every entry is indexed by
+its query terms so that a change to the knowledge base only evicts the
+entries whose query shares a term with a changed fact. That is approximate:
+a new BM25 document shifts idf and the average document length, so scores
+of unrelated queries drift slightly, and hashed embeddings can collide. A
+cached ranking is only stale in such second-order ways, and the TTL bounds
+for how long. Callers that need exact results after every write should
+call ``invalidate_all`` instead.
+
+Term-level invalidation only fits lexical retrievers. Embedding and graph
+retrievers can return a new fact for a query it shares no term with, so a
+cache created with ``lexical=False`` drops every entry on each write;
+MemoryStub configures this from its retriever's ``lexical`` attribute.
+
+The cache keeps a knowledge-base ``version`` that advances on every
+invalidation. A caller captures it before retrieving and passes it to
+``put``, which drops the result if a relevant invalidation happened while
+the retrieval was in flight.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, Optional, Set, Tuple
+
+from .retriever import RetrievalResult, tokenize
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, int]
+Compute = Callable[[], Awaitable[RetrievalResult]]
+
+
+@dataclass
+class _Entry:
+    value: RetrievalResult
+    terms: FrozenSet[str]
+    expires: float
+    cost: float
+
+
+class RetrievalCache:
+    """LRU + TTL cache of retrieval results with term-level invalidation."""
+
+    def __init__(self, max_entries: int = 4096, ttl: float = 300.0,
+                 stopwords: Iterable[str] = (), max_tracked_terms: int = 100_000,
+                 clock: Callable[[], float] = time.monotonic, lexical: bool = True):
+        """
+        Args:
+            max_entries: Entries kept before the least recently used is evicted.
+            ttl: Seconds an entry stays valid; 0 disables expiry.
+            stopwords: Terms ignored for invalidation. Trades exactness for hit
+                rate when writes are full of common words.
+            max_tracked_terms: Bound on remembered per-term invalidation
+                versions; past it every older in-flight result is rejected.
+            lexical: Results only change through facts that share a query term.
+                False makes ``invalidate_facts`` drop everything.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._stopwords = frozenset(stopwords)
+        self._max_tracked_terms = max_tracked_terms
+        self._clock = clock
+        self.lexical = lexical
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._by_term: Dict[str, Set[CacheKey]] = {}
+        self._term_versions: Dict[str, int] = {}
+        self._floor = 0
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.saved_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(tokenize(query))
+
+    def _terms(self, text: str) -> Set[str]:
+        return set(tokenize(text)) - self._stopwords
+
+    def _remove(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key)
+        for term in entry.terms:
+            keys = self._by_term.get(term)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_term[term]
+
+    def get(self, query: str, top_k: int) -> Optional[RetrievalResult]:
+        """Return a cached result (a shallow copy) or None."""
+        key = (self.normalize(query), top_k)
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires and entry.expires <= self._clock():
+            self._remove(key)
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.saved_seconds += entry.cost
+        return dict(entry.value)
+
+    def put(self, query: str, top_k: int, value: RetrievalResult, version: int, cost: float = 0.0) -> bool:
+        """
+        Store a result computed against knowledge-base ``version``.
+
+        Args:
+            cost: Seconds the retrieval took, credited to ``saved_seconds`` on hits.
+
+        Returns:
+            bool: False if a relevant invalidation made the result stale.
+        """
+        terms = frozenset(self._terms(query))
+        if version < self._floor or any(self._term_versions.get(t, -1) > version for t in terms):
+            return False
+        key = (self.normalize(query), top_k)
+        if key in self._entries:
+            self._remove(key)
+        expires = self._clock() + self.ttl if self.ttl else 0.0
+        self._entries[key] = _Entry(dict(value), terms, expires, cost)
+        for term in terms:
+            self._by_term.setdefault(term, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        return True
+
+    async def get_or_compute(self, query: str, top_k: int, compute: Compute) -> RetrievalResult:
+        """
+        Return the cached result or run ``compute`` and cache its result.
+
+        Concurrent misses for the same key share one ``compute`` call; when
+        the caller running it is cancelled, a waiting caller runs it instead.
+        """
+        cached = self.get(query, top_k)
+        if cached is not None:
+            return cached
+        key = (self.normalize(query), top_k)
+        while key in self._inflight:
+            inflight = self._inflight[key]
+            try:
+                return dict(await asyncio.shield(inflight))
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            version = self.version
+            started = time.perf_counter()
+            value = await compute()
+            self.put(query, top_k, value, version, cost=time.perf_counter() - started)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def invalidate_facts(self, facts: Iterable[str]) -> int:
+        """
+        Evict entries whose query shares a term with any of ``facts``, or every
+        entry when the cache is not ``lexical``. Returns the count.
+        """
+        if not self.lexical:
+            count = len(self._entries)
+            self.invalidate_all()
+            return count
+        self.version += 1
+        terms: Set[str] = set()
+        for fact in facts:
+            terms |= self._terms(fact)
+        stale: Set[CacheKey] = set()
+        for term in terms:
+            stale |= self._by_term.get(term, set())
+            self._term_versions[term] = self.version
+        if len(self._term_versions) > self._max_tracked_terms:
+            self._term_versions.clear()
+            self._floor = self.version
+        for key in stale:
+            self._remove(key)
+        self.invalidations += len(stale)
+        if stale:
+            logger.debug(f"RetrievalCache invalidated {len(stale)} entries at version {self.version}")
+        return len(stale)
+
+    def invalidate_all(self) -> None:
+        """Drop everything, e.g. after a backend was rebuilt or reloaded."""
+        self.version += 1
+        self._floor = self.version
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._by_term.clear()
+        self._term_versions.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "saved_seconds": self.saved_seconds,
+        }
@@ -0,0 +1,331 @@
+# File: src/deepthought/memory/compaction.py
+"""
+Background compaction and point-in-time snapshots of the memory indexes.
+
+Incremental writes leave work behind that slows retrieval down over time:
+BM25 tombstones (and score bounds that deletes never tighten), the graph's
+append buffer, and IVF vectors that are not yet grouped by cluster.
+``MemoryCompactor`` owns the indexes, takes the writes, and repairs each of
+them off the hot path:
+
+* the heavy part (rebuilding BM25 postings, building the merged CSR arrays,
+  sorting IVF codes) runs in an executor thread on a consistent prefix of
+  the index, while the event loop keeps serving reads and writes;
+* back on the event loop the result catches up with the writes made in the
+  meantime and is swapped in with plain attribute assignments, so a query
+  sees either the old or the new structure, never a mix.
+
+Snapshots capture how much of every index exists at one instant on the
+event loop, write exactly that prefix with ``KnowledgeStore.write`` in the
+executor, and name the file after its creation time so the newest one is
+easy to find. New workers start from ``MemoryCompactor.load``.
+
+Build the graph with a large ``merge_threshold`` so that merges happen here
+instead of inside ``add_fact``.
+"""
+import asyncio
+import glob
+import logging
+import os
+import time
+from collections.abc import Sequence as SequenceABC
+from concurrent.futures import Executor
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from .bm25 import BM25Index
+from .graph import KnowledgeGraph, Triple
+from .retriever import RetrievalResult
+from .store import KnowledgeStore
+from .vector_index import Embedder, IVFIndex, VectorRetriever
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATTERN = "memory-*.dtks"
+
+
+class _Prefix(SequenceABC):
+    """The first ``size`` items of an append-only sequence.
+
+    Also stands in for an interner in ``KnowledgeStore.write``.
+    """
+
+    def __init__(self, items: Sequence, size: int):
+        self._items = items
+        self._size = size
+
+    @property
+    def names(self) -> "_Prefix":
+        return self
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._items[i] for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        return self._items[index]
+
+
+def _frozen_vectors(vectors: VectorRetriever, count: int) -> VectorRetriever:
+    """A VectorRetriever over the first ``count`` facts of ``vectors``."""
+    retriever = VectorRetriever(vectors.active_index.prefix(count), vectors.embedder)
+    retriever.facts = _Prefix(vectors.facts, count)
+    return retriever
+
+
+class _CurrentBM25:
+    """Retriever that always reads the compactor's current BM25 index."""
+    lexical = True
+
+    def __init__(self, owner: "MemoryCompactor"):
+        self._owner = owner
+
+    def retrieve(self, query: str, top_k: int = 10) -> RetrievalResult:
+        return self._owner.bm25.retrieve(query, top_k)
+
+
+class MemoryCompactor:
+    """Owns the memory indexes, compacts them in the background and writes snapshots."""
+
+    def __init__(self, bm25: Optional[BM25Index] = None, graph: Optional[KnowledgeGraph] = None,
+                 vectors: Optional[VectorRetriever] = None, executor: Optional[Executor] = None,
+                 max_tombstone_ratio: float = 0.1, max_pending_edges: int = 16384,
+                 max_vector_tail: int = 16384, snapshot_dir: Optional[str] = None, keep_snapshots: int = 3):
+        """
+        Args:
+            executor: Executor for rebuilds and snapshot writes (default: the loop's default).
+            max_tombstone_ratio: Deleted share of BM25 documents that triggers a rebuild.
+            max_pending_edges: Buffered graph facts that trigger a merge.
+            max_vector_tail: IVF vectors outside their cluster group that trigger a regroup.
+            snapshot_dir: Where ``snapshot()`` writes by default.
+            keep_snapshots: Snapshots kept in ``snapshot_dir``; older ones are removed.
+        """
+        self.bm25 = bm25
+        self.graph = graph
+        self.vectors = vectors
+        self._executor = executor
+        self.max_tombstone_ratio = max_tombstone_ratio
+        self.max_pending_edges = max_pending_edges
+        self.max_vector_tail = max_vector_tail
+        self.snapshot_dir = snapshot_dir
+        self.keep_snapshots = keep_snapshots
+        self._store: Optional[KnowledgeStore] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.facts_written = 0
+        self.compactions: Dict[str, int] = {"bm25": 0, "graph": 0, "vectors": 0}
+        self.compaction_seconds = 0.0
+        self.caught_up = 0
+        self.snapshots = 0
+        self.last_snapshot: Optional[str] = None
+
+    def retriever(self) -> _CurrentBM25:
+        """BM25 retriever that follows index swaps; the graph and vector indexes are compacted in place."""
+        return _CurrentBM25(self)
+
+    def add_facts(self, facts: List[str]) -> None:
+        """Index text facts in BM25 and the vector index; usable as a MemoryIngestor sink."""
+        if self.bm25 is not None:
+            self.bm25.add_many(facts)
+        if self.vectors is not None:
+            self.vectors.add_facts(facts)
+        self.facts_written += len(facts)
+
+    def add_triples(self, triples: Iterable[Triple]) -> None:
+        """Buffer facts in the knowledge graph; they are visible immediately."""
+        for subject, relation, obj in triples:
+            self.graph.add_fact(subject, relation, obj)
+
+    def delete(self, doc: int) -> bool:
+        """Delete a BM25 document; its postings are dropped by the next compaction."""
+        return self.bm25.delete(doc) if self.bm25 is not None else False
+
+    def needs_compaction(self) -> List[str]:
+        """Names of the indexes whose leftover write work crossed its threshold."""
+        due = []
+        bm25 = self.bm25
+        if bm25 is not None and bm25.tombstones > self.max_tombstone_ratio * max(bm25.num_docs, 1):
+            due.append("bm25")
+        if self.graph is not None and self.graph.pending_edges >= self.max_pending_edges:
+            due.append("graph")
+        index = self.vectors.index if self.vectors is not None else None
+        if isinstance(index, IVFIndex) and index.tail >= self.max_vector_tail:
+            due.append("vectors")
+        return due
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def compact(self, force: bool = False) -> List[str]:
+        """
+        Rebuild the indexes that need it (all of them with ``force``) and swap them in.
+
+        Returns:
+            List[str]: Names of the indexes that were compacted.
+        """
+        async with self._lock:
+            started = time.perf_counter()
+            due = self.needs_compaction()
+            done = []
+            bm25 = self.bm25
+            if bm25 is not None and (force or "bm25" in due):
+                rebuilt = await self._run(BM25Index.from_documents, bm25.documents(), bm25.k1, bm25.b)
+                # Writes made while the rebuild ran; the swap happens in the same loop step
+                self.caught_up += rebuilt.catch_up(bm25)
+                self.bm25 = rebuilt
+                done.append("bm25")
+            graph = self.graph
+            if graph is not None and (force or "graph" in due) and graph.pending_edges:
+                merge = await self._run(graph.build_merge)
+                if graph.install_merge(merge):
+                    done.append("graph")
+            index = self.vectors.index if self.vectors is not None else None
+            if isinstance(index, IVFIndex) and index.is_trained and (force or "vectors" in due) and index.tail:
+                reorder = await self._run(index.build_reorder)
+                if index.install_reorder(reorder):
+                    done.append("vectors")
+            for name in done:
+                self.compactions[name] += 1
+            if done:
+                elapsed = time.perf_counter() - started
+                self.compaction_seconds += elapsed
+                logger.info(f"MemoryCompactor compacted {', '.join(done)} in {elapsed:.3f}s")
+            return done
+
+    async def snapshot(self, path: Optional[str] = None, meta: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Write a point-in-time snapshot of all indexes and return its path.
+
+        Writes arriving while the file is written are not part of it.
+        """
+        rotate = path is None
+        if rotate:
+            if not self.snapshot_dir:
+                raise ValueError("A snapshot path or snapshot_dir must be provided.")
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+            path = os.path.join(self.snapshot_dir, f"memory-{stamp}.dtks")
+        async with self._lock:
+            # Everything below up to the executor call runs in one loop step
+            docs = self.bm25.documents() if self.bm25 is not None else None
+            graph = self.graph
+            graph_base = graph.merge_base if graph is not None else None
+            graph_pending = graph.pending_edges if graph is not None else 0
+            nodes = len(graph.nodes) if graph is not None else 0
+            relations = len(graph.relations) if graph is not None else 0
+            vectors = self.vectors
+            vector_count = len(vectors.facts) if vectors is not None else 0
+            meta = dict(meta or {}, facts_written=self.facts_written, created=datetime.utcnow().isoformat())
+            if self.bm25 is not None:
+                meta.update(bm25_k1=self.bm25.k1, bm25_b=self.bm25.b)
+
+            def write() -> None:
+                frozen_graph = None
+                if graph is not None:
+                    merge = graph.build_merge(limit=graph_pending)
+                    if merge.base is not graph_base:
+                        raise RuntimeError("Knowledge graph was merged while the snapshot was taken.")
+                    for csr in (merge.out, merge.incoming):
+                        # Drop rows of nodes interned after the capture; they have no edges here
+                        csr.indptr = csr.indptr[:nodes + 1]
+                    frozen_graph = KnowledgeGraph.from_merge(merge, _Prefix(graph.nodes.names, nodes),
+                                                             _Prefix(graph.relations.names, relations))
+                facts = [fact for fact in docs if fact is not None] if docs is not None else None
+                frozen_vectors = _frozen_vectors(vectors, vector_count) if vectors is not None else None
+                KnowledgeStore.write(path, facts=facts, graph=frozen_graph, vectors=frozen_vectors, meta=meta)
+
+            started = time.perf_counter()
+            await self._run(write)
+        self.snapshots += 1
+        self.last_snapshot = path
+        logger.info(f"MemoryCompactor wrote snapshot {path} in {time.perf_counter() - started:.3f}s")
+        if rotate:
+            self._prune()
+        return path
+
+    def _prune(self) -> None:
+        for old in sorted(glob.glob(os.path.join(self.snapshot_dir, SNAPSHOT_PATTERN)))[:-self.keep_snapshots]:
+            try:
+                os.remove(old)
+            except OSError as e:
+                logger.warning(f"Failed to remove old snapshot {old}: {e}")
+
+    @staticmethod
+    def latest_snapshot(directory: str) -> Optional[str]:
+        """Path of the newest snapshot in ``directory``, or None."""
+        snapshots = sorted(glob.glob(os.path.join(directory, SNAPSHOT_PATTERN)))
+        return snapshots[-1] if snapshots else None
+
+    @classmethod
+    def load(cls, path: str, embedder: Optional[Embedder] = None, **kwargs) -> "MemoryCompactor":
+        """
+        Start from a snapshot: the graph and vectors are mapped, BM25 is rebuilt from the facts.
+
+        Args:
+            kwargs: Passed to the constructor.
+        """
+        store = KnowledgeStore(path)
+        facts = store.facts
+        bm25 = None
+        if facts is not None:
+            bm25 = BM25Index.from_documents(facts, store.meta.get("bm25_k1", 1.2), store.meta.get("bm25_b", 0.75))
+        # Merges are left to the compactor
+        compactor = cls(bm25=bm25, graph=store.graph(merge_threshold=1 << 62),
+                        vectors=store.vector_retriever(embedder), **kwargs)
+        compactor._store = store
+        compactor.facts_written = int(store.meta.get("facts_written", 0))
+        logger.info(f"MemoryCompactor loaded snapshot {path}")
+        return compactor
+
+    async def _loop(self, interval: float, snapshot_interval: Optional[float]) -> None:
+        last_snapshot = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self.needs_compaction():
+                    await self.compact()
+                if snapshot_interval and time.monotonic() - last_snapshot >= snapshot_interval:
+                    await self.snapshot()
+                    last_snapshot = time.monotonic()
+            except Exception as e:
+                logger.error(f"MemoryCompactor background run failed: {e}", exc_info=True)
+
+    async def start(self, interval: float = 5.0, snapshot_interval: Optional[float] = None) -> None:
+        """
+        Check the compaction thresholds every ``interval`` seconds in a background task.
+
+        Args:
+            snapshot_interval: Seconds between snapshots to ``snapshot_dir``; None disables them.
+        """
+        if snapshot_interval and not self.snapshot_dir:
+            raise ValueError("snapshot_dir must be set to take periodic snapshots.")
+        self._task = asyncio.create_task(self._loop(interval, snapshot_interval))
+        logger.info(f"MemoryCompactor started (interval={interval}s, snapshots every {snapshot_interval}s)")
+
+    async def stop(self) -> None:
+        """Stop the background task after the compaction or snapshot in progress."""
+        if self._task:
+            async with self._lock:
+                self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        logger.info("MemoryCompactor stopped.")
+
+    def stats(self) -> Dict[str, Any]:
+        index = self.vectors.index if self.vectors is not None else None
+        return {
+            "facts_written": self.facts_written,
+            "compactions": dict(self.compactions),
+            "compaction_seconds": self.compaction_seconds,
+            "caught_up": self.caught_up,
+            "bm25_tombstones": self.bm25.tombstones if self.bm25 is not None else 0,
+            "graph_pending_edges": self.graph.pending_edges if self.graph is not None else 0,
+            "vector_tail": index.tail if isinstance(index, IVFIndex) else 0,
+            "snapshots": self.snapshots,
+            "last_snapshot": self.last_snapshot,
+        }
@@ -0,0 +1,174 @@
+# File: src/deepthought/memory/embedding.py
+"""
+Cross-request micro-batching of query embeddings.
+
+Concurrent memory-stage handlers each need one query embedded. Calling the
+embedder once per query wastes most of a model's per-call overhead, so
+``BatchingEmbedder`` collects queries into one batch:
+
+* a batch is dispatched when ``max_batch`` queries are waiting, or
+  ``window`` seconds after the first query of the batch arrived;
+* while a batch is being embedded, new queries keep accumulating for the
+  next one, but no query waits in the queue longer than ``max_latency``
+  (a second batch is started in parallel instead).
+
+Batches run in an executor thread so the event loop keeps serving other
+handlers; NumPy and torch release the GIL for the heavy work.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import Executor
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .retriever import RetrievalResult
+from .vector_index import Embedder, VectorRetriever
+
+logger = logging.getLogger(__name__)
+
+
+class BatchingEmbedder:
+    """Embeds queries from concurrent callers in shared batches."""
+
+    def __init__(self, embedder: Embedder, max_batch: int = 64, window: float = 0.002,
+                 max_latency: float = 0.05, executor: Optional[Executor] = None,
+                 stats_window: int = 1024):
+        """
+        Args:
+            embedder: Callable mapping a list of texts to a ``(n, dim)`` array.
+            max_batch: Largest batch passed to the embedder.
+            window: Seconds to wait for a batch to fill after its first query.
+            max_latency: Longest a query may queue behind a running batch.
+            executor: Executor for embedder calls (default: the loop's default).
+        """
+        self._embed = embedder
+        self.max_batch = max_batch
+        self.window = window
+        self.max_latency = max_latency
+        self._executor = executor
+        self._pending: Deque[Tuple[str, asyncio.Future, float]] = deque()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running = 0
+        self._latencies: Deque[float] = deque(maxlen=stats_window)
+        self.requests = 0
+        self.batches = 0
+        self.embed_seconds = 0.0
+        self.queue_seconds = 0.0
+        self._first_request: Optional[float] = None
+        self._last_done: Optional[float] = None
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embed one text as part of a shared batch; returns a ``(dim,)`` vector."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        now = time.perf_counter()
+        if self._first_request is None:
+            self._first_request = now
+        self._pending.append((text, future, now))
+        self.requests += 1
+        if len(self._pending) >= self.max_batch:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._on_timer)
+        return await future
+
+    async def embed_many(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = await asyncio.gather(*(self.embed(t) for t in texts))
+        return np.stack(vectors) if vectors else np.zeros((0, 0), np.float32)
+
+    def _schedule(self, delay: float) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(max(delay, 0.0), self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        if not self._pending:
+            return
+        age = time.perf_counter() - self._pending[0][2]
+        if self._running and age < self.max_latency:
+            # Keep filling the next batch while the current one runs
+            self._schedule(self.max_latency - age)
+        else:
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            size = min(len(self._pending), self.max_batch)
+            batch = [self._pending.popleft() for _ in range(size)]
+            self._running += 1
+            asyncio.get_running_loop().create_task(self._run_batch(batch))
+            if len(self._pending) < self.max_batch:
+                break
+        if self._pending:
+            self._schedule(self.window)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future, float]]) -> None:
+        started = time.perf_counter()
+        texts = [text for text, _, _ in batch]
+        try:
+            vectors = await asyncio.get_running_loop().run_in_executor(self._executor, self._embed, texts)
+            if len(vectors) != len(batch):
+                raise ValueError(f"Embedder returned {len(vectors)} vectors for {len(batch)} texts.")
+        except Exception as e:
+            logger.error(f"BatchingEmbedder batch of {len(batch)} failed: {e}", exc_info=True)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for row, (_, future, _) in enumerate(batch):
+                if not future.done():
+                    future.set_result(vectors[row])
+        finally:
+            self._running -= 1
+        done = time.perf_counter()
+        self.batches += 1
+        self.embed_seconds += done - started
+        self._last_done = done
+        for _, _, enqueued in batch:
+            self.queue_seconds += started - enqueued
+            self._latencies.append(done - enqueued)
+        # Queries that piled up behind this batch go next
+        if self._pending and not self._running:
+            self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        """Batching effectiveness: batch sizes, queueing delay, latency and throughput."""
+        latencies = np.asarray(self._latencies) if self._latencies else np.zeros(1)
+        completed = self.requests - len(self._pending)
+        elapsed = (self._last_done - self._first_request) if self._last_done and self._first_request else 0.0
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": completed / self.batches if self.batches else 0.0,
+            "mean_queue_ms": 1e3 * self.queue_seconds / completed if completed else 0.0,
+            "p50_latency_ms": 1e3 * float(np.percentile(latencies, 50)),
+            "p95_latency_ms": 1e3 * float(np.percentile(latencies, 95)),
+            "throughput_per_s": completed / elapsed if elapsed else 0.0,
+            "window_ms": 1e3 * self.window,
+        }
+
+
+class BatchedVectorRetriever:
+    """Async retriever that embeds queries through a shared BatchingEmbedder."""
+
+    def __init__(self, retriever: VectorRetriever, embedder: BatchingEmbedder):
+        self._retriever = retriever
+        self._embedder = embedder
+
+    @property
+    def max_batch(self) -> int:
+        """Queries embedded together; callers should retrieve this many concurrently."""
+        return self._embedder.max_batch
+
+    async def retrieve(self, query: str, top_k: int = 10) -> RetrievalResult:
+        vector = await self._embedder.embed(query)
+        hits = self._retriever.search_vectors(vector[None, :], top_k)[0]
+        return {"facts": [fact for fact, _ in hits], "scores": [score for _, score in hits],
+                "source": "vector_index"}
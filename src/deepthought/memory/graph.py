@@ -0,0 +1,290 @@
+# File: src/deepthought/memory/graph.py
+"""
+Embedded knowledge graph with compact CSR adjacency.
+
+Entity and relation names are interned to dense integer ids. Edges live in
+two compressed sparse row structures (outgoing and incoming) made of flat
+``int32`` NumPy arrays, so a fact costs 16 bytes of adjacency instead of a
+handful of Python objects. New facts go to a small append buffer that is
+merged into the CSR arrays once it reaches ``merge_threshold`` edges.
+"""
+import logging
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .retriever import RetrievalResult, tokenize
+
+logger = logging.getLogger(__name__)
+
+Triple = Tuple[str, str, str]
+
+
+class _Interner:
+    """Bidirectional mapping between names and dense integer ids."""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def get(self, name: str) -> Optional[int]:
+        return self._ids.get(name.lower())
+
+    def intern(self, name: str) -> int:
+        key = name.lower()
+        idx = self._ids.get(key)
+        if idx is None:
+            idx = len(self.names)
+            self._ids[key] = idx
+            self.names.append(name)
+        return idx
+
+
+class _CSR:
+    """Adjacency in compressed sparse row form."""
+
+    def __init__(self):
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.targets = np.zeros(0, dtype=np.int32)
+        self.labels = np.zeros(0, dtype=np.int32)
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.indptr) - 1
+
+    def edges(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Expand back into ``(source, target, label)`` arrays."""
+        sources = np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(self.indptr))
+        return sources, self.targets, self.labels
+
+    def row(self, node: int) -> Tuple[np.ndarray, np.ndarray]:
+        if node >= self.num_nodes:
+            return self.targets[:0], self.labels[:0]
+        start, end = self.indptr[node], self.indptr[node + 1]
+        return self.targets[start:end], self.labels[start:end]
+
+    @classmethod
+    def build(cls, sources: np.ndarray, targets: np.ndarray, labels: np.ndarray,
+              num_nodes: int) -> "_CSR":
+        csr = cls()
+        if len(sources):
+            # Sort by (source, label, target) and drop repeated facts
+            order = np.lexsort((targets, labels, sources))
+            sources, targets, labels = sources[order], targets[order], labels[order]
+            keep = np.ones(len(sources), dtype=bool)
+            keep[1:] = sources[1:] != sources[:-1]
+            keep[1:] |= labels[1:] != labels[:-1]
+            keep[1:] |= targets[1:] != targets[:-1]
+            sources, targets, labels = sources[keep], targets[keep], labels[keep]
+        counts = np.bincount(sources, minlength=num_nodes) if len(sources) else np.zeros(num_nodes, np.int64)
+        csr.indptr = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        csr.targets = np.ascontiguousarray(targets, dtype=np.int32)
+        csr.labels = np.ascontiguousarray(labels, dtype=np.int32)
+        return csr
+
+
+class GraphMerge(NamedTuple):
+    """CSR arrays built by ``KnowledgeGraph.build_merge``."""
+    base: _CSR
+    out: _CSR
+    incoming: _CSR
+    count: int
+
+
+class KnowledgeGraph:
+    """Directed, labelled multigraph of ``(subject, relation, object)`` facts."""
+
+    def __init__(self, merge_threshold: int = 65536):
+        """
+        Args:
+            merge_threshold: Buffered edges that trigger a merge into the CSR arrays.
+        """
+        self.nodes = _Interner()
+        self.relations = _Interner()
+        self._out = _CSR()
+        self._in = _CSR()
+        self._merge_threshold = merge_threshold
+        self._pending_src: List[int] = []
+        self._pending_dst: List[int] = []
+        self._pending_rel: List[int] = []
+        # Positions of buffered edges per node, so lookups never scan the buffer
+        self._pending_by_src: Dict[int, List[int]] = {}
+        self._pending_by_dst: Dict[int, List[int]] = {}
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def num_edges(self) -> int:
+        """Number of stored facts (buffered facts may include duplicates until merged)."""
+        return len(self._out.targets) + len(self._pending_src)
+
+    @property
+    def pending_edges(self) -> int:
+        """Facts buffered since the last merge."""
+        return len(self._pending_src)
+
+    @property
+    def merge_base(self) -> "_CSR":
+        """Outgoing CSR arrays of the last merge; replaced, never modified, by the next one."""
+        return self._out
+
+    @classmethod
+    def from_merge(cls, merge: "GraphMerge", nodes, relations) -> "KnowledgeGraph":
+        """Read-only graph over the CSR arrays of a built merge and the given interners."""
+        graph = cls()
+        graph.nodes, graph.relations = nodes, relations
+        graph._out, graph._in = merge.out, merge.incoming
+        return graph
+
+    def add_fact(self, subject: str, relation: str, obj: str) -> None:
+        """Insert one fact; it is visible to lookups immediately."""
+        src, dst = self.nodes.intern(subject), self.nodes.intern(obj)
+        pos = len(self._pending_src)
+        self._pending_src.append(src)
+        self._pending_rel.append(self.relations.intern(relation))
+        self._pending_dst.append(dst)
+        self._pending_by_src.setdefault(src, []).append(pos)
+        self._pending_by_dst.setdefault(dst, []).append(pos)
+        if len(self._pending_src) >= self._merge_threshold:
+            self.merge()
+
+    def add_facts(self, facts: Iterable[Triple]) -> int:
+        """Bulk-load facts with a single CSR rebuild. Returns the number of facts read."""
+        count = 0
+        intern_node, intern_rel = self.nodes.intern, self.relations.intern
+        for subject, relation, obj in facts:
+            self._pending_src.append(intern_node(subject))
+            self._pending_rel.append(intern_rel(relation))
+            self._pending_dst.append(intern_node(obj))
+            count += 1
+        self.merge()
+        return count
+
+    def merge(self) -> None:
+        """Fold buffered facts into the CSR arrays."""
+        if self._pending_src:
+            self.install_merge(self.build_merge())
+
+    def build_merge(self, limit: Optional[int] = None) -> "GraphMerge":
+        """
+        Build CSR arrays that include the facts buffered so far (at most ``limit``).
+
+        Only reads the graph, so it may run in a worker thread while facts
+        keep being added; ``install_merge`` then swaps the result in.
+        """
+        base = self._out
+        n = self.num_nodes
+        # ``add_fact`` appends to the three lists one by one; only use complete facts
+        count = min(len(self._pending_src), len(self._pending_rel), len(self._pending_dst))
+        if limit is not None:
+            count = min(count, limit)
+        new_src = np.asarray(self._pending_src[:count], dtype=np.int32)
+        new_dst = np.asarray(self._pending_dst[:count], dtype=np.int32)
+        new_rel = np.asarray(self._pending_rel[:count], dtype=np.int32)
+        src, dst, rel = base.edges()
+        out = _CSR.build(np.concatenate((src, new_src)), np.concatenate((dst, new_dst)),
+                         np.concatenate((rel, new_rel)), n)
+        src, dst, rel = out.edges()
+        return GraphMerge(base, out, _CSR.build(dst, src, rel, n), count)
+
+    def install_merge(self, merge: "GraphMerge") -> bool:
+        """Swap in a built merge; False if the graph was merged in the meantime."""
+        if merge.base is not self._out:
+            return False
+        self._out, self._in = merge.out, merge.incoming
+        count = merge.count
+        self._pending_src = self._pending_src[count:]
+        self._pending_dst = self._pending_dst[count:]
+        self._pending_rel = self._pending_rel[count:]
+        self._pending_by_src, self._pending_by_dst = {}, {}
+        for pos, (src, dst) in enumerate(zip(self._pending_src, self._pending_dst)):
+            self._pending_by_src.setdefault(src, []).append(pos)
+            self._pending_by_dst.setdefault(dst, []).append(pos)
+        logger.debug(f"KnowledgeGraph merged: {self.num_nodes} nodes, {len(self._out.targets)} edges")
+        return True
+
+    def _pending_row(self, node: int, outgoing: bool) -> Tuple[List[int], List[int]]:
+        positions = (self._pending_by_src if outgoing else self._pending_by_dst).get(node)
+        if not positions:
+            return [], []
+        others = self._pending_dst if outgoing else self._pending_src
+        return [others[i] for i in positions], [self._pending_rel[i] for i in positions]
+
+    def neighbors(self, node: int, outgoing: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(neighbor_ids, relation_ids)`` for a node id."""
+        targets, labels = (self._out if outgoing else self._in).row(node)
+        extra_t, extra_l = self._pending_row(node, outgoing)
+        if extra_t:
+            targets = np.concatenate((targets, np.asarray(extra_t, dtype=np.int32)))
+            labels = np.concatenate((labels, np.asarray(extra_l, dtype=np.int32)))
+        return targets, labels
+
+    def degree(self, node: int) -> int:
+        out_row, in_row = self._out.row(node)[0], self._in.row(node)[0]
+        pending = len(self._pending_by_src.get(node, ())) + len(self._pending_by_dst.get(node, ()))
+        return len(out_row) + len(in_row) + pending
+
+    def degrees(self, nodes: np.ndarray) -> np.ndarray:
+        """Vectorised ``degree`` for an array of node ids."""
+        nodes = np.asarray(nodes, dtype=np.int64)
+        degrees = np.zeros(len(nodes), dtype=np.int64)
+        for csr in (self._out, self._in):
+            inside = nodes < csr.num_nodes
+            ids = nodes[inside]
+            degrees[inside] += csr.indptr[ids + 1] - csr.indptr[ids]
+        if self._pending_src:
+            for i, node in enumerate(nodes.tolist()):
+                degrees[i] += len(self._pending_by_src.get(node, ())) + len(self._pending_by_dst.get(node, ()))
+        return degrees
+
+    def facts_about(self, name: str, limit: Optional[int] = None) -> List[Triple]:
+        """Facts where ``name`` is the subject or the object."""
+        node = self.nodes.get(name)
+        if node is None:
+            return []
+        names, rels = self.nodes.names, self.relations.names
+        facts = []
+        targets, labels = self.neighbors(node, outgoing=True)
+        for t, r in zip(targets.tolist(), labels.tolist()):
+            facts.append((names[node], rels[r], names[t]))
+        sources, labels = self.neighbors(node, outgoing=False)
+        for s, r in zip(sources.tolist(), labels.tolist()):
+            facts.append((names[s], rels[r], names[node]))
+        return facts[:limit] if limit is not None else facts
+
+    def match_entities(self, text: str, max_ngram: int = 3) -> List[int]:
+        """Node ids whose names appear in ``text`` (longest match first)."""
+        tokens = tokenize(text)
+        found, covered = [], set()
+        for size in range(min(max_ngram, len(tokens)), 0, -1):
+            for i in range(len(tokens) - size + 1):
+                if any(j in covered for j in range(i, i + size)):
+                    continue
+                node = self.nodes.get(" ".join(tokens[i:i + size]))
+                if node is not None and node not in found:
+                    found.append(node)
+                    covered.update(range(i, i + size))
+        return found
+
+
+class GraphRetriever:
+    """Retriever that answers with facts about entities mentioned in the query."""
+
+    def __init__(self, graph: KnowledgeGraph):
+        self._graph = graph
+
+    def retrieve(self, query: str, top_k: int = 10) -> RetrievalResult:
+        names = self._graph.nodes.names
+        entities = self._graph.match_entities(query)
+        facts: List[str] = []
+        for node in entities:
+            for fact in self._graph.facts_about(names[node], limit=top_k - len(facts)):
+                facts.append(" ".join(fact))
+            if len(facts) >= top_k:
+                break
+        return {"facts": facts, "entities": [names[n] for n in entities], "source": "knowledge_graph"}
@@ -0,0 +1,223 @@
+# File: src/deepthought/memory/ingest.py
+"""
+Batched write-behind ingestion of new memories.
+
+Writers publish ``MemoryStorePayload`` events on ``dtr.memory.store``.
+``MemoryIngestor`` reads them from a pull consumer in micro-batches (up to
+``max_batch`` events or whatever arrived within ``max_delay`` seconds),
+applies the facts of a whole batch to the memory indexes with bulk calls,
+invalidates the retrieval cache once, and publishes one
+``MemoryVersionPayload`` on ``dtr.memory.version``. The batch is acknowledged
+only after it was applied, so a crashed worker's writes are redelivered.
+
+The indexes live in each worker's process, so every worker must see every
+write: each one reads through its own durable consumer (the durable name
+plus ``worker_id``) instead of sharing one that would split the stream
+between workers. A worker started under a new id replays the stream from
+the start; consumers of workers that are gone are removed by the server
+after ``inactive_threshold`` seconds. Versions count the batches one worker
+applied and carry its ``worker_id``; observers compare them per worker.
+
+Indexes are applied in chunks of ``apply_chunk`` facts with a yield to the
+event loop in between, so retrieval handlers in the same process never wait
+behind more than one chunk of writes.
+
+Example::
+
+    ingestor = MemoryIngestor(nc, js, sinks=[bm25.add_many, vectors.add_facts], cache=cache)
+    await ingestor.start()
+    await Publisher(nc, js).publish(EventSubjects.MEMORY_STORE,
+                                    MemoryStorePayload(facts=[f"Q: {q} A: {a}"]))
+"""
+import asyncio
+import inspect
+import json
+import logging
+import os
+import re
+import socket
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Iterable, List, Optional, Sequence, Union
+from nats.aio.client import Client as NATS
+from nats.js.api import AckPolicy, ConsumerConfig
+from nats.js.client import JetStreamContext
+from nats.errors import TimeoutError as NatsTimeoutError
+
+from ..config import get_default_config
+from ..eda.events import EventSubjects, MemoryVersionPayload
+from ..eda.publisher import Publisher
+from .cache import RetrievalCache
+
+if TYPE_CHECKING:
+    from .shared_cache import SharedRetrievalCache
+
+logger = logging.getLogger(__name__)
+
+#: Bulk writer for one index, e.g. ``BM25Index.add_many`` or ``VectorRetriever.add_facts``
+Sink = Callable[[List[str]], Any]
+
+
+def _durable_token(worker_id: str) -> str:
+    """``worker_id`` with the characters durable names may not contain replaced."""
+    return re.sub(r"[^\w-]", "_", worker_id)
+
+
+def _facts_of(data: bytes) -> List[str]:
+    try:
+        facts = json.loads(data).get("facts", [])
+    except (ValueError, AttributeError, UnicodeDecodeError):
+        logger.warning("MemoryIngestor skipped an undecodable store event")
+        return []
+    return [f for f in facts if isinstance(f, str) and f]
+
+
+class MemoryIngestor:
+    """Applies ``dtr.memory.store`` events to the memory indexes in micro-batches."""
+
+    def __init__(self, nats_client: NATS, js_context: JetStreamContext, sinks: Iterable[Sink],
+                 cache: Optional[Union[RetrievalCache, "SharedRetrievalCache"]] = None, max_batch: int = 256,
+                 max_delay: float = 0.05, apply_chunk: int = 64, stream_name: Optional[str] = None,
+                 worker_id: Optional[str] = None, inactive_threshold: float = 300.0):
+        """
+        Initialize with shared NATS client and JetStream context.
+
+        Args:
+            sinks: Bulk writers called with each chunk of new facts.
+            cache: Retrieval cache invalidated once per applied batch.
+            max_batch: Store events fetched per batch.
+            max_delay: Seconds to wait for a batch to fill.
+            apply_chunk: Facts written between yields to the event loop.
+            worker_id: Names this worker's consumer and versions (default: host and pid).
+            inactive_threshold: Seconds after which the server removes the consumer
+                of a worker that stopped fetching.
+        """
+        if not nats_client or not nats_client.is_connected:
+            raise ValueError("NATS client must be connected.")
+        if not js_context:
+            raise ValueError("JetStream context must be provided.")
+        self._js = js_context
+        self._publisher = Publisher(nats_client, js_context)
+        self._sinks = list(sinks)
+        self._cache = cache
+        self._max_batch = max_batch
+        self._max_delay = max_delay
+        self._apply_chunk = apply_chunk
+        self._stream = stream_name or get_default_config().stream_name
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self._inactive_threshold = inactive_threshold
+        self._sub = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        self.version = 0
+        self.batches = 0
+        self.facts_ingested = 0
+        self.apply_seconds = 0.0
+        logger.info("MemoryIngestor initialized (JetStream enabled).")
+
+    async def apply(self, facts: Sequence[str], batch_events: int = 1) -> int:
+        """Write one batch of facts to every sink and announce the new version."""
+        facts = list(dict.fromkeys(facts))
+        if not facts:
+            return self.version
+        started = time.perf_counter()
+        for start in range(0, len(facts), self._apply_chunk):
+            chunk = facts[start:start + self._apply_chunk]
+            for sink in self._sinks:
+                sink(chunk)
+            # Let retrieval handlers run between chunks
+            await asyncio.sleep(0)
+        if self._cache is not None:
+            invalidated = self._cache.invalidate_facts(facts)
+            if inspect.isawaitable(invalidated):
+                await invalidated
+        self.version += 1
+        self.batches += 1
+        self.facts_ingested += len(facts)
+        self.apply_seconds += time.perf_counter() - started
+        payload = MemoryVersionPayload(version=self.version, facts=facts, batch_events=batch_events,
+                                       timestamp=datetime.utcnow().isoformat(), worker=self.worker_id)
+        try:
+            await self._publisher.publish(EventSubjects.MEMORY_VERSION, payload, use_jetstream=True, timeout=10.0)
+        except Exception as e:
+            # The batch is applied; redelivering it would only duplicate facts
+            logger.error(f"MemoryIngestor failed to announce version {self.version}: {e}", exc_info=True)
+        logger.debug(f"MemoryIngestor applied {len(facts)} facts from {batch_events} events "
+                     f"as version {self.version}")
+        return self.version
+
+    async def _run(self) -> None:
+        while self._running:
+            try:
+                msgs = await self._sub.fetch(self._max_batch, timeout=self._max_delay)
+            except (NatsTimeoutError, asyncio.TimeoutError):
+                continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"MemoryIngestor fetch failed: {e}", exc_info=True)
+                await asyncio.sleep(1.0)
+                continue
+            if not msgs:
+                continue
+            facts: List[str] = []
+            for msg in msgs:
+                facts.extend(_facts_of(msg.data))
+            try:
+                await self.apply(facts, batch_events=len(msgs))
+            except Exception as e:
+                # Leave the batch unacknowledged so it is redelivered
+                logger.error(f"MemoryIngestor failed to apply a batch: {e}", exc_info=True)
+                continue
+            # AckPolicy.ALL: acknowledging the last message covers the whole batch
+            await msgs[-1].ack()
+
+    async def start(self, durable_name: str = "memory_ingestor") -> bool:
+        """
+        Start consuming store events in a background task.
+
+        Args:
+            durable_name: Prefix of this worker's durable pull consumer, which is
+                suffixed with ``worker_id``. Defaults to "memory_ingestor".
+
+        Returns:
+            bool: True if the consumer was bound successfully, False otherwise.
+        """
+        durable_name = f"{durable_name}_{_durable_token(self.worker_id)}"
+        config = ConsumerConfig(durable_name=durable_name, ack_policy=AckPolicy.ALL,
+                                inactive_threshold=self._inactive_threshold)
+        try:
+            self._sub = await self._js.pull_subscribe(EventSubjects.MEMORY_STORE, durable=durable_name,
+                                                      stream=self._stream, config=config)
+        except Exception as e:
+            logger.error(f"MemoryIngestor failed to subscribe: {e}", exc_info=True)
+            return False
+        self._running = True
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"MemoryIngestor consuming '{EventSubjects.MEMORY_STORE}' with durable '{durable_name}'")
+        return True
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """
+        Stop after the batch in progress has been applied and acknowledged.
+
+        The task is cancelled if that takes longer than ``drain_timeout``
+        seconds; unacknowledged events stay with the server.
+        """
+        self._running = False
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"MemoryIngestor batch still running after {drain_timeout:.1f}s; cancelled")
+            except Exception as e:
+                logger.error(f"MemoryIngestor task failed: {e}", exc_info=True)
+            self._task = None
+        if self._sub:
+            try:
+                await self._sub.unsubscribe()
+            except Exception as e:
+                logger.warning(f"Error unsubscribing MemoryIngestor: {e}")
+            self._sub = None
+        await self._publisher.wait_idle(10.0)
+        logger.info("MemoryIngestor stopped.")
@@ -0,0 +1,34 @@
+# File: src/deepthought/memory/retriever.py
+"""
+Retrieval interface used by the memory stage.
+
+MemoryStub hands the user's input to a retriever and places the returned
+dictionary under ``retrieved_knowledge`` in the MemoryRetrieved payload. A
+retriever result always carries a ``facts`` list of strings and a ``source``
+name; backends may add their own keys (scores, entities, ...).
+"""
+import re
+from typing import Any, Awaitable, Dict, List, Protocol, Union
+
+RetrievalResult = Dict[str, Any]
+
+_TOKEN_RE = re.compile(r"[\w']+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens used by the lexical and graph backends."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class Retriever(Protocol):
+    """
+    Anything MemoryStub can ask for knowledge about a user input.
+
+    A retriever whose results only change through facts sharing a term with
+    the query sets ``lexical = True``; the retrieval cache then invalidates by
+    term instead of dropping everything on each write.
+    """
+
+    def retrieve(self, query: str, top_k: int = 10) -> Union[RetrievalResult, Awaitable[RetrievalResult]]:
+        """Return ``{"facts": [...], "source": ...}`` for ``query``."""
+        ...
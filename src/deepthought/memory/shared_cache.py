@@ -0,0 +1,377 @@
+# File: src/deepthought/memory/shared_cache.py
+"""
+Two-tier retrieval cache shared by memory-stage workers.
+
+Tier one is each worker's in-process ``RetrievalCache``. Tier two is a
+JetStream Key-Value bucket (or ``LocalKeyValue`` on a single host and in
+tests) that every worker reads and fills. Keys are hashes of the normalized
+query and ``top_k``:
+
+* ``q.<hash>`` holds a result with the query terms and the invalidation
+  revision it was computed against; the bucket TTL expires entries.
+* ``lock.<hash>`` is created by the one worker filling a missing entry; the
+  others poll for the result instead of repeating the retrieval. A lock
+  older than ``lock_timeout`` is taken over, so a crashed filler cannot
+  block a key.
+* ``inv`` receives every knowledge-base invalidation (the changed facts).
+  Each worker watches it, evicts matching local entries and remembers the
+  revision per term; shared entries computed before a relevant
+  invalidation are ignored on read.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from nats.js.api import KeyValueConfig
+from nats.js.errors import BucketNotFoundError, KeyNotFoundError, KeyWrongLastSequenceError
+from nats.js.kv import KeyValue
+
+from .cache import Compute, RetrievalCache
+from .retriever import RetrievalResult, tokenize
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_KEY = "inv"
+
+
+class _LocalWatcher:
+    def __init__(self, owner: "LocalKeyValue", prefix: str):
+        self._owner = owner
+        self._prefix = prefix
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    def matches(self, key: str) -> bool:
+        return not self._prefix or key == self._prefix or key.startswith(self._prefix + ".")
+
+    async def updates(self, timeout: float = 5.0) -> Optional[KeyValue.Entry]:
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+    async def stop(self) -> None:
+        self._owner._watchers.remove(self)
+        self._queue.put_nowait(StopAsyncIteration)
+
+    def __aiter__(self) -> "_LocalWatcher":
+        return self
+
+    async def __anext__(self) -> Optional[KeyValue.Entry]:
+        entry = await self._queue.get()
+        if entry is StopAsyncIteration:
+            raise StopAsyncIteration
+        return entry
+
+
+class LocalKeyValue:
+    """In-process stand-in for a JetStream KV bucket with the same semantics.
+
+    Supports the subset used by SharedRetrievalCache: ``get``, ``put``,
+    ``create``, ``update``, ``delete`` and ``watch`` of a key or ``key.>``.
+    """
+
+    def __init__(self, bucket: str = "local", ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self._bucket = bucket
+        self._ttl = ttl
+        self._clock = clock
+        self._data: Dict[str, Tuple[bytes, int, float]] = {}
+        self._revision = 0
+        self._watchers: List[_LocalWatcher] = []
+
+    def _live(self, key: str) -> Optional[Tuple[bytes, int, float]]:
+        item = self._data.get(key)
+        if item is not None and self._ttl and item[2] + self._ttl <= self._clock():
+            del self._data[key]
+            return None
+        return item
+
+    def _entry(self, key: str, value: Optional[bytes], revision: int, op: Optional[str] = None) -> KeyValue.Entry:
+        return KeyValue.Entry(bucket=self._bucket, key=key, value=value, revision=revision,
+                              delta=0, created=None, operation=op)
+
+    def _store(self, key: str, value: bytes) -> int:
+        self._revision += 1
+        self._data[key] = (value, self._revision, self._clock())
+        entry = self._entry(key, value, self._revision)
+        for watcher in self._watchers:
+            if watcher.matches(key):
+                watcher._queue.put_nowait(entry)
+        return self._revision
+
+    async def get(self, key: str) -> KeyValue.Entry:
+        item = self._live(key)
+        if item is None:
+            raise KeyNotFoundError()
+        return self._entry(key, item[0], item[1])
+
+    async def put(self, key: str, value: bytes) -> int:
+        return self._store(key, value)
+
+    async def create(self, key: str, value: bytes) -> int:
+        if self._live(key) is not None:
+            raise KeyWrongLastSequenceError(description=f"key {key} exists")
+        return self._store(key, value)
+
+    async def update(self, key: str, value: bytes, last: Optional[int] = None) -> int:
+        item = self._live(key)
+        if (item[1] if item else 0) != (last or 0):
+            raise KeyWrongLastSequenceError(description=f"wrong last sequence for {key}")
+        return self._store(key, value)
+
+    async def delete(self, key: str, last: Optional[int] = None) -> bool:
+        self._data.pop(key, None)
+        self._revision += 1
+        entry = self._entry(key, None, self._revision, "DEL")
+        for watcher in self._watchers:
+            if watcher.matches(key):
+                watcher._queue.put_nowait(entry)
+        return True
+
+    async def watch(self, keys: str) -> _LocalWatcher:
+        watcher = _LocalWatcher(self, "" if keys == ">" else keys[:-2] if keys.endswith(".>") else keys)
+        # Like JetStream: current values first, then a None marker
+        for key in sorted(self._data):
+            item = self._live(key)
+            if item is not None and watcher.matches(key):
+                watcher._queue.put_nowait(self._entry(key, item[0], item[1]))
+        watcher._queue.put_nowait(None)
+        self._watchers.append(watcher)
+        return watcher
+
+
+async def open_cache_bucket(js_context, bucket: str = "dtr_retrieval_cache", ttl: float = 300.0) -> KeyValue:
+    """Bind to the shared cache bucket, creating it with ``ttl`` if needed."""
+    try:
+        return await js_context.key_value(bucket)
+    except BucketNotFoundError:
+        logger.info(f"Creating retrieval cache bucket '{bucket}' (ttl={ttl}s)")
+        return await js_context.create_key_value(KeyValueConfig(bucket=bucket, ttl=ttl, history=1))
+
+
+class SharedRetrievalCache:
+    """Local LRU in front of a KV bucket shared by all memory-stage workers."""
+
+    def __init__(self, kv, local: Optional[RetrievalCache] = None, fill_timeout: float = 2.0,
+                 lock_timeout: float = 10.0, worker_id: Optional[str] = None,
+                 max_tracked_terms: int = 100_000):
+        """
+        Args:
+            kv: JetStream KeyValue bucket (see ``open_cache_bucket``) or LocalKeyValue.
+            local: In-process tier; a default RetrievalCache when omitted.
+            fill_timeout: Seconds to wait for another worker's fill before computing.
+            lock_timeout: Age after which a fill lock is considered abandoned.
+        """
+        self._kv = kv
+        self.local = local or RetrievalCache()
+        self._fill_timeout = fill_timeout
+        self._lock_timeout = lock_timeout
+        self._worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self._max_tracked_terms = max_tracked_terms
+        self._term_revisions: Dict[str, int] = {}
+        self._floor = 0
+        self._seen_revision = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._watcher = None
+        self._task: Optional[asyncio.Task] = None
+        self.requests = 0
+        self.shared_hits = 0
+        self.fills = 0
+        self.waits = 0
+        self.stale = 0
+
+    @property
+    def version(self) -> int:
+        return self.local.version
+
+    @property
+    def lexical(self) -> bool:
+        """See ``RetrievalCache``; when False every invalidation drops all shared entries too."""
+        return self.local.lexical
+
+    @lexical.setter
+    def lexical(self, value: bool) -> None:
+        self.local.lexical = value
+
+    @staticmethod
+    def key_hash(query: str, top_k: int) -> str:
+        normalized = RetrievalCache.normalize(query)
+        return hashlib.blake2b(f"{top_k}|{normalized}".encode(), digest_size=16).hexdigest()
+
+    async def start(self) -> None:
+        """Start following invalidations published by other workers."""
+        self._watcher = await self._kv.watch(INVALIDATION_KEY)
+        self._task = asyncio.create_task(self._follow())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watcher:
+            try:
+                await self._watcher.stop()
+            except Exception as e:
+                logger.warning(f"Error stopping cache invalidation watcher: {e}")
+            self._watcher = None
+
+    async def _follow(self) -> None:
+        async for entry in self._watcher:
+            if entry is None or not entry.value or entry.operation:
+                continue
+            try:
+                facts = json.loads(entry.value)["facts"]
+            except (ValueError, KeyError, TypeError):
+                logger.warning(f"Ignoring malformed cache invalidation at revision {entry.revision}")
+                continue
+            self._apply_invalidation(facts, entry.revision)
+
+    def _apply_invalidation(self, facts: Iterable[str], revision: int) -> None:
+        if revision <= self._seen_revision:
+            return
+        facts = list(facts)
+        self._seen_revision = revision
+        self.local.invalidate_facts(facts)
+        if not self.lexical:
+            self._term_revisions.clear()
+            self._floor = revision
+            return
+        for fact in facts:
+            for term in tokenize(fact):
+                self._term_revisions[term] = revision
+        if len(self._term_revisions) > self._max_tracked_terms:
+            self._term_revisions.clear()
+            self._floor = revision
+
+    async def invalidate_facts(self, facts: Iterable[str]) -> None:
+        """Publish an invalidation to every worker (and apply it here right away)."""
+        facts = list(facts)
+        revision = await self._kv.put(INVALIDATION_KEY, json.dumps({"facts": facts}).encode())
+        self._apply_invalidation(facts, revision)
+
+    async def _read(self, key: str) -> Optional[RetrievalResult]:
+        try:
+            entry = await self._kv.get(f"q.{key}")
+        except KeyNotFoundError:
+            return None
+        if not entry.value:
+            return None
+        record = json.loads(entry.value)
+        revision = record["revision"]
+        if revision < self._floor or any(self._term_revisions.get(t, 0) > revision for t in record["terms"]):
+            self.stale += 1
+            return None
+        return record["value"]
+
+    async def _acquire(self, key: str) -> bool:
+        lock_key = f"lock.{key}"
+        claim = json.dumps({"worker": self._worker_id, "at": time.time()}).encode()
+        try:
+            await self._kv.create(lock_key, claim)
+            return True
+        except KeyWrongLastSequenceError:
+            pass
+        try:
+            entry = await self._kv.get(lock_key)
+        except KeyNotFoundError:
+            return False
+        if time.time() - json.loads(entry.value)["at"] < self._lock_timeout:
+            return False
+        try:
+            await self._kv.update(lock_key, claim, last=entry.revision)
+            logger.warning(f"Took over abandoned cache fill lock for {key}")
+            return True
+        except KeyWrongLastSequenceError:
+            return False
+
+    async def _fill(self, query: str, top_k: int, key: str, compute: Compute) -> RetrievalResult:
+        local = self.local
+        version, revision = local.version, self._seen_revision
+        value = await self._read(key)
+        if value is not None:
+            self.shared_hits += 1
+            local.put(query, top_k, value, version)
+            return value
+        deadline = time.monotonic() + self._fill_timeout
+        backoff, locked = 0.002, False
+        while not locked:
+            locked = await self._acquire(key)
+            if locked:
+                break
+            self.waits += 1
+            value = await self._read(key)
+            if value is not None:
+                self.shared_hits += 1
+                local.put(query, top_k, value, version)
+                return value
+            if time.monotonic() >= deadline:
+                logger.warning(f"Cache fill for {key} still running elsewhere; computing locally")
+                break
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 0.05)
+        try:
+            # The previous lock holder may have filled the key just before releasing it
+            value = await self._read(key) if locked else None
+            if value is not None:
+                self.shared_hits += 1
+                local.put(query, top_k, value, version)
+                return value
+            started = time.perf_counter()
+            value = await compute()
+            self.fills += 1
+            if local.put(query, top_k, value, version, cost=time.perf_counter() - started):
+                record = {"value": value, "terms": sorted(set(tokenize(query))), "revision": revision}
+                await self._kv.put(f"q.{key}", json.dumps(record).encode())
+            return value
+        finally:
+            if locked:
+                try:
+                    await self._kv.delete(f"lock.{key}")
+                except Exception as e:
+                    logger.warning(f"Failed to release cache fill lock for {key}: {e}")
+
+    async def get_or_compute(self, query: str, top_k: int, compute: Compute) -> RetrievalResult:
+        """Local hit, else shared hit, else one fill across all workers."""
+        self.requests += 1
+        cached = self.local.get(query, top_k)
+        if cached is not None:
+            return cached
+        key = self.key_hash(query, top_k)
+        while key in self._inflight:
+            inflight = self._inflight[key]
+            try:
+                return dict(await asyncio.shield(inflight))
+            except asyncio.CancelledError:
+                # A cancelled filler hands the fill to the next waiter
+                if not inflight.cancelled():
+                    raise
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._fill(query, top_k, key, compute)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        local_hits = self.local.hits
+        return {
+            "requests": self.requests,
+            "local_hits": local_hits,
+            "shared_hits": self.shared_hits,
+            "hit_rate": (local_hits + self.shared_hits) / self.requests if self.requests else 0.0,
+            "fills": self.fills,
+            "waits": self.waits,
+            "stale": self.stale,
+            "invalidation_revision": self._seen_revision,
+        }
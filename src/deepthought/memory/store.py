@@ -0,0 +1,282 @@
+# File: src/deepthought/memory/store.py
+"""
+Memory-mapped persistent knowledge store.
+
+A store is a single file holding the fact list, the knowledge graph and the
+embedding index as raw little-endian arrays::
+
+    b"DTKSTOR1" | uint64 header length | JSON header | 64-byte aligned arrays
+
+The JSON header only names each array with its dtype, shape and offset.
+Opening a store maps the file read-only and wraps every array with
+``np.frombuffer``, so nothing is parsed or copied and start-up time does not
+depend on the store size. Pages are faulted in on first use and, being
+read-only file mappings, are shared by every worker process on the host.
+
+Strings (facts, entity and relation names) are stored as one UTF-8 blob plus
+an offsets array and decoded on access. Entity lookup by name uses a sorted
+permutation of the names and a binary search instead of a hash table.
+
+Objects built from a store (``graph()``, ``vector_retriever()``) still accept
+writes: new data goes to regular in-memory buffers and the mapped arrays are
+copied only when a structure is rebuilt.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .graph import KnowledgeGraph, _CSR
+from .vector_index import Embedder, FlatIndex, IVFIndex, VectorRetriever
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"DTKSTOR1"
+_PREFIX = struct.Struct("<8sQ")
+_ALIGN = 64
+
+
+class StringTable(Sequence[str]):
+    """Read-only list of strings backed by a UTF-8 blob and an offsets array."""
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray):
+        self._offsets = offsets
+        self._blob = blob
+
+    @classmethod
+    def encode(cls, strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        encoded = [s.encode() for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("StringTable index out of range")
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        return self._blob[start:end].tobytes().decode()
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+class _MappedInterner:
+    """Name interner over a StringTable; names added later live in memory."""
+
+    def __init__(self, base: StringTable, order: np.ndarray):
+        self._base = base
+        # Ids sorted by lower-cased name, for binary search
+        self._order = order
+        self._ids: Dict[str, int] = {}
+        self._extra: List[str] = []
+
+    @property
+    def names(self) -> "_MappedInterner":
+        return self
+
+    def __len__(self) -> int:
+        return len(self._base) + len(self._extra)
+
+    def __getitem__(self, index: int) -> str:
+        base = len(self._base)
+        return self._base[index] if index < base else self._extra[index - base]
+
+    def _find(self, key: str) -> Optional[int]:
+        lo, hi = 0, len(self._order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._base[int(self._order[mid])].lower() < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._order):
+            idx = int(self._order[lo])
+            if self._base[idx].lower() == key:
+                return idx
+        return None
+
+    def get(self, name: str) -> Optional[int]:
+        key = name.lower()
+        idx = self._ids.get(key)
+        return idx if idx is not None else self._find(key)
+
+    def intern(self, name: str) -> int:
+        idx = self.get(name)
+        if idx is None:
+            idx = len(self)
+            self._ids[name.lower()] = idx
+            self._extra.append(name)
+        return idx
+
+
+def _name_order(names: Sequence[str]) -> np.ndarray:
+    return np.asarray(sorted(range(len(names)), key=lambda i: names[i].lower()), dtype=np.int32)
+
+
+class KnowledgeStore:
+    """Read-only, memory-mapped snapshot of the memory backends."""
+
+    def __init__(self, path: str):
+        """Map the store at ``path``; only the JSON header is parsed."""
+        self.path = path
+        self._fd = open(path, "rb")
+        self._map = mmap.mmap(self._fd.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_len = _PREFIX.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a knowledge store.")
+        header = json.loads(self._map[_PREFIX.size:_PREFIX.size + header_len])
+        self.meta: Dict = header["meta"]
+        self._arrays: Dict[str, np.ndarray] = {}
+        for name, spec in header["arrays"].items():
+            count = int(np.prod(spec["shape"])) if spec["shape"] else 1
+            array = np.frombuffer(self._map, dtype=np.dtype(spec["dtype"]), count=count, offset=spec["offset"])
+            self._arrays[name] = array.reshape(spec["shape"])
+        logger.debug(f"KnowledgeStore mapped {len(self._arrays)} arrays from {path}")
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._arrays
+
+    def array(self, name: str) -> np.ndarray:
+        return self._arrays[name]
+
+    def _strings(self, prefix: str) -> StringTable:
+        return StringTable(self._arrays[f"{prefix}.offsets"], self._arrays[f"{prefix}.blob"])
+
+    @property
+    def facts(self) -> Optional[StringTable]:
+        return self._strings("facts") if "facts.offsets" in self._arrays else None
+
+    def graph(self, merge_threshold: int = 65536) -> Optional[KnowledgeGraph]:
+        """A KnowledgeGraph whose adjacency and names are the mapped arrays."""
+        if "graph.out.indptr" not in self._arrays:
+            return None
+        graph = KnowledgeGraph(merge_threshold=merge_threshold)
+        graph.nodes = _MappedInterner(self._strings("graph.nodes"), self._arrays["graph.nodes.order"])
+        graph.relations = _MappedInterner(self._strings("graph.relations"),
+                                          self._arrays["graph.relations.order"])
+        for direction in ("out", "in"):
+            csr = _CSR()
+            csr.indptr = self._arrays[f"graph.{direction}.indptr"]
+            csr.targets = self._arrays[f"graph.{direction}.targets"]
+            csr.labels = self._arrays[f"graph.{direction}.labels"]
+            setattr(graph, f"_{direction}", csr)
+        return graph
+
+    def vector_retriever(self, embedder: Optional[Embedder] = None) -> Optional[VectorRetriever]:
+        """A VectorRetriever over the mapped embedding index and the stored facts."""
+        kind = self.meta.get("vector_index")
+        if kind is None:
+            return None
+        arrays = self._arrays
+        if kind == "flat":
+            index = FlatIndex(int(self.meta["vector_dim"]), initial_capacity=0)
+            index._vectors = arrays["vectors.flat"]
+            index._size = len(index._vectors)
+        else:
+            index = IVFIndex(int(self.meta["vector_dim"]), nlist=int(self.meta["ivf_nlist"]),
+                             nprobe=int(self.meta["ivf_nprobe"]))
+            index.centroids = arrays["vectors.centroids"]
+            index._codes, index._scales = arrays["vectors.codes"], arrays["vectors.scales"]
+            index._lists, index._ids = arrays["vectors.lists"], arrays["vectors.ids"]
+            index._offsets = arrays["vectors.offsets"]
+            index._size = index._sorted = len(index._ids)
+        retriever = VectorRetriever(index, embedder)
+        retriever.facts = self._strings("vectors.facts")
+        return retriever
+
+    def close(self) -> None:
+        """Drop this store's references to the mapping.
+
+        The file stays mapped until every array and object built from the store
+        has been released.
+        """
+        self._arrays = {}
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+        self._fd.close()
+
+    def __enter__(self) -> "KnowledgeStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @staticmethod
+    def write(path: str, facts: Optional[Sequence[str]] = None, graph: Optional[KnowledgeGraph] = None,
+              vectors: Optional[VectorRetriever] = None, meta: Optional[Dict] = None) -> None:
+        """Write a store atomically (temp file + rename)."""
+        arrays: Dict[str, np.ndarray] = {}
+        meta = dict(meta or {})
+
+        def add_strings(prefix: str, strings: Sequence[str]) -> None:
+            arrays[f"{prefix}.offsets"], arrays[f"{prefix}.blob"] = StringTable.encode(strings)
+
+        if facts is not None:
+            add_strings("facts", facts)
+        if graph is not None:
+            graph.merge()
+            for prefix, interner in (("graph.nodes", graph.nodes), ("graph.relations", graph.relations)):
+                names = [interner.names[i] for i in range(len(interner))]
+                add_strings(prefix, names)
+                arrays[f"{prefix}.order"] = _name_order(names)
+            for direction, csr in (("out", graph._out), ("in", graph._in)):
+                # CSR rows must cover nodes interned without edges too
+                indptr = np.concatenate((csr.indptr, np.full(len(graph.nodes) - csr.num_nodes, csr.indptr[-1])))
+                arrays[f"graph.{direction}.indptr"] = indptr.astype(np.int64)
+                arrays[f"graph.{direction}.targets"] = csr.targets
+                arrays[f"graph.{direction}.labels"] = csr.labels
+        if vectors is not None:
+            index = vectors.active_index
+            meta["vector_dim"] = index.dim
+            add_strings("vectors.facts", vectors.facts)
+            if isinstance(index, FlatIndex):
+                meta["vector_index"] = "flat"
+                arrays["vectors.flat"] = index._vectors[:len(index)]
+            else:
+                if index.tail:
+                    index.regroup()
+                meta.update(vector_index="ivf", ivf_nlist=index.nlist, ivf_nprobe=index.nprobe)
+                arrays["vectors.centroids"] = index.centroids
+                rows = len(index)
+                arrays["vectors.codes"], arrays["vectors.scales"] = index._codes[:rows], index._scales[:rows]
+                arrays["vectors.lists"], arrays["vectors.ids"] = index._lists[:rows], index._ids[:rows]
+                arrays["vectors.offsets"] = np.asarray(index._offsets, dtype=np.int64)
+
+        specs, offset = {}, 0
+        for name, array in arrays.items():
+            offset = -(-offset // _ALIGN) * _ALIGN
+            specs[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+            offset += array.nbytes
+        header = {"meta": meta, "arrays": specs}
+        # Offsets in the header are relative to the data start; fix them up once its size is known
+        encoded = json.dumps(header).encode()
+        data_start = -(-(_PREFIX.size + len(encoded) + 24 * len(specs) + 64) // _ALIGN) * _ALIGN
+        for spec in specs.values():
+            spec["offset"] += data_start
+        encoded = json.dumps(header).encode()
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_PREFIX.pack(MAGIC, len(encoded)))
+            f.write(encoded)
+            for name, array in arrays.items():
+                f.seek(specs[name]["offset"])
+                f.write(np.ascontiguousarray(array).data)
+            f.truncate(data_start + offset)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        logger.info(f"KnowledgeStore wrote {len(arrays)} arrays ({offset} bytes) to {path}")
@@ -0,0 +1,194 @@
+# File: src/deepthought/memory/traversal.py
+"""
+Budgeted multi-hop expansion over the knowledge graph.
+
+Expansion is best-first from the entities matched in the query. A node's
+score is the best path score reaching it: every hop multiplies by ``decay``
+and by ``1 / log2(2 + degree)`` of the node reached, so paths through hubs
+fade quickly. Work per query is bounded independently of graph size:
+
+* ``max_nodes`` caps the nodes discovered, ``max_edges`` the candidate edges
+  considered, ``max_seconds`` the wall time and ``max_hops`` the depth;
+* a node contributes at most ``max_fanout`` neighbors, picked from at most
+  ``max_scan`` of its edges;
+* hubs can have precomputed ``NeighborSummaries`` (their best ``top_n``
+  neighbors), which are used instead of scanning their adjacency at all.
+
+The result is a ranked subgraph that serializes to plain JSON for
+``retrieved_knowledge``.
+"""
+import heapq
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .graph import KnowledgeGraph
+from .retriever import RetrievalResult
+
+logger = logging.getLogger(__name__)
+
+#: ``(targets, relations, outgoing, weights)`` arrays describing a node's chosen neighbors
+Neighborhood = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+@dataclass
+class TraversalBudget:
+    """Per-query limits on graph expansion."""
+    max_hops: int = 2
+    max_nodes: int = 200
+    max_edges: int = 5000
+    max_seconds: float = 0.01
+    #: Neighbors kept per expanded node
+    max_fanout: int = 32
+    #: Edges read per expanded node when it has no summary
+    max_scan: int = 4096
+
+
+@dataclass
+class Subgraph:
+    """Ranked traversal result."""
+    seeds: List[int]
+    nodes: Dict[int, Tuple[float, int]] = field(default_factory=dict)
+    #: ``(source, relation, target)`` -> best path score through the edge
+    edges: Dict[Tuple[int, int, int], float] = field(default_factory=dict)
+    edges_scanned: int = 0
+    elapsed: float = 0.0
+    #: Which budget stopped the traversal early, if any
+    exhausted: Optional[str] = None
+
+    def to_dict(self, graph: KnowledgeGraph, max_edges: Optional[int] = None) -> Dict[str, Any]:
+        names, rels = graph.nodes.names, graph.relations.names
+        ranked = sorted(self.nodes.items(), key=lambda item: -item[1][0])
+        edges = sorted(self.edges.items(), key=lambda item: -item[1])[:max_edges]
+        return {
+            "nodes": [{"name": names[n], "score": round(s, 6), "hops": h} for n, (s, h) in ranked],
+            "edges": [{"source": names[s], "relation": rels[r], "target": names[t], "score": round(w, 6)}
+                      for (s, r, t), w in edges],
+            "edges_scanned": self.edges_scanned,
+            "elapsed_ms": round(self.elapsed * 1e3, 3),
+            "exhausted": self.exhausted,
+        }
+
+
+def _weights(graph: KnowledgeGraph, targets: np.ndarray) -> np.ndarray:
+    return 1.0 / np.log2(2.0 + graph.degrees(targets))
+
+
+class NeighborSummaries:
+    """Precomputed best neighbors of high-degree nodes.
+
+    Summaries reflect the graph when they were built; rebuild them after
+    large ingestions or compaction.
+    """
+
+    def __init__(self, graph: KnowledgeGraph, min_degree: int = 256, top_n: int = 32):
+        self.min_degree = min_degree
+        self.top_n = top_n
+        self._rows: Dict[int, Neighborhood] = {}
+        degrees = graph.degrees(np.arange(graph.num_nodes))
+        for node in np.nonzero(degrees >= min_degree)[0].tolist():
+            self._rows[node] = _best_neighbors(graph, node, top_n, max_scan=None)
+        logger.info(f"NeighborSummaries built for {len(self._rows)} nodes with degree >= {min_degree}")
+
+    def __contains__(self, node: int) -> bool:
+        return node in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, node: int) -> Optional[Neighborhood]:
+        return self._rows.get(node)
+
+
+def _best_neighbors(graph: KnowledgeGraph, node: int, fanout: int, max_scan: Optional[int]) -> Neighborhood:
+    out_t, out_l = graph.neighbors(node, outgoing=True)
+    in_t, in_l = graph.neighbors(node, outgoing=False)
+    if max_scan is not None:
+        out_t, out_l = out_t[:max_scan], out_l[:max_scan]
+        in_t, in_l = in_t[:max(max_scan - len(out_t), 0)], in_l[:max(max_scan - len(out_t), 0)]
+    targets = np.concatenate((out_t, in_t)).astype(np.int64)
+    labels = np.concatenate((out_l, in_l))
+    outgoing = np.concatenate((np.ones(len(out_t), bool), np.zeros(len(in_t), bool)))
+    weights = _weights(graph, targets)
+    if len(targets) > fanout:
+        keep = np.argpartition(-weights, fanout - 1)[:fanout]
+        targets, labels, outgoing, weights = targets[keep], labels[keep], outgoing[keep], weights[keep]
+    return targets, labels, outgoing, weights
+
+
+class GraphTraversal:
+    """Best-first k-hop expansion under a TraversalBudget."""
+
+    def __init__(self, graph: KnowledgeGraph, budget: Optional[TraversalBudget] = None,
+                 summaries: Optional[NeighborSummaries] = None, decay: float = 0.5):
+        self._graph = graph
+        self.budget = budget or TraversalBudget()
+        self._summaries = summaries
+        self._decay = decay
+
+    def _neighborhood(self, node: int) -> Neighborhood:
+        if self._summaries is not None:
+            summary = self._summaries.get(node)
+            if summary is not None:
+                return summary
+        return _best_neighbors(self._graph, node, self.budget.max_fanout, self.budget.max_scan)
+
+    def traverse(self, seeds: List[int], budget: Optional[TraversalBudget] = None) -> Subgraph:
+        budget = budget or self.budget
+        started = time.perf_counter()
+        deadline = started + budget.max_seconds
+        result = Subgraph(seeds=list(seeds))
+        heap: List[Tuple[float, int, int]] = []
+        for seed in seeds:
+            result.nodes[seed] = (1.0, 0)
+            heap.append((-1.0, seed, 0))
+        heapq.heapify(heap)
+        expanded = set()
+        while heap:
+            if time.perf_counter() > deadline:
+                result.exhausted = "time"
+                break
+            neg_score, node, hops = heapq.heappop(heap)
+            if node in expanded or hops >= budget.max_hops:
+                continue
+            expanded.add(node)
+            targets, labels, outgoing, weights = self._neighborhood(node)
+            result.edges_scanned += len(targets)
+            scores = -neg_score * self._decay * weights
+            for t, r, out, s in zip(targets.tolist(), labels.tolist(), outgoing.tolist(), scores.tolist()):
+                known = result.nodes.get(t)
+                if known is None and len(result.nodes) >= budget.max_nodes:
+                    result.exhausted = "nodes"
+                    continue
+                edge = (node, r, t) if out else (t, r, node)
+                if s > result.edges.get(edge, 0.0):
+                    result.edges[edge] = s
+                if known is None or s > known[0]:
+                    result.nodes[t] = (s, hops + 1)
+                    heapq.heappush(heap, (-s, t, hops + 1))
+            if result.edges_scanned >= budget.max_edges:
+                result.exhausted = "edges"
+                break
+        result.elapsed = time.perf_counter() - started
+        return result
+
+
+class TraversalRetriever:
+    """Retriever answering with the ranked multi-hop neighborhood of matched entities."""
+
+    def __init__(self, graph: KnowledgeGraph, budget: Optional[TraversalBudget] = None,
+                 summaries: Optional[NeighborSummaries] = None, decay: float = 0.5):
+        self._graph = graph
+        self._traversal = GraphTraversal(graph, budget, summaries, decay)
+
+    def retrieve(self, query: str, top_k: int = 10) -> RetrievalResult:
+        seeds = self._graph.match_entities(query)
+        subgraph = self._traversal.traverse(seeds)
+        serialized = subgraph.to_dict(self._graph, max_edges=max(top_k * 4, top_k))
+        facts = [f"{e['source']} {e['relation']} {e['target']}" for e in serialized["edges"][:top_k]]
+        names = self._graph.nodes.names
+        return {"facts": facts, "entities": [names[n] for n in seeds], "subgraph": serialized,
+                "source": "knowledge_graph"}
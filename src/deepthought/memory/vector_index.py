@@ -0,0 +1,367 @@
+# File: src/deepthought/memory/vector_index.py
+"""
+Embedding similarity search for memory retrieval.
+
+Two indexes share one interface (``add`` / ``search``):
+
+* ``FlatIndex`` keeps float32 embeddings in one contiguous matrix and scores
+  a batch of queries with a single matrix product followed by a partial
+  top-k selection.
+* ``IVFIndex`` clusters the embeddings with spherical k-means, stores them as
+  int8 codes with one float scale per vector (about a quarter of the
+  float32 memory), and only scores the ``nprobe`` clusters closest to each
+  query. Codes are kept grouped by cluster; vectors added since the last
+  regrouping form an unsorted tail that queries filter by cluster, so
+  inserts never force a regroup on the query path; ``MemoryCompactor``
+  regroups in the background once the tail grows. Inserts append to
+  capacity-doubling buffers.
+
+Embeddings are L2-normalised on insert, so scores are cosine similarities.
+``HashingEmbedder`` is a dependency-free embedder based on feature hashing
+for tests and deployments without a sentence-embedding model; any callable
+mapping a list of strings to a ``(n, dim)`` array can be used instead.
+"""
+import hashlib
+import logging
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .retriever import RetrievalResult, tokenize
+
+logger = logging.getLogger(__name__)
+
+Embedder = Callable[[Sequence[str]], np.ndarray]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Row-wise top-k of a 2D score matrix, best first."""
+    n = scores.shape[1]
+    if n == 0:
+        return np.zeros((len(scores), 0), np.float32), np.zeros((len(scores), 0), np.int64)
+    k = min(k, n)
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k < n else np.tile(np.arange(n), (len(scores), 1))
+    part = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-part, axis=1)
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(idx, order, axis=1)
+
+
+class HashingEmbedder:
+    """Embeds text by hashing word unigrams and bigrams into ``dim`` signed buckets."""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _bucket(self, feature: str) -> Tuple[int, float]:
+        h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+        return h % self.dim, 1.0 if (h >> 63) & 1 else -1.0
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                col, sign = self._bucket(feature)
+                out[row, col] += sign
+        return _normalize(out)
+
+
+class FlatIndex:
+    """Exact inner-product search over a contiguous float32 matrix."""
+
+    def __init__(self, dim: int, initial_capacity: int = 1024):
+        self.dim = dim
+        self._vectors = np.zeros((initial_capacity, dim), dtype=np.float32)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return self._size * self.dim * 4
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """Append vectors and return their ids."""
+        vectors = _normalize(vectors)
+        needed = self._size + len(vectors)
+        if needed > len(self._vectors):
+            grown = np.zeros((max(needed, 2 * len(self._vectors)), self.dim), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+        self._vectors[self._size:needed] = vectors
+        ids = np.arange(self._size, needed)
+        self._size = needed
+        return ids
+
+    def search(self, queries: np.ndarray, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(scores, ids)`` of shape ``(len(queries), k)``, best first."""
+        scores = _normalize(queries) @ self._vectors[:self._size].T
+        return _top_k(scores, k)
+
+    def prefix(self, count: int) -> "FlatIndex":
+        """Read-only index over the first ``count`` vectors, sharing their rows."""
+        frozen = FlatIndex(self.dim, initial_capacity=0)
+        # Rows below the size are never rewritten, and growing allocates a new matrix
+        frozen._vectors = self._vectors[:count]
+        frozen._size = count
+        return frozen
+
+
+class IVFReorder(NamedTuple):
+    """Cluster-grouped copy of an IVFIndex prefix built by ``IVFIndex.build_reorder``."""
+    codes: np.ndarray
+    scales: np.ndarray
+    lists: np.ndarray
+    ids: np.ndarray
+    offsets: np.ndarray
+    count: int
+    #: ``_sorted`` of the index when the reorder was built
+    base: int
+
+
+class IVFIndex:
+    """Inverted-file index over int8-quantised vectors."""
+
+    def __init__(self, dim: int, nlist: int = 256, nprobe: int = 8, seed: int = 0):
+        """
+        Args:
+            nlist: Number of k-means clusters.
+            nprobe: Clusters scanned per query; higher is slower and more accurate.
+        """
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._rng = np.random.default_rng(seed)
+        self.centroids: Optional[np.ndarray] = None
+        self._codes = np.zeros((0, dim), dtype=np.int8)
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._lists = np.zeros(0, dtype=np.int32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        #: Filled rows of the buffers above; the rest is spare capacity
+        self._size = 0
+        #: Vectors grouped by cluster; the rest is the unsorted tail
+        self._sorted = 0
+        self._offsets = np.zeros(nlist + 1, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def nbytes(self) -> int:
+        return self._size * (self.dim + self._scales.itemsize + self._lists.itemsize + self._ids.itemsize)
+
+    def train(self, sample: np.ndarray, iterations: int = 10) -> None:
+        """Learn cluster centroids from a sample of vectors with spherical k-means."""
+        sample = _normalize(sample)
+        if len(sample) < self.nlist:
+            raise ValueError(f"Need at least nlist={self.nlist} training vectors, got {len(sample)}.")
+        centroids = sample[self._rng.choice(len(sample), self.nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(assign, kind="stable")
+            counts = np.bincount(assign, minlength=self.nlist)
+            empty = counts == 0
+            sums = np.zeros_like(centroids)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[~empty]
+            sums[~empty] = np.add.reduceat(sample[order], starts, axis=0)
+            # Re-seed empty clusters from random points so every list is used
+            sums[empty] = sample[self._rng.choice(len(sample), int(empty.sum()))]
+            centroids = _normalize(sums)
+        self.centroids = centroids
+        logger.debug(f"IVFIndex trained {self.nlist} centroids on {len(sample)} vectors")
+
+    @staticmethod
+    def _quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def _reserve(self, size: int) -> None:
+        """Grow the buffers to hold ``size`` vectors, doubling so appends stay amortised O(1)."""
+        if size <= len(self._scales):
+            return
+        capacity = max(size, 2 * len(self._scales))
+        for name in ("_codes", "_scales", "_lists", "_ids"):
+            old = getattr(self, name)
+            grown = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            grown[:self._size] = old[:self._size]
+            setattr(self, name, grown)
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """Quantise, assign and append vectors; returns their ids."""
+        if not self.is_trained:
+            raise RuntimeError("IVFIndex must be trained before adding vectors.")
+        vectors = _normalize(vectors)
+        start, end = self._size, self._size + len(vectors)
+        self._reserve(end)
+        self._codes[start:end], self._scales[start:end] = self._quantize(vectors)
+        self._lists[start:end] = np.argmax(vectors @ self.centroids.T, axis=1)
+        self._ids[start:end] = np.arange(start, end)
+        # Rows below the fill count are complete; readers in other threads rely on it
+        self._size = end
+        return np.arange(start, end)
+
+    @property
+    def tail(self) -> int:
+        """Vectors not yet grouped by cluster."""
+        return len(self) - self._sorted
+
+    def build_reorder(self) -> "IVFReorder":
+        """
+        Group all current vectors by cluster.
+
+        Only reads the index, so it may run in a worker thread while vectors
+        keep being added; ``install_reorder`` then swaps the result in.
+        """
+        base = self._sorted
+        # Read the fill count first: every buffer read afterwards has those rows
+        count = self._size
+        lists = self._lists[:count]
+        # Group codes by cluster once so a probe reads one contiguous block
+        order = np.argsort(lists, kind="stable")
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(lists, minlength=self.nlist))))
+        return IVFReorder(self._codes[:count][order], self._scales[:count][order], lists[order],
+                          self._ids[:count][order], offsets, count, base)
+
+    def install_reorder(self, reorder: "IVFReorder") -> bool:
+        """Swap in a built reorder; False if the index was regrouped in the meantime."""
+        if reorder.base != self._sorted:
+            return False
+        count = reorder.count
+        # Fresh buffers rather than rewriting rows that searches may be reading
+        for name, grouped in zip(("_codes", "_scales", "_lists", "_ids"), reorder[:4]):
+            old = getattr(self, name)
+            new = np.zeros(old.shape, dtype=old.dtype)
+            new[:count] = grouped
+            new[count:self._size] = old[count:self._size]
+            setattr(self, name, new)
+        self._offsets = reorder.offsets
+        self._sorted = count
+        return True
+
+    def regroup(self) -> None:
+        """Group the tail by cluster now, on the calling thread."""
+        self.install_reorder(self.build_reorder())
+
+    def prefix(self, count: int) -> "IVFIndex":
+        """Cluster-grouped copy holding the vectors with ids below ``count``."""
+        frozen = IVFIndex(self.dim, nlist=self.nlist, nprobe=self.nprobe)
+        frozen.centroids = self.centroids
+        rows = len(self)
+        keep = np.nonzero(self._ids[:rows] < count)[0]
+        frozen._codes, frozen._scales = self._codes[keep], self._scales[keep]
+        frozen._lists, frozen._ids = self._lists[keep], self._ids[keep]
+        frozen._size = len(keep)
+        frozen.regroup()
+        return frozen
+
+    def search(self, queries: np.ndarray, k: int = 10,
+               nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(scores, ids)`` of shape ``(len(queries), k)``, best first (-1 pads)."""
+        queries = _normalize(queries)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        out_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        out_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        tail_lists = self._lists[self._sorted:self._size]
+        for row, query in enumerate(queries):
+            blocks = [np.arange(self._offsets[c], self._offsets[c + 1]) for c in probes[row]]
+            if len(tail_lists):
+                blocks.append(self._sorted + np.nonzero(np.isin(tail_lists, probes[row]))[0])
+            positions = np.concatenate(blocks) if blocks else np.zeros(0, np.int64)
+            if not len(positions):
+                continue
+            scores = (self._codes[positions] @ query) * self._scales[positions]
+            top_scores, top = _top_k(scores[None, :], k)
+            n = top.shape[1]
+            out_scores[row, :n] = top_scores[0]
+            out_ids[row, :n] = self._ids[positions[top[0]]]
+        return out_scores, out_ids
+
+
+class VectorRetriever:
+    """Semantic fact retrieval on top of a FlatIndex or IVFIndex."""
+
+    def __init__(self, index, embedder: Optional[Embedder] = None):
+        self._index = index
+        self._embed = embedder or HashingEmbedder(index.dim)
+        self.facts: Sequence[str] = []
+        #: Facts of an untrained IVFIndex, searched exhaustively until there are enough to train
+        self._untrained: Optional[FlatIndex] = None
+        if isinstance(index, IVFIndex) and not index.is_trained:
+            self._untrained = FlatIndex(index.dim)
+
+    @property
+    def index(self):
+        """The FlatIndex or IVFIndex the retriever was built with."""
+        return self._index
+
+    @property
+    def active_index(self):
+        """The index queries run on: the flat buffer until the IVF index is trained."""
+        return self._untrained if self._untrained is not None else self._index
+
+    @property
+    def embedder(self) -> Embedder:
+        return self._embed
+
+    def add_facts(self, facts: Sequence[str], batch_size: int = 4096) -> None:
+        """
+        Embed and index facts in batches.
+
+        An untrained IVFIndex is trained on the first ``40 * nlist`` facts (or
+        on all of them once this call ends with at least ``nlist``); earlier
+        facts sit in a flat buffer that queries search exhaustively.
+        """
+        if not isinstance(self.facts, list):
+            # Facts mapped from a KnowledgeStore are read-only
+            self.facts = list(self.facts)
+        for start in range(0, len(facts), batch_size):
+            chunk = list(facts[start:start + batch_size])
+            vectors = self._embed(chunk)
+            if self._untrained is None:
+                self._index.add(vectors)
+            else:
+                self._untrained.add(vectors)
+            self.facts.extend(chunk)
+            if self._untrained is not None and len(self._untrained) >= self._index.nlist * 40:
+                self._train()
+        if self._untrained is not None and len(self._untrained) >= self._index.nlist:
+            self._train()
+
+    def _train(self) -> None:
+        vectors = self._untrained._vectors[:len(self._untrained)]
+        self._index.train(vectors[:self._index.nlist * 40])
+        self._index.add(vectors)
+        self._untrained = None
+
+    def search(self, queries: Sequence[str], top_k: int = 10) -> List[List[Tuple[str, float]]]:
+        """Batched lookup: one embedding call and one index search for all queries."""
+        return self.search_vectors(self._embed(list(queries)), top_k)
+
+    def search_vectors(self, vectors: np.ndarray, top_k: int = 10) -> List[List[Tuple[str, float]]]:
+        """Like ``search`` for queries that are already embedded."""
+        scores, ids = self.active_index.search(vectors, top_k)
+        return [[(self.facts[i], float(s)) for s, i in zip(srow, irow) if i >= 0]
+                for srow, irow in zip(scores, ids)]
+
+    def retrieve(self, query: str, top_k: int = 10) -> RetrievalResult:
+        hits = self.search([query], top_k)[0]
+        return {"facts": [fact for fact, _ in hits], "scores": [score for _, score in hits],
+                "source": "vector_index"}
@@ -3,11 +3,27 @@ DeepThought reThought system modules.
 
 This package contains the main functional modules of the DeepThought reThought system,
 including input handling, memory, LLM processing, and output handling components.
+
+Modules are imported lazily on first access, so a worker that runs a single
+stage only loads that stage.
 """
 
-from .input_handler import InputHandler
-from .output_handler import OutputHandler
-from .memory_stub import MemoryStub
-from .llm_stub import LLMStub
+from typing import TYPE_CHECKING
+
+from .._lazy import lazy_exports
+
+if TYPE_CHECKING:
+    from .input_handler import InputHandler
+    from .output_handler import OutputHandler
+    from .memory_stub import MemoryStub
+    from .llm_stub import LLMStub
+
+_LAZY_IMPORTS = {
+    "InputHandler": ".input_handler",
+    "OutputHandler": ".output_handler",
+    "MemoryStub": ".memory_stub",
+    "LLMStub": ".llm_stub",
+}
 
-__all__ = ["InputHandler", "OutputHandler", "MemoryStub", "LLMStub"] 
\ No newline at end of file
+__all__ = list(_LAZY_IMPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _LAZY_IMPORTS)
@@ -1,11 +1,14 @@
 # File: src/deepthought/modules/input_handler.py
 import logging
+import time
 import uuid
 from datetime import datetime
+from typing import Optional
 from nats.aio.client import Client as NATS
 from nats.js.client import JetStreamContext
 # Assuming eda modules are in parent dir relative to modules dir
 from ..eda.events import EventSubjects, InputReceivedPayload
+from ..eda.pipeline import Pipeline
 from ..eda.publisher import Publisher
 
 logger = logging.getLogger(__name__)
@@ -13,19 +16,41 @@ logger = logging.getLogger(__name__)
 class InputHandler:
     """Handles user input and publishes InputReceived event via JetStream."""
 
-    def __init__(self, nats_client: NATS, js_context: JetStreamContext):
-        """Initialize with shared NATS client and JetStream context."""
+    def __init__(self, nats_client: NATS, js_context: JetStreamContext,
+                 pipeline: Optional[Pipeline] = None):
+        """
+        Initialize with shared NATS client and JetStream context.
+
+        If a started ``pipeline`` is given, input events are submitted to it so
+        co-located stages run in-process; it still publishes them when a stage
+        elsewhere consumes INPUT_RECEIVED.
+        """
         self._publisher = Publisher(nats_client, js_context)
+        self._pipeline = pipeline
         logger.info("InputHandler initialized (JetStream enabled).")
 
-    async def process_input(self, user_input: str) -> str:
-        """Process input and publish via JetStream."""
+    async def process_input(self, user_input: str, priority: Optional[str] = None,
+                            timeout: Optional[float] = None, adapter: Optional[str] = None) -> str:
+        """
+        Process input and publish via JetStream.
+
+        Args:
+            priority: "interactive" (default) or "batch".
+            timeout: Seconds after which the response is no longer wanted; later
+                stages drop the request instead of generating it.
+            adapter: LoRA adapter the LLM stage answers with (default: the base model).
+        """
         input_id = str(uuid.uuid4())
         timestamp = datetime.utcnow().isoformat()
         payload = InputReceivedPayload(
-            user_input=user_input, input_id=input_id, timestamp=timestamp
+            user_input=user_input, input_id=input_id, timestamp=timestamp, priority=priority,
+            deadline=time.time() + timeout if timeout is not None else None, adapter=adapter
         )
         try:
+            if self._pipeline is not None:
+                await self._pipeline.submit(EventSubjects.INPUT_RECEIVED, payload)
+                logger.info(f"Submitted input ID {input_id} to pipeline")
+                return input_id
             # Always use JetStream for input events in this version
             await self._publisher.publish(
                 EventSubjects.INPUT_RECEIVED, payload,
@@ -2,43 +2,346 @@
 import asyncio
 import json
 import logging
+import time
 from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
 from nats.aio.client import Client as NATS
 from nats.aio.msg import Msg
 from nats.js.client import JetStreamContext
 # Assuming eda modules are in parent dir relative to modules dir
-from ..eda.events import EventSubjects, ResponseGeneratedPayload
+from ..eda.events import EventSubjects, ResponseChunkPayload, ResponseGeneratedPayload
+from ..eda.pipeline import Stage
 from ..eda.publisher import Publisher
-from ..eda.subscriber import Subscriber
+from ..eda.streaming import ChunkCoalescer
+from ..eda.subscriber import DrainReport, Subscriber
+from ..llm.prompt import build_prompt
+from ..llm.response_cache import CachedResponse, response_key
+from ..llm.scheduler import BATCH, INTERACTIVE, DeadlineExceeded
+
+if TYPE_CHECKING:
+    from ..llm.engine import ContinuousBatchingEngine, GenerationParams, GenerationResult
+    from ..llm.response_cache import ResponseCache
 
 logger = logging.getLogger(__name__)
 
+
+def _strip_stream(feed: Callable[[str], None]) -> Callable[[str], None]:
+    """
+    Trim streamed text like the final response: leading whitespace is dropped and
+    trailing whitespace is held back until more text follows it.
+    """
+    started = False
+    held = ""
+
+    def wrapped(text: str) -> None:
+        nonlocal started, held
+        text = held + text
+        if not started:
+            text = text.lstrip()
+            started = bool(text)
+        kept = text.rstrip()
+        held = text[len(kept):]
+        feed(kept)
+    return wrapped
+
+
+class _Cursor:
+    """
+    One request's view of the flights it streams from.
+
+    Every flight streams from the start of the response, so after switching to
+    another flight the text this request already received is skipped.
+    """
+
+    def __init__(self, feed: Callable[[str], None]):
+        self._feed = feed
+        self._skip = 0
+        self.received = 0
+
+    def restart(self) -> None:
+        self._skip = self.received
+
+    def __call__(self, text: str) -> None:
+        if self._skip:
+            skipped = min(self._skip, len(text))
+            self._skip -= skipped
+            text = text[skipped:]
+        if text:
+            self.received += len(text)
+            self._feed(text)
+
+
+class _Flight:
+    """A generation in progress that identical requests attach to."""
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self._pieces: List[str] = []
+        self._listeners: List[Callable[[str], None]] = []
+
+    def feed(self, text: str) -> None:
+        if not text:
+            return
+        self._pieces.append(text)
+        for listener in list(self._listeners):
+            listener(text)
+
+    def attach(self, listener: Callable[[str], None]) -> None:
+        """Stream to ``listener``, starting with the text generated before it joined."""
+        for piece in self._pieces:
+            listener(piece)
+        self._listeners.append(listener)
+
+    def detach(self, listener: Callable[[str], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+
 class LLMStub:
     """Subscribes to MemoryRetrieved, publishes ResponseGenerated via JetStream."""
 
-    def __init__(self, nats_client: NATS, js_context: JetStreamContext):
-        """Initialize with shared NATS client and JetStream context."""
+    def __init__(self, nats_client: NATS, js_context: JetStreamContext,
+                 engine: Optional["ContinuousBatchingEngine"] = None,
+                 params: Optional["GenerationParams"] = None,
+                 prompt_builder: Callable[[str, Sequence[str]], str] = build_prompt,
+                 stream_interval: Optional[float] = 0.05, stream_max_chars: int = 512,
+                 response_cache: Optional["ResponseCache"] = None,
+                 warmup_prompt: Optional[str] = None, warmup_tokens: int = 8,
+                 batch_requeue_delay: float = 1.0):
+        """
+        Initialize with shared NATS client and JetStream context.
+
+        Args:
+            engine: Generation engine. Without one the stub answers with a template.
+            params: Decoding settings for every request (default: the engine's).
+            prompt_builder: Renders the prompt from the user input and retrieved facts.
+            stream_interval: Minimum seconds between RESPONSE_CHUNK events while an engine
+                generates; None publishes only the final RESPONSE_GENERATED event.
+            stream_max_chars: Buffered characters that publish a chunk before the interval is up.
+            response_cache: Optional cache of responses by rendered prompt and parameters;
+                hits are published at once, flagged ``cached``.
+            warmup_prompt: Prompt the engine generates before ``start_listening``
+                subscribes (default: the prompt template with a placeholder question).
+            warmup_tokens: Tokens per warm-up generation; 0 subscribes without warming up.
+            batch_requeue_delay: Seconds before JetStream redelivers a batch-priority
+                event that arrived while batch work held all its handler slots.
+        """
         self._publisher = Publisher(nats_client, js_context)
         self._subscriber = Subscriber(nats_client, js_context)
+        self._engine = engine
+        self._params = params
+        self._prompt_builder = prompt_builder
+        self._stream_interval = stream_interval
+        self._stream_max_chars = stream_max_chars
+        self._response_cache = response_cache
+        self._inflight: Dict[str, _Flight] = {}
+        self._warmup_prompt = warmup_prompt
+        self._warmup_tokens = warmup_tokens
+        self._batch_requeue_delay = batch_requeue_delay
+        self._batch_handlers = 0
+        self._batch_limit = 1
+        self._created = time.perf_counter()
+        #: Seconds from model loading (or construction) until subscribed
+        self.time_to_ready: Optional[float] = None
+        self.generations = 0
+        self.coalesced = 0
+        self.expired = 0
+        self.requeued = 0
         logger.info("LLMStub initialized (JetStream enabled).")
 
+    async def generate(self, data: Dict[str, Any]) -> Optional[ResponseGeneratedPayload]:
+        """
+        Builds the ResponseGenerated payload for a decoded MemoryRetrieved event.
+
+        The event's ``adapter`` field selects the LoRA adapter the engine answers with.
+
+        Returns None when the event's deadline passed, or generation could not
+        finish before it; nothing is published for such events.
+
+        Raises:
+            ValueError: The event can never be served, e.g. it selects an adapter
+                the engine does not have.
+        """
+        input_id = data.get("input_id", "unknown")
+        knowledge = data.get("retrieved_knowledge", {}).get("retrieved_knowledge", {})
+        facts = knowledge.get("facts", [])
+        deadline = data.get("deadline")
+        logger.info(f"LLMStub received memory event ID {input_id}")
+        if deadline is not None and deadline <= time.time():
+            self.expired += 1
+            logger.info(f"LLMStub dropped {input_id}: deadline passed before generation")
+            return None
+
+        if self._engine is not None:
+            prompt = self._prompt_builder(data.get("user_input") or "", [str(f) for f in facts])
+            try:
+                return await self._generate_with_engine(prompt, input_id, data.get("priority") or INTERACTIVE,
+                                                        deadline, data.get("adapter"))
+            except DeadlineExceeded as e:
+                self.expired += 1
+                logger.info(f"LLMStub dropped {input_id}: {e}")
+                return None
+
+        await asyncio.sleep(0.5) # Simulate work
+
+        facts_str = ", ".join(map(str, facts))
+        response = f"Based on: {facts_str}, this is a stub response. [TS: {datetime.utcnow().isoformat()}]"
+        return ResponseGeneratedPayload(
+            final_response=response, input_id=input_id,
+            timestamp=datetime.utcnow().isoformat(), confidence=0.95
+        )
+
+    async def _generate_with_engine(self, prompt: str, input_id: str, priority: str,
+                                    deadline: Optional[float], adapter: Optional[str]) -> ResponseGeneratedPayload:
+        params = self._params or self._engine.default_params
+        started = time.perf_counter()
+        # Cache and coalesce by adapter version, so re-registered weights never reuse old answers
+        pool = getattr(self._engine, "adapters", None)
+        adapter_key = pool.key(adapter) if adapter is not None and pool is not None and adapter in pool else adapter
+        if self._response_cache is not None:
+            cached = self._response_cache.get(prompt, params, adapter_key)
+            if cached is not None:
+                logger.info(f"LLMStub answered {input_id} from the response cache")
+                return ResponseGeneratedPayload(
+                    final_response=cached.text, input_id=input_id,
+                    timestamp=datetime.utcnow().isoformat(), confidence=cached.confidence,
+                    ttft=time.perf_counter() - started, cached=True
+                )
+
+        chunks = None
+        if self._stream_interval is not None:
+            chunks = ChunkCoalescer(self._publish_chunk, input_id, self._stream_interval,
+                                    self._stream_max_chars)
+        key = response_key(prompt, params, self._response_cache.namespace if self._response_cache else "", adapter_key)
+        try:
+            result, coalesced = await self._generate_once(key, prompt, params, chunks, priority, deadline, adapter)
+        except BaseException:
+            # Readers must not take the text streamed so far for the full response
+            if chunks is not None:
+                await chunks.close(aborted=True)
+            raise
+        if chunks is not None:
+            await chunks.close()
+        logger.debug(f"LLMStub {'shared' if coalesced else 'generated'} {len(result.token_ids)} tokens "
+                     f"for {input_id} (ttft {result.ttft * 1e3:.0f} ms, {result.finish_reason}, "
+                     f"{chunks.chunks if chunks else 0} chunks)")
+        text = result.text.strip()
+        if self._response_cache is not None and not coalesced:
+            self._response_cache.put(prompt, params, CachedResponse(
+                text, result.confidence, len(result.token_ids), cost=time.perf_counter() - started), adapter_key)
+        return ResponseGeneratedPayload(
+            final_response=text, input_id=input_id,
+            timestamp=datetime.utcnow().isoformat(), confidence=result.confidence,
+            ttft=(chunks.first_chunk_at - started) if chunks and chunks.chars else result.ttft,
+            coalesced=coalesced
+        )
+
+    async def _generate_once(self, key: str, prompt: str, params: "GenerationParams",
+                             chunks: Optional[ChunkCoalescer], priority: str, deadline: Optional[float],
+                             adapter: Optional[str] = None) -> Tuple["GenerationResult", bool]:
+        """
+        Run the generation for ``key`` or attach to the one already in flight.
+
+        Returns the result and whether it was shared from another request's
+        generation. Only requests of the same priority share one, so an
+        interactive request never waits behind batch scheduling. A follower
+        whose leader was cancelled or ran out of time takes over, streaming on
+        from where the abandoned flight left off; a follower stops waiting at
+        its own deadline.
+        """
+        key = f"{priority}:{key}"
+        cursor = _Cursor(chunks.feed) if chunks is not None else None
+        while True:
+            flight = self._inflight.get(key)
+            if flight is None:
+                break
+            self.coalesced += 1
+            if cursor is not None:
+                cursor.restart()
+                flight.attach(cursor)
+            try:
+                timeout = None if deadline is None else max(deadline - time.time(), 0.0)
+                return await asyncio.wait_for(asyncio.shield(flight.future), timeout), True
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("Deadline passed waiting for an identical request") from None
+            except asyncio.CancelledError:
+                if not flight.future.cancelled():
+                    raise
+            except DeadlineExceeded:
+                if deadline is not None and deadline <= time.time():
+                    raise
+            finally:
+                if cursor is not None:
+                    flight.detach(cursor)
+            self.coalesced -= 1
+
+        flight = _Flight(asyncio.get_running_loop().create_future())
+        self._inflight[key] = flight
+        self.generations += 1
+        if cursor is not None:
+            cursor.restart()
+            flight.attach(cursor)
+        try:
+            result = await self._engine.generate(
+                prompt, params, on_text=_strip_stream(flight.feed) if self._stream_interval is not None else None,
+                priority=priority, deadline=deadline, adapter=adapter)
+            flight.future.set_result(result)
+            return result, False
+        except asyncio.CancelledError:
+            flight.future.cancel()
+            raise
+        except Exception as e:
+            flight.future.set_exception(e)
+            # Mark the exception retrieved when nobody else was waiting
+            flight.future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Generation counts: requests that ran the model, shared a run, were dropped
+        at their deadline, or were batch events handed back to JetStream.
+        """
+        return {
+            "generations": self.generations,
+            "coalesced": self.coalesced,
+            "expired": self.expired,
+            "requeued": self.requeued,
+            "in_flight": len(self._inflight),
+        }
+
+    async def _publish_chunk(self, payload: ResponseChunkPayload) -> None:
+        # Core NATS on a subject outside the stream: chunks are superseded by the final
+        # event, so they are neither acked nor stored and archived
+        await self._publisher.publish(EventSubjects.RESPONSE_CHUNK, payload, use_jetstream=False)
+
+    def _batch_handler_limit(self, concurrency: int) -> int:
+        """Handler slots batch-priority events may hold: the engine's unreserved share of ``concurrency``."""
+        if self._engine is None:
+            return concurrency
+        size = self._engine.max_batch_size
+        return max(1, concurrency * (size - self._engine.reserved_slots) // size)
+
     async def _handle_memory_event(self, msg: Msg) -> None:
         """Handles MemoryRetrieved event from JetStream."""
+        batch = False
         try:
             data = json.loads(msg.data.decode())
-            input_id = data.get("input_id", "unknown")
-            knowledge = data.get("retrieved_knowledge", {}).get("retrieved_knowledge", {})
-            facts = knowledge.get("facts", [])
-            logger.info(f"LLMStub received memory event ID {input_id}")
-
-            await asyncio.sleep(0.5) # Simulate work
-
-            facts_str = ", ".join(map(str, facts))
-            response = f"Based on: {facts_str}, this is a stub response. [TS: {datetime.utcnow().isoformat()}]"
-            payload = ResponseGeneratedPayload(
-                final_response=response, input_id=input_id,
-                timestamp=datetime.utcnow().isoformat(), confidence=0.95
-            )
+            if (data.get("priority") or INTERACTIVE) == BATCH:
+                if self._batch_handlers >= self._batch_limit:
+                    # Waiting here would hold a handler slot that an interactive event needs
+                    self.requeued += 1
+                    await msg.nak(delay=self._batch_requeue_delay)
+                    return
+                batch = True
+                self._batch_handlers += 1
+            payload = await self.generate(data)
+            if payload is None:
+                # Nobody waits for the response any more; redelivery would not help
+                await msg.ack()
+                return
+            input_id = payload.input_id
 
             logger.info(f"LLMStub: Publishing RESPONSE_GENERATED for input_id: {input_id}")
             try:
@@ -53,16 +356,56 @@ class LLMStub:
                 logger.error(f"LLMStub: Failed to publish RESPONSE_GENERATED for {input_id}: {e}", exc_info=True)
                 # Decide handling - NAK? Let timeout?
 
+        except ValueError as e:
+            # Malformed or unservable (unknown adapter): redelivery would fail the same way
+            logger.error(f"LLMStub rejected event: {e}")
+            await self._terminate(msg)
         except Exception as e:
             logger.error(f"Error in LLMStub handler: {e}", exc_info=True)
             # Consider if this error should result in a NAK instead, depending on if it's retriable
+        finally:
+            if batch:
+                self._batch_handlers -= 1
+
+    @staticmethod
+    async def _terminate(msg: Msg) -> None:
+        try:
+            await msg.term()
+        except Exception as e:
+            logger.warning(f"LLMStub failed to terminate {msg.subject}: {e}")
+
+    def as_stage(self, durable_name: str = "llm_stub_listener",
+                 max_concurrency: Optional[int] = None) -> Stage:
+        """
+        Describes this module as a pipeline stage (MEMORY_RETRIEVED -> RESPONSE_GENERATED).
 
-    async def start_listening(self, durable_name: str = "llm_stub_listener") -> bool:
+        ``max_concurrency`` defaults as in ``start_listening``.
+        """
+        return Stage(name="llm", input_subject=EventSubjects.MEMORY_RETRIEVED,
+                     output_subject=EventSubjects.RESPONSE_GENERATED,
+                     handler=self.generate, durable=durable_name,
+                     max_concurrency=max_concurrency or self._default_concurrency())
+
+    def _default_concurrency(self) -> int:
+        return 2 * self._engine.max_batch_size if self._engine else 1
+
+    async def start_listening(self, durable_name: str = "llm_stub_listener",
+                              max_concurrency: Optional[int] = None) -> bool:
         """
         Starts the NATS subscriber to listen for MEMORY_RETRIEVED events.
+
+        With an engine, the configured warm-up generation runs first, so the
+        worker only takes events once its first requests are fast; the time
+        from model loading to subscription is logged and kept in ``time_to_ready``.
         
         Args:
             durable_name: Optional name for the durable consumer. Defaults to "llm_stub_listener".
+            max_concurrency: Events handled at once. Defaults to twice the engine's batch
+                size, so the engine can batch concurrent requests and its scheduler has
+                waiting work to order by priority and deadline; 1 without an engine.
+                Batch-priority events never take the share of these slots that matches
+                the engine's ``reserved_slots``: past their share they go back to
+                JetStream, so interactive events are delivered under a batch backlog.
             
         Returns:
             bool: True if subscription was successful, False otherwise.
@@ -71,27 +414,52 @@ class LLMStub:
             logger.error("Subscriber not initialized for LLMStub.")
             return False
 
+        started = self._created
+        warmup = 0.0
+        if self._engine is not None:
+            started = min(started, getattr(self._engine, "load_started", started))
+            if self._warmup_tokens > 0:
+                try:
+                    warmup = await self._engine.warm_up(self._warmup_prompt, self._warmup_tokens)
+                except Exception as e:
+                    logger.error(f"LLMStub warm-up failed, not subscribing: {e}", exc_info=True)
+                    return False
+
         try:
             logger.info(f"LLMStub subscribing to {EventSubjects.MEMORY_RETRIEVED}...")
+            concurrency = max_concurrency or self._default_concurrency()
+            self._batch_limit = self._batch_handler_limit(concurrency)
             await self._subscriber.subscribe(
                 subject=EventSubjects.MEMORY_RETRIEVED,
                 handler=self._handle_memory_event,
                 use_jetstream=True,
-                durable=durable_name
+                durable=durable_name,
+                max_concurrency=concurrency
             )
-            logger.info(f"LLMStub successfully subscribed to {EventSubjects.MEMORY_RETRIEVED}.")
+            self.time_to_ready = time.perf_counter() - started
+            load = getattr(self._engine, "load_seconds", 0.0)
+            logger.info(f"LLMStub successfully subscribed to {EventSubjects.MEMORY_RETRIEVED}; "
+                        f"ready in {self.time_to_ready:.2f}s (model load {load:.2f}s, warm-up {warmup:.2f}s).")
             return True
         except Exception as e:
             logger.error(f"LLMStub failed to subscribe: {e}", exc_info=True)
             return False
             
-    async def stop_listening(self) -> None:
+    async def stop_listening(self, drain_timeout: float = 30.0) -> Optional[DrainReport]:
         """
-        Stops all active NATS subscriptions for this LLMStub instance.
+        Drains and stops all active NATS subscriptions for this LLMStub instance.
+
+        New messages are returned to the server, running handlers and publishes get
+        up to ``drain_timeout`` seconds to finish, and acks are flushed before unsubscribing.
+
+        Returns:
+            Optional[DrainReport]: Drain outcome, or None if there was no subscriber.
         """
         if self._subscriber:
-            logger.info("Stopping LLMStub subscriptions...")
-            await self._subscriber.unsubscribe_all()
+            logger.info("Draining LLMStub subscriptions...")
+            report = await self._subscriber.drain(drain_timeout, publishers=[self._publisher])
             logger.info("LLMStub stopped listening.")
+            return report
         else:
-            logger.warning("Cannot stop listening - no subscriber available.")
\ No newline at end of file
+            logger.warning("Cannot stop listening - no subscriber available.")
+            return None
\ No newline at end of file
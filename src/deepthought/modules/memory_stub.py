@@ -1,48 +1,94 @@
 # File: src/deepthought/modules/memory_stub.py
 import asyncio
+import inspect
 import json
 import logging
 from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, Optional, Union
 from nats.aio.client import Client as NATS
 from nats.aio.msg import Msg
 from nats.js.client import JetStreamContext
 # Assuming eda modules are in parent dir relative to modules dir
 from ..eda.events import EventSubjects, MemoryRetrievedPayload
+from ..eda.pipeline import Stage
 from ..eda.publisher import Publisher
-from ..eda.subscriber import Subscriber
+from ..eda.subscriber import DrainReport, Subscriber
+
+if TYPE_CHECKING:
+    from ..memory.cache import RetrievalCache
+    from ..memory.retriever import Retriever
+    from ..memory.shared_cache import SharedRetrievalCache
 
 logger = logging.getLogger(__name__)
 
 class MemoryStub:
     """Subscribes to InputReceived, publishes MemoryRetrieved via JetStream."""
 
-    def __init__(self, nats_client: NATS, js_context: JetStreamContext):
-        """Initialize with shared NATS client and JetStream context."""
+    def __init__(self, nats_client: NATS, js_context: JetStreamContext,
+                 retriever: Optional["Retriever"] = None, top_k: int = 10,
+                 cache: Optional[Union["RetrievalCache", "SharedRetrievalCache"]] = None):
+        """
+        Initialize with shared NATS client and JetStream context.
+
+        Args:
+            retriever: Memory backend queried for each input. Without one the
+                stub answers with placeholder facts.
+            top_k: Maximum number of facts requested from the retriever.
+            cache: Optional result cache consulted before the retriever. Unless the
+                retriever is ``lexical``, every write invalidates the whole cache.
+        """
         self._publisher = Publisher(nats_client, js_context)
         self._subscriber = Subscriber(nats_client, js_context)
+        self._retriever = retriever
+        self._top_k = top_k
+        self._cache = cache
+        if cache is not None and retriever is not None:
+            cache.lexical = getattr(retriever, "lexical", False)
         logger.info("MemoryStub initialized (JetStream enabled).")
 
+    async def retrieve(self, data: Dict[str, Any]) -> MemoryRetrievedPayload:
+        """Builds the MemoryRetrieved payload for a decoded InputReceived event."""
+        input_id = data.get("input_id", "unknown")
+        user_input = data.get("user_input", "")
+        logger.info(f"MemoryStub received input event ID {input_id}")
+
+        if self._retriever is not None:
+            knowledge = await self._retrieve_cached(user_input)
+        else:
+            await asyncio.sleep(0.1) # Simulate work
+            knowledge = {
+                "facts": ["Fact1", f"User asked: {user_input}"],
+                "source": "memory_stub"
+            }
+
+        memory_data = {"retrieved_knowledge": knowledge}
+        return MemoryRetrievedPayload(
+            retrieved_knowledge=memory_data,
+            input_id=input_id,
+            timestamp=datetime.utcnow().isoformat(),
+            user_input=user_input,
+            priority=data.get("priority"),
+            deadline=data.get("deadline"),
+            adapter=data.get("adapter")
+        )
+
+    async def _retrieve_cached(self, user_input: str) -> Dict[str, Any]:
+        async def compute() -> Dict[str, Any]:
+            knowledge = self._retriever.retrieve(user_input, top_k=self._top_k)
+            if inspect.isawaitable(knowledge):
+                knowledge = await knowledge
+            return knowledge
+
+        if self._cache is None:
+            return await compute()
+        return await self._cache.get_or_compute(user_input, self._top_k, compute)
+
     async def _handle_input_event(self, msg: Msg) -> None:
         """Handles InputReceived event from JetStream."""
         try:
             data = json.loads(msg.data.decode())
-            input_id = data.get("input_id", "unknown")
-            user_input = data.get("user_input", "")
-            logger.info(f"MemoryStub received input event ID {input_id}")
-
-            await asyncio.sleep(0.1) # Simulate work
-
-            memory_data = {
-                "retrieved_knowledge": {
-                    "facts": ["Fact1", f"User asked: {user_input}"],
-                    "source": "memory_stub"
-                }
-            }
-            payload = MemoryRetrievedPayload(
-                retrieved_knowledge=memory_data,
-                input_id=input_id,
-                timestamp=datetime.utcnow().isoformat()
-            )
+            payload = await self.retrieve(data)
+            input_id = payload.input_id
 
             # Publish result via JetStream
             await self._publisher.publish(
@@ -60,12 +106,31 @@ class MemoryStub:
             # Optionally NAK the message if error is temporary:
             # if hasattr(msg, 'nak') and callable(msg.nak): await msg.nak()
 
-    async def start_listening(self, durable_name: str = "memory_stub_listener") -> bool:
+    def as_stage(self, durable_name: str = "memory_stub_listener",
+                 max_concurrency: Optional[int] = None) -> Stage:
+        """
+        Describes this module as a pipeline stage (INPUT_RECEIVED -> MEMORY_RETRIEVED).
+
+        ``max_concurrency`` defaults as in ``start_listening``.
+        """
+        return Stage(name="memory", input_subject=EventSubjects.INPUT_RECEIVED,
+                     output_subject=EventSubjects.MEMORY_RETRIEVED,
+                     handler=self.retrieve, durable=durable_name,
+                     max_concurrency=max_concurrency or self._default_concurrency())
+
+    def _default_concurrency(self) -> int:
+        return getattr(self._retriever, "max_batch", 1)
+
+    async def start_listening(self, durable_name: str = "memory_stub_listener",
+                              max_concurrency: Optional[int] = None) -> bool:
         """
         Starts the NATS subscriber to listen for INPUT_RECEIVED events.
         
         Args:
             durable_name: Optional name for the durable consumer. Defaults to "memory_stub_listener".
+            max_concurrency: Events handled at once. Defaults to the retriever's ``max_batch``
+                when it batches queries across requests (``BatchedVectorRetriever``), so
+                concurrent inputs can share a batch; 1 otherwise.
             
         Returns:
             bool: True if subscription was successful, False otherwise.
@@ -80,7 +145,8 @@ class MemoryStub:
                 subject=EventSubjects.INPUT_RECEIVED,
                 handler=self._handle_input_event,
                 use_jetstream=True,
-                durable=durable_name
+                durable=durable_name,
+                max_concurrency=max_concurrency or self._default_concurrency()
             )
             logger.info(f"MemoryStub successfully subscribed to {EventSubjects.INPUT_RECEIVED}.")
             return True
@@ -88,13 +154,21 @@ class MemoryStub:
             logger.error(f"MemoryStub failed to subscribe: {e}", exc_info=True)
             return False
             
-    async def stop_listening(self) -> None:
+    async def stop_listening(self, drain_timeout: float = 30.0) -> Optional[DrainReport]:
         """
-        Stops all active NATS subscriptions for this MemoryStub instance.
+        Drains and stops all active NATS subscriptions for this MemoryStub instance.
+
+        New messages are returned to the server, running handlers and publishes get
+        up to ``drain_timeout`` seconds to finish, and acks are flushed before unsubscribing.
+
+        Returns:
+            Optional[DrainReport]: Drain outcome, or None if there was no subscriber.
         """
         if self._subscriber:
-            logger.info("Stopping MemoryStub subscriptions...")
-            await self._subscriber.unsubscribe_all()
+            logger.info("Draining MemoryStub subscriptions...")
+            report = await self._subscriber.drain(drain_timeout, publishers=[self._publisher])
             logger.info("MemoryStub stopped listening.")
+            return report
         else:
-            logger.warning("Cannot stop listening - no subscriber available.")
\ No newline at end of file
+            logger.warning("Cannot stop listening - no subscriber available.")
+            return None
\ No newline at end of file
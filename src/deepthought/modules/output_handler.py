@@ -1,13 +1,15 @@
 # File: src/deepthought/modules/output_handler.py
 import json
 import logging
-from typing import Callable, Dict, Optional, Any
+from typing import AsyncIterator, Callable, Dict, Optional, Any
 from nats.aio.client import Client as NATS
 from nats.aio.msg import Msg
 from nats.js.client import JetStreamContext
 # Assuming eda modules are in parent dir relative to modules dir
 from ..eda.events import EventSubjects
-from ..eda.subscriber import Subscriber
+from ..eda.pipeline import Stage
+from ..eda.streaming import ResponseStream
+from ..eda.subscriber import DrainReport, Subscriber
 
 logger = logging.getLogger(__name__)
 
@@ -15,37 +17,97 @@ class OutputHandler:
     """Subscribes to ResponseGenerated via JetStream and handles output."""
 
     def __init__(self, nats_client: NATS, js_context: JetStreamContext,
-                 output_callback: Optional[Callable[[str, str], None]] = None):
-        """Initialize with shared NATS client and JetStream context."""
+                 output_callback: Optional[Callable[[str, str], None]] = None,
+                 stream_chunks: bool = True):
+        """
+        Initialize with shared NATS client and JetStream context.
+
+        Args:
+            output_callback: Called with each final response instead of printing it.
+            stream_chunks: Also listen for RESPONSE_CHUNK events so ``stream`` yields
+                text while it is generated.
+        """
         self._subscriber = Subscriber(nats_client, js_context)
         self._responses = {}
+        self._streams: Dict[str, ResponseStream] = {}
+        self._stream_chunks = stream_chunks
         self._output_callback = output_callback
         logger.info("OutputHandler initialized (JetStream enabled).")
 
+    async def deliver(self, data: Dict[str, Any]) -> None:
+        """Records and emits a decoded ResponseGenerated event."""
+        input_id = data.get("input_id", "unknown")
+        final_response = data.get("final_response", "N/A")
+        logger.info(f"OutputHandler received response event ID {input_id}")
+
+        self._responses[input_id] = final_response # Store response
+        stream = self._streams.pop(input_id, None)
+        if stream is not None:
+            stream.finish(final_response)
+
+        # Use callback or print
+        if self._output_callback:
+            self._output_callback(input_id, final_response)
+        else:
+            print(f"Output ({input_id}): {final_response}")
+
+    async def deliver_chunk(self, data: Dict[str, Any]) -> None:
+        """Adds a decoded RESPONSE_CHUNK event to the stream of its response."""
+        input_id = data.get("input_id", "unknown")
+        if input_id in self._responses:
+            return  # Late chunk of a response that is already complete
+        stream = self._streams.get(input_id)
+        if stream is None:
+            stream = self._streams[input_id] = ResponseStream()
+        stream.add(int(data.get("seq", 0)), data.get("text", ""), bool(data.get("final", False)),
+                   bool(data.get("error", False)))
+        if stream.failed:
+            # A redelivered request streams again from the start
+            del self._streams[input_id]
+
+    def stream(self, input_id: str) -> AsyncIterator[str]:
+        """
+        Iterate over the text of a response as it arrives.
+
+        Works before the first chunk, while chunks arrive, and after the response
+        completed; the pieces concatenate to the final response. Raises
+        ``StreamAborted`` when the generation failed or was dropped.
+        """
+        stream = self._streams.get(input_id)
+        if stream is None:
+            stream = ResponseStream()
+            if input_id in self._responses:
+                stream.finish(self._responses[input_id])
+            else:
+                self._streams[input_id] = stream
+        return stream.__aiter__()
+
+    async def _handle_chunk_event(self, msg: Msg) -> None:
+        """Handles a RESPONSE_CHUNK event (core NATS, nothing to ack)."""
+        try:
+            await self.deliver_chunk(json.loads(msg.data.decode()))
+        except Exception as e:
+            logger.error(f"Error in OutputHandler chunk handler: {e}", exc_info=True)
+
     async def _handle_response_event(self, msg: Msg) -> None:
         """Handles ResponseGenerated event from JetStream."""
         try:
             data = json.loads(msg.data.decode())
-            input_id = data.get("input_id", "unknown")
-            final_response = data.get("final_response", "N/A")
-            logger.info(f"OutputHandler received response event ID {input_id}")
-
-            self._responses[input_id] = final_response # Store response
-
-            # Use callback or print
-            if self._output_callback:
-                self._output_callback(input_id, final_response)
-            else:
-                print(f"Output ({input_id}): {final_response}")
+            await self.deliver(data)
 
             # Acknowledge the received message
             await msg.ack()
-            logger.debug(f"Acked message for {input_id} in OutputHandler")
+            logger.debug(f"Acked message for {data.get('input_id', 'unknown')} in OutputHandler")
 
         except Exception as e:
             logger.error(f"Error in OutputHandler handler: {e}", exc_info=True)
             # Optionally NAK
 
+    def as_stage(self, durable_name: str = "output_handler_listener") -> Stage:
+        """Describes this module as a terminal pipeline stage consuming RESPONSE_GENERATED."""
+        return Stage(name="output", input_subject=EventSubjects.RESPONSE_GENERATED,
+                     handler=self.deliver, durable=durable_name)
+
     async def start_listening(self, durable_name: str = "output_handler_listener") -> bool:
         """
         Starts the NATS subscriber to listen for RESPONSE_GENERATED events.
@@ -68,22 +130,37 @@ class OutputHandler:
                 use_jetstream=True,
                 durable=durable_name
             )
+            if self._stream_chunks:
+                # Chunks only matter while a response is being generated: no durable replay
+                await self._subscriber.subscribe(
+                    subject=EventSubjects.RESPONSE_CHUNK,
+                    handler=self._handle_chunk_event,
+                    use_jetstream=False
+                )
             logger.info(f"OutputHandler successfully subscribed to {EventSubjects.RESPONSE_GENERATED}.")
             return True
         except Exception as e:
             logger.error(f"OutputHandler failed to subscribe: {e}", exc_info=True)
             return False
             
-    async def stop_listening(self) -> None:
+    async def stop_listening(self, drain_timeout: float = 30.0) -> Optional[DrainReport]:
         """
-        Stops all active NATS subscriptions for this OutputHandler instance.
+        Drains and stops all active NATS subscriptions for this OutputHandler instance.
+
+        New messages are returned to the server, running handlers get
+        up to ``drain_timeout`` seconds to finish, and acks are flushed before unsubscribing.
+
+        Returns:
+            Optional[DrainReport]: Drain outcome, or None if there was no subscriber.
         """
         if self._subscriber:
-            logger.info("Stopping OutputHandler subscriptions...")
-            await self._subscriber.unsubscribe_all()
+            logger.info("Draining OutputHandler subscriptions...")
+            report = await self._subscriber.drain(drain_timeout)
             logger.info("OutputHandler stopped listening.")
+            return report
         else:
             logger.warning("Cannot stop listening - no subscriber available.")
+            return None
 
     # Methods to retrieve responses for testing
     def get_response(self, input_id: str) -> Optional[str]:
@@ -0,0 +1,205 @@
+# File: tests/fakes.py
+"""
+In-memory stand-ins for the NATS client, JetStream, messages and the LLM engine.
+
+Shared by the stage tests so they run the real modules without a server or a
+model; ``tests/tiny_lm.py`` provides a real (tiny) model where one is needed.
+"""
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from nats.aio.msg import Msg
+
+
+class FakeMsg:
+    """A delivered message; ``data`` may be a dict (JSON-encoded), str or bytes."""
+
+    def __init__(self, data: Any = b"", subject: str = "", seq: Optional[int] = None, js: "FakeJS" = None):
+        if isinstance(data, dict):
+            data = json.dumps(data)
+        self.data = data.encode() if isinstance(data, str) else data
+        self.subject = subject
+        self.reply = f"$JS.ACK.deepthought_events.listener.1.{seq}.{seq}.0.0" if seq is not None else ""
+        self.acked = False
+        self.naked = False
+        self.termed = False
+        self.deliveries = 0
+        self._js = js
+
+    @property
+    def metadata(self):
+        return Msg.Metadata._from_reply(self.reply)
+
+    async def ack(self):
+        self.acked = True
+
+    async def term(self):
+        self.termed = True
+
+    async def nak(self, delay=None):
+        self.naked = True
+        if self._js is None:
+            return
+        if delay is not None:
+            self._js.delayed.append(self)
+        else:
+            await self._js.deliver(self)
+
+
+class FakeSub:
+    """A bound subscription; ``buffered`` messages reached the client but not the callback yet."""
+
+    def __init__(self, cb: Callable):
+        self.cb = cb
+        self.active = True
+        self.buffered: List[FakeMsg] = []
+
+    async def drain(self):
+        self.active = False
+        while self.buffered:
+            await self.cb(self.buffered.pop(0))
+
+    async def unsubscribe(self):
+        self.active = False
+
+
+class FakeNATS:
+    """Core NATS client: records publishes and loops them back to local subscribers."""
+    is_connected = True
+
+    def __init__(self):
+        self.published: List[tuple] = []
+        self.callbacks: Dict[str, Callable] = {}
+        self.flushed = False
+
+    def messages(self, subject: str) -> List[Dict[str, Any]]:
+        """Decoded payloads published on ``subject``."""
+        return [json.loads(data) for s, data in self.published if s == subject]
+
+    async def publish(self, subject, data):
+        self.published.append((subject, data))
+        if subject in self.callbacks:
+            await self.callbacks[subject](FakeMsg(data, subject))
+
+    async def subscribe(self, subject, queue="", cb=None):
+        self.callbacks[subject] = cb
+        return FakeSub(cb)
+
+    async def flush(self, timeout=10):
+        self.flushed = True
+
+
+class FakeJS:
+    """JetStream context: records publishes and push subscriptions, redelivers NAKed messages."""
+
+    def __init__(self, publish_delay: float = 0.0, max_deliver: int = 5):
+        self.publish_delay = publish_delay
+        self.max_deliver = max_deliver
+        self.published: List[str] = []
+        self.subscribed: List[tuple] = []
+        self.subs: List[FakeSub] = []
+        self.undelivered: List[FakeMsg] = []
+        #: Messages NAKed with a delay, waiting for their redelivery
+        self.delayed: List[FakeMsg] = []
+
+    @property
+    def handlers(self) -> List[Callable]:
+        return [sub.cb for sub in self.subs]
+
+    async def subscribe(self, subject, queue, durable, cb, manual_ack):
+        self.subscribed.append((subject, durable))
+        self.subs.append(FakeSub(cb))
+        return self.subs[-1]
+
+    async def deliver(self, msg: FakeMsg):
+        """Push ``msg`` to a bound subscription, as the server does with a NAKed message."""
+        active = [sub for sub in self.subs if sub.active]
+        if not active or msg.deliveries >= self.max_deliver:
+            self.undelivered.append(msg)
+            return
+        msg.deliveries += 1
+        await active[0].cb(msg)
+
+    async def publish(self, subject, data, timeout):
+        await asyncio.sleep(self.publish_delay)
+        self.published.append(subject)
+
+        class Ack:
+            seq = len(self.published)
+            stream = "deepthought_events"
+        return Ack()
+
+
+@dataclass(frozen=True)
+class FakeParams:
+    max_new_tokens: int = 8
+    temperature: float = 0.0
+
+
+@dataclass
+class FakeResult:
+    text: str
+    token_ids: List[int]
+    confidence: float = 0.9
+    ttft: float = 0.01
+    finish_reason: str = "eos"
+
+
+def _instruction_words(prompt: str, adapter: Optional[str]) -> str:
+    return " ".join(prompt.split("### Instruction:\n")[1].split()[:4])
+
+
+class RecordingEngine:
+    """
+    Engine double that records its calls and streams a canned answer word by word.
+
+    Args:
+        answer: ``(prompt, adapter) -> text``; defaults to the first four words of the question.
+        delay: Seconds per streamed word.
+        fail: Raise after streaming the answer.
+        warmup_error: Raised by ``warm_up`` instead of warming up.
+    """
+    max_batch_size = 4
+    reserved_slots = 0
+    default_params = FakeParams()
+    load_started = 0.0
+    load_seconds = 0.0
+
+    def __init__(self, answer: Callable[[str, Optional[str]], str] = _instruction_words, delay: float = 0.0,
+                 fail: bool = False, warmup_error: Optional[Exception] = None):
+        self.answer = answer
+        self.delay = delay
+        self.fail = fail
+        self.warmup_error = warmup_error
+        self.calls: List[Dict[str, Any]] = []
+        self.warmups: List[tuple] = []
+        self.running = 0
+        self.peak = 0
+
+    @property
+    def prompts(self) -> List[str]:
+        return [call["prompt"] for call in self.calls]
+
+    async def generate(self, prompt, params, on_text=None, priority="interactive", deadline=None, adapter=None):
+        self.calls.append({"prompt": prompt, "priority": priority, "deadline": deadline, "adapter": adapter})
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            words = [f" {w}" for w in self.answer(prompt, adapter).split()]
+            for word in words:
+                await asyncio.sleep(self.delay)
+                if on_text:
+                    on_text(word)
+            if self.fail:
+                raise RuntimeError("model failed")
+            return FakeResult("".join(words), list(range(len(words))))
+        finally:
+            self.running -= 1
+
+    async def warm_up(self, prompt, max_new_tokens):
+        if self.warmup_error is not None:
+            raise self.warmup_error
+        self.warmups.append((prompt, max_new_tokens))
+        return 0.01
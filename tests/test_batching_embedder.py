@@ -0,0 +1,103 @@
+# File: tests/test_batching_embedder.py
+"""
+Tests for cross-request micro-batching of query embeddings.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from tests.fakes import FakeJS, FakeMsg, FakeNATS
+
+from src.deepthought.memory.embedding import BatchedVectorRetriever, BatchingEmbedder
+from src.deepthought.memory.vector_index import FlatIndex, HashingEmbedder, VectorRetriever
+from src.deepthought.modules.memory_stub import MemoryStub
+
+
+class RecordingEmbedder:
+    def __init__(self, delay=0.0):
+        self.inner = HashingEmbedder(32)
+        self.delay = delay
+        self.batches = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.batches.append(len(texts))
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return self.inner(texts)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_share_batches():
+    inner = RecordingEmbedder()
+    service = BatchingEmbedder(inner, max_batch=16, window=0.01)
+    texts = [f"query number {i}" for i in range(40)]
+    vectors = await service.embed_many(texts)
+    assert np.allclose(vectors, HashingEmbedder(32)(texts))
+    assert sum(inner.batches) == 40
+    assert len(inner.batches) <= 4
+    stats = service.stats()
+    assert stats["requests"] == 40 and stats["mean_batch_size"] >= 10
+
+
+@pytest.mark.asyncio
+async def test_latency_cap_starts_parallel_batch():
+    inner = RecordingEmbedder(delay=0.2)
+    service = BatchingEmbedder(inner, max_batch=64, window=0.001, max_latency=0.02)
+    first = asyncio.ensure_future(service.embed("first"))
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    await service.embed("second")
+    await first
+    # The second query did not wait for the first 200 ms batch to finish
+    assert time.perf_counter() - started < 0.35
+    assert inner.max_active == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller():
+    def broken(texts):
+        raise RuntimeError("model unavailable")
+
+    service = BatchingEmbedder(broken, window=0.001)
+    results = await asyncio.gather(service.embed("a"), service.embed("b"), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+    short = BatchingEmbedder(lambda texts: HashingEmbedder(32)(texts[:-1]), max_batch=2, window=0.001)
+    results = await asyncio.wait_for(asyncio.gather(*(short.embed(t) for t in "abc"), return_exceptions=True), 1.0)
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_batched_vector_retriever():
+    retriever = VectorRetriever(FlatIndex(256), HashingEmbedder(256))
+    retriever.add_facts(["Berlin is the capital of Germany", "The Eiffel Tower is in Paris"])
+    batched = BatchedVectorRetriever(retriever, BatchingEmbedder(HashingEmbedder(256)))
+    results = await asyncio.gather(batched.retrieve("capital of Germany", 1), batched.retrieve("Eiffel Tower", 1))
+    assert [r["facts"] for r in results] == [["Berlin is the capital of Germany"], ["The Eiffel Tower is in Paris"]]
+
+
+@pytest.mark.asyncio
+async def test_memory_stage_batches_concurrent_inputs():
+    inner = RecordingEmbedder()
+    retriever = VectorRetriever(FlatIndex(32), HashingEmbedder(32))
+    retriever.add_facts(["Berlin is the capital of Germany"])
+    js = FakeJS()
+    stub = MemoryStub(FakeNATS(), js, retriever=BatchedVectorRetriever(retriever, BatchingEmbedder(inner, window=0.02)))
+    assert await stub.start_listening()
+    msgs = [FakeMsg({"input_id": str(i), "user_input": f"question {i}"}, seq=i + 1) for i in range(5)]
+    for msg in msgs:
+        await js.handlers[0](msg)
+    await stub.stop_listening(drain_timeout=1.0)
+    assert all(msg.acked for msg in msgs)
+    assert inner.batches == [5]
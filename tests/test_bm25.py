@@ -0,0 +1,81 @@
+# File: tests/test_bm25.py
+"""
+Tests for the incremental BM25 inverted index.
+"""
+import math
+import random
+from collections import Counter
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.deepthought.memory.bm25 import BLOCK_SIZE, BM25Index
+from src.deepthought.memory.retriever import tokenize
+
+WORDS = [f"w{i}" for i in range(200)]
+
+
+def _corpus(n, seed=0):
+    rng = random.Random(seed)
+    # Zipf-like vocabulary so some terms span many blocks
+    return [" ".join(rng.choices(WORDS, weights=[1 / (i + 1) for i in range(len(WORDS))], k=rng.randint(3, 12)))
+            for _ in range(n)]
+
+
+def _exhaustive(index, docs, query, top_k):
+    live = [(i, d) for i, d in enumerate(docs) if d is not None]
+    avgdl = sum(len(tokenize(d)) for _, d in live) / len(live)
+    df = Counter(t for _, d in live for t in set(tokenize(d)))
+    scores = []
+    for i, d in live:
+        tfs, dl, score = Counter(tokenize(d)), len(tokenize(d)), 0.0
+        for term, qtf in Counter(tokenize(query)).items():
+            if tfs[term]:
+                idf = math.log(1 + (len(live) - df[term] + 0.5) / (df[term] + 0.5))
+                tf = tfs[term]
+                score += qtf * idf * tf * (index.k1 + 1) / (tf + index.k1 * (1 - index.b + index.b * dl / avgdl))
+        if score > 0:
+            scores.append((score, i))
+    return sorted(scores, reverse=True)[:top_k]
+
+
+def test_wand_matches_exhaustive_scoring():
+    docs = _corpus(3 * BLOCK_SIZE * 4)
+    index = BM25Index()
+    index.add_many(docs)
+    for query in ["w0 w17", "w3 w150 w199", "w1 w1 w42", "w5"]:
+        expected = _exhaustive(index, docs, query, 10)
+        found = index.search(query, top_k=10)
+        assert [round(s, 6) for _, s in found] == [round(s, 6) for s, _ in expected]
+
+
+def test_incremental_add_and_delete():
+    docs = _corpus(1000, seed=1)
+    index = BM25Index()
+    index.add_many(docs[:600])
+    for i in range(0, 600, 3):
+        assert index.delete(i)
+        docs[i] = None
+    assert not index.delete(0)
+    index.add_many(docs[600:])
+    assert len(index) == sum(d is not None for d in docs)
+    query = "w2 w30 w77"
+    expected = [round(s, 6) for s, _ in _exhaustive(index, docs, query, 5)]
+    assert [round(s, 6) for _, s in index.search(query, 5)] == expected
+    before = index.nbytes
+    index.compact()
+    assert index.nbytes < before
+    assert [round(s, 6) for _, s in index.search(query, 5)] == expected
+    assert all(docs[i] is not None for i, _ in index.search(query, 50))
+
+
+def test_retrieve_interface():
+    index = BM25Index()
+    index.add_many(["The Eiffel Tower is in Paris", "Berlin is the capital of Germany",
+                    "Paris is the capital of France"])
+    result = index.retrieve("capital of Germany", top_k=2)
+    assert result["facts"][0] == "Berlin is the capital of Germany"
+    assert result["source"] == "bm25"
+    assert len(result["scores"]) == 2
+    assert BM25Index().retrieve("anything")["facts"] == []
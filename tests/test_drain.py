@@ -0,0 +1,76 @@
+# File: tests/test_drain.py
+"""
+Tests for graceful subscriber drain with in-flight accounting.
+"""
+import asyncio
+
+import pytest
+
+from tests.fakes import FakeJS, FakeMsg, FakeNATS
+
+from src.deepthought.modules.memory_stub import MemoryStub
+
+SUBJECT = "dtr.input.received"
+
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_running_handler_and_rejects_new_messages():
+    nc, js = FakeNATS(), FakeJS(publish_delay=0.05)
+    stub = MemoryStub(nc, js)
+    assert await stub.start_listening()
+    handler = js.handlers[0]
+
+    running = FakeMsg({"input_id": "a", "user_input": "hi"}, SUBJECT, 1)
+    task = asyncio.create_task(handler(running))
+    await asyncio.sleep(0.01)
+    drain = asyncio.create_task(stub.stop_listening(drain_timeout=5.0))
+    await asyncio.sleep(0.01)
+    late = FakeMsg({"input_id": "b", "user_input": "hi"}, SUBJECT, 2)
+    await handler(late)
+
+    report = await drain
+    await task
+    assert running.acked
+    assert late.naked and not late.acked
+    assert report.completed == 1
+    assert report.rejected == 1
+    assert report.clean
+    assert nc.flushed
+
+
+@pytest.mark.asyncio
+async def test_drain_stops_delivery_so_rejected_messages_are_not_redelivered_here():
+    nc, js = FakeNATS(), FakeJS(publish_delay=0.05)
+    stub = MemoryStub(nc, js)
+    assert await stub.start_listening()
+    sub = js.subs[0]
+
+    running = FakeMsg({"input_id": "a", "user_input": "hi"}, SUBJECT, 1, js)
+    task = asyncio.create_task(sub.cb(running))
+    await asyncio.sleep(0.01)
+    buffered = FakeMsg({"input_id": "b", "user_input": "hi"}, SUBJECT, 2, js)
+    buffered.deliveries = 1
+    sub.buffered.append(buffered)
+
+    report = await stub.stop_listening(drain_timeout=5.0)
+    await task
+    assert not sub.active
+    assert buffered.naked and not buffered.acked
+    assert buffered.deliveries == 1 and js.undelivered == [buffered]
+    assert report.rejected == 1 and report.completed == 1 and report.clean
+
+
+@pytest.mark.asyncio
+async def test_drain_reports_abandoned_handlers_at_deadline():
+    nc, js = FakeNATS(), FakeJS(publish_delay=1.0)
+    stub = MemoryStub(nc, js)
+    assert await stub.start_listening()
+
+    slow = FakeMsg({"input_id": "slow", "user_input": "hi"}, SUBJECT, 7)
+    task = asyncio.create_task(js.handlers[0](slow))
+    await asyncio.sleep(0.01)
+    report = await stub.stop_listening(drain_timeout=0.2)
+    assert report.abandoned == ["dtr.input.received#7"]
+    assert report.pending_publishes == 1
+    assert not report.clean
+    task.cancel()
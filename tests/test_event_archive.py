@@ -0,0 +1,59 @@
+# File: tests/test_event_archive.py
+"""
+Tests for the input_id-indexed EventArchive.
+"""
+import json
+
+from src.deepthought.eda.archive import EventArchive
+from src.deepthought.eda.events import EventSubjects
+
+
+def _event(input_id, stage):
+    return json.dumps({"input_id": input_id, "stage": stage}).encode()
+
+
+def _fill(archive, count, start=1):
+    subjects = [EventSubjects.INPUT_RECEIVED, EventSubjects.MEMORY_RETRIEVED, EventSubjects.RESPONSE_GENERATED]
+    seq = start
+    for i in range(count):
+        for subject in subjects:
+            archive.append(seq, seq * 1000, subject, _event(f"id-{i}", subject))
+            seq += 1
+    return seq
+
+
+def test_lookup_returns_full_trace(tmp_path):
+    with EventArchive(str(tmp_path), max_memtable_entries=50) as archive:
+        _fill(archive, 100)
+        archive.append(301, 301000, "dtr.other", b"not json")
+        trace = archive.lookup("id-42")
+        assert [e.subject for e in trace] == [
+            EventSubjects.INPUT_RECEIVED, EventSubjects.MEMORY_RETRIEVED, EventSubjects.RESPONSE_GENERATED]
+        assert json.loads(trace[0].data)["input_id"] == "id-42"
+        assert archive.lookup("missing") == []
+
+
+def test_duplicate_sequences_are_ignored(tmp_path):
+    with EventArchive(str(tmp_path)) as archive:
+        assert archive.append(1, 1, EventSubjects.INPUT_RECEIVED, _event("a", "x"))
+        assert not archive.append(1, 1, EventSubjects.INPUT_RECEIVED, _event("a", "x"))
+        assert len(archive.lookup("a")) == 1
+
+
+def test_compaction_and_reopen(tmp_path):
+    archive = EventArchive(str(tmp_path), max_memtable_entries=30, max_runs=100)
+    next_seq = _fill(archive, 100)
+    assert archive.run_count > 2
+    archive.compact()
+    assert archive.run_count == 1
+    # Leave the last events unflushed from the index to exercise recovery
+    archive.append(next_seq, 0, EventSubjects.INPUT_RECEIVED, _event("late", "x"))
+    archive.flush()
+    archive._memtable = {}
+    archive._writer.close()
+
+    reopened = EventArchive(str(tmp_path))
+    assert reopened.last_seq == next_seq
+    assert len(reopened.lookup("id-7")) == 3
+    assert len(reopened.lookup("late")) == 1
+    reopened.close()
@@ -0,0 +1,64 @@
+# File: tests/test_graph_traversal.py
+"""
+Tests for budgeted multi-hop knowledge graph traversal.
+"""
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.deepthought.memory.graph import KnowledgeGraph
+from src.deepthought.memory.traversal import (GraphTraversal, NeighborSummaries, TraversalBudget,
+                                              TraversalRetriever)
+
+
+def _graph(hub_size=20000):
+    graph = KnowledgeGraph()
+    facts = [("Marie Curie", "born_in", "Warsaw"), ("Warsaw", "capital_of", "Poland"),
+             ("Poland", "member_of", "European Union"), ("Marie Curie", "won", "Nobel Prize"),
+             ("Marie Curie", "citizen_of", "Earth")]
+    # "Earth" is a hub that everybody is a citizen of
+    facts += [(f"person {i}", "citizen_of", "Earth") for i in range(hub_size)]
+    graph.add_facts(facts)
+    return graph
+
+
+def test_two_hop_expansion_ranks_specific_paths_first():
+    graph = _graph(hub_size=200)
+    traversal = GraphTraversal(graph, TraversalBudget(max_hops=2, max_seconds=1.0))
+    subgraph = traversal.traverse(graph.match_entities("Marie Curie"))
+    result = subgraph.to_dict(graph)
+    edges = [(e["source"], e["relation"], e["target"]) for e in result["edges"]]
+    assert ("Warsaw", "capital_of", "Poland") in edges
+    assert ("Poland", "member_of", "European Union") not in edges
+    names = [n["name"] for n in result["nodes"]]
+    assert names[0] == "Marie Curie"
+    # The hub is reachable but scores below the specific neighbours
+    assert names.index("Earth") > names.index("Warsaw")
+    assert max(n["hops"] for n in result["nodes"]) == 2
+
+
+def test_budgets_bound_work_on_hubs():
+    graph = _graph()
+    budget = TraversalBudget(max_hops=3, max_nodes=10, max_fanout=16, max_scan=512, max_seconds=1.0)
+    subgraph = GraphTraversal(graph, budget).traverse(graph.match_entities("Earth"))
+    assert len(subgraph.nodes) <= 10
+    assert subgraph.exhausted == "nodes"
+    summaries = NeighborSummaries(graph, min_degree=1000, top_n=8)
+    assert graph.nodes.get("Earth") in summaries and len(summaries) == 1
+    with_summaries = GraphTraversal(graph, budget, summaries).traverse(graph.match_entities("Earth"))
+    assert with_summaries.edges_scanned <= subgraph.edges_scanned
+    tight = GraphTraversal(graph, TraversalBudget(max_edges=10, max_seconds=1.0)).traverse([0])
+    assert tight.exhausted == "edges"
+
+
+def test_retriever_serializes_ranked_subgraph():
+    graph = _graph(hub_size=50)
+    retriever = TraversalRetriever(graph, TraversalBudget(max_seconds=1.0))
+    result = retriever.retrieve("Where was Marie Curie born?", top_k=3)
+    assert result["entities"] == ["Marie Curie"]
+    assert len(result["facts"]) == 3
+    assert result["source"] == "knowledge_graph"
+    assert json.loads(json.dumps(result)) == result
+    assert retriever.retrieve("nothing known here")["facts"] == []
@@ -0,0 +1,52 @@
+# File: tests/test_import_time.py
+"""
+Startup-time budget for importing the DeepThought packages.
+
+Short-lived workers pay the package import cost on every start, so importing
+``deepthought`` and its subpackages must stay cheap and must not load the
+NATS client until a component that needs it is used.
+"""
+import json
+import os
+import subprocess
+import sys
+
+#: Cold import budget in milliseconds; override with DEEPTHOUGHT_IMPORT_BUDGET_MS
+IMPORT_BUDGET_MS = float(os.getenv("DEEPTHOUGHT_IMPORT_BUDGET_MS", "250"))
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import src.deepthought
+import src.deepthought.config
+import src.deepthought.eda
+import src.deepthought.modules
+elapsed = (time.perf_counter() - start) * 1000
+heavy = [m for m in ("nats", "numpy", "torch", "transformers") if m in sys.modules]
+print(json.dumps({"ms": elapsed, "heavy": heavy}))
+"""
+
+
+def _probe() -> dict:
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=REPO_ROOT, capture_output=True,
+                         text=True, check=True, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"})
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_package_import_does_not_load_heavy_dependencies():
+    assert _probe()["heavy"] == []
+
+
+def test_cold_import_within_budget():
+    # Best of three runs filters out scheduler noise on shared CI machines
+    best = min(_probe()["ms"] for _ in range(3))
+    assert best <= IMPORT_BUDGET_MS, f"Importing deepthought took {best:.1f}ms (budget {IMPORT_BUDGET_MS}ms)"
+
+
+def test_lazy_attributes_resolve():
+    from src.deepthought import eda, modules
+    assert eda.EventSubjects.INPUT_RECEIVED == "dtr.input.received"
+    assert modules.MemoryStub.__name__ == "MemoryStub"
+    assert "Publisher" in dir(eda)
@@ -0,0 +1,60 @@
+# File: tests/test_knowledge_graph.py
+"""
+Tests for the CSR-backed knowledge graph and its MemoryStub integration.
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from tests.fakes import FakeNATS
+
+from src.deepthought.memory.graph import GraphRetriever, KnowledgeGraph
+from src.deepthought.modules.memory_stub import MemoryStub
+
+FACTS = [
+    ("Paris", "capital_of", "France"),
+    ("France", "member_of", "European Union"),
+    ("Berlin", "capital_of", "Germany"),
+    ("Paris", "capital_of", "France"),
+]
+
+
+def test_bulk_load_dedupes_and_indexes_both_directions():
+    graph = KnowledgeGraph()
+    assert graph.add_facts(FACTS) == 4
+    assert graph.num_edges == 3
+    assert graph.facts_about("paris") == [("Paris", "capital_of", "France")]
+    assert sorted(graph.facts_about("France")) == [
+        ("France", "member_of", "European Union"), ("Paris", "capital_of", "France")]
+    assert graph._out.targets.dtype == np.int32
+
+
+def test_incremental_inserts_are_visible_before_and_after_merge():
+    graph = KnowledgeGraph(merge_threshold=3)
+    graph.add_facts(FACTS[:1])
+    graph.add_fact("Paris", "located_on", "Seine")
+    assert ("Paris", "located_on", "Seine") in graph.facts_about("Paris")
+    assert graph.degree(graph.nodes.get("Paris")) == 2
+    graph.add_fact("Lyon", "located_in", "France")
+    graph.add_fact("Lyon", "located_on", "Rhone")
+    assert graph._pending_src == []
+    assert ("Lyon", "located_in", "France") in graph.facts_about("France")
+
+
+def test_retriever_matches_multi_word_entities():
+    graph = KnowledgeGraph()
+    graph.add_facts(FACTS)
+    result = GraphRetriever(graph).retrieve("Tell me about the European Union", top_k=5)
+    assert result["entities"] == ["European Union"]
+    assert result["facts"] == ["France member_of European Union"]
+    assert result["source"] == "knowledge_graph"
+
+
+@pytest.mark.asyncio
+async def test_memory_stub_uses_retriever():
+    graph = KnowledgeGraph()
+    graph.add_facts(FACTS)
+    stub = MemoryStub(FakeNATS(), object(), retriever=GraphRetriever(graph))
+    payload = await stub.retrieve({"input_id": "i1", "user_input": "What is Berlin?"})
+    knowledge = payload.retrieved_knowledge["retrieved_knowledge"]
+    assert knowledge["facts"] == ["Berlin capital_of Germany"]
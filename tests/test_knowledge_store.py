@@ -0,0 +1,74 @@
+# File: tests/test_knowledge_store.py
+"""
+Tests for the memory-mapped knowledge store.
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.deepthought.memory.graph import GraphRetriever, KnowledgeGraph
+from src.deepthought.memory.store import KnowledgeStore
+from src.deepthought.memory.vector_index import FlatIndex, HashingEmbedder, IVFIndex, VectorRetriever
+
+FACTS = ["Paris is the capital of France", "Berlin is the capital of Germany",
+         "The Louvre is in Paris", "Mount Everest is the tallest mountain"]
+
+
+def _graph():
+    graph = KnowledgeGraph()
+    graph.add_facts([("Paris", "capital_of", "France"), ("Berlin", "capital_of", "Germany"),
+                     ("France", "member_of", "European Union")])
+    graph.nodes.intern("Isolated")
+    return graph
+
+
+def test_round_trip_is_zero_copy(tmp_path):
+    path = str(tmp_path / "kb.store")
+    vectors = VectorRetriever(FlatIndex(64), HashingEmbedder(64))
+    vectors.add_facts(FACTS)
+    KnowledgeStore.write(path, facts=FACTS, graph=_graph(), vectors=vectors)
+
+    with KnowledgeStore(path) as store:
+        assert list(store.facts) == FACTS
+        assert store.facts[-1] == FACTS[-1]
+        indptr = store.array("graph.out.indptr")
+        assert not indptr.flags.owndata and not indptr.flags.writeable
+
+        graph = store.graph()
+        assert graph.facts_about("paris") == [("Paris", "capital_of", "France")]
+        assert graph.nodes.get("isolated") is not None
+        result = GraphRetriever(graph).retrieve("Tell me about the European Union")
+        assert result["facts"] == ["France member_of European Union"]
+
+        retriever = store.vector_retriever()
+        assert retriever.retrieve("capital of Germany", top_k=1) == vectors.retrieve("capital of Germany", top_k=1)
+
+
+def test_mapped_structures_accept_writes(tmp_path):
+    path = str(tmp_path / "kb.store")
+    rng = np.random.default_rng(0)
+    facts = [f"fact {i} about topic {i % 7}" for i in range(200)]
+    ivf = VectorRetriever(IVFIndex(32, nlist=8, nprobe=8), HashingEmbedder(32))
+    ivf.add_facts(facts)
+    KnowledgeStore.write(path, graph=_graph(), vectors=ivf)
+
+    store = KnowledgeStore(path)
+    graph = store.graph()
+    graph.add_fact("Lyon", "city_in", "France")
+    assert ("Lyon", "city_in", "France") in graph.facts_about("France")
+    graph.merge()
+    assert graph.facts_about("Lyon") == [("Lyon", "city_in", "France")]
+    assert graph.facts_about("Berlin") == [("Berlin", "capital_of", "Germany")]
+
+    retriever = store.vector_retriever()
+    query = facts[rng.integers(0, 200)]
+    assert retriever.retrieve(query, top_k=1)["facts"] == [query]
+    retriever.add_facts(["a brand new memory"])
+    assert retriever.retrieve("a brand new memory", top_k=1)["facts"] == ["a brand new memory"]
+
+
+def test_rejects_foreign_files(tmp_path):
+    path = tmp_path / "not-a-store"
+    path.write_bytes(b"x" * 64)
+    with pytest.raises(ValueError):
+        KnowledgeStore(str(path))
@@ -0,0 +1,103 @@
+# File: tests/test_lag_monitor.py
+"""
+Tests for consumer lag tracking, scaling decisions and the worker supervisor.
+"""
+import sys
+import types
+
+import pytest
+
+from tests.fakes import FakeNATS
+
+from src.deepthought.eda.events import EventSubjects
+from src.deepthought.eda.lag_monitor import ConsumerLagMonitor, LagSample, LagTracker, ScalingPolicy
+from src.deepthought.eda.supervisor import WorkerSupervisor
+
+
+def _tracker(backlogs, acked_step=10):
+    tracker = LagTracker(window=10)
+    for i, backlog in enumerate(backlogs):
+        tracker.add(LagSample(float(i), backlog, 0, 0, i * acked_step))
+    return tracker
+
+
+def test_tracker_rates_and_drain_estimate():
+    growing = _tracker([0, 10, 20, 30])
+    assert growing.backlog_rate() == pytest.approx(10.0)
+    assert growing.processing_rate() == pytest.approx(10.0)
+    assert growing.arrival_rate() == pytest.approx(20.0)
+    assert growing.drain_seconds() is None
+
+    draining = _tracker([40, 30, 20, 10])
+    assert draining.drain_seconds() == pytest.approx(1.0)
+    assert _tracker([0, 0]).drain_seconds() == 0.0
+
+
+def test_policy_uses_capacity_and_limits():
+    policy = ScalingPolicy(target_drain_seconds=10, min_workers=1, max_workers=4)
+    # 20 msg/s arriving plus 30 queued / 10s drain target = 23 msg/s at 10 msg/s per worker
+    assert policy.desired_workers(_tracker([0, 10, 20, 30]), current=1, capacity=10.0) == 3
+    assert policy.desired_workers(_tracker([0, 100, 200, 300]), current=1, capacity=10.0) == 4
+    # Unknown capacity: only react to a backlog that is not shrinking
+    assert policy.desired_workers(_tracker([5, 6, 7]), current=2) == 3
+    assert policy.desired_workers(_tracker([0, 0, 0]), current=2) == 2
+
+
+class _FakeJS:
+    def __init__(self):
+        self.pending = 0
+        self.acked = 0
+
+    async def consumer_info(self, stream, name):
+        return types.SimpleNamespace(name=name, num_pending=self.pending, num_ack_pending=0,
+                                     num_redelivered=0,
+                                     ack_floor=types.SimpleNamespace(consumer_seq=self.acked))
+
+
+@pytest.mark.asyncio
+async def test_monitor_scales_up_then_down_with_hysteresis(monkeypatch):
+    js = _FakeJS()
+    clock = iter(range(100))
+    monkeypatch.setattr("src.deepthought.eda.lag_monitor.time.monotonic", lambda: float(next(clock)))
+    nc = types.SimpleNamespace(is_connected=True)
+    policy = ScalingPolicy(target_drain_seconds=10, max_workers=4, worker_capacity=10.0, scale_down_after=2)
+    monitor = ConsumerLagMonitor(nc, js, consumers=["llm_stub_listener"], policy=policy, publish=False)
+
+    for pending in (0, 50, 100):
+        js.pending = pending
+        js.acked += 10
+        report = (await monitor.collect())["llm_stub_listener"]
+    assert report.action == "scale_up"
+    assert report.recommended_workers > report.current_workers > 1
+
+    js.pending = 0
+    actions = []
+    for _ in range(12):
+        js.acked += 1
+        actions.append((await monitor.collect())["llm_stub_listener"].action)
+    assert "scale_down" in actions
+    assert actions[0] == "hold"
+    assert monitor.latest("llm_stub_listener").recommended_workers < report.recommended_workers
+
+
+@pytest.mark.asyncio
+async def test_reports_are_published_outside_the_event_stream():
+    nc = FakeNATS()
+    monitor = ConsumerLagMonitor(nc, _FakeJS(), consumers=["llm_stub_listener"])
+    await monitor.collect()
+    assert [r["consumer"] for r in nc.messages(EventSubjects.CONSUMER_LAG)] == ["llm_stub_listener"]
+    # deepthought_events stores dtr.>; lag reports must not add stream and archive records
+    assert not EventSubjects.CONSUMER_LAG.startswith("dtr.")
+
+
+@pytest.mark.asyncio
+async def test_supervisor_scales_processes():
+    supervisor = WorkerSupervisor([sys.executable, "-c", "import time; time.sleep(60)"],
+                                  min_workers=0, max_workers=3, stop_timeout=5.0)
+    try:
+        assert await supervisor.scale_to(5) == 3
+        assert supervisor.worker_count == 3
+        assert await supervisor.scale_to(1) == 1
+    finally:
+        await supervisor.stop_all()
+    assert supervisor.worker_count == 0
@@ -0,0 +1,76 @@
+# File: tests/test_llm_cold_start.py
+"""
+Tests for memory-mapped model loading, engine warm-up and time-to-ready.
+"""
+import pytest
+
+from tests.fakes import FakeNATS, RecordingEngine
+from tests.tiny_lm import tiny_model, tiny_tokenizer, torch
+
+from src.deepthought.llm.engine import ContinuousBatchingEngine
+from src.deepthought.llm.loader import load_mapped_model, map_safetensors
+from src.deepthought.modules.llm_stub import LLMStub
+
+
+@pytest.mark.parametrize("shard", [None, "100KB"])
+def test_mapped_checkpoint_matches_and_never_writes_the_file(tmp_path, shard):
+    options = {"max_shard_size": shard} if shard else {}
+    tiny_model().save_pretrained(tmp_path, **options)
+    model = load_mapped_model(str(tmp_path))
+    ids = torch.randint(2, 258, (2, 16))
+    with torch.no_grad():
+        assert torch.equal(model(ids).logits, tiny_model()(ids).logits)
+    assert not any(p.is_meta for p in model.parameters())
+
+    weight = model.model.layers[0].self_attn.q_proj.weight
+    before = weight.detach().clone()
+    with torch.no_grad():
+        weight.add_(1.0)  # a private copy-on-write page; the file is untouched
+    reloaded = load_mapped_model(str(tmp_path)).model.layers[0].self_attn.q_proj.weight
+    assert torch.equal(reloaded, before)
+
+
+def test_map_safetensors_reads_dtypes_in_place(tmp_path):
+    from safetensors.torch import save_file
+    tensors = {"a": torch.arange(6, dtype=torch.int64).view(2, 3), "b": torch.ones(4, dtype=torch.bfloat16),
+               "empty": torch.zeros(0, 3)}
+    save_file(tensors, tmp_path / "t.safetensors")
+    mapped = map_safetensors(str(tmp_path / "t.safetensors"))
+    for name, tensor in tensors.items():
+        assert mapped[name].dtype == tensor.dtype and torch.equal(mapped[name], tensor)
+
+
+@pytest.mark.asyncio
+async def test_warm_up_resets_counters_but_keeps_step_estimate(tmp_path):
+    tiny_model().save_pretrained(tmp_path)
+    tiny_tokenizer().save_pretrained(tmp_path)
+    engine = ContinuousBatchingEngine.from_pretrained(str(tmp_path), max_batch_size=3)
+    engine._eos = set()
+    assert engine.load_seconds > 0
+    seconds = await engine.warm_up(max_new_tokens=4)
+    stats = engine.stats()
+    assert seconds == stats["warmup_seconds"] > 0
+    assert stats["requests"] == stats["steps"] == stats["tokens_generated"] == 0
+    assert engine._step_seconds > 0 and engine._mean_tokens is None
+    await engine.close()
+
+
+@pytest.mark.asyncio
+async def test_stub_warms_up_before_subscribing():
+    subscribed = []
+
+    async def subscribe(**kwargs):
+        subscribed.append((kwargs["subject"], list(engine.warmups)))
+
+    engine = RecordingEngine()
+    stub = LLMStub(FakeNATS(), object(), engine=engine, warmup_prompt="hello", warmup_tokens=3)
+    stub._subscriber.subscribe = subscribe
+    assert await stub.start_listening()
+    assert subscribed == [("dtr.memory.retrieved", [("hello", 3)])]
+    assert stub.time_to_ready > 0
+
+    subscribed.clear()
+    broken = LLMStub(FakeNATS(), object(), engine=RecordingEngine(warmup_error=RuntimeError("bad weights")))
+    broken._subscriber.subscribe = subscribe
+    assert not await broken.start_listening()
+    assert subscribed == [] and broken.time_to_ready is None
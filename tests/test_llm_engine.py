@@ -0,0 +1,128 @@
+# File: tests/test_llm_engine.py
+"""
+Tests for the continuous-batching generation engine and its use by LLMStub.
+"""
+import asyncio
+
+import pytest
+
+from tests.fakes import FakeJS, FakeNATS
+from tests.tiny_lm import tiny_model, tiny_tokenizer, torch
+
+from src.deepthought.eda.subscriber import Subscriber
+from src.deepthought.llm.engine import ContinuousBatchingEngine, GenerationParams
+from src.deepthought.llm.prompt import build_prompt
+from src.deepthought.modules.llm_stub import LLMStub
+
+PROMPTS = ["hello there", "the capital of France is", "a", "once upon a time, in a land far away"]
+
+
+def _reference(model, tokenizer, prompt, max_new_tokens):
+    ids = torch.tensor([tokenizer.encode(prompt)])
+    out = model.generate(ids, attention_mask=torch.ones_like(ids), max_new_tokens=max_new_tokens,
+                         do_sample=False, pad_token_id=0)
+    return out[0, ids.shape[1]:].tolist()
+
+
+@pytest.mark.asyncio
+async def test_greedy_batch_matches_sequential_generation_with_staggered_arrivals():
+    model, tokenizer = tiny_model(), tiny_tokenizer()
+    engine = ContinuousBatchingEngine(model, tokenizer, max_batch_size=3)
+    params = GenerationParams(max_new_tokens=12)
+
+    async def submit(i, prompt):
+        await asyncio.sleep(0.005 * i)
+        return await engine.generate(prompt, params)
+
+    results = await asyncio.gather(*(submit(i, p) for i, p in enumerate(PROMPTS * 2)))
+    await engine.close()
+    for prompt, result in zip(PROMPTS * 2, results):
+        expected = _reference(model, tokenizer, prompt, 12)
+        assert result.token_ids == expected[:len(result.token_ids)]
+        assert result.finish_reason in ("eos", "length")
+        assert 0.0 < result.confidence <= 1.0
+        assert result.ttft <= result.latency
+    stats = engine.stats()
+    assert stats["completed"] == len(PROMPTS) * 2
+    assert 1.0 < stats["mean_batch_size"] <= 3
+    assert stats["running"] == stats["waiting"] == 0
+
+
+@pytest.mark.asyncio
+async def test_length_eos_and_context_limits():
+    model, tokenizer = tiny_model(), tiny_tokenizer()
+    engine = ContinuousBatchingEngine(model, tokenizer)
+    first = (await engine.generate("hello", GenerationParams(max_new_tokens=1))).token_ids[0]
+    assert (await engine.generate("hello", GenerationParams(max_new_tokens=5))).finish_reason == "length"
+
+    engine._eos = {first}
+    result = await engine.generate("hello", GenerationParams(max_new_tokens=5))
+    assert result.finish_reason == "eos" and result.token_ids == [first]
+    engine._eos = set()
+    engine._max_positions = 10
+    result = await engine.generate("hello", GenerationParams(max_new_tokens=50))
+    assert result.finish_reason == "context" and len(result.token_ids) == 5
+    await engine.close()
+
+
+@pytest.mark.asyncio
+async def test_seeded_sampling_is_reproducible_within_a_batch():
+    engine = ContinuousBatchingEngine(tiny_model(), tiny_tokenizer())
+    params = GenerationParams(max_new_tokens=16, temperature=1.5, top_k=50, top_p=0.9, seed=3)
+    runs = await asyncio.gather(engine.generate("hello", params), engine.generate("hello", params),
+                                engine.generate("other", GenerationParams(max_new_tokens=16, temperature=1.5)))
+    alone = await engine.generate("hello", params)
+    await engine.close()
+    assert runs[0].token_ids == runs[1].token_ids == alone.token_ids
+
+
+@pytest.mark.asyncio
+async def test_cancelled_request_frees_its_slot():
+    engine = ContinuousBatchingEngine(tiny_model(), tiny_tokenizer(), max_batch_size=1)
+    engine._eos = set()
+    slow = asyncio.create_task(engine.generate("hello", GenerationParams(max_new_tokens=400)))
+    await asyncio.sleep(0.05)
+    assert engine.running == 1
+    slow.cancel()
+    result = await asyncio.wait_for(engine.generate("next", GenerationParams(max_new_tokens=3)), 10)
+    assert len(result.token_ids) == 3
+    assert engine.running == 0
+    await engine.close()
+
+
+@pytest.mark.asyncio
+async def test_llm_stub_generates_from_prompt_with_facts():
+    model, tokenizer = tiny_model(), tiny_tokenizer()
+    engine = ContinuousBatchingEngine(model, tokenizer, max_batch_size=4)
+    nc, js = FakeNATS(), FakeJS()
+    stub = LLMStub(nc, js, engine=engine, params=GenerationParams(max_new_tokens=6))
+    data = {"input_id": "i1", "user_input": "Where is Paris?",
+            "retrieved_knowledge": {"retrieved_knowledge": {"facts": ["Paris is in France"]}}}
+    payload = await stub.generate(data)
+    await engine.close()
+    prompt = build_prompt("Where is Paris?", ["Paris is in France"])
+    assert "- Paris is in France\n\n### Response:\n" in prompt
+    expected = _reference(model, tokenizer, prompt, 6)
+    assert payload.input_id == "i1"
+    assert payload.final_response == tokenizer.decode(expected, skip_special_tokens=True).strip()
+
+
+@pytest.mark.asyncio
+async def test_subscriber_runs_handlers_concurrently_up_to_limit():
+    js = FakeJS()
+    subscriber = Subscriber(FakeNATS(), js)
+    running, peak = 0, 0
+
+    async def handler(msg):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+
+    await subscriber.subscribe("dtr.test", handler, use_jetstream=True, durable="t", max_concurrency=3)
+    for i in range(7):
+        await js.handlers[0](object())
+    while running:
+        await asyncio.sleep(0.01)
+    assert peak == 3
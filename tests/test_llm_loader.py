@@ -0,0 +1,74 @@
+# File: tests/test_llm_loader.py
+"""
+Tests for merging the LoRA adapter and the int8 CPU serving path.
+"""
+import pytest
+
+from tests.tiny_lm import tiny_model, tiny_tokenizer, torch
+
+from src.deepthought.llm.engine import ContinuousBatchingEngine, GenerationParams
+from src.deepthought.llm.loader import load_cpu_model, merge_lora, model_nbytes, quantize_int8
+from src.deepthought.llm.prompt import build_prompt
+
+peft = pytest.importorskip("peft")
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    """A saved tiny base model and a trained-looking (non-zero) LoRA adapter for it."""
+    base_dir, adapter_dir = tmp_path / "base", tmp_path / "adapter"
+    tiny_model().save_pretrained(base_dir)
+    tiny_tokenizer().save_pretrained(base_dir)
+    config = peft.LoraConfig(r=4, lora_alpha=8, target_modules=["q_proj", "k_proj", "v_proj", "o_proj"],
+                             init_lora_weights=False)
+    base = type(tiny_model()).from_pretrained(base_dir)
+    adapted = peft.get_peft_model(base, config)
+    adapted.save_pretrained(adapter_dir)
+    return base_dir, adapter_dir, adapted.eval()
+
+
+def _greedy_agreement(reference, model, ids):
+    with torch.no_grad():
+        return (reference(ids).logits.argmax(-1) == model(ids).logits.argmax(-1)).float().mean().item()
+
+
+def test_merged_adapter_matches_the_unmerged_model(checkpoint):
+    base_dir, adapter_dir, adapted = checkpoint
+    ids = torch.randint(2, 258, (2, 24))
+    merged = merge_lora(tiny_model(), str(adapter_dir))
+    assert not any("lora" in name for name, _ in merged.named_parameters())
+    with torch.no_grad():
+        expected = adapted(ids).logits
+        assert torch.allclose(merged(ids).logits, expected, atol=1e-5)
+        assert not torch.allclose(tiny_model()(ids).logits, expected, atol=1e-3)
+
+    # The base model is found from the adapter's config
+    model, tokenizer = load_cpu_model(adapter_path=str(adapter_dir), quantize=False)
+    assert tokenizer.eos_token == "</s>"
+    with torch.no_grad():
+        assert torch.allclose(model(ids).logits, expected, atol=1e-5)
+
+
+def test_int8_model_is_smaller_and_agrees_with_fp32():
+    reference = tiny_model(layers=4)
+    model = quantize_int8(tiny_model(layers=4))
+    linears = [m for name, m in model.named_modules() if isinstance(m, torch.nn.Linear)]
+    assert [type(m).__name__ for m in linears] == ["Linear"]  # lm_head stays fp32
+    linear_bytes = sum(m.weight.numel() * 4 for m in reference.modules()
+                       if isinstance(m, torch.nn.Linear) and m is not reference.lm_head)
+    saved = model_nbytes(reference) - model_nbytes(model)
+    assert saved > 0.7 * linear_bytes
+    ids = torch.randint(2, 258, (4, 64), generator=torch.Generator().manual_seed(0))
+    assert _greedy_agreement(reference, model, ids) > 0.85
+
+
+@pytest.mark.asyncio
+async def test_engine_serves_the_merged_int8_model(checkpoint):
+    base_dir, adapter_dir, _ = checkpoint
+    engine = ContinuousBatchingEngine.from_pretrained(str(base_dir), adapter_path=str(adapter_dir),
+                                                      quantize=True, max_batch_size=2)
+    assert engine.model.model.layers[0].self_attn.q_proj.weight().dtype == torch.qint8
+    prompt = build_prompt("What is the capital of France?", ["Paris is the capital of France."])
+    result = await engine.generate(prompt, GenerationParams(max_new_tokens=6))
+    assert result.prompt_tokens > 0 and 0 < len(result.token_ids) <= 6
+    await engine.close()
@@ -0,0 +1,131 @@
+# File: tests/test_llm_scheduler.py
+"""
+Tests for deadline- and priority-aware admission in the LLM stage.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from tests.fakes import FakeJS, FakeMsg, FakeNATS, RecordingEngine
+
+from src.deepthought.llm.scheduler import DeadlineExceeded, RequestScheduler
+from src.deepthought.modules.llm_stub import LLMStub
+from src.deepthought.modules.memory_stub import MemoryStub
+
+
+def _seq(name, priority="interactive", deadline=None, tokens=10):
+    future = asyncio.get_running_loop().create_future()
+    return SimpleNamespace(name=name, priority=priority, deadline=deadline, future=future,
+                           params=SimpleNamespace(max_new_tokens=tokens))
+
+
+def _names(seqs):
+    return [seq.name for seq in seqs]
+
+
+@pytest.mark.asyncio
+async def test_priority_classes_then_earliest_deadline_first():
+    scheduler = RequestScheduler(max_batch_size=8)
+    for seq in [_seq("b-late", "batch", 50.0), _seq("i-none"), _seq("i-late", deadline=40.0),
+                _seq("b-none", "batch"), _seq("i-soon", deadline=20.0), _seq("i-none-2")]:
+        scheduler.push(seq)
+    admitted, dropped = scheduler.admit(free=8, running_batch=0, now=10.0)
+    assert _names(admitted) == ["i-soon", "i-late", "i-none", "i-none-2", "b-late", "b-none"]
+    assert dropped == [] and len(scheduler) == 0
+    with pytest.raises(ValueError):
+        scheduler.push(_seq("x", "urgent"))
+
+
+@pytest.mark.asyncio
+async def test_reserved_slots_keep_batch_work_out():
+    scheduler = RequestScheduler(max_batch_size=4, reserved_slots=2)
+    for i in range(4):
+        scheduler.push(_seq(f"b{i}", "batch"))
+    admitted, _ = scheduler.admit(free=4, running_batch=1, now=0.0)
+    assert _names(admitted) == ["b0"]
+    scheduler.push(_seq("i0"))
+    admitted, _ = scheduler.admit(free=2, running_batch=2, now=0.0)
+    assert _names(admitted) == ["i0"]
+    assert len(scheduler) == 3
+
+
+@pytest.mark.asyncio
+async def test_late_infeasible_and_cancelled_requests_are_not_admitted():
+    scheduler = RequestScheduler(max_batch_size=4)
+    gone = _seq("gone")
+    gone.future.cancel()
+    for seq in [_seq("late", deadline=5.0), _seq("tight", deadline=10.5, tokens=100),
+                _seq("ok", deadline=30.0, tokens=100), gone, _seq("waiting", "batch", deadline=9.0)]:
+        scheduler.push(seq)
+    # 20 tokens expected at 0.1 s each: "tight" needs until 12.0
+    admitted, dropped = scheduler.admit(free=4, running_batch=0, now=10.0, seconds_per_token=0.1, mean_tokens=20)
+    assert _names(admitted) == ["ok"]
+    assert sorted(_names(dropped)) == ["late", "tight", "waiting"]
+
+
+@pytest.mark.asyncio
+async def test_engine_admits_interactive_into_reserved_slot_and_enforces_deadlines():
+    tiny_lm = pytest.importorskip("tests.tiny_lm")
+    from src.deepthought.llm.engine import ContinuousBatchingEngine, GenerationParams
+
+    engine = ContinuousBatchingEngine(tiny_lm.tiny_model(), tiny_lm.tiny_tokenizer(), max_batch_size=2,
+                                      reserved_slots=1)
+    engine._eos = set()
+    long = GenerationParams(max_new_tokens=60)
+    batch = [asyncio.create_task(engine.generate(f"job {i}", long, priority="batch")) for i in range(3)]
+    await asyncio.sleep(0.05)
+    assert engine.running == 1 and engine.waiting == 2
+    interactive = await engine.generate("quick", GenerationParams(max_new_tokens=3))
+    assert len(interactive.token_ids) == 3
+    assert not any(task.done() for task in batch[1:])
+
+    with pytest.raises(DeadlineExceeded):
+        await engine.generate("too late", long, deadline=time.time() - 1)
+    with pytest.raises(DeadlineExceeded, match="while generating"):
+        await engine.generate("slow", GenerationParams(max_new_tokens=400), deadline=time.time() + 0.1)
+    assert engine.stats()["expired"] == 2
+    await asyncio.gather(*batch)
+    await engine.close()
+
+
+@pytest.mark.asyncio
+async def test_stages_carry_deadline_and_drop_expired_events():
+    memory = MemoryStub(FakeNATS(), object())
+    retrieved = await memory.retrieve({"input_id": "i1", "user_input": "hi", "priority": "batch",
+                                       "deadline": time.time() - 1})
+    assert retrieved.priority == "batch" and retrieved.deadline is not None
+
+    engine = RecordingEngine()
+    stub = LLMStub(FakeNATS(), object(), engine=engine)
+    msg = FakeMsg(retrieved.__dict__)
+    await stub._handle_memory_event(msg)
+    assert msg.acked and engine.calls == []
+    assert stub.stats()["expired"] == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_backlog_leaves_handler_slots_for_interactive_events():
+    engine = RecordingEngine(delay=0.05)
+    engine.reserved_slots = 1
+    js = FakeJS()
+    stub = LLMStub(FakeNATS(), js, engine=engine, stream_interval=None, warmup_tokens=0)
+    assert await stub.start_listening()
+
+    def event(i, priority):
+        return FakeMsg({"input_id": f"{priority}{i}", "user_input": f"question {i}", "retrieved_knowledge": {},
+                        "priority": priority}, js=js)
+
+    backlog = [event(i, "batch") for i in range(8)]
+    for msg in backlog:
+        await js.handlers[0](msg)
+    await asyncio.sleep(0)
+    # 8 handler slots with 1 of 4 engine rows reserved: batch work holds at most 6
+    assert [msg.naked for msg in backlog] == [False] * 6 + [True] * 2
+    assert js.delayed == backlog[6:] and stub.stats()["requeued"] == 2
+    interactive = [event(i, "interactive") for i in range(2)]
+    for msg in interactive:
+        await asyncio.wait_for(js.handlers[0](msg), 0.01)
+    await stub.stop_listening(drain_timeout=1.0)
+    assert all(msg.acked for msg in backlog[:6] + interactive)
@@ -0,0 +1,153 @@
+# File: tests/test_lora_adapters.py
+"""
+Tests for serving several LoRA adapters on one base model.
+"""
+import asyncio
+import threading
+
+import pytest
+
+from tests.fakes import FakeMsg, FakeNATS, RecordingEngine
+from tests.tiny_lm import tiny_model, tiny_tokenizer, torch
+
+from src.deepthought.llm.adapters import AdapterPool, LoRALinear
+from src.deepthought.llm.engine import ContinuousBatchingEngine, GenerationParams
+from src.deepthought.llm.loader import merge_lora, quantize_int8
+from src.deepthought.llm.prefix_cache import PrefixCache
+from src.deepthought.llm.prompt import build_prompt
+from src.deepthought.llm.response_cache import ResponseCache
+from src.deepthought.modules.llm_stub import LLMStub
+
+peft = pytest.importorskip("peft")
+
+
+def _save_adapter(path, seed, targets=("q_proj", "v_proj")):
+    torch.manual_seed(seed)
+    config = peft.LoraConfig(r=4, lora_alpha=16, target_modules=list(targets), init_lora_weights=False)
+    peft.get_peft_model(tiny_model(), config).save_pretrained(path)
+    return str(path)
+
+
+@pytest.fixture
+def adapters(tmp_path):
+    return {"legal": _save_adapter(tmp_path / "legal", 1),
+            "medical": _save_adapter(tmp_path / "medical", 2, ("k_proj", "o_proj", "down_proj"))}
+
+
+async def _greedy(model, prompt, **kwargs):
+    engine = ContinuousBatchingEngine(model, tiny_tokenizer(), max_batch_size=1)
+    engine._eos = set()
+    result = await engine.generate(prompt, GenerationParams(max_new_tokens=8), **kwargs)
+    await engine.close()
+    return result.token_ids
+
+
+@pytest.mark.asyncio
+async def test_mixed_adapter_batch_matches_merged_models(adapters):
+    prompt = build_prompt("What is the capital of France?", ["Paris is the capital of France."])
+    expected = {None: await _greedy(tiny_model(), prompt)}
+    for name, path in adapters.items():
+        expected[name] = await _greedy(merge_lora(tiny_model(), path), prompt)
+    assert len({tuple(ids) for ids in expected.values()}) == 3
+
+    pool = AdapterPool(adapters)
+    engine = ContinuousBatchingEngine(tiny_model(), tiny_tokenizer(), max_batch_size=6,
+                                      prefix_cache=PrefixCache(block_size=4), adapters=pool)
+    engine._eos = set()
+    assert sum(isinstance(m, LoRALinear) for m in engine.model.modules()) == 2 * 5
+    order = [None, "legal", "medical", "legal", None, "medical"]
+    params = GenerationParams(max_new_tokens=8)
+    results = await asyncio.gather(*(engine.generate(prompt, params, adapter=name) for name in order))
+    assert [r.token_ids for r in results] == [expected[name] for name in order]
+    assert engine.stats()["mean_batch_size"] > 1
+    assert pool.stats()["loads"] == 2
+    with pytest.raises(ValueError):
+        await engine.generate(prompt, params, adapter="unknown")
+    await engine.close()
+
+
+@pytest.mark.asyncio
+async def test_adapters_with_new_target_layers_register_through_the_engine(adapters):
+    prompt = build_prompt("What is the capital of France?", [])
+    pool = AdapterPool({"legal": adapters["legal"]})
+    engine = ContinuousBatchingEngine(tiny_model(), tiny_tokenizer(), max_batch_size=2, adapters=pool)
+    engine._eos = set()
+    with pytest.raises(ValueError):
+        pool.register("medical", adapters["medical"])
+    assert "medical" not in pool
+    pool.register("legal", adapters["legal"])  # layers already wrapped
+    await engine.register_adapter("medical", adapters["medical"])
+    assert sum(isinstance(m, LoRALinear) for m in engine.model.modules()) == 2 * 5
+    result = await engine.generate(prompt, GenerationParams(max_new_tokens=8), adapter="medical")
+    await engine.close()
+    assert result.token_ids == await _greedy(merge_lora(tiny_model(), adapters["medical"]), prompt)
+
+
+@pytest.mark.asyncio
+async def test_adapters_load_in_the_engine_thread_and_unknown_ones_are_terminated(adapters):
+    pool = AdapterPool(adapters)
+    engine = ContinuousBatchingEngine(tiny_model(), tiny_tokenizer(), max_batch_size=2, adapters=pool)
+    threads = []
+    get = pool.get
+
+    def recording_get(name):
+        threads.append(threading.current_thread().name)
+        return get(name)
+
+    pool.get = recording_get
+    await engine.generate(build_prompt("hello", []), GenerationParams(max_new_tokens=2), adapter="legal")
+    assert threads and all(name.startswith("llm-engine") for name in threads)
+
+    stub = LLMStub(FakeNATS(), object(), engine=engine, stream_interval=None)
+    msg = FakeMsg({"input_id": "i1", "user_input": "hello", "retrieved_knowledge": {}, "adapter": "unknown"})
+    await stub._handle_memory_event(msg)
+    assert msg.termed and not msg.acked
+    await engine.close()
+
+
+def test_adapters_apply_over_an_int8_base(adapters):
+    reference = merge_lora(tiny_model(), adapters["legal"])
+    model = quantize_int8(tiny_model())
+    pool = AdapterPool(adapters)
+    pool.attach(model)
+    ids = torch.randint(2, 258, (4, 64), generator=torch.Generator().manual_seed(0))
+    with torch.no_grad():
+        expected = reference(ids).logits.argmax(-1)
+        base = model(ids).logits.argmax(-1)
+        with pool.select([pool.get("legal")] * 4):
+            served = model(ids).logits.argmax(-1)
+    agreement = (served == expected).float().mean().item()
+    assert agreement > 0.85 and agreement > (base == expected).float().mean().item() + 0.1
+
+
+def test_pool_evicts_least_recently_used(adapters, tmp_path):
+    pool = AdapterPool(adapters, max_loaded=1)
+    legal = pool.get("legal")
+    assert pool.get("legal") is legal
+    medical = pool.get("medical")
+    assert pool.stats() == {"registered": 2, "loaded": 1, "bytes": medical.nbytes,
+                            "loads": 2, "hits": 1, "evictions": 1}
+    reloaded = pool.get("legal")
+    assert reloaded is not legal and reloaded.key == legal.key == "legal#0"
+    pool.register("legal", _save_adapter(tmp_path / "legal-v2", 3))
+    assert pool.get("legal").key == "legal#1"
+    with pytest.raises(KeyError):
+        pool.get("unknown")
+
+
+@pytest.mark.asyncio
+async def test_stub_routes_adapter_and_keys_caches_by_its_version(adapters, tmp_path):
+    engine = RecordingEngine(answer=lambda prompt, adapter: f"answer from {adapter}")
+    engine.adapters = AdapterPool(adapters)
+    stub = LLMStub(FakeNATS(), object(), engine=engine, stream_interval=None, response_cache=ResponseCache())
+    event = {"input_id": "a", "user_input": "same question", "retrieved_knowledge": {}}
+    first = await stub.generate(dict(event, adapter="legal"))
+    other = await stub.generate(dict(event, adapter="medical"))
+    again = await stub.generate(dict(event, adapter="legal"))
+    assert [call["adapter"] for call in engine.calls] == ["legal", "medical"]
+    assert first.final_response == again.final_response == "answer from legal" and again.cached
+    assert other.final_response == "answer from medical"
+
+    engine.adapters.register("legal", _save_adapter(tmp_path / "legal-v2", 3))
+    retrained = await stub.generate(dict(event, adapter="legal"))
+    assert not retrained.cached and len(engine.calls) == 3
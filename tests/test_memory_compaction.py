@@ -0,0 +1,141 @@
+# File: tests/test_memory_compaction.py
+"""
+Tests for background compaction and point-in-time snapshots of the memory indexes.
+"""
+import asyncio
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.deepthought.memory.bm25 import BM25Index
+from src.deepthought.memory.compaction import MemoryCompactor
+from src.deepthought.memory.graph import KnowledgeGraph
+from src.deepthought.memory.vector_index import HashingEmbedder, IVFIndex, VectorRetriever
+
+WORDS = [f"w{i}" for i in range(60)]
+
+
+def _facts(n, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(3, 8))) for _ in range(n)]
+
+
+def _compactor(n=400, **kwargs):
+    facts = _facts(n)
+    bm25 = BM25Index()
+    bm25.add_many(facts)
+    graph = KnowledgeGraph(merge_threshold=1 << 30)
+    vectors = VectorRetriever(IVFIndex(32, nlist=8, nprobe=8), HashingEmbedder(32))
+    vectors.add_facts(facts)
+    return MemoryCompactor(bm25=bm25, graph=graph, vectors=vectors, **kwargs), facts
+
+
+def test_rebuilt_bm25_catches_up_and_matches():
+    facts = _facts(600)
+    old = BM25Index()
+    old.add_many(facts[:500])
+    for doc in range(0, 500, 3):
+        old.delete(doc)
+    rebuilt = BM25Index.from_documents(old.documents())
+    assert rebuilt.tombstones == 0
+    # Writes that reach the old index while the rebuild runs
+    old.add_many(facts[500:])
+    old.delete(1)
+    old.delete(550)
+    # 100 appended ids (one of them already deleted) and one delete below the rebuild point
+    assert rebuilt.catch_up(old) == 101
+    assert len(rebuilt) == len(old)
+    for query in ["w1 w2", "w5 w7 w9", "w30"]:
+        assert rebuilt.search(query, 10) == pytest.approx(old.search(query, 10))
+
+
+def test_ivf_tail_is_searchable_and_regrouped():
+    vectors = VectorRetriever(IVFIndex(32, nlist=8, nprobe=8), HashingEmbedder(32))
+    facts = _facts(300)
+    vectors.add_facts(facts[:200])
+    vectors.index.regroup()
+    vectors.add_facts(facts[200:])
+    assert vectors._index.tail == 100
+    before = vectors.search(facts[250:260], 3)
+    # Queries scan the tail and leave regrouping to the compactor
+    assert vectors._index.tail == 100
+    assert all(hits[0][0] == fact for hits, fact in zip(before, facts[250:260]))
+    reorder = vectors._index.build_reorder()
+    vectors.add_facts(["w1 w2 w3 late"])
+    assert vectors._index.install_reorder(reorder)
+    assert vectors._index.tail == 1
+    after = vectors.search(facts[250:260], 3)
+    assert [sorted(hits) for hits in after] == [sorted(hits) for hits in before]
+    assert vectors.search(["w1 w2 w3 late"], 1)[0][0][0] == "w1 w2 w3 late"
+
+
+@pytest.mark.asyncio
+async def test_compaction_keeps_results_and_concurrent_writes():
+    compactor, facts = _compactor(max_tombstone_ratio=0.05, max_pending_edges=10, max_vector_tail=1)
+    for doc in range(0, 100):
+        compactor.delete(doc)
+    compactor.add_triples([(f"e{i}", "rel", f"e{i + 1}") for i in range(50)])
+    assert set(compactor.needs_compaction()) == {"bm25", "graph", "vectors"}
+    retriever = compactor.retriever()
+    before = retriever.retrieve("w1 w2 w3", 10)
+
+    task = asyncio.create_task(compactor.compact())
+    await asyncio.sleep(0)
+    compactor.add_facts(["w1 w2 w3 w1 w2 w3 fresh"])
+    compactor.add_triples([("e50", "rel", "late")])
+    assert sorted(await task) == ["bm25", "graph", "vectors"]
+
+    assert compactor.bm25.tombstones == 0
+    after = retriever.retrieve("w1 w2 w3", 11)
+    assert after["facts"][0] == "w1 w2 w3 w1 w2 w3 fresh"
+    assert set(before["facts"]) <= set(after["facts"])
+    assert ("e50", "rel", "late") in compactor.graph.facts_about("e50")
+    assert compactor.graph.facts_about("e1") == [("e1", "rel", "e2"), ("e0", "rel", "e1")]
+    assert compactor.needs_compaction() == []
+
+
+@pytest.mark.asyncio
+async def test_snapshot_is_point_in_time_and_loadable(tmp_path):
+    compactor, facts = _compactor(snapshot_dir=str(tmp_path), keep_snapshots=2)
+    compactor.add_triples([("Paris", "capital_of", "France")])
+    compactor.delete(0)
+    task = asyncio.create_task(compactor.snapshot(meta={"version": 7}))
+    await asyncio.sleep(0)
+    compactor.add_facts(["written after the snapshot"])
+    compactor.add_triples([("Berlin", "capital_of", "Germany")])
+    path = await task
+    assert MemoryCompactor.latest_snapshot(str(tmp_path)) == path
+
+    loaded = MemoryCompactor.load(path, embedder=HashingEmbedder(32))
+    assert loaded._store.meta["version"] == 7
+    assert len(loaded.bm25) == len(facts) - 1
+    assert loaded.retriever().retrieve(facts[5], 1)["facts"] == [facts[5]]
+    assert loaded.vectors.search([facts[7]], 1)[0][0][0] == facts[7]
+    assert len(loaded.vectors.facts) == len(facts)
+    assert loaded.graph.facts_about("paris") == [("Paris", "capital_of", "France")]
+    assert loaded.graph.nodes.get("berlin") is None
+    loaded.add_facts(["new worker fact"])
+    assert loaded.retriever().retrieve("new worker fact", 1)["facts"] == ["new worker fact"]
+
+    for _ in range(2):
+        await asyncio.sleep(0.001)
+        await compactor.snapshot()
+    assert len(list(tmp_path.glob("memory-*.dtks"))) == 2
+
+
+@pytest.mark.asyncio
+async def test_background_task_compacts_and_snapshots(tmp_path):
+    compactor, _ = _compactor(n=100, max_pending_edges=5, snapshot_dir=str(tmp_path))
+    await compactor.start(interval=0.01, snapshot_interval=0.01)
+    try:
+        compactor.add_triples([(f"a{i}", "r", f"b{i}") for i in range(10)])
+        for _ in range(200):
+            await asyncio.sleep(0.01)
+            if compactor.compactions["graph"] and compactor.snapshots:
+                break
+    finally:
+        await compactor.stop()
+    assert compactor.stats()["graph_pending_edges"] == 0
+    assert compactor.last_snapshot is not None
@@ -0,0 +1,111 @@
+# File: tests/test_memory_ingest.py
+"""
+Tests for batched write-behind memory ingestion.
+"""
+import asyncio
+import json
+import time
+
+import pytest
+
+from tests.fakes import FakeMsg, FakeNATS
+
+from src.deepthought.eda.events import EventSubjects, MemoryStorePayload
+from src.deepthought.memory.cache import RetrievalCache
+from src.deepthought.memory.ingest import MemoryIngestor
+
+
+def _msg(facts):
+    return FakeMsg(MemoryStorePayload(facts=facts).to_json())
+
+
+class FakePullSub:
+    def __init__(self, batches):
+        self.batches = list(batches)
+
+    async def fetch(self, batch, timeout):
+        if not self.batches:
+            await asyncio.sleep(timeout)
+            raise asyncio.TimeoutError()
+        return self.batches.pop(0)[:batch]
+
+    async def unsubscribe(self):
+        pass
+
+
+class FakeJS:
+    def __init__(self, sub=None):
+        self.sub = sub
+        self.published = []
+        self.durables = []
+
+    async def pull_subscribe(self, subject, durable, stream, config):
+        assert subject == EventSubjects.MEMORY_STORE
+        assert config.durable_name == durable and config.inactive_threshold
+        self.durables.append(durable)
+        return self.sub
+
+    async def publish(self, subject, data, timeout):
+        self.published.append((subject, json.loads(data)))
+
+
+@pytest.mark.asyncio
+async def test_batch_is_applied_once_and_acked():
+    batch = [_msg(["paris is in france"]), _msg(["berlin is in germany", "paris is in france"]),
+             _msg([])]
+    js = FakeJS(FakePullSub([batch]))
+    written, cache = [], RetrievalCache()
+    cache.put("paris", 10, {"facts": []}, cache.version)
+    cache.put("mountains", 10, {"facts": []}, cache.version)
+    ingestor = MemoryIngestor(FakeNATS(), js, sinks=[written.extend], cache=cache, max_delay=0.01)
+    assert await ingestor.start()
+    for _ in range(100):
+        if batch[-1].acked:
+            break
+        await asyncio.sleep(0.01)
+    await ingestor.stop()
+    assert written == ["paris is in france", "berlin is in germany"]
+    assert batch[-1].acked
+    assert [subject for subject, _ in js.published] == [EventSubjects.MEMORY_VERSION]
+    version = js.published[0][1]
+    assert version["version"] == 1 and version["batch_events"] == 3
+    assert version["worker"] == ingestor.worker_id
+    assert cache.get("paris", 10) is None
+    assert cache.get("mountains", 10) is not None
+
+
+@pytest.mark.asyncio
+async def test_large_batch_yields_to_readers():
+    def slow_sink(chunk):
+        time.sleep(0.001 * len(chunk))
+
+    ingestor = MemoryIngestor(FakeNATS(), FakeJS(), sinks=[slow_sink], apply_chunk=5)
+    gaps = []
+
+    async def reader():
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(0)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    done = asyncio.Event()
+    task = asyncio.create_task(reader())
+    await ingestor.apply([f"fact {i}" for i in range(200)], batch_events=200)
+    done.set()
+    await task
+    assert ingestor.version == 1 and ingestor.facts_ingested == 200
+    # 200 ms of writes, but readers never wait much longer than one 5 ms chunk
+    assert max(gaps) < 0.05
+
+
+@pytest.mark.asyncio
+async def test_every_worker_reads_all_writes_through_its_own_consumer():
+    js = FakeJS(FakePullSub([]))
+    workers = [MemoryIngestor(FakeNATS(), js, sinks=[], worker_id=f"host.local-{pid}") for pid in (11, 12)]
+    for worker in workers:
+        assert await worker.start()
+    for worker in workers:
+        await worker.stop()
+    assert js.durables == ["memory_ingestor_host_local-11", "memory_ingestor_host_local-12"]
@@ -0,0 +1,132 @@
+# File: tests/test_pipeline.py
+"""
+Tests for the declarative stage pipeline and stage fusion.
+"""
+import asyncio
+
+import pytest
+
+from tests.fakes import FakeJS, FakeMsg, FakeNATS, RecordingEngine
+
+from src.deepthought.eda.events import EventSubjects, InputReceivedPayload
+from src.deepthought.eda.pipeline import Pipeline, Stage
+from src.deepthought.modules.llm_stub import LLMStub
+from src.deepthought.modules.memory_stub import MemoryStub
+from src.deepthought.modules.output_handler import OutputHandler
+
+
+def _modules(responses, nc=None, js=None):
+    nc, js = nc or FakeNATS(), js or FakeJS()
+    memory = MemoryStub(nc, js)
+    llm = LLMStub(nc, js)
+    output = OutputHandler(nc, js, output_callback=lambda i, r: responses.update({i: r}))
+    return Pipeline([memory.as_stage(), llm.as_stage(), output.as_stage()])
+
+
+def test_plan_fuses_local_neighbours():
+    pipeline = _modules({})
+    plan = pipeline.plan()
+    # Fused stages still consume events that other processes publish
+    assert plan["heads"] == ["llm", "memory", "output"]
+    assert plan["fused"] == [("llm", "output"), ("memory", "llm")]
+    assert plan["published"] == []
+
+    split = pipeline.plan(local={"memory", "output"})
+    assert split["heads"] == ["memory", "output"]
+    assert split["fused"] == []
+    assert split["published"] == [EventSubjects.MEMORY_RETRIEVED]
+
+
+def test_cycles_and_duplicates_are_rejected():
+    async def noop(data):
+        return None
+
+    pipeline = Pipeline([Stage("a", "x", noop, output_subject="y")])
+    with pytest.raises(ValueError):
+        pipeline.add_stage(Stage("a", "z", noop))
+    with pytest.raises(ValueError):
+        pipeline.add_stage(Stage("b", "y", noop, output_subject="x"))
+    assert [s.name for s in pipeline.stages] == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_fused_pipeline_runs_in_process_without_broker():
+    responses = {}
+    pipeline = _modules(responses)
+    assert await pipeline.start()
+    await pipeline.submit(EventSubjects.INPUT_RECEIVED, InputReceivedPayload(user_input="hello", input_id="i1"))
+    assert "User asked: hello" in responses["i1"]
+
+
+@pytest.mark.asyncio
+async def test_publishes_where_fan_out_or_durability_needs_it():
+    calls = []
+
+    async def first(data):
+        calls.append("first")
+        return {"input_id": data["input_id"], "value": 1}
+
+    async def second(data):
+        calls.append(("second", data["value"]))
+
+    pipeline = Pipeline([
+        Stage("first", "dtr.test.in", first, output_subject="dtr.test.mid", publish_output=True),
+        Stage("second", "dtr.test.mid", second),
+    ])
+    nc, js = FakeNATS(), FakeJS()
+    assert pipeline.plan()["fused"] == []
+    assert await pipeline.start(nc, js)
+    assert js.subscribed == [("dtr.test.in", "first_listener"), ("dtr.test.mid", "second_listener")]
+    await pipeline.submit("dtr.test.in", {"input_id": "x"})
+    # The published output reaches the local consumer through the broker, once
+    assert calls == ["first"]
+    assert js.published == ["dtr.test.mid"]
+    await js.handlers[1](FakeMsg({"input_id": "x", "value": 1}, "dtr.test.mid"))
+    assert calls == ["first", ("second", 1)]
+
+    await pipeline.submit("dtr.test.in", {"input_id": "y"}, publish=True)
+    await pipeline.submit("dtr.test.unconsumed", {"input_id": "z"})
+    assert js.published == ["dtr.test.mid", "dtr.test.in", "dtr.test.unconsumed"]
+    await pipeline.stop(drain_timeout=0.1)
+
+
+@pytest.mark.asyncio
+async def test_fused_stages_consume_remote_events_unless_local_only():
+    responses = {}
+    nc, js = FakeNATS(), FakeJS()
+    pipeline = _modules(responses, nc, js)
+    assert await pipeline.start(nc, js)
+    assert [durable for _, durable in js.subscribed] == [
+        "memory_stub_listener", "llm_stub_listener", "output_handler_listener"]
+    # A response published by an LLM worker in another process
+    await js.handlers[2](FakeMsg({"input_id": "r1", "final_response": "remote answer"}, EventSubjects.RESPONSE_GENERATED))
+    assert responses == {"r1": "remote answer"}
+    await pipeline.stop(drain_timeout=0.1)
+
+    async def noop(data):
+        return data
+
+    local_only = Pipeline([Stage("a", "x", noop, output_subject="y"), Stage("b", "y", noop, local_input_only=True)])
+    assert local_only.plan()["heads"] == ["a"]
+    assert local_only.plan(local={"b"})["heads"] == ["b"]
+
+
+@pytest.mark.asyncio
+async def test_broker_fed_stage_handles_events_concurrently():
+    running, peak = 0, 0
+
+    async def slow(data):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    assert LLMStub(FakeNATS(), FakeJS(), engine=RecordingEngine()).as_stage().max_concurrency == 8
+    pipeline = Pipeline([Stage("slow", "dtr.test.in", slow, max_concurrency=3)])
+    nc, js = FakeNATS(), FakeJS()
+    assert await pipeline.start(nc, js)
+    for i in range(3):
+        await js.handlers[0](FakeMsg({"input_id": str(i)}, "dtr.test.in"))
+    await pipeline.stop(drain_timeout=1.0)
+    assert peak == 3
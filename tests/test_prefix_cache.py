@@ -0,0 +1,65 @@
+# File: tests/test_prefix_cache.py
+"""
+Tests for reusing cached key/values of shared prompt prefixes.
+"""
+import asyncio
+
+import pytest
+
+from tests.tiny_lm import tiny_model, tiny_tokenizer, torch
+
+from src.deepthought.llm.engine import ContinuousBatchingEngine, GenerationParams
+from src.deepthought.llm.prefix_cache import PrefixCache
+from src.deepthought.llm.prompt import build_prompt
+
+
+def _block(value, tokens=4):
+    return [(torch.full((1, 2, tokens, 8), float(value)), torch.full((1, 2, tokens, 8), -float(value)))]
+
+
+def test_lookup_matches_whole_prefix_chains_and_leaves_a_suffix():
+    cache = PrefixCache(block_size=4)
+    ids = list(range(12))
+    assert cache.store(ids, lambda block: _block(block)) == 3
+    assert cache.lookup(ids)[0] == 8  # the last token is always prefilled
+    tokens, layers = cache.lookup(ids + [99])
+    assert tokens == 12
+    assert layers[0][0].shape == (1, 2, 12, 8)
+    assert layers[0][0][0, 0, :, 0].tolist() == [0.0] * 4 + [1.0] * 4 + [2.0] * 4
+    # Same second block after a different first block is a different chain
+    assert cache.lookup([7] + ids[1:])[0] == 0
+    assert cache.lookup(ids[:4] + [50] * 8)[0] == 4
+    assert cache.store(ids, lambda block: pytest.fail("cached blocks are not rebuilt")) == 0
+
+
+def test_eviction_respects_memory_bound_from_chain_tails():
+    block_bytes = 2 * 2 * 4 * 8 * 4
+    cache = PrefixCache(block_size=4, max_bytes=3 * block_bytes)
+    first, second = list(range(12)), list(range(100, 108))
+    cache.store(first, _block)
+    cache.lookup(first + [0])
+    cache.store(second, _block)
+    assert cache.nbytes <= 3 * block_bytes
+    assert cache.stats()["evictions"] == 2
+    # The first chain lost its tail, not its head
+    assert cache.lookup(first + [0])[0] == 4
+
+
+@pytest.mark.asyncio
+async def test_engine_reuses_template_prefix_with_identical_output():
+    model, tokenizer = tiny_model(), tiny_tokenizer()
+    prompts = [build_prompt("hi"), build_prompt("where is Paris", ["Paris is in France"]),
+               build_prompt("x", ["a", "b"]), build_prompt("hello world")]
+    params = GenerationParams(max_new_tokens=8)
+    plain = ContinuousBatchingEngine(model, tokenizer, max_batch_size=3)
+    cached = ContinuousBatchingEngine(model, tokenizer, max_batch_size=3, prefix_cache=PrefixCache(block_size=16))
+    expected = await asyncio.gather(*(plain.generate(p, params) for p in prompts))
+    await cached.generate(prompts[1], params)
+    cached.prefill_tokens = cached.reused_tokens = 0
+    results = await asyncio.gather(*(cached.generate(p, params) for p in prompts))
+    await plain.close()
+    await cached.close()
+    assert [r.token_ids for r in results] == [r.token_ids for r in expected]
+    stats = cached.stats()
+    assert stats["reused_prefix_tokens"] >= 16 * 4
+    assert stats["prefill_tokens"] + stats["reused_prefix_tokens"] == plain.stats()["prefill_tokens"]
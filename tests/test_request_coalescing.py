@@ -0,0 +1,97 @@
+# File: tests/test_request_coalescing.py
+"""
+Tests for single-flight coalescing of identical in-flight LLM requests.
+"""
+import asyncio
+
+import pytest
+
+from tests.fakes import FakeNATS, RecordingEngine
+
+from src.deepthought.eda.events import EventSubjects
+from src.deepthought.modules.llm_stub import LLMStub
+
+
+def _event(input_id, question):
+    return {"input_id": input_id, "user_input": question, "retrieved_knowledge": {}}
+
+
+def _streamed(nc, input_id):
+    chunks = [c for c in nc.messages(EventSubjects.RESPONSE_CHUNK) if c["input_id"] == input_id]
+    return "".join(c["text"] for c in sorted(chunks, key=lambda c: c["seq"]))
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_share_one_generation():
+    engine, nc = RecordingEngine(delay=0.01), FakeNATS()
+    stub = LLMStub(nc, object(), engine=engine, stream_interval=0.0)
+
+    async def late(input_id, delay):
+        await asyncio.sleep(delay)
+        return await stub.generate(_event(input_id, "what is the capital of France"))
+
+    payloads = await asyncio.gather(late("a", 0), late("b", 0), late("c", 0.025),
+                                    stub.generate(_event("d", "something else entirely")))
+    assert len(engine.calls) == 2 and engine.peak == 2
+    a, b, c, d = payloads
+    assert [p.input_id for p in payloads] == ["a", "b", "c", "d"]
+    assert a.final_response == b.final_response == c.final_response == "what is the capital"
+    assert [p.coalesced for p in payloads] == [False, True, True, False]
+    # A follower that joined mid-stream still gets every chunk under its own id
+    assert _streamed(nc, "c") == _streamed(nc, "a") == "what is the capital"
+    assert stub.stats() == {"generations": 2, "coalesced": 2, "expired": 0, "requeued": 0, "in_flight": 0}
+
+    # Once finished, the same question generates again (no response cache here)
+    await stub.generate(_event("e", "what is the capital of France"))
+    assert len(engine.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_follower_takes_over_when_leader_is_cancelled():
+    engine = RecordingEngine(delay=0.02)
+    stub = LLMStub(FakeNATS(), object(), engine=engine, stream_interval=None)
+    leader = asyncio.create_task(stub.generate(_event("a", "one two three four")))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(stub.generate(_event("b", "one two three four")))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    payload = await follower
+    assert payload.final_response == "one two three four"
+    assert not payload.coalesced
+    assert len(engine.calls) == 2 and engine.peak == 1
+    assert stub.stats()["coalesced"] == 0
+
+
+@pytest.mark.asyncio
+async def test_takeover_streams_on_without_repeating_text():
+    engine, nc = RecordingEngine(delay=0.02), FakeNATS()
+    stub = LLMStub(nc, object(), engine=engine, stream_interval=0.0)
+    leader = asyncio.create_task(stub.generate(_event("a", "one two three four")))
+    await asyncio.sleep(0.05)
+    follower = asyncio.create_task(stub.generate(_event("b", "one two three four")))
+    await asyncio.sleep(0.005)
+    assert _streamed(nc, "b").startswith("one")
+    leader.cancel()
+    payload = await follower
+    assert len(engine.calls) == 2
+    assert _streamed(nc, "b") == payload.final_response == "one two three four"
+
+
+@pytest.mark.asyncio
+async def test_leader_failure_reaches_every_follower():
+    stub = LLMStub(FakeNATS(), object(), engine=RecordingEngine(delay=0.01, fail=True), stream_interval=None)
+    results = await asyncio.gather(*(stub.generate(_event(i, "same question")) for i in "abc"),
+                                   return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert stub.stats() == {"generations": 1, "coalesced": 2, "expired": 0, "requeued": 0, "in_flight": 0}
+
+
+@pytest.mark.asyncio
+async def test_requests_only_coalesce_within_their_priority():
+    engine = RecordingEngine(delay=0.01)
+    stub = LLMStub(FakeNATS(), object(), engine=engine, stream_interval=None)
+    events = [dict(_event(i, "same question"), priority=priority)
+              for i, priority in zip("abcd", ["batch", "interactive", "batch", "interactive"])]
+    payloads = await asyncio.gather(*(stub.generate(event) for event in events))
+    assert [call["priority"] for call in engine.calls] == ["batch", "interactive"]
+    assert [p.coalesced for p in payloads] == [False, False, True, True]
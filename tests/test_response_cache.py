@@ -0,0 +1,99 @@
+# File: tests/test_response_cache.py
+"""
+Tests for the LLM response cache and its use in LLMStub.
+"""
+import random
+
+import pytest
+
+from tests.fakes import FakeNATS
+
+from src.deepthought.llm.prompt import build_prompt
+from src.deepthought.llm.response_cache import CachedResponse, ResponseCache
+
+GREEDY = {"max_new_tokens": 32, "temperature": 0.0, "top_k": 0, "top_p": 1.0, "seed": None}
+SAMPLED = dict(GREEDY, temperature=0.8)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_key_covers_prompt_facts_params_and_model():
+    cache = ResponseCache()
+    prompt = build_prompt("Where is Paris?", ["Paris is in France"])
+    cache.put(prompt, GREEDY, CachedResponse("In France.", 0.9, 3, cost=0.5))
+    assert cache.get(prompt, GREEDY).text == "In France."
+    assert cache.get(build_prompt("Where is Paris?", ["Paris is in Texas"]), GREEDY) is None
+    assert cache.get(prompt, dict(GREEDY, max_new_tokens=8)) is None
+    assert ResponseCache(namespace="other-adapter").key(prompt, GREEDY) != cache.key(prompt, GREEDY)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+    assert stats["saved_seconds"] == pytest.approx(0.5)
+
+
+def test_sampled_requests_follow_their_own_policy():
+    clock = FakeClock()
+    assert not ResponseCache().put("p", SAMPLED, CachedResponse("x"))
+    seeded = dict(SAMPLED, seed=7)
+    cache = ResponseCache(sample_pool=3, sampled_ttl=10.0, ttl=100.0, clock=clock, rng=random.Random(0))
+    assert cache.put("p", seeded, CachedResponse("fixed"))
+    for text in ["a", "b"]:
+        assert cache.get("p", SAMPLED) is None
+        cache.put("p", SAMPLED, CachedResponse(text))
+    assert cache.get("p", SAMPLED) is None
+    cache.put("p", SAMPLED, CachedResponse("c"))
+    served = {cache.get("p", SAMPLED).text for _ in range(30)}
+    assert served == {"a", "b", "c"}
+    clock.now += 11
+    assert cache.get("p", SAMPLED) is None
+    assert cache.get("p", seeded).text == "fixed"
+    clock.now += 90
+    assert cache.get("p", seeded) is None
+
+
+def test_memory_bound_and_disk_tier(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    cache = ResponseCache(max_bytes=650, disk_path=path)
+    for i in range(10):
+        cache.put(f"prompt {i}", GREEDY, CachedResponse(f"answer {i}", 0.5, 2))
+    assert len(cache) == 3
+    assert cache.stats()["evictions"] == 7
+    assert cache.get("prompt 0", GREEDY).text == "answer 0"
+    assert cache.stats()["disk_hits"] == 1
+    cache.close()
+
+    restarted = ResponseCache(disk_path=path)
+    hit = restarted.get("prompt 4", GREEDY)
+    assert (hit.text, hit.confidence, hit.tokens) == ("answer 4", 0.5, 2)
+    restarted.clear()
+    assert ResponseCache(disk_path=path).get("prompt 4", GREEDY) is None
+
+
+@pytest.mark.asyncio
+async def test_llm_stub_publishes_cache_hits_without_generating():
+    tiny_lm = pytest.importorskip("tests.tiny_lm")
+    from src.deepthought.llm.engine import ContinuousBatchingEngine, GenerationParams
+    from src.deepthought.modules.llm_stub import LLMStub
+
+    engine = ContinuousBatchingEngine(tiny_lm.tiny_model(), tiny_lm.tiny_tokenizer())
+    cache = ResponseCache()
+    nc = FakeNATS()
+    stub = LLMStub(nc, object(), engine=engine, params=GenerationParams(max_new_tokens=6), response_cache=cache)
+    data = {"input_id": "i1", "user_input": "hello", "retrieved_knowledge": {
+        "retrieved_knowledge": {"facts": ["a fact"]}}}
+    first = await stub.generate(data)
+    chunks = len(nc.published)
+    second = await stub.generate(dict(data, input_id="i2"))
+    assert len(nc.published) == chunks  # no chunks for a hit
+    other = await stub.generate(dict(data, retrieved_knowledge={}))
+    await engine.close()
+    assert not first.cached and second.cached and not other.cached
+    assert second.final_response == first.final_response
+    assert second.input_id == "i2"
+    assert engine.requests == 2
+    assert cache.stats()["hits"] == 1
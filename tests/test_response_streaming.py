@@ -0,0 +1,129 @@
+# File: tests/test_response_streaming.py
+"""
+Tests for streaming responses as coalesced RESPONSE_CHUNK events.
+"""
+import asyncio
+import json
+
+import pytest
+
+from tests.fakes import FakeJS, FakeNATS, RecordingEngine
+
+from src.deepthought.eda.events import EventSubjects
+from src.deepthought.eda.streaming import ChunkCoalescer, ResponseStream, StreamAborted
+from src.deepthought.modules.llm_stub import LLMStub
+from src.deepthought.modules.output_handler import OutputHandler
+
+
+async def _collect(iterator):
+    return [piece async for piece in iterator]
+
+
+def test_chunks_are_not_captured_by_the_event_stream():
+    # deepthought_events stores dtr.>; chunks must not add stream and archive records
+    assert not EventSubjects.RESPONSE_CHUNK.startswith("dtr.")
+
+
+@pytest.mark.asyncio
+async def test_coalescer_sends_first_piece_at_once_and_merges_the_rest():
+    sent = []
+
+    async def send(payload):
+        sent.append(payload)
+
+    chunks = ChunkCoalescer(send, "i1", interval=0.05, max_chars=1000)
+    chunks.feed("Hel")
+    await asyncio.sleep(0)
+    assert [c.text for c in sent] == ["Hel"]
+    for piece in "lo, world":
+        chunks.feed(piece)
+        await asyncio.sleep(0.001)
+    await chunks.close()
+    assert "".join(c.text for c in sent) == "Hello, world"
+    assert [c.seq for c in sent] == list(range(len(sent)))
+    assert len(sent) <= 3
+    assert sent[-1].final and not any(c.final for c in sent[:-1])
+
+
+@pytest.mark.asyncio
+async def test_coalescer_flushes_early_when_buffer_fills():
+    sent = []
+
+    async def send(payload):
+        sent.append(payload.text)
+
+    chunks = ChunkCoalescer(send, "i1", interval=10.0, max_chars=4)
+    for piece in ["a", "bc", "de", "f", "g"]:
+        chunks.feed(piece)
+        await asyncio.sleep(0)
+    await asyncio.wait_for(chunks.close(), 1.0)
+    # One chunk before the 10 s window ended, and close did not wait for it either
+    assert sent[0] == "a" and len(sent) == 3
+    assert "".join(sent) == "abcdefg"
+
+
+@pytest.mark.asyncio
+async def test_stream_reorders_drops_duplicates_and_serves_late_readers():
+    stream = ResponseStream()
+    early = asyncio.create_task(_collect(stream))
+    stream.add(1, " world")
+    stream.add(0, "Hello")
+    stream.add(0, "Hello")
+    stream.add(3, "", final=True)
+    assert stream.text == "Hello world"
+    stream.add(2, "!")
+    assert stream.done
+    assert await early == ["Hello", " world", "!"]
+    assert "".join(await _collect(stream)) == "Hello world!"
+
+
+@pytest.mark.asyncio
+async def test_final_event_completes_a_stream_with_lost_chunks():
+    output = OutputHandler(FakeNATS(), FakeJS(), output_callback=lambda i, r: None)
+    reader = asyncio.create_task(_collect(output.stream("i1")))
+    await output.deliver_chunk({"input_id": "i1", "seq": 0, "text": "The answer"})
+    await output.deliver_chunk({"input_id": "i1", "seq": 2, "text": " 42"})
+    await output.deliver({"input_id": "i1", "final_response": "The answer is 42"})
+    assert "".join(await reader) == "The answer is 42"
+    await output.deliver_chunk({"input_id": "i1", "seq": 3, "text": "late", "final": True})
+    assert "".join(await _collect(output.stream("i1"))) == "The answer is 42"
+    assert output._streams == {}
+
+
+@pytest.mark.asyncio
+async def test_failed_generation_aborts_the_stream():
+    nc, js = FakeNATS(), FakeJS()
+    output = OutputHandler(nc, js, output_callback=lambda i, r: None)
+    assert await output.start_listening()
+    stub = LLMStub(nc, js, engine=RecordingEngine(fail=True), stream_interval=0.0)
+    reader = asyncio.create_task(_collect(output.stream("i1")))
+    with pytest.raises(RuntimeError):
+        await stub.generate({"input_id": "i1", "user_input": "one two three", "retrieved_knowledge": {}})
+    chunks = nc.messages(EventSubjects.RESPONSE_CHUNK)
+    assert chunks[-1]["final"] and chunks[-1]["error"]
+    with pytest.raises(StreamAborted):
+        await reader
+    assert output.get_response("i1") is None and output._streams == {}
+
+
+@pytest.mark.asyncio
+async def test_llm_stage_streams_engine_output_to_output_handler():
+    tiny_lm = pytest.importorskip("tests.tiny_lm")
+    from src.deepthought.llm.engine import ContinuousBatchingEngine, GenerationParams
+
+    engine = ContinuousBatchingEngine(tiny_lm.tiny_model(), tiny_lm.tiny_tokenizer())
+    engine._eos = set()
+    nc, js = FakeNATS(), FakeJS()
+    output = OutputHandler(nc, js, output_callback=lambda i, r: None)
+    assert await output.start_listening()
+    assert EventSubjects.RESPONSE_CHUNK in nc.callbacks
+    stub = LLMStub(nc, js, engine=engine, params=GenerationParams(max_new_tokens=40), stream_interval=0.0)
+    reader = asyncio.create_task(_collect(output.stream("i1")))
+    data = {"input_id": "i1", "user_input": "hello", "retrieved_knowledge": {}}
+    payload = await stub.generate(data)
+    await output.deliver(json.loads(payload.to_json()))
+    await engine.close()
+    pieces = await reader
+    assert len(pieces) > 1
+    assert "".join(pieces) == payload.final_response
+    assert 0.0 < payload.ttft < 10.0
@@ -0,0 +1,120 @@
+# File: tests/test_retrieval_cache.py
+"""
+Tests for the memory-stage retrieval cache and its write-aware invalidation.
+"""
+import asyncio
+
+import pytest
+
+from tests.fakes import FakeNATS
+
+from src.deepthought.memory.cache import RetrievalCache
+from src.deepthought.modules.memory_stub import MemoryStub
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingRetriever:
+    def __init__(self, facts):
+        self.facts = list(facts)
+        self.calls = 0
+
+    def retrieve(self, query, top_k=10):
+        self.calls += 1
+        words = set(query.lower().split())
+        return {"facts": [f for f in self.facts if words & set(f.lower().split())][:top_k], "source": "test"}
+
+
+def test_normalized_hits_lru_and_ttl():
+    clock = Clock()
+    cache = RetrievalCache(max_entries=2, ttl=10.0, clock=clock)
+    assert cache.get("Where is Paris?", 5) is None
+    assert cache.put("Where is Paris?", 5, {"facts": ["a"]}, cache.version, cost=0.5)
+    assert cache.get("  where IS paris ", 5) == {"facts": ["a"]}
+    assert cache.get("where is paris", 3) is None
+    cache.put("b", 5, {"facts": []}, cache.version)
+    cache.get("where is paris", 5)
+    cache.put("c", 5, {"facts": []}, cache.version)
+    assert cache.get("b", 5) is None
+    assert cache.evictions == 1
+    clock.now = 11.0
+    assert cache.get("where is paris", 5) is None
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["expirations"] == 1
+    assert stats["saved_seconds"] == pytest.approx(1.0)
+
+
+def test_invalidation_is_limited_to_overlapping_queries():
+    cache = RetrievalCache()
+    for query in ["capital of france", "tallest mountain", "france population"]:
+        cache.put(query, 10, {"facts": []}, cache.version)
+    assert cache.invalidate_facts(["Lyon is a city in France"]) == 2
+    assert cache.get("tallest mountain", 10) is not None
+    assert cache.get("capital of france", 10) is None
+
+
+def test_result_computed_before_invalidation_is_not_cached():
+    cache = RetrievalCache(stopwords={"is", "a", "in"})
+    version = cache.version
+    cache.invalidate_facts(["Paris is in France"])
+    assert not cache.put("paris", 10, {"facts": []}, version)
+    assert cache.put("mountain is high", 10, {"facts": []}, version)
+    cache.invalidate_all()
+    assert len(cache) == 0
+    assert not cache.put("mountain", 10, {"facts": []}, version)
+
+
+def test_non_lexical_retrievers_invalidate_everything():
+    bm25 = pytest.importorskip("src.deepthought.memory.bm25")
+    cache = RetrievalCache()
+    MemoryStub(FakeNATS(), object(), retriever=bm25.BM25Index(), cache=cache)
+    assert cache.lexical
+    # An embedding retriever can rank a new fact first for a query it shares no term with
+    MemoryStub(FakeNATS(), object(), retriever=CountingRetriever([]), cache=cache)
+    assert not cache.lexical
+    version = cache.version
+    for query in ["capital of france", "tallest mountain"]:
+        cache.put(query, 10, {"facts": []}, version)
+    assert cache.invalidate_facts(["Lyon is a city in France"]) == 2
+    assert len(cache) == 0
+    assert not cache.put("tallest mountain", 10, {"facts": []}, version)
+
+
+@pytest.mark.asyncio
+async def test_waiter_computes_when_the_leader_is_cancelled():
+    cache = RetrievalCache()
+    calls = []
+
+    async def compute():
+        calls.append(None)
+        await asyncio.sleep(0.01)
+        return {"facts": [len(calls)]}
+
+    leader = asyncio.create_task(cache.get_or_compute("paris", 5, compute))
+    await asyncio.sleep(0)
+    waiters = [asyncio.create_task(cache.get_or_compute("paris", 5, compute)) for _ in range(2)]
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert [await w for w in waiters] == [{"facts": [2]}, {"facts": [2]}]
+    assert len(calls) == 2 and leader.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_memory_stub_serves_repeats_from_cache():
+    retriever = CountingRetriever(["paris is in france", "berlin is in germany"])
+    cache = RetrievalCache()
+    stub = MemoryStub(FakeNATS(), object(), retriever=retriever, cache=cache)
+    for _ in range(3):
+        payload = await stub.retrieve({"input_id": "i", "user_input": "Tell me about Paris"})
+    assert retriever.calls == 1
+    assert payload.retrieved_knowledge["retrieved_knowledge"]["facts"] == ["paris is in france"]
+    retriever.facts.append("paris hosts the louvre")
+    cache.invalidate_facts(["paris hosts the louvre"])
+    payload = await stub.retrieve({"input_id": "j", "user_input": "tell me about paris"})
+    assert retriever.calls == 2
+    assert len(payload.retrieved_knowledge["retrieved_knowledge"]["facts"]) == 2
@@ -0,0 +1,77 @@
+# File: tests/test_segment_log.py
+"""
+Tests for the append-only segment log used by the stream exporter.
+"""
+import types
+
+import pytest
+
+from src.deepthought.eda.segment_log import SegmentLogReader, SegmentLogWriter, list_segments
+from src.deepthought.eda.exporter import _reply_metadata
+
+
+def _write(directory, count, start=1, **kwargs):
+    with SegmentLogWriter(str(directory), **kwargs) as writer:
+        for seq in range(start, start + count):
+            writer.append(seq, seq * 1000, f"dtr.test.{seq % 3}", f"payload-{seq}".encode())
+
+
+def test_round_trip_across_segments(tmp_path):
+    _write(tmp_path, 500, max_segment_bytes=2048)
+    assert len(list_segments(str(tmp_path))) > 1
+
+    with SegmentLogReader(str(tmp_path)) as reader:
+        records = list(reader)
+        assert len(reader) == 500
+        assert reader.first_seq == 1 and reader.last_seq == 500
+    assert [r.seq for r in records] == list(range(1, 501))
+    assert records[41].subject == "dtr.test.0"
+    assert records[41].data == b"payload-42"
+
+
+def test_refresh_remaps_only_the_newest_segment(tmp_path):
+    writer = SegmentLogWriter(str(tmp_path), max_segment_bytes=2048)
+    for seq in range(1, 201):
+        writer.append(seq, seq * 1000, "dtr.test", f"payload-{seq}".encode())
+    writer.flush()
+    with SegmentLogReader(str(tmp_path)) as reader:
+        sealed = reader._segments[:-1]
+        for seq in range(201, 401):
+            writer.append(seq, seq * 1000, "dtr.test", f"payload-{seq}".encode())
+        writer.flush()
+        assert reader.last_seq == 200
+        reader.refresh()
+        assert reader.last_seq == 400 and len(reader) == 400
+        assert reader._segments[:len(sealed)] == sealed
+        assert [r.seq for r in reader.read_seq_range(195, 205)] == list(range(195, 205))
+    writer.close()
+
+
+def test_seq_and_time_ranges(tmp_path):
+    _write(tmp_path, 1000, max_segment_bytes=4096)
+
+    with SegmentLogReader(str(tmp_path)) as reader:
+        assert [r.seq for r in reader.read_seq_range(250, 260)] == list(range(250, 260))
+        by_time = [r.seq for r in reader.read_time_range(700_000, 705_000)]
+        assert by_time == list(range(700, 705))
+        assert [r.seq for r in reader.read_time_range(999_500)] == [1000]
+        assert list(reader.read_seq_range(2000)) == []
+
+
+def test_writer_resumes_after_last_record(tmp_path):
+    _write(tmp_path, 10)
+    with SegmentLogWriter(str(tmp_path)) as writer:
+        assert writer.last_seq == 10
+        with pytest.raises(ValueError):
+            writer.append(10, 0, "dtr.test", b"")
+    _write(tmp_path, 10, start=11)
+
+    with SegmentLogReader(str(tmp_path)) as reader:
+        assert [r.seq for r in reader] == list(range(1, 21))
+
+
+def test_reply_metadata_formats():
+    v1 = types.SimpleNamespace(reply="$JS.ACK.deepthought_events.c1.1.42.7.1700000000123456789.3")
+    v2 = types.SimpleNamespace(reply="$JS.ACK._.acc.deepthought_events.c1.1.42.7.1700000000123456789.3.xyz")
+    assert _reply_metadata(v1) == (42, 1700000000123456789, 3)
+    assert _reply_metadata(v2) == (42, 1700000000123456789, 3)
@@ -0,0 +1,110 @@
+# File: tests/test_shared_cache.py
+"""
+Tests for the two-tier retrieval cache shared between memory-stage workers.
+"""
+import asyncio
+import json
+
+import pytest
+
+from src.deepthought.memory.cache import RetrievalCache
+from src.deepthought.memory.shared_cache import LocalKeyValue, SharedRetrievalCache
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def compute_counter(result):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return dict(result)
+    return compute, calls
+
+
+@pytest.mark.asyncio
+async def test_second_worker_hits_shared_tier():
+    kv = LocalKeyValue()
+    first, second = SharedRetrievalCache(kv), SharedRetrievalCache(kv)
+    compute, calls = compute_counter({"facts": ["paris is in france"]})
+    await first.get_or_compute("Where is Paris?", 5, compute)
+    assert await second.get_or_compute("where is  paris", 5, compute) == {"facts": ["paris is in france"]}
+    assert await second.get_or_compute("where is paris", 5, compute) == {"facts": ["paris is in france"]}
+    assert len(calls) == 1
+    assert second.stats()["shared_hits"] == 1 and second.stats()["local_hits"] == 1
+    assert not [k for k in kv._data if k.startswith("lock.")]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_fill_once_across_workers():
+    kv = LocalKeyValue()
+    workers = [SharedRetrievalCache(kv) for _ in range(4)]
+    compute, calls = compute_counter({"facts": ["x"]})
+    results = await asyncio.gather(*(w.get_or_compute("same query", 3, compute)
+                                     for w in workers for _ in range(3)))
+    assert all(r == {"facts": ["x"]} for r in results)
+    assert len(calls) == 1
+    assert sum(w.stats()["waits"] for w in workers) > 0
+
+
+@pytest.mark.asyncio
+async def test_abandoned_lock_is_taken_over():
+    kv = LocalKeyValue()
+    cache = SharedRetrievalCache(kv, lock_timeout=5.0)
+    key = cache.key_hash("q", 1)
+    await kv.create(f"lock.{key}", json.dumps({"worker": "dead", "at": 0.0}).encode())
+    compute, calls = compute_counter({"facts": []})
+    await cache.get_or_compute("q", 1, compute)
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_other_workers():
+    kv = LocalKeyValue()
+    writer, reader = SharedRetrievalCache(kv), SharedRetrievalCache(kv)
+    await reader.start()
+    try:
+        compute, calls = compute_counter({"facts": ["paris is in france"]})
+        await reader.get_or_compute("paris", 5, compute)
+        await reader.get_or_compute("berlin", 5, compute)
+        await writer.invalidate_facts(["Paris hosts the Louvre"])
+        await asyncio.sleep(0)
+        # The shared entry predates the invalidation and is ignored as well
+        await writer.get_or_compute("paris", 5, compute)
+        assert writer.stats()["stale"] >= 1
+        await reader.get_or_compute("paris", 5, compute)
+        await reader.get_or_compute("berlin", 5, compute)
+        assert len(calls) == 3
+    finally:
+        await reader.stop()
+
+
+@pytest.mark.asyncio
+async def test_non_lexical_invalidation_drops_every_shared_entry():
+    kv = LocalKeyValue()
+    writer, reader = SharedRetrievalCache(kv), SharedRetrievalCache(kv)
+    writer.lexical = reader.lexical = False
+    compute, calls = compute_counter({"facts": ["x"]})
+    await reader.get_or_compute("berlin", 5, compute)
+    await writer.invalidate_facts(["Paris hosts the Louvre"])
+    await writer.get_or_compute("berlin", 5, compute)
+    assert len(calls) == 2 and writer.stats()["stale"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_shared_entries_expire_with_bucket_ttl():
+    clock = Clock()
+    kv = LocalKeyValue(ttl=60.0, clock=clock)
+    first = SharedRetrievalCache(kv)
+    second = SharedRetrievalCache(kv, local=RetrievalCache(ttl=60.0, clock=clock))
+    compute, calls = compute_counter({"facts": []})
+    await first.get_or_compute("q", 1, compute)
+    clock.now = 61.0
+    await second.get_or_compute("q", 1, compute)
+    assert len(calls) == 2
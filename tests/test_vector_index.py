@@ -0,0 +1,80 @@
+# File: tests/test_vector_index.py
+"""
+Tests for the flat and IVF embedding indexes used by the memory stage.
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.deepthought.memory.vector_index import FlatIndex, HashingEmbedder, IVFIndex, VectorRetriever
+
+
+def _data(n=4000, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((40, dim))
+    return (centers[rng.integers(0, 40, n)] + 0.3 * rng.standard_normal((n, dim))).astype(np.float32)
+
+
+def test_flat_index_returns_exact_neighbours():
+    data = _data()
+    index = FlatIndex(32, initial_capacity=16)
+    index.add(data[:100])
+    index.add(data[100:])
+    scores, ids = index.search(data[:5], k=3)
+    assert ids.shape == (5, 3)
+    assert ids[:, 0].tolist() == [0, 1, 2, 3, 4]
+    assert np.allclose(scores[:, 0], 1.0, atol=1e-5)
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+
+def test_ivf_recall_and_memory_against_brute_force():
+    data = _data()
+    flat = FlatIndex(32)
+    flat.add(data)
+    ivf = IVFIndex(32, nlist=32, nprobe=8)
+    ivf.train(data)
+    ivf.add(data[:2000])
+    ivf.add(data[2000:])
+    queries = data[::50] + 0.05
+    _, truth = flat.search(queries, k=10)
+    _, found = ivf.search(queries, k=10)
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth.tolist(), found.tolist()))
+    assert hits / truth.size > 0.8
+    assert ivf.nbytes < flat.nbytes / 2
+
+
+def test_ivf_requires_training():
+    with pytest.raises(RuntimeError):
+        IVFIndex(8, nlist=4).add(np.ones((2, 8)))
+
+
+def test_vector_retriever_interface():
+    retriever = VectorRetriever(FlatIndex(256), HashingEmbedder(256))
+    retriever.add_facts(["The Eiffel Tower is in Paris", "Berlin is the capital of Germany",
+                         "Paris is the capital of France"])
+    result = retriever.retrieve("capital of Germany", top_k=2)
+    assert result["facts"][0] == "Berlin is the capital of Germany"
+    assert result["source"] == "vector_index"
+    assert len(result["scores"]) == 2
+    batch = retriever.search(["Eiffel Tower", "France capital"], top_k=1)
+    assert batch[0][0][0] == "The Eiffel Tower is in Paris"
+
+
+def test_ivf_retriever_searches_exhaustively_until_it_can_train():
+    embedded = []
+
+    def embed(texts):
+        embedded.extend(texts)
+        return HashingEmbedder(64)(texts)
+
+    retriever = VectorRetriever(IVFIndex(64, nlist=16, nprobe=16), embed)
+    retriever.add_facts(["Berlin is the capital of Germany", "The Eiffel Tower is in Paris"])
+    assert not retriever._index.is_trained
+    assert retriever.retrieve("capital of Germany", top_k=1)["facts"] == ["Berlin is the capital of Germany"]
+
+    facts = [f"fact number {i} about topic {i % 7}" for i in range(40)]
+    for start in range(0, len(facts), 5):
+        retriever.add_facts(facts[start:start + 5], batch_size=2)
+    assert retriever._index.is_trained and len(retriever._index) == 42
+    assert embedded == retriever.facts[:2] + ["capital of Germany"] + facts  # each fact embedded once
+    assert retriever.retrieve("The Eiffel Tower is in Paris", top_k=1)["facts"] == ["The Eiffel Tower is in Paris"]
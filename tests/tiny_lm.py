@@ -0,0 +1,32 @@
+# File: tests/tiny_lm.py
+"""
+A tiny randomly initialised causal LM and byte-level tokenizer for LLM tests.
+
+Built locally so the tests need no downloads; shared by the LLM engine tests.
+"""
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+tokenizers = pytest.importorskip("tokenizers")
+
+
+def tiny_tokenizer():
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    alphabet = pre_tokenizers.ByteLevel.alphabet()
+    vocab = {"<pad>": 0, "</s>": 1}
+    for char in sorted(alphabet):
+        vocab[char] = len(vocab)
+    tok = Tokenizer(models.BPE(vocab=vocab, merges=[]))
+    tok.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tok.decoder = decoders.ByteLevel()
+    return transformers.PreTrainedTokenizerFast(tokenizer_object=tok, eos_token="</s>", pad_token="<pad>")
+
+
+def tiny_model(seed=0, vocab_size=258, eos_token_id=1, layers=2):
+    torch.manual_seed(seed)
+    config = transformers.LlamaConfig(vocab_size=vocab_size, hidden_size=64, intermediate_size=128,
+                                      num_hidden_layers=layers, num_attention_heads=4, num_key_value_heads=2,
+                                      max_position_embeddings=512, eos_token_id=eos_token_id,
+                                      pad_token_id=0, bos_token_id=None)
+    return transformers.LlamaForCausalLM(config).eval()